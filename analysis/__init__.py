@@ -0,0 +1,38 @@
+"""
+分析モジュール
+
+各分析レイヤーを入出力を宣言したステージとして定義し、
+依存関係に従って（独立したステージは並列に）実行する。
+"""
+from .pipeline import Stage, PipelineError, run_stages, select_stages
+from .cache import StageCache
+from .parallel import ProcessPool
+from .stages import DEFAULT_SEGMENTS, LAYER_OUTPUTS, LAYER_NAMES, build_stages, resolve_layers, run_analysis
+from .incremental import IncrementalAnalysis, run_incremental
+from .chunked import run_chunked
+from .ingest import canonical_record, ingest_records, ingest_store, iter_store
+from .export import save_json, save_excel
+
+__all__ = [
+    "Stage",
+    "PipelineError",
+    "run_stages",
+    "select_stages",
+    "StageCache",
+    "ProcessPool",
+    "DEFAULT_SEGMENTS",
+    "LAYER_OUTPUTS",
+    "LAYER_NAMES",
+    "build_stages",
+    "resolve_layers",
+    "run_analysis",
+    "IncrementalAnalysis",
+    "run_incremental",
+    "run_chunked",
+    "canonical_record",
+    "ingest_records",
+    "ingest_store",
+    "iter_store",
+    "save_json",
+    "save_excel",
+]
@@ -0,0 +1,256 @@
+"""
+マージ可能な集計量（十分統計量）
+
+平均・標準偏差・最小値・最大値・度数・相関係数を、
+チャンクごとに計算した集計量を合算（マージ）して求める。
+分散・共分散は Chan らの並列アルゴリズムで合算するため、
+件数が大きくなっても桁落ちしにくい。
+"""
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class ColumnMoments:
+    """列ごとの件数・平均・偏差平方和・最小値・最大値（欠損値は列ごとに除外）"""
+
+    def __init__(self, k: int):
+        """
+        Args:
+            k: 列数
+        """
+        self.n = np.zeros(k, dtype=np.int64)
+        self.mean = np.zeros(k)
+        self.m2 = np.zeros(k)
+        self.min = np.full(k, np.inf)
+        self.max = np.full(k, -np.inf)
+
+    @classmethod
+    def from_array(cls, x: np.ndarray) -> "ColumnMoments":
+        """
+        配列（行 = 回答者, 列 = 変数、欠損値は NaN）から集計量を計算
+
+        Args:
+            x: 2次元配列
+
+        Returns:
+            集計量
+        """
+        x = np.asarray(x, dtype=float)
+        moments = cls(x.shape[1])
+        valid = ~np.isnan(x)
+        n = valid.sum(axis=0)
+        has_data = n > 0
+        if not has_data.any():
+            return moments
+        filled = np.where(valid, x, 0.0)
+        mean = np.divide(filled.sum(axis=0), n, out=np.zeros(x.shape[1]), where=has_data)
+        moments.n = n.astype(np.int64)
+        moments.mean = mean
+        moments.m2 = np.where(valid, (x - mean) ** 2, 0.0).sum(axis=0)
+        moments.min = np.where(valid, x, np.inf).min(axis=0)
+        moments.max = np.where(valid, x, -np.inf).max(axis=0)
+        return moments
+
+    def merge(self, other: "ColumnMoments") -> None:
+        """他の集計量を合算"""
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        safe_n = np.maximum(n, 1)
+        self.mean = self.mean + delta * other.n / safe_n
+        self.m2 = self.m2 + other.m2 + delta ** 2 * self.n * other.n / safe_n
+        self.n = n
+        self.min = np.minimum(self.min, other.min)
+        self.max = np.maximum(self.max, other.max)
+
+    def means(self) -> np.ndarray:
+        """平均（データがない列はNaN）"""
+        return np.where(self.n > 0, self.mean, np.nan)
+
+    def stds(self) -> np.ndarray:
+        """不偏標準偏差（pandas の std() と同じ ddof=1）"""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.n > 1, np.sqrt(self.m2 / (self.n - 1)), np.nan)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSONに保存できる形式に変換"""
+        return {
+            "n": self.n.tolist(),
+            "mean": self.mean.tolist(),
+            "m2": self.m2.tolist(),
+            "min": [None if np.isinf(v) else v for v in self.min.tolist()],
+            "max": [None if np.isinf(v) else v for v in self.max.tolist()],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ColumnMoments":
+        """to_dict() の結果から復元"""
+        moments = cls(len(data["n"]))
+        moments.n = np.asarray(data["n"], dtype=np.int64)
+        moments.mean = np.asarray(data["mean"], dtype=float)
+        moments.m2 = np.asarray(data["m2"], dtype=float)
+        moments.min = np.asarray([np.inf if v is None else v for v in data["min"]], dtype=float)
+        moments.max = np.asarray([-np.inf if v is None else v for v in data["max"]], dtype=float)
+        return moments
+
+
+class CoMoments:
+    """件数・平均ベクトル・共偏差積和行列（欠損値を含む行は除外）"""
+
+    def __init__(self, k: int):
+        """
+        Args:
+            k: 変数の数
+        """
+        self.n = 0
+        self.mean = np.zeros(k)
+        self.comoment = np.zeros((k, k))
+
+    @classmethod
+    def from_array(cls, x: np.ndarray) -> "CoMoments":
+        """
+        配列（行 = 回答者, 列 = 変数）から集計量を計算
+
+        Args:
+            x: 2次元配列
+
+        Returns:
+            集計量
+        """
+        x = np.asarray(x, dtype=float)
+        moments = cls(x.shape[1])
+        x = x[~np.isnan(x).any(axis=1)]
+        if len(x) == 0:
+            return moments
+        moments.n = len(x)
+        moments.mean = x.mean(axis=0)
+        centered = x - moments.mean
+        moments.comoment = centered.T @ centered
+        return moments
+
+    def merge(self, other: "CoMoments") -> None:
+        """他の集計量を合算"""
+        if other.n == 0:
+            return
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.comoment = self.comoment + other.comoment + np.outer(delta, delta) * self.n * other.n / n
+        self.mean = self.mean + delta * other.n / n
+        self.n = n
+
+    def correlation(self) -> np.ndarray:
+        """ピアソン相関行列（分散0の変数を含む要素はNaN）"""
+        scale = np.sqrt(np.diag(self.comoment))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            corr = self.comoment / np.outer(scale, scale)
+        corr[~np.isfinite(corr)] = np.nan
+        return corr
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSONに保存できる形式に変換"""
+        return {"n": self.n, "mean": self.mean.tolist(), "comoment": self.comoment.tolist()}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CoMoments":
+        """to_dict() の結果から復元"""
+        moments = cls(len(data["mean"]))
+        moments.n = int(data["n"])
+        moments.mean = np.asarray(data["mean"], dtype=float)
+        moments.comoment = np.asarray(data["comoment"], dtype=float)
+        return moments
+
+
+class ValueCounts:
+    """値ごとの度数"""
+
+    def __init__(self, counts: Optional[Dict[Hashable, int]] = None):
+        self.counts: Dict[Hashable, int] = dict(counts or {})
+
+    @classmethod
+    def from_series(cls, series: pd.Series, weights: Optional[np.ndarray] = None) -> "ValueCounts":
+        """
+        列の値の度数を計算（欠損値と、カテゴリ型の列で回答のないカテゴリは除外）
+
+        Args:
+            series: 回答テーブルの列
+            weights: 回答者の重み（Noneの場合は件数。指定した場合は値ごとの重みの和）
+        """
+        if weights is None:
+            return cls({_to_python(k): int(v) for k, v in series.value_counts().items() if v})
+        totals = pd.Series(weights, index=series.index).groupby(series, observed=True, sort=False).sum()
+        return cls({_to_python(k): float(v) for k, v in totals.items() if v})
+
+    def add(self, values: Iterable[Hashable]) -> None:
+        """値を1件ずつ加算"""
+        for value in values:
+            self.counts[value] = self.counts.get(value, 0) + 1
+
+    def merge(self, other: "ValueCounts") -> None:
+        """他の度数を合算"""
+        for value, count in other.counts.items():
+            self.counts[value] = self.counts.get(value, 0) + count
+
+    def to_result(self) -> Dict[Hashable, int]:
+        """度数の降順の辞書（pandas の value_counts().to_dict() と同じ形式）"""
+        return dict(sorted(self.counts.items(), key=lambda x: -x[1]))
+
+    def to_dict(self) -> List[List[Any]]:
+        """JSONに保存できる形式に変換（キーの型を保つため [値, 度数] のリストとする）"""
+        return [[value, count] for value, count in self.counts.items()]
+
+    @classmethod
+    def from_dict(cls, data: List[List[Any]]) -> "ValueCounts":
+        """to_dict() の結果から復元"""
+        return cls({value: count for value, count in data})
+
+
+def value_counts(series: pd.Series, weights: Optional[np.ndarray] = None) -> Dict[Hashable, Any]:
+    """
+    回答のあった値の度数（度数の降順）
+
+    pandas の value_counts().to_dict() と同じ形式だが、カテゴリ型の回答のないカテゴリを含めず、
+    nullable 整数型の値も Python の int に変換する。
+
+    Args:
+        series: 回答テーブルの列
+        weights: 回答者の重み（指定した場合は値ごとの重みの和）
+
+    Returns:
+        値 -> 度数
+    """
+    return ValueCounts.from_series(series, weights).to_result()
+
+
+def mean_std(series: pd.Series, weights: Optional[np.ndarray] = None) -> Tuple[float, float]:
+    """
+    列の平均と不偏標準偏差（欠損値は除外）
+
+    重みは平均1の頻度重みとして扱い、分散の分母は重みの和 - 1 とする
+    （重みがすべて1の場合は pandas の mean() / std() と同じ）。
+
+    Args:
+        series: 回答テーブルの列
+        weights: 回答者の重み（Noneの場合は重み付けしない）
+
+    Returns:
+        (平均, 標準偏差)。計算できない場合は NaN
+    """
+    if weights is None:
+        return float(series.mean()), float(series.std())
+    x = series.to_numpy(dtype=float, na_value=np.nan)
+    valid = ~np.isnan(x)
+    w = np.asarray(weights, dtype=float)[valid]
+    x = x[valid]
+    total = w.sum()
+    if total <= 0:
+        return np.nan, np.nan
+    mean = float(np.dot(w, x) / total)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        var = np.dot(w, (x - mean) ** 2) / (total - 1)
+    return mean, float(np.sqrt(var)) if total > 1 else np.nan
+
+
+def _to_python(value: Any) -> Any:
+    """NumPyのスカラーをPythonの値に変換"""
+    return value.item() if isinstance(value, np.generic) else value
@@ -0,0 +1,363 @@
+"""
+ブートストラップ信頼区間
+
+回答者ごとの特徴量行列（SD評価・購買意欲の欠損マスク・値・平方・積、完全ケースの積和、最良／最悪音の選択）を
+1度だけ作り、B 個の再標本を「回答者が何回選ばれたか」の重み行列 (b, N) として一括で生成して、
+重み行列 × 特徴量行列 の行列積から全サンプルの平均・相関・Shapley 値・重要度順位・選択率を同時に求める。
+WTP の選択肢の指定がある場合は、選択肢ごとの回答者数から再標本ごとに区間打ち切り推定（wtp.fit_lognormal()）を行う。
+再標本はブロック単位で SeedSequence から乱数を派生させるため、並列数によらず結果は同じになる。
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .drivers import analyze_drivers, correlation_from_sums, covariance_features
+from .parallel import ProcessPool
+from .tensor import RatingTensor
+from .wtp import fit_lognormal, wtp_codes, wtp_intervals, wtp_statistics
+
+
+DEFAULT_RESAMPLES = 2000
+DEFAULT_SEED = 20260109
+DEFAULT_CONFIDENCE = 0.95
+
+# 1ブロックの再標本数 × 回答者数 の上限（インデックス・重み行列の作業メモリを抑える）
+_BLOCK_ELEMENTS = 12_000_000
+_MAX_BLOCK_SIZE = 256
+
+
+@dataclass
+class BootstrapFeatures:
+    """再標本の重み付き和から統計量を求めるための特徴量行列"""
+
+    samples: List[str]
+    axis_ids: List[str]
+    present: np.ndarray  # bool (サンプル数, 軸数 + 1)
+    center: np.ndarray   # (サンプル数, 軸数 + 1)、桁落ちを避けるために差し引いた値
+    matrix: np.ndarray   # float64 (N, 特徴量数)
+    wtp_lower: np.ndarray  # WTP の選択肢の区間の下限（選択肢の指定がない場合は空）
+    wtp_upper: np.ndarray  # WTP の選択肢の区間の上限
+
+    @classmethod
+    def from_table(
+        cls, df: pd.DataFrame, samples: List[str], axes: List[Dict], wtp_labels: Optional[List[str]] = None,
+    ) -> "BootstrapFeatures":
+        """
+        回答テーブルから特徴量行列を作成
+
+        列の並び（S: サンプル数, V: 軸数 + 1, A: 軸数）:
+            m, m·x, m·x² をそれぞれ S×V 列、
+            軸と購買意欲の両方に回答がある p について p, p·x, p·y, p·x², p·y², p·x·y をそれぞれ S×A 列、
+            最良音・最悪音の選択をそれぞれ S 列、最良音・最悪音の回答有無を1列ずつ、
+            ドライバー分析用の完全ケースの積和（drivers.covariance_features()）、
+            WTP の選択の有無（選択肢の指定がある場合）を S×選択肢数 列
+
+        Args:
+            df: 回答テーブル
+            samples: サンプルIDのリスト
+            axes: SD評価軸の定義
+            wtp_labels: WTPの選択肢（金額の昇順。Noneの場合は WTP を推定しない）
+
+        Returns:
+            特徴量行列
+        """
+        tensor = RatingTensor.from_table(df, samples, axes)
+        m = tensor.mask.astype(np.float64)
+        count = m.sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            center = np.where(count > 0, tensor.values.sum(axis=0, dtype=np.float64) / count, 0.0)
+        x = (tensor.values - center) * m
+
+        p = m[:, :, :-1] * m[:, :, -1:]
+        xa = x[:, :, :-1] * p
+        xi = x[:, :, -1:] * p
+        n = len(df)
+        blocks = [m, x, x * x, p, xa, xi, xa * xa, xi * xi, xa * xi]
+        choices = []
+        for column in ("best_sound", "worst_sound"):
+            labels = df[column] if column in df.columns else pd.Series([None] * n, index=df.index)
+            choices.append(np.stack([(labels == sample_id).to_numpy() for sample_id in samples], axis=1))
+            choices.append(labels.notna().to_numpy()[:, None])
+        covariance = covariance_features(tensor)
+        wtp = []
+        wtp_lower = wtp_upper = np.empty(0)
+        if wtp_labels:
+            wtp_lower, wtp_upper = wtp_intervals(wtp_labels)
+            codes = wtp_codes(df, samples, wtp_labels)
+            wtp.append((codes[:, :, None] == np.arange(len(wtp_labels))).reshape(n, -1))
+        matrix = np.concatenate(
+            [block.reshape(n, -1) for block in blocks] + choices + [covariance] + wtp, axis=1, dtype=np.float64
+        )
+        return cls(list(samples), tensor.axis_ids, tensor.present, center, matrix, wtp_lower, wtp_upper)
+
+    @property
+    def n_respondents(self) -> int:
+        """回答者数"""
+        return self.matrix.shape[0]
+
+    def statistics(self, sums: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        特徴量の重み付き和から統計量を計算
+
+        Args:
+            sums: (b, 特徴量数) の重み付き和
+
+        Returns:
+            mean (b, S, V)、correlation (b, S, A)、shapley (b, S, A)、rank (b, S, A)、
+            best_share / worst_share (b, S)、WTP を推定する場合は wtp_mean / wtp_median (b, S)
+        """
+        b = sums.shape[0]
+        n_samples, n_vars = self.present.shape
+        n_axes = n_vars - 1
+        sv, sa = n_samples * n_vars, n_samples * n_axes
+        m, sx, _ = (sums[:, i * sv:(i + 1) * sv].reshape(b, n_samples, n_vars) for i in range(3))
+        offset = 3 * sv
+        p, sa_x, sa_y, sa_xx, sa_yy, sa_xy = (
+            sums[:, offset + i * sa:offset + (i + 1) * sa].reshape(b, n_samples, n_axes) for i in range(6)
+        )
+        offset += 6 * sa
+        best = sums[:, offset:offset + n_samples]
+        best_n = sums[:, offset + n_samples]
+        offset += n_samples + 1
+        worst = sums[:, offset:offset + n_samples]
+        worst_n = sums[:, offset + n_samples]
+        offset += n_samples + 1
+        n_brackets = len(self.wtp_lower)
+        end = sums.shape[1] - n_samples * n_brackets
+        _, driver_corr = correlation_from_sums(sums[:, offset:end], n_samples, n_vars)
+        r2, shapley, _ = analyze_drivers(driver_corr)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = sx / m + self.center
+            cov = sa_xy - sa_x * sa_y / p
+            var_x = sa_xx - sa_x * sa_x / p
+            var_y = sa_yy - sa_y * sa_y / p
+            corr = np.clip(cov / np.sqrt(var_x * var_y), -1.0, 1.0)
+            best_share = best / best_n[:, None]
+            worst_share = worst / worst_n[:, None]
+        # sd_purchase_correlation() と同様に、計算できない相関は0とみなす
+        corr[(p < 2) | ~np.isfinite(corr)] = 0.0
+
+        # rank_importance() と同じく Shapley 値の降順（計算できない場合は相関係数の絶対値の降順、
+        # 同値は軸の定義順）。列のない軸は最下位
+        use_shapley = ~np.isnan(r2)[..., None] & self.present.all(axis=1)[:, None]
+        importance = np.where(use_shapley, np.nan_to_num(shapley, nan=-np.inf), np.abs(corr))
+        importance = np.where(self.present[:, :-1], importance, -np.inf)
+        order = np.argsort(-importance, axis=-1, kind="stable")
+        rank = np.empty_like(order)
+        np.put_along_axis(rank, order, np.arange(1, n_axes + 1), axis=-1)
+        result = {
+            "mean": mean,
+            "correlation": corr,
+            "shapley": shapley,
+            "rank": rank,
+            "best_share": best_share,
+            "worst_share": worst_share,
+        }
+        if n_brackets:
+            counts = sums[:, end:].reshape(b, n_samples, n_brackets)
+            wtp = wtp_statistics(fit_lognormal(counts, self.wtp_lower, self.wtp_upper))
+            result["wtp_mean"] = wtp["mean"]
+            result["wtp_median"] = wtp["median"]
+        return result
+
+
+def block_size(n_respondents: int) -> int:
+    """
+    1ブロックの再標本数（回答者数のみで決まるため、並列数によらず乱数の割り当ては同じ）
+
+    Args:
+        n_respondents: 回答者数
+
+    Returns:
+        再標本数
+    """
+    return int(max(1, min(_MAX_BLOCK_SIZE, _BLOCK_ELEMENTS // max(n_respondents, 1))))
+
+
+def resample_sums(matrix: np.ndarray, size: int, seed_sequence: np.random.SeedSequence) -> np.ndarray:
+    """
+    1ブロック分の再標本について特徴量の重み付き和を計算
+
+    Args:
+        matrix: 特徴量行列 (N, 特徴量数)
+        size: 再標本数
+        seed_sequence: このブロックの乱数シード
+
+    Returns:
+        (size, 特徴量数) の重み付き和
+    """
+    n = matrix.shape[0]
+    rng = np.random.default_rng(seed_sequence)
+    index = rng.integers(0, n, size=(size, n))
+    index += np.arange(size)[:, None] * n
+    weights = np.bincount(index.ravel(), minlength=size * n).reshape(size, n)
+    return weights.astype(np.float64) @ matrix
+
+
+def _resample_task(arrays: Dict[str, np.ndarray], task: Tuple[int, np.random.SeedSequence]) -> np.ndarray:
+    """1ブロック分の再標本の重み付き和（ワーカープロセスで実行）"""
+    size, seed_sequence = task
+    return resample_sums(arrays["matrix"], size, seed_sequence)
+
+
+def bootstrap_sums(
+    features: BootstrapFeatures,
+    resamples: int,
+    seed: int = DEFAULT_SEED,
+    workers: int = 1,
+    pool: Optional[ProcessPool] = None,
+) -> np.ndarray:
+    """
+    全再標本の特徴量の重み付き和
+
+    Args:
+        features: 特徴量行列
+        resamples: 再標本数
+        seed: 乱数シード
+        workers: プロセス数（1の場合は同じプロセスで計算。pool を指定した場合は無視）
+        pool: 特徴量行列を共有するプロセスプール
+
+    Returns:
+        (resamples, 特徴量数) の重み付き和
+    """
+    size = block_size(features.n_respondents)
+    sizes = [min(size, resamples - start) for start in range(0, resamples, size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    if pool is None:
+        with ProcessPool(workers) as own_pool:
+            return bootstrap_sums(features, resamples, seed, pool=own_pool)
+    shared = pool.share(matrix=features.matrix)
+    return np.concatenate(pool.map(_resample_task, shared, list(zip(sizes, seeds))), axis=0)
+
+
+def _interval(estimate: np.ndarray, replicates: np.ndarray, confidence: float) -> Dict[str, np.ndarray]:
+    """パーセンタイル法の信頼区間"""
+    alpha = (1 - confidence) / 2
+    with np.errstate(invalid="ignore"):
+        low, high = np.nanpercentile(replicates, [100 * alpha, 100 * (1 - alpha)], axis=0)
+    return {"estimate": estimate, "ci_low": low, "ci_high": high}
+
+
+def _to_float(value: float) -> Optional[float]:
+    """JSONに書き出せる値（NaN は None）"""
+    return None if np.isnan(value) else float(value)
+
+
+def bootstrap_intervals(
+    features: BootstrapFeatures,
+    resamples: int = DEFAULT_RESAMPLES,
+    seed: int = DEFAULT_SEED,
+    confidence: float = DEFAULT_CONFIDENCE,
+    workers: int = 1,
+    pool: Optional[ProcessPool] = None,
+) -> Dict[str, Any]:
+    """
+    SD評価・購買意欲の平均、SD評価-購買意欲相関、Shapley 値、重要度順位、最良／最悪音の選択率の信頼区間
+
+    Args:
+        features: 特徴量行列
+        resamples: 再標本数
+        seed: 乱数シード
+        confidence: 信頼水準
+        workers: プロセス数（pool を指定した場合は無視）
+        pool: 特徴量行列を共有するプロセスプール
+
+    Returns:
+        {"n_resamples", "seed", "confidence", "sd_means", "purchase_intent",
+         "sd_purchase_correlation", "shapley", "importance_rank", "best_share", "worst_share"}
+        （WTP を推定する場合はさらに "wtp_mean", "wtp_median"）
+        各値は {"estimate", "ci_low", "ci_high"}（重要度順位はさらに首位となった割合 "p_top"）
+    """
+    point = features.statistics(features.matrix.sum(axis=0, keepdims=True))
+    replicates = features.statistics(bootstrap_sums(features, resamples, seed, workers, pool))
+    mean = _interval(point["mean"][0], replicates["mean"], confidence)
+    corr = _interval(point["correlation"][0], replicates["correlation"], confidence)
+    shapley = _interval(point["shapley"][0], replicates["shapley"], confidence)
+    rank = _interval(point["rank"][0].astype(np.float64), replicates["rank"], confidence)
+    p_top = (replicates["rank"] == 1).mean(axis=0)
+    best = _interval(point["best_share"][0], replicates["best_share"], confidence)
+    worst = _interval(point["worst_share"][0], replicates["worst_share"], confidence)
+
+    def pick(interval: Dict[str, np.ndarray], index) -> Dict[str, Optional[float]]:
+        return {key: _to_float(values[index]) for key, values in interval.items()}
+
+    result = {
+        "n_resamples": int(resamples),
+        "seed": int(seed),
+        "confidence": float(confidence),
+        "sd_means": {},
+        "purchase_intent": {},
+        "sd_purchase_correlation": {},
+        "shapley": {},
+        "importance_rank": {},
+        "best_share": {},
+        "worst_share": {},
+    }
+    present = features.present
+    for s, sample_id in enumerate(features.samples):
+        sd_means = {
+            axis_id: pick(mean, (s, a))
+            for a, axis_id in enumerate(features.axis_ids) if present[s, a]
+        }
+        if sd_means:
+            result["sd_means"][sample_id] = sd_means
+        result["best_share"][sample_id] = pick(best, s)
+        result["worst_share"][sample_id] = pick(worst, s)
+        if not present[s, -1]:
+            continue
+        result["purchase_intent"][sample_id] = pick(mean, (s, -1))
+        axes = [a for a in range(len(features.axis_ids)) if present[s, a]]
+        result["sd_purchase_correlation"][sample_id] = {
+            features.axis_ids[a]: pick(corr, (s, a)) for a in axes
+        }
+        if present[s].all():
+            result["shapley"][sample_id] = {
+                axis_id: pick(shapley, (s, a)) for a, axis_id in enumerate(features.axis_ids)
+            }
+        result["importance_rank"][sample_id] = [
+            {
+                "axis": features.axis_ids[a],
+                "rank": int(point["rank"][0, s, a]),
+                "ci_low": _to_float(rank["ci_low"][s, a]),
+                "ci_high": _to_float(rank["ci_high"][s, a]),
+                "p_top": float(p_top[s, a]),
+            }
+            for a in sorted(axes, key=lambda a: point["rank"][0, s, a])
+        ]
+    if "wtp_mean" in point:
+        wtp_mean = _interval(point["wtp_mean"][0], replicates["wtp_mean"], confidence)
+        wtp_median = _interval(point["wtp_median"][0], replicates["wtp_median"], confidence)
+        result["wtp_mean"], result["wtp_median"] = {}, {}
+        for s, sample_id in enumerate(features.samples):
+            result["wtp_mean"][sample_id] = pick(wtp_mean, s)
+            result["wtp_median"][sample_id] = pick(wtp_median, s)
+    return result
+
+
+def run_bootstrap(
+    table: pd.DataFrame,
+    samples: List[str],
+    axes: List[Dict],
+    bootstrap_options: Dict[str, Any],
+    pool: Optional[ProcessPool] = None,
+    wtp_options: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    ブートストラップステージ
+
+    Args:
+        table: 回答テーブル
+        samples: サンプルIDのリスト
+        axes: SD評価軸の定義
+        bootstrap_options: bootstrap_intervals() のキーワード引数（resamples, seed, confidence）
+        pool: 再標本のブロックを並列に計算するプロセスプール
+        wtp_options: WTP 推定の設定（"labels" に選択肢がある場合は WTP の平均・中央値の信頼区間も求める）
+
+    Returns:
+        {"bootstrap": 信頼区間}
+    """
+    features = BootstrapFeatures.from_table(table, samples, axes, (wtp_options or {}).get("labels"))
+    return {"bootstrap": bootstrap_intervals(features, **bootstrap_options, pool=pool)}
@@ -0,0 +1,163 @@
+"""
+分析ステージ出力のキャッシュ
+
+各ステージの出力を、入力の指紋（ファイル内容のハッシュ・設定値）と
+ステージのコードバージョン（パッケージのソースのハッシュ）から求めたキーでディスクに保存する。
+上流ステージの指紋を下流の指紋に含める（Merkle木）ため、
+ステージを実行する前に全ステージのキャッシュの有無を判定できる。
+"""
+import hashlib
+import inspect
+import json
+import pickle
+import sys
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from .pipeline import Stage
+
+
+# ハッシュ計算時の読み込みサイズ
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class StageCache:
+    """ステージ出力のディスクキャッシュ"""
+
+    def __init__(self, cache_dir: Path):
+        """
+        キャッシュの初期化
+
+        Args:
+            cache_dir: キャッシュの保存先
+        """
+        self.cache_dir = Path(cache_dir)
+        # (パス, 更新時刻, サイズ) -> ファイル内容のハッシュ
+        self._file_hashes: Dict[Tuple[str, int, int], str] = {}
+        self._source_hashes: Dict[str, str] = {}
+
+    def fingerprint_value(self, value: Any) -> str:
+        """
+        初期入力の指紋を計算
+
+        ファイルパスは内容のハッシュ、それ以外の値はJSON表現のハッシュとする。
+
+        Args:
+            value: 入力値
+
+        Returns:
+            指紋（16進文字列）
+        """
+        if isinstance(value, Path):
+            return self._file_hash(value)
+        if hasattr(value, "fingerprint"):
+            return str(value.fingerprint())
+        encoded = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    def fingerprint_stage(self, stage: Stage, input_fingerprints: Dict[str, str]) -> str:
+        """
+        ステージの指紋を計算
+
+        Args:
+            stage: ステージ
+            input_fingerprints: 入力名 -> 指紋
+
+        Returns:
+            指紋（16進文字列）
+        """
+        digest = hashlib.sha256()
+        digest.update(stage.name.encode("utf-8"))
+        digest.update(stage.version.encode("utf-8"))
+        digest.update(self._source_hash(stage).encode("utf-8"))
+        for name in stage.inputs:
+            digest.update(f"{name}={input_fingerprints[name]}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def has(self, stage: Stage, fingerprint: str) -> bool:
+        """キャッシュが存在するか"""
+        return self._path(stage, fingerprint).exists()
+
+    def load(self, stage: Stage, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """
+        キャッシュ済みの出力を読み込み
+
+        Returns:
+            出力名 -> 値（読み込めない場合はNone）
+        """
+        try:
+            with open(self._path(stage, fingerprint), "rb") as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def store(self, stage: Stage, fingerprint: str, outputs: Dict[str, Any]) -> None:
+        """
+        出力を保存（同じステージの古いキャッシュは削除する）
+
+        Args:
+            stage: ステージ
+            fingerprint: ステージの指紋
+            outputs: 出力名 -> 値
+        """
+        stage_dir = self.cache_dir / stage.name
+        stage_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(stage, fingerprint)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump(outputs, f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp_path.replace(path)
+        for old in stage_dir.glob("*.pkl"):
+            if old != path:
+                old.unlink(missing_ok=True)
+
+    def _path(self, stage: Stage, fingerprint: str) -> Path:
+        """キャッシュファイルのパス"""
+        return self.cache_dir / stage.name / f"{fingerprint[:32]}.pkl"
+
+    def _file_hash(self, path: Path) -> str:
+        """ファイル内容のハッシュ（更新時刻とサイズが同じ間は再計算しない）"""
+        if not path.is_file():
+            return f"missing:{path}"
+        stat = path.stat()
+        key = (str(path.resolve()), stat.st_mtime_ns, stat.st_size)
+        cached = self._file_hashes.get(key)
+        if cached is None:
+            digest = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+                    digest.update(chunk)
+            cached = digest.hexdigest()
+            self._file_hashes[key] = cached
+        return cached
+
+    def _source_hash(self, stage: Stage) -> str:
+        """
+        ステージ関数を定義しているパッケージのソースのハッシュ
+
+        ステージ関数が使う補助モジュール（集計量・読み込み・並列実行など）の変更でもキャッシュを無効化するため、
+        関数を定義しているモジュールが属するパッケージの全モジュールのソースをまとめてハッシュする
+        （パッケージに属さないモジュールはそのモジュールのソースのみ）。
+        """
+        module_name = getattr(stage.func, "__module__", None) or ""
+        package_name = module_name.split(".")[0]
+        cached = self._source_hashes.get(package_name)
+        if cached is None:
+            package = sys.modules.get(package_name)
+            package_path = getattr(package, "__path__", None)
+            digest = hashlib.sha256()
+            if package_path:
+                for directory in package_path:
+                    for path in sorted(Path(directory).rglob("*.py")):
+                        digest.update(str(path.relative_to(directory)).encode("utf-8"))
+                        digest.update(path.read_bytes())
+            else:
+                module = sys.modules.get(module_name)
+                try:
+                    source = inspect.getsource(module) if module else ""
+                except (OSError, TypeError):
+                    source = ""
+                digest.update(source.encode("utf-8"))
+            cached = digest.hexdigest()
+            self._source_hashes[package_name] = cached
+        return cached
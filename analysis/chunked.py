@@ -0,0 +1,84 @@
+"""
+分割実行（アウトオブコア分析）
+
+回答データ（CSV と JSON / JSON Lines）を一定件数ずつ順に読み込み、
+増分分析と同じマージ可能な集計量・ラダリングの度数に加算する。
+同時にメモリに載るのは1回分の読み込みと集計量だけなので、
+ピークメモリは回答者数によらず1回あたりの読み込み件数でほぼ決まる。
+回答データ（JSON）はラダリングの集計に使う項目だけを残して読み込む。
+"""
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Mapping, Optional
+
+from .incremental import ID_COLUMN, IncrementalAnalysis
+from .loaders import DEFAULT_CHUNK_SIZE, DEFAULT_RECORD_CHUNK_SIZE, ColumnType, iter_records, iter_table
+from .segmentation import SegmentSpec
+
+
+# 回答データ（JSON）のうちラダリングの集計に使う項目
+RECORD_KEYS = (ID_COLUMN, "grid_evaluation", "demographics")
+
+
+def run_chunked(
+    csv_path: Path,
+    json_path: Path,
+    samples: List[str],
+    axes: List[Dict],
+    segments: Optional[List[SegmentSpec]] = None,
+    laddering_vocab: Optional[Dict[str, List[str]]] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    record_chunk_size: int = DEFAULT_RECORD_CHUNK_SIZE,
+    on_chunk_done: Optional[Callable[[str, int], None]] = None,
+    column_types: Optional[Mapping[str, ColumnType]] = None,
+) -> Dict[str, Any]:
+    """
+    回答データを分割して読み込みながら分析を実行
+
+    Args:
+        csv_path: 回答データ（CSV）のパス
+        json_path: 回答データ（JSON配列、または拡張子 .jsonl の JSON Lines）のパス
+        samples: 分析対象のサンプルID
+        axes: SD評価軸の定義
+        segments: セグメント分析に使う属性列、または組み合わせる属性列のタプル（Noneの場合は DEFAULT_SEGMENTS）
+        laddering_vocab: ラダリングの why_good 等のキー -> 選択肢の語彙
+        chunk_size: CSVを1回に読み込む行数
+        record_chunk_size: 回答データ（JSON）を1回に読み込む件数
+        on_chunk_done: 1回分を加算するたびに呼ばれるコールバック（"table" / "records", 累計件数）
+        column_types: CSVの列名のパターン -> 型の指定（loaders.load_table() を参照）
+
+    Returns:
+        analysis_results.json 形式の結果（chunked に読み込んだ件数と回数を含む）
+    """
+    from .stages import DEFAULT_SEGMENTS
+
+    state = IncrementalAnalysis(
+        samples, axes, segments if segments is not None else DEFAULT_SEGMENTS, laddering_vocab
+    )
+    timings = {}
+    progress = {"rows": 0, "records": 0, "table_chunks": 0, "record_chunks": 0}
+
+    start = time.perf_counter()
+    for chunk in iter_table(csv_path, chunk_size, column_types):
+        progress["rows"] += state.fold_table(chunk)
+        progress["table_chunks"] += 1
+        if on_chunk_done is not None:
+            on_chunk_done("table", progress["rows"])
+    timings["chunked_table"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for records in iter_records(json_path, record_chunk_size, keys=RECORD_KEYS):
+        progress["records"] += state.fold_records(records)
+        progress["record_chunks"] += 1
+        if on_chunk_done is not None:
+            on_chunk_done("records", progress["records"])
+    timings["chunked_records"] = time.perf_counter() - start
+
+    return {
+        "analysis_date": datetime.now().isoformat(),
+        "total_responses": progress["records"] or progress["rows"],
+        **state.to_results(),
+        "stage_timings": {name: round(seconds, 6) for name, seconds in timings.items()},
+        "chunked": {"chunk_size": chunk_size, "record_chunk_size": record_chunk_size, **progress},
+    }
@@ -0,0 +1,311 @@
+"""
+回答者のクラスタリング（ミニバッチ k-means）
+
+回答者ごとの SD評価（サンプル × 軸）と購買意欲を並べたベクトルを列ごとに標準化し、
+ミニバッチ k-means で回答者をクラスタに分ける。クラスタ数は候補ごとに当てはめたうえで、
+無作為に抽出した回答者のシルエット係数が最大のものを選ぶ（シルエット係数の計算は抽出数の2乗に比例するため）。
+欠損した評価は列の平均で補完し、すべて欠損の回答者はクラスタに割り当てない。
+
+クラスタ番号は回答者数の多い順に 1, 2, ... とし、回答テーブルの cluster 列として
+セグメント分析・ドライバー分析・サンプル間比較の検定の属性に使えるようにする。
+"""
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.metrics import silhouette_score
+
+from .aggregates import value_counts
+from .tensor import RatingTensor
+
+
+# 回答テーブルに追加するクラスタ番号の列名
+CLUSTER_COLUMN = "cluster"
+
+# クラスタ数の候補（最小, 最大）
+DEFAULT_K_RANGE = (2, 8)
+
+# ミニバッチの回答者数
+DEFAULT_BATCH_SIZE = 4096
+
+# 初期値を変えて当てはめる回数（慣性が最小のものを使う）
+DEFAULT_N_INIT = 3
+
+# シルエット係数を計算する回答者数
+DEFAULT_SILHOUETTE_SAMPLE = 5000
+
+# 乱数シード（初期値・ミニバッチ・シルエット係数の抽出）
+DEFAULT_SEED = 20260109
+
+# クラスタの特徴として出力する変数の数（標準化した平均の絶対値の降順）
+DEFAULT_TOP_FEATURES = 5
+
+
+def cluster_features(
+    table: pd.DataFrame,
+    samples: List[str],
+    axes: List[Dict],
+    weights: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, List[str]]:
+    """
+    クラスタリングに使う特徴量行列（列ごとに標準化し、欠損は列の平均で補完）
+
+    Args:
+        table: 回答テーブル
+        samples: サンプルIDのリスト
+        axes: SD評価軸の定義
+        weights: 回答者の重み（列の平均・標準偏差を重み付きで求める。Noneの場合は重み付けしない）
+
+    Returns:
+        (標準化した特徴量 float32 (N, 変数), 評価値 float32 (N, 変数)、欠損は NaN,
+         回答が1つ以上ある回答者 bool (N,), 変数名（回答テーブルの列名）)
+    """
+    tensor = RatingTensor.from_table(table, samples, axes)
+    n = len(table)
+    present = tensor.present.ravel()
+    names = [
+        name
+        for sample_id in samples
+        for name in [f"sd_{sample_id}_{axis_id}" for axis_id in tensor.axis_ids] + [f"purchase_intent_{sample_id}"]
+    ]
+    names = [name for name, keep in zip(names, present) if keep]
+    mask = tensor.mask.reshape(n, -1)[:, present]
+    raw = np.where(mask, tensor.values.reshape(n, -1)[:, present], np.nan).astype(np.float32)
+
+    w = np.ones(n) if weights is None else np.asarray(weights, dtype=float)
+    wm = mask * w[:, None]
+    w_sum = wm.sum(axis=0)
+    filled = np.where(mask, raw, 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(w_sum > 0, (wm * filled).sum(axis=0) / w_sum, 0.0)
+        var = np.where(w_sum > 0, (wm * (filled - mean) ** 2).sum(axis=0) / w_sum, 0.0)
+    std = np.sqrt(var)
+    std[std == 0] = 1.0
+    standardized = np.where(mask, (filled - mean) / std, 0.0).astype(np.float32)
+    return standardized, raw, mask.any(axis=1), names
+
+
+def fit_kmeans(
+    x: np.ndarray,
+    k: int,
+    weights: Optional[np.ndarray] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    n_init: int = DEFAULT_N_INIT,
+    seed: int = DEFAULT_SEED,
+) -> MiniBatchKMeans:
+    """ミニバッチ k-means を当てはめる（labels_ に全回答者のクラスタ番号（0始まり）が入る）"""
+    model = MiniBatchKMeans(
+        n_clusters=k, batch_size=batch_size, n_init=n_init, random_state=seed,
+    )
+    return model.fit(x, sample_weight=weights)
+
+
+def choose_k(
+    x: np.ndarray,
+    candidates: Sequence[int],
+    weights: Optional[np.ndarray] = None,
+    silhouette_sample: int = DEFAULT_SILHOUETTE_SAMPLE,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    n_init: int = DEFAULT_N_INIT,
+    seed: int = DEFAULT_SEED,
+) -> Tuple[Optional[MiniBatchKMeans], Dict[int, float]]:
+    """
+    クラスタ数の候補ごとに当てはめ、抽出した回答者のシルエット係数が最大のモデルを選ぶ
+
+    全候補で同じ回答者を抽出して比較する。抽出した回答者がクラスタ数以下の候補は除く。
+
+    Args:
+        x: 標準化した特徴量 (N, 変数)
+        candidates: クラスタ数の候補
+        weights: 回答者の重み（当てはめに使う）
+        silhouette_sample: シルエット係数を計算する回答者数
+        batch_size: ミニバッチの回答者数
+        n_init: 初期値を変えて当てはめる回数
+        seed: 乱数シード
+
+    Returns:
+        (選んだモデル（候補がない場合はNone）, クラスタ数 -> シルエット係数)
+    """
+    rng = np.random.default_rng(seed)
+    rows = np.sort(rng.choice(len(x), size=min(silhouette_sample, len(x)), replace=False))
+    best: Optional[MiniBatchKMeans] = None
+    scores: Dict[int, float] = {}
+    for k in candidates:
+        if k < 2 or k >= len(rows):
+            continue
+        model = fit_kmeans(x, k, weights, batch_size, n_init, seed)
+        labels = model.labels_[rows]
+        if len(np.unique(labels)) < 2:
+            continue
+        scores[k] = float(silhouette_score(x[rows], labels))
+        if best is None or scores[k] > scores[best.n_clusters]:
+            best = model
+    return best, scores
+
+
+def relabel_by_size(labels: np.ndarray, k: int, weights: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    クラスタ番号を回答者数（重み付けした場合は重みの和）の多い順に 1, 2, ... に付け替える
+
+    Returns:
+        int16 (N,)
+    """
+    sizes = np.bincount(labels, weights=weights, minlength=k)
+    order = np.lexsort((np.arange(k), -sizes))
+    mapping = np.empty(k, dtype=np.int16)
+    mapping[order] = np.arange(1, k + 1)
+    return mapping[labels]
+
+
+def profile_clusters(
+    table: pd.DataFrame,
+    clusters: np.ndarray,
+    standardized: np.ndarray,
+    raw: np.ndarray,
+    names: List[str],
+    segments: Sequence[str] = (),
+    weights: Optional[np.ndarray] = None,
+    top_features: int = DEFAULT_TOP_FEATURES,
+) -> Dict[int, Dict[str, Any]]:
+    """
+    クラスタごとの回答者数・評価の平均・特徴的な変数・属性構成
+
+    Args:
+        table: 回答テーブル
+        clusters: 回答者のクラスタ番号（1始まり、割り当てなしは0）
+        standardized: 標準化した特徴量
+        raw: 評価値（欠損は NaN）
+        names: 変数名
+        segments: 構成を出す属性列
+        weights: 回答者の重み
+        top_features: 特徴的な変数として出力する数
+
+    Returns:
+        クラスタ番号 -> {"size", "share", "means", "distinctive", 属性列 -> 値 -> 人数}
+        （distinctive は標準化した平均の絶対値の降順で [{"feature", "mean", "z"}, ...]）
+    """
+    w = np.ones(len(clusters)) if weights is None else np.asarray(weights, dtype=float)
+    k = int(clusters.max()) if len(clusters) else 0
+    valid = ~np.isnan(raw)
+    wv = valid * w[:, None]
+    sums = np.stack([np.bincount(clusters, weights=wv[:, j] * np.nan_to_num(raw[:, j]), minlength=k + 1)
+                     for j in range(len(names))], axis=1)
+    counts = np.stack([np.bincount(clusters, weights=wv[:, j], minlength=k + 1) for j in range(len(names))], axis=1)
+    z_sums = np.stack([np.bincount(clusters, weights=w * standardized[:, j], minlength=k + 1)
+                       for j in range(len(names))], axis=1)
+    sizes = np.bincount(clusters, minlength=k + 1)
+    totals = np.bincount(clusters, weights=w, minlength=k + 1)
+    assigned = totals[1:].sum()
+
+    profiles: Dict[int, Dict[str, Any]] = {}
+    for c in range(1, k + 1):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = np.where(counts[c] > 0, sums[c] / counts[c], np.nan)
+            z = z_sums[c] / totals[c] if totals[c] > 0 else np.zeros(len(names))
+        order = np.lexsort((np.arange(len(names)), -np.abs(z)))[:top_features]
+        rows = clusters == c
+        profile: Dict[str, Any] = {
+            "size": int(sizes[c]),
+            "share": float(totals[c] / assigned) if assigned > 0 else 0.0,
+            "means": {name: (float(m) if not np.isnan(m) else None) for name, m in zip(names, means)},
+            "distinctive": [
+                {"feature": names[j], "mean": float(means[j]) if not np.isnan(means[j]) else None, "z": float(z[j])}
+                for j in order
+            ],
+        }
+        for column in segments:
+            if column in table.columns and column != CLUSTER_COLUMN:
+                profile[column] = value_counts(table[column][rows], None if weights is None else w[rows])
+        profiles[c] = profile
+    return profiles
+
+
+def assign_clusters(table: pd.DataFrame, clusters: Optional[np.ndarray]) -> pd.DataFrame:
+    """
+    回答テーブルにクラスタ番号の列（Int8、割り当てなしは欠損）を追加
+
+    Args:
+        table: 回答テーブル
+        clusters: 回答者のクラスタ番号（1始まり、割り当てなしは0。Noneの場合は追加しない）
+
+    Returns:
+        列を追加したテーブル（元のテーブルは変更しない）
+    """
+    if clusters is None:
+        return table
+    values = pd.array(clusters, dtype="Int8")
+    values[clusters == 0] = pd.NA
+    table = table.copy(deep=False)
+    table[CLUSTER_COLUMN] = values
+    return table
+
+
+def run_clustering(
+    table: pd.DataFrame,
+    samples: List[str],
+    axes: List[Dict],
+    segments: List[Any],
+    clustering_options: Optional[Dict[str, Any]],
+    weights: Optional[np.ndarray] = None,
+) -> Dict[str, Any]:
+    """
+    クラスタリングステージ
+
+    Args:
+        table: 回答テーブル
+        samples: サンプルIDのリスト
+        axes: SD評価軸の定義
+        segments: セグメント指定（単一属性列の構成をクラスタごとに出力する）
+        clustering_options: {"k": クラスタ数（省略時はシルエット係数で選ぶ）, "k_range": (最小, 最大),
+                    "batch_size", "n_init", "silhouette_sample", "seed"（省略可）}
+            （Noneの場合はクラスタリングしない）
+        weights: 回答者の重み（Noneの場合は重み付けしない）
+
+    Returns:
+        {"clusters": 回答者のクラスタ番号 int16（1始まり、割り当てなしは0。クラスタリングしない場合は None）,
+         "clustering": {"k", "features", "assigned", "unassigned", "silhouette", "silhouette_sample",
+                        "inertia", "clusters": クラスタ番号 -> profile_clusters() の結果}（しない場合は None）}
+    """
+    if not clustering_options:
+        return {"clusters": None, "clustering": None}
+    standardized, raw, answered, names = cluster_features(table, samples, axes, weights)
+    rows = np.flatnonzero(answered)
+    x = standardized[rows]
+    w = None if weights is None else np.asarray(weights, dtype=float)[rows]
+    seed = clustering_options.get("seed", DEFAULT_SEED)
+    batch_size = clustering_options.get("batch_size", DEFAULT_BATCH_SIZE)
+    n_init = clustering_options.get("n_init", DEFAULT_N_INIT)
+    silhouette_sample = clustering_options.get("silhouette_sample", DEFAULT_SILHOUETTE_SAMPLE)
+    if clustering_options.get("k"):
+        candidates = [int(clustering_options["k"])]
+    else:
+        low, high = clustering_options.get("k_range", DEFAULT_K_RANGE)
+        candidates = list(range(low, high + 1))
+    model, scores = choose_k(x, candidates, w, silhouette_sample, batch_size, n_init, seed)
+
+    summary: Dict[str, Any] = {
+        "k": None,
+        "features": names,
+        "assigned": 0,
+        "unassigned": len(table),
+        "silhouette": {str(k): score for k, score in scores.items()},
+        "silhouette_sample": min(silhouette_sample, len(rows)),
+        "inertia": None,
+        "clusters": {},
+    }
+    if model is None:
+        # 回答者が少なくクラスタに分けられない
+        return {"clusters": None, "clustering": summary}
+
+    clusters = np.zeros(len(table), dtype=np.int16)
+    clusters[rows] = relabel_by_size(model.labels_, model.n_clusters, w)
+    columns = [column for column in segments if isinstance(column, str)]
+    summary.update({
+        "k": int(model.n_clusters),
+        "assigned": int(len(rows)),
+        "unassigned": int(len(table) - len(rows)),
+        "inertia": float(model.inertia_),
+        "clusters": profile_clusters(table, clusters, standardized, raw, names, columns, weights),
+    })
+    return {"clusters": clusters, "clustering": summary}
@@ -0,0 +1,76 @@
+"""
+Layer 2: 比較分析
+"""
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from .aggregates import value_counts
+from .tensor import RatingMoments
+
+
+def compare_sd(moments: RatingMoments) -> Dict[str, Any]:
+    """
+    サンプル間比較（SD評価）
+
+    Returns:
+        評価軸 -> サンプル -> 平均・標準偏差
+    """
+    mean, std = moments.mean(), moments.std()
+    sd_comparison = {}
+    for a, axis_id in enumerate(moments.axis_ids):
+        sd_comparison[axis_id] = {
+            sample_id: {"mean": float(mean[s, a]), "std": float(std[s, a])}
+            for s, sample_id in enumerate(moments.samples)
+            if moments.present[s, a]
+        }
+    return sd_comparison
+
+
+def compare_purchase(moments: RatingMoments) -> Dict[str, Any]:
+    """
+    購買意欲比較
+
+    Returns:
+        サンプル -> 平均・標準偏差
+    """
+    mean, std = moments.mean(), moments.std()
+    return {
+        sample_id: {"mean": float(mean[s, -1]), "std": float(std[s, -1])}
+        for s, sample_id in enumerate(moments.samples)
+        if moments.present[s, -1]
+    }
+
+
+def count_best_worst(df: pd.DataFrame, weights: Optional[np.ndarray] = None) -> Dict[str, Any]:
+    """
+    最良・最悪音の度数（重みを指定した場合は重みの和）
+
+    Returns:
+        {"best_sound": 度数, "worst_sound": 度数}
+    """
+    return {
+        "best_sound": value_counts(df["best_sound"], weights),
+        "worst_sound": value_counts(df["worst_sound"], weights),
+    }
+
+
+def run_comparative(
+    table: pd.DataFrame,
+    rating_moments: RatingMoments,
+    weights: Optional[np.ndarray] = None,
+) -> Dict[str, Any]:
+    """
+    Layer 2 ステージ
+
+    Returns:
+        {"layer2_comparative": 比較分析の結果}
+    """
+    return {
+        "layer2_comparative": {
+            "sd_comparison": compare_sd(rating_moments),
+            "purchase_comparison": compare_purchase(rating_moments),
+            "best_worst": count_best_worst(table, weights),
+        }
+    }
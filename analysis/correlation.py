@@ -0,0 +1,304 @@
+"""
+Layer 3: 相関・回帰分析
+
+相関の検定（correlation_tests）は、全体・各セグメントの水準 × サンプルごとの SD評価軸・購買意欲・WTP の
+ペアワイズの和を所属行列との1回の行列積で求め、相関行列・p 値・BH 法の q 値を行列のまま出力する。
+"""
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from .clustering import assign_clusters
+from .segmentation import DEFAULT_MIN_CELL_SIZE, SegmentSpec
+from .significance import PURCHASE_INTENT, benjamini_hochberg, membership_matrix, segment_groups
+from .tensor import RatingMoments, RatingTensor, pairwise_correlation
+from .wtp import wtp_codes
+
+
+# WTP の変数名（購買意欲の後に並ぶ。値は選択肢の番号）
+WTP = "wtp"
+
+# 1回に処理する特徴量（回答者 × 変数ペアの積）の要素数の上限
+_BLOCK_ELEMENTS = 12_000_000
+
+
+def sd_axis_correlation(moments: RatingMoments) -> Dict[str, Any]:
+    """
+    SD軸間相関
+
+    Returns:
+        サンプル -> 相関行列（列名 -> 列名 -> 相関係数）
+    """
+    corr = moments.correlation()
+    correlation_matrix = {}
+    for s, sample_id in enumerate(moments.samples):
+        available = [a for a in range(len(moments.axis_ids)) if moments.present[s, a]]
+        if available:
+            names = {a: moments.column_name(s, a) for a in available}
+            correlation_matrix[sample_id] = {
+                names[j]: {names[i]: float(corr[s, i, j]) for i in available}
+                for j in available
+            }
+    return correlation_matrix
+
+
+def sd_purchase_correlation(moments: RatingMoments) -> Dict[str, Any]:
+    """
+    SD評価-購買意欲相関
+
+    Returns:
+        サンプル -> 評価軸 -> 相関係数（計算できない場合は0.0）
+    """
+    corr = moments.correlation()
+    result = {}
+    for s, sample_id in enumerate(moments.samples):
+        if not moments.present[s, -1]:
+            continue
+        result[sample_id] = {
+            axis_id: float(corr[s, a, -1]) if not np.isnan(corr[s, a, -1]) else 0.0
+            for a, axis_id in enumerate(moments.axis_ids)
+            if moments.present[s, a]
+        }
+    return result
+
+
+def rank_importance(
+    correlations: Dict[str, Dict[str, float]],
+    drivers: Optional[Dict[str, Dict[str, Any]]] = None,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    購買意欲への重要度ランキング
+
+    ドライバー分析の結果があるサンプルは Shapley 値の降順（importance は Shapley 値）、
+    ないサンプルは相関係数の絶対値の降順（importance は相関係数の絶対値）。
+
+    Args:
+        correlations: sd_purchase_correlation() の結果
+        drivers: サンプル -> drivers.driver_summary() の結果
+
+    Returns:
+        サンプル -> [{"axis", "correlation", "importance"（, "shapley", "shapley_share",
+                      "relative_weight", "relative_weight_share"）}, ...]
+    """
+    drivers = drivers or {}
+    importance_ranking = {}
+    for sample_id, corrs in correlations.items():
+        summary = drivers.get(sample_id)
+        if summary is None or summary["r2"] is None:
+            sorted_corrs = sorted(corrs.items(), key=lambda x: abs(x[1]), reverse=True)
+            importance_ranking[sample_id] = [
+                {"axis": axis_id, "correlation": corr, "importance": abs(corr)}
+                for axis_id, corr in sorted_corrs
+            ]
+            continue
+        importance_ranking[sample_id] = [
+            {
+                "axis": item["axis"],
+                "correlation": corrs.get(item["axis"], 0.0),
+                "importance": item["shapley"],
+                **{key: item[key] for key in ("shapley", "shapley_share", "relative_weight", "relative_weight_share")},
+            }
+            for item in summary["axes"]
+            if item["axis"] in corrs
+        ]
+    return importance_ranking
+
+
+def run_correlation(rating_moments: RatingMoments, drivers: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Layer 3 ステージ
+
+    Args:
+        rating_moments: 評価値テンソルの集計量
+        drivers: ドライバー分析ステージの結果（全体の Shapley 値で重要度を順位付けする）
+
+    Returns:
+        {"layer3_correlation": 相関分析の結果}
+    """
+    purchase_corr = sd_purchase_correlation(rating_moments)
+    return {
+        "layer3_correlation": {
+            "sd_axis_correlation": sd_axis_correlation(rating_moments),
+            "sd_purchase_correlation": purchase_corr,
+            "importance_ranking": rank_importance(purchase_corr, drivers["overall"]),
+        }
+    }
+
+
+def grouped_pairwise_moments(
+    values: np.ndarray,
+    mask: np.ndarray,
+    membership: np.ndarray,
+    weights: Optional[np.ndarray] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    グループ × サンプルごとのペアワイズの件数・和・平方和・積和
+
+    欠損を0で埋めた値と回答ありのマスクから、回答者ごとの変数ペアの積（マスク同士・値とマスク・値の2乗とマスク・値同士）を
+    並べた特徴量を作り、所属行列（と重み）との行列積で全グループ・全サンプルの和を回答者のチャンクごとに一括で加算する。
+
+    Args:
+        values: 評価値 (N, サンプル数, 変数)（欠損は0）
+        mask: 回答ありがTrue (N, サンプル数, 変数)
+        membership: 所属行列 (グループ数, N)（significance.membership_matrix() を参照）
+        weights: 回答者の重み (N,)（Noneの場合は重み付けしない）
+
+    Returns:
+        {"n", "sx", "sxx", "sxy"}: いずれも (グループ数, サンプル数, 変数i, 変数j)（RatingMoments と同じ定義）
+    """
+    n_groups = membership.shape[0]
+    n_samples, n_vars = values.shape[1:]
+    keys = ("n", "sx", "sxx", "sxy")
+    total = np.zeros((n_groups, len(keys), n_samples, n_vars, n_vars))
+    flat = total.reshape(n_groups, -1)
+    chunk_size = max(1, _BLOCK_ELEMENTS // (len(keys) * n_samples * n_vars * n_vars))
+    for start in range(0, len(values), chunk_size):
+        stop = start + chunk_size
+        m = mask[start:stop].astype(np.float64)
+        x = values[start:stop].astype(np.float64)
+        # 変数iの因子 (回答者, サンプル, 変数i, 1) と変数jの因子 (回答者, サンプル, 1, 変数j) の積
+        xi, mi, mj = x[:, :, :, None], m[:, :, :, None], m[:, :, None, :]
+        features = np.stack([mi * mj, xi * mj, xi * xi * mj, xi * x[:, :, None, :]], axis=1)
+        w = membership[:, start:stop]
+        if weights is not None:
+            w = w * np.asarray(weights[start:stop], dtype=np.float64)
+        flat += w @ features.reshape(len(features), -1)
+    return {key: total[:, k] for k, key in enumerate(keys)}
+
+
+def correlation_p_values(corr: np.ndarray, n: np.ndarray) -> np.ndarray:
+    """
+    相関係数の無相関検定（t 検定、両側）の p 値
+
+    Args:
+        corr: 相関行列 (..., 変数, 変数)
+        n: ペアワイズの件数（同じ形状。重み付きの場合は重みの和を件数とみなす）
+
+    Returns:
+        p 値（同じ形状。件数が3未満・相関係数が NaN のペアと対角成分は NaN）
+    """
+    df = n - 2
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t = np.abs(corr) * np.sqrt(df / (1.0 - corr * corr))
+        p = 2.0 * stats.t.sf(t, df)
+    p[(df < 1) | np.isnan(corr)] = np.nan
+    diagonal = np.arange(corr.shape[-1])
+    p[..., diagonal, diagonal] = np.nan
+    return p
+
+
+def _matrix(values: np.ndarray) -> List[List[Optional[float]]]:
+    """行列をJSONに保存できる入れ子のリストに変換（NaN は None）"""
+    return [[float(v) if np.isfinite(v) else None for v in row] for row in values]
+
+
+def correlation_significance(
+    table: pd.DataFrame,
+    samples: List[str],
+    axes: List[Dict],
+    segments: List[SegmentSpec],
+    wtp_labels: Optional[Sequence[str]] = None,
+    min_cell_size: int = DEFAULT_MIN_CELL_SIZE,
+    weights: Optional[np.ndarray] = None,
+) -> Dict[str, Any]:
+    """
+    全体・各セグメントの水準 × サンプルごとに、SD評価軸・購買意欲・WTP の相関行列と p 値・q 値を求める
+
+    相関は各ペアで両方に回答がある回答者のみを使う（pandas の DataFrame.corr() と同じ）。
+    q 値はグループ × サンプルごとに、相関行列の上三角（変数ペア）を1つの族として Benjamini-Hochberg 法で補正した p 値。
+
+    Args:
+        table: 回答テーブル
+        samples: サンプルIDのリスト
+        axes: SD評価軸の定義
+        segments: セグメント指定のリスト
+        wtp_labels: WTPの選択肢（金額の昇順。指定した場合は選択肢の番号を WTP の変数として加える）
+        min_cell_size: これ未満の回答者数のグループは値を秘匿する
+        weights: 回答者の重み（Noneの場合は重み付けしない）
+
+    Returns:
+        {"method": "pearson", "correction": "benjamini_hochberg", "min_cell_size", "variables": 変数名のリスト,
+         "matrices": [{"segment", "level", "sample", "size", "suppressed",
+                       "n", "r", "p_value", "q_value": 変数 × 変数 の行列（入れ子のリスト）}, ...]}
+        （列がない変数・計算できないペアは None）
+    """
+    tensor = RatingTensor.from_table(table, samples, axes)
+    values, mask, present = tensor.values, tensor.mask, tensor.present
+    variables = tensor.axis_ids + [PURCHASE_INTENT]
+    if wtp_labels and any(f"wtp_{sample_id}" in table.columns for sample_id in samples):
+        codes = wtp_codes(table, samples, wtp_labels)
+        values = np.concatenate([values, np.maximum(codes, 0)[:, :, None]], axis=2)
+        mask = np.concatenate([mask, (codes >= 0)[:, :, None]], axis=2)
+        present = np.concatenate(
+            [present, np.array([[f"wtp_{sample_id}" in table.columns] for sample_id in samples])], axis=1
+        )
+        variables.append(WTP)
+
+    groups = segment_groups(table, segments)
+    membership = membership_matrix(groups, len(table))
+    sizes = membership.sum(axis=1)
+    sums = grouped_pairwise_moments(values, mask, membership, weights)
+    corr = pairwise_correlation(sums["n"], sums["sx"], sums["sxx"], sums["sxy"])
+    p_values = correlation_p_values(corr, sums["n"])
+
+    upper = np.triu_indices(len(variables), 1)
+    q_values = np.full(p_values.shape, np.nan)
+    q_values[..., upper[0], upper[1]] = benjamini_hochberg(p_values[..., upper[0], upper[1]])
+    q_values[..., upper[1], upper[0]] = q_values[..., upper[0], upper[1]]
+
+    matrices = []
+    for g, (segment, level, _) in enumerate(groups):
+        hidden = bool(sizes[g] < min_cell_size)
+        for s, sample_id in enumerate(samples):
+            if not present[s].any():
+                continue
+            record = {"segment": segment, "level": level, "sample": sample_id,
+                      "size": int(sizes[g]), "suppressed": hidden}
+            for key, matrix in (("n", sums["n"]), ("r", corr), ("p_value", p_values), ("q_value", q_values)):
+                record[key] = None if hidden else _matrix(matrix[g, s])
+            matrices.append(record)
+
+    return {
+        "method": "pearson",
+        "correction": "benjamini_hochberg",
+        "min_cell_size": int(min_cell_size),
+        "variables": variables,
+        "matrices": matrices,
+    }
+
+
+def run_correlation_tests(
+    table: pd.DataFrame,
+    samples: List[str],
+    axes: List[Dict],
+    segments: List[SegmentSpec],
+    wtp_options: Dict[str, Any],
+    correlation_test_options: Optional[Dict[str, Any]] = None,
+    weights: Optional[np.ndarray] = None,
+    clusters: Optional[np.ndarray] = None,
+) -> Dict[str, Any]:
+    """
+    相関の検定ステージ
+
+    Args:
+        table: 回答テーブル
+        samples: サンプルIDのリスト
+        axes: SD評価軸の定義
+        segments: セグメント指定のリスト
+        wtp_options: WTP 推定の設定（"labels" を WTP の変数に使う）
+        correlation_test_options: {"min_cell_size"}（これ未満の回答者数のグループは値を秘匿する。省略可）
+        weights: 回答者の重み（Noneの場合は重み付けしない）
+        clusters: 回答者のクラスタ番号（cluster 列として segments に使える。clustering.assign_clusters() を参照）
+
+    Returns:
+        {"correlation_tests": correlation_significance() の結果}
+    """
+    table = assign_clusters(table, clusters)
+    return {"correlation_tests": correlation_significance(
+        table, samples, axes, segments,
+        wtp_labels=wtp_options.get("labels"),
+        min_cell_size=(correlation_test_options or {}).get("min_cell_size", DEFAULT_MIN_CELL_SIZE),
+        weights=weights,
+    )}
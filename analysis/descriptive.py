@@ -0,0 +1,113 @@
+"""
+Layer 1: 記述統計分析
+"""
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from .aggregates import mean_std, value_counts
+from .tensor import RatingMoments
+
+
+def describe_demographics(df: pd.DataFrame, weights: Optional[np.ndarray] = None) -> Dict[str, Any]:
+    """
+    回答者属性の集計
+
+    Args:
+        df: 回答テーブル
+        weights: 回答者の重み（Noneの場合は重み付けしない）
+
+    Returns:
+        属性ごとの度数と音への敏感さの要約統計量
+    """
+    sensitivity_mean, sensitivity_std = mean_std(df["sound_sensitivity"], weights)
+    return {
+        "age_group": value_counts(df["age_group"], weights),
+        "gender": value_counts(df["gender"], weights),
+        "driving_experience": value_counts(df["driving_experience"], weights),
+        "ev_experience": value_counts(df["ev_experience"], weights),
+        "sound_sensitivity": {
+            "mean": sensitivity_mean,
+            "std": sensitivity_std,
+            "min": int(df["sound_sensitivity"].min()),
+            "max": int(df["sound_sensitivity"].max()),
+        }
+    }
+
+
+def describe_sd_ratings(moments: RatingMoments) -> Dict[str, Any]:
+    """
+    SD法評価の集計
+
+    Args:
+        moments: 評価値テンソルの集計量
+
+    Returns:
+        サンプル -> 評価軸 -> 要約統計量
+    """
+    mean, std = moments.mean(), moments.std()
+    sd_summary = {}
+    for s, sample_id in enumerate(moments.samples):
+        sd_summary[sample_id] = {}
+        for a, axis_id in enumerate(moments.axis_ids):
+            if moments.present[s, a]:
+                sd_summary[sample_id][axis_id] = {
+                    "mean": float(mean[s, a]),
+                    "std": float(std[s, a]),
+                    "min": int(moments.min[s, a]),
+                    "max": int(moments.max[s, a]),
+                }
+    return sd_summary
+
+
+def describe_purchase(df: pd.DataFrame, moments: RatingMoments, weights: Optional[np.ndarray] = None) -> Dict[str, Any]:
+    """
+    購買意欲・WTPの集計
+
+    Args:
+        df: 回答テーブル（WTPの度数に使用）
+        moments: 評価値テンソルの集計量
+        weights: 回答者の重み（WTPの度数に使用。Noneの場合は重み付けしない）
+
+    Returns:
+        {"purchase_intent": ..., "wtp": ...}
+    """
+    mean, std = moments.mean(), moments.std()
+    purchase_summary = {}
+    wtp_summary = {}
+    for s, sample_id in enumerate(moments.samples):
+        if moments.present[s, -1]:
+            purchase_summary[sample_id] = {
+                "mean": float(mean[s, -1]),
+                "std": float(std[s, -1]),
+                "distribution": moments.intent_distribution(s),
+            }
+
+        wtp_col = f"wtp_{sample_id}"
+        if wtp_col in df.columns:
+            wtp_summary[sample_id] = value_counts(df[wtp_col], weights)
+
+    return {"purchase_intent": purchase_summary, "wtp": wtp_summary}
+
+
+def run_descriptive(
+    table: pd.DataFrame,
+    rating_moments: RatingMoments,
+    weights: Optional[np.ndarray] = None,
+) -> Dict[str, Any]:
+    """
+    Layer 1 ステージ
+
+    Returns:
+        {"layer1_descriptive": 記述統計の結果}
+    """
+    purchase = describe_purchase(table, rating_moments, weights)
+    return {
+        "layer1_descriptive": {
+            "demographics": describe_demographics(table, weights),
+            "sd_ratings": describe_sd_ratings(rating_moments),
+            "purchase_intent": purchase["purchase_intent"],
+            "wtp": purchase["wtp"],
+        }
+    }
@@ -0,0 +1,401 @@
+"""
+購買意欲のドライバー分析（Shapley 値回帰・Johnson の相対重み）
+
+SD評価軸は互いに相関が強いため、単相関の絶対値では重要度を取り違えやすい。
+サンプルごとに、全変数に回答した回答者（完全ケース）の相関行列を1つ求め、
+ - Shapley 値回帰: 全 2^軸数 通りの軸の組み合わせの決定係数から、各軸の R² への平均的な寄与を求める
+ - Johnson の相対重み: 軸を直交化した上での R² の分解
+を計算する。組み合わせの決定係数は相関行列の掃き出し（シューア補元）を深さ優先でたどって求め、
+相関行列を積み重ねた配列（サンプル × セグメント × ブートストラップ再標本など）をまとめて処理する。
+"""
+import hashlib
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .clustering import assign_clusters
+from .segmentation import DEFAULT_MIN_CELL_SIZE, SegmentSpec
+from .parallel import ProcessPool, grid, group_index, membership_block
+from .significance import segment_groups
+from .tensor import DEFAULT_CHUNK_SIZE, RatingTensor
+
+
+# 掃き出しの軸が退化しているとみなす残差分散
+_SINGULAR_TOLERANCE = 1e-10
+
+# 一度に処理する相関行列の数（掃き出しの作業用配列のメモリ使用量を抑える）
+_BATCH = 4096
+
+
+def covariance_features(tensor: RatingTensor) -> np.ndarray:
+    """
+    完全ケースの相関行列を重み付き和から求めるための特徴量行列
+
+    サンプルごとに、全変数に回答したかの指標 c、c·x（変数数）、c·x_i·x_j（i ≤ j）を並べる。
+    評価値は小さな整数のため、重み付き和は足し合わせる順序（分割・並列数）によらず誤差なく求まる。
+
+    Args:
+        tensor: 評価値テンソル
+
+    Returns:
+        float64 (N, サンプル数 × (1 + V + V(V+1)/2))
+    """
+    complete = tensor.mask.all(axis=2)
+    c = complete.astype(np.float64)
+    x = tensor.values * c[:, :, None]
+    upper_i, upper_j = np.triu_indices(tensor.n_variables)
+    products = x[:, :, upper_i] * x[:, :, upper_j]
+    n = len(c)
+    return np.concatenate([c[:, :, None], x, products], axis=2).reshape(n, -1)
+
+
+def feature_width(n_vars: int) -> int:
+    """covariance_features() のサンプルあたりの列数"""
+    return 1 + n_vars + n_vars * (n_vars + 1) // 2
+
+
+def correlation_from_sums(sums: np.ndarray, n_samples: int, n_vars: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    covariance_features() の重み付き和から完全ケースの件数と相関行列を計算
+
+    Args:
+        sums: (..., 特徴量数) の重み付き和
+        n_samples: サンプル数
+        n_vars: サンプルあたりの変数の数
+
+    Returns:
+        (件数 (..., サンプル), 相関行列 (..., サンプル, V, V)。計算できない要素は NaN)
+    """
+    blocks = sums.reshape(sums.shape[:-1] + (n_samples, feature_width(n_vars)))
+    n = blocks[..., 0]
+    sx = blocks[..., 1:1 + n_vars]
+    upper_i, upper_j = np.triu_indices(n_vars)
+    sxx = np.zeros(blocks.shape[:-1] + (n_vars, n_vars))
+    sxx[..., upper_i, upper_j] = blocks[..., 1 + n_vars:]
+    sxx[..., upper_j, upper_i] = blocks[..., 1 + n_vars:]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cov = sxx - sx[..., :, None] * sx[..., None, :] / n[..., None, None]
+        scale = np.sqrt(np.diagonal(cov, axis1=-2, axis2=-1))
+        corr = cov / (scale[..., :, None] * scale[..., None, :])
+    corr[~np.isfinite(corr) | (n[..., None, None] < 2)] = np.nan
+    return n, np.clip(corr, -1.0, 1.0)
+
+
+def subset_r2(corr: np.ndarray) -> np.ndarray:
+    """
+    全ての軸の組み合わせについて、購買意欲（最後の変数）の決定係数を計算
+
+    組み合わせ S の R² は、S の軸を掃き出した（S についてのシューア補元をとった）後の
+    1 - (購買意欲の残差分散)。S から最大の添字の軸を除いた組み合わせを親として深さ優先でたどり、
+    子には以降に掃き出す軸と購買意欲の部分だけを残すため、掃き出しは組み合わせごとに1回で、行列も次第に小さくなる。
+    残差分散が0に近い（他の軸と完全に共線な）軸は掃き出さない。
+
+    Args:
+        corr: (..., V, V) の相関行列（変数の最後が購買意欲）
+
+    Returns:
+        (..., 2^(V-1)) の決定係数（添字のビット j が立っている組み合わせが軸 j を含む）
+    """
+    lead = corr.shape[:-2]
+    n_vars = corr.shape[-1]
+    p = n_vars - 1
+    flat = corr.reshape(-1, n_vars, n_vars)
+    r2 = np.empty((2 ** p, len(flat)))
+    r2[0] = 0.0
+    for start in range(0, len(flat), _BATCH):
+        stop = start + _BATCH
+        # (組み合わせのビット列, 行列の先頭の軸, 未掃き出しの軸 + 購買意欲 の (V', V', batch) 行列)
+        stack = [(0, 0, np.ascontiguousarray(flat[start:stop].transpose(1, 2, 0)))]
+        while stack:
+            mask, first, a = stack.pop()
+            for k in range(a.shape[0] - 1):
+                pivot = a[k, k]
+                d = np.where(pivot > _SINGULAR_TOLERANCE, pivot, np.inf)
+                child = a[k + 1:, k + 1:] - (a[k + 1:, k] / d)[:, None, :] * a[k, k + 1:][None, :, :]
+                child_mask = mask | (1 << (first + k))
+                r2[child_mask, start:stop] = 1.0 - child[-1, -1]
+                if child.shape[0] > 1:
+                    stack.append((child_mask, first + k + 1, child))
+    return np.clip(r2.T, 0.0, 1.0).reshape(lead + (2 ** p,))
+
+
+@lru_cache(maxsize=None)
+def _shapley_weights(p: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Shapley 値の計算に使う (軸 j を含まない組み合わせ, j を加えた組み合わせ, 重み)
+
+    Returns:
+        いずれも (p, 2^(p-1))
+    """
+    masks = np.arange(2 ** p)
+    sizes = np.array([bin(mask).count("1") for mask in masks])
+    factorial = np.cumprod(np.r_[1.0, np.arange(1, p + 1)])
+    without, added, weights = [], [], []
+    for j in range(p):
+        subset = masks[(masks >> j) & 1 == 0]
+        size = sizes[subset]
+        without.append(subset)
+        added.append(subset | (1 << j))
+        weights.append(factorial[size] * factorial[p - size - 1] / factorial[p])
+    return np.array(without), np.array(added), np.array(weights)
+
+
+def shapley_values(r2: np.ndarray) -> np.ndarray:
+    """
+    Shapley 値回帰（各軸の R² への限界寄与の加重平均。合計は全軸の R²）
+
+    Args:
+        r2: subset_r2() の結果 (..., 2^p)
+
+    Returns:
+        (..., p) の Shapley 値
+    """
+    p = int(np.log2(r2.shape[-1]))
+    without, added, weights = _shapley_weights(p)
+    return ((r2[..., added] - r2[..., without]) * weights).sum(axis=-1)
+
+
+def relative_weights(corr: np.ndarray) -> np.ndarray:
+    """
+    Johnson の相対重み（合計は全軸の R²）
+
+    軸の相関行列 R = V diag(λ) V^T の対称平方根 Λ = V diag(√λ) V^T で軸を直交化し、
+    直交化した軸への回帰係数 β = Λ^-1 r と Λ の2乗から R² を軸ごとに分解する。
+
+    Args:
+        corr: (..., V, V) の相関行列（変数の最後が購買意欲）
+
+    Returns:
+        (..., V - 1) の相対重み
+    """
+    rxx = corr[..., :-1, :-1]
+    rxy = corr[..., :-1, -1]
+    eigenvalues, eigenvectors = np.linalg.eigh(rxx)
+    root = np.sqrt(np.clip(eigenvalues, 0.0, None))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        inverse_root = np.where(root > np.sqrt(_SINGULAR_TOLERANCE), 1.0 / root, 0.0)
+    lam = (eigenvectors * root[..., None, :]) @ np.swapaxes(eigenvectors, -1, -2)
+    lam_inverse = (eigenvectors * inverse_root[..., None, :]) @ np.swapaxes(eigenvectors, -1, -2)
+    beta = (lam_inverse @ rxy[..., None])[..., 0]
+    return ((lam ** 2) * (beta ** 2)[..., None, :]).sum(axis=-1)
+
+
+class DriverCache:
+    """
+    相関行列 -> (R², Shapley 値, 相対重み) の計算結果のキャッシュ
+
+    同じ回答者集合（変更のないセグメントなど）の相関行列は同じ値になるため、
+    相関行列のバイト列をキーに再計算を省く。
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        """
+        Args:
+            maxsize: 保持する結果の数（古いものから削除）
+        """
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, Tuple[float, np.ndarray, np.ndarray]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def key(corr: np.ndarray) -> str:
+        """相関行列のキー"""
+        return hashlib.sha256(np.ascontiguousarray(corr, dtype=np.float64).tobytes()).hexdigest()
+
+    def analyze(self, corr: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        キャッシュにない相関行列だけをまとめて計算
+
+        Args:
+            corr: (..., V, V) の相関行列
+
+        Returns:
+            (R² (...), Shapley 値 (..., V - 1), 相対重み (..., V - 1))
+        """
+        lead = corr.shape[:-2]
+        p = corr.shape[-1] - 1
+        flat = corr.reshape(-1, p + 1, p + 1)
+        keys = [self.key(matrix) for matrix in flat]
+        missing = [i for i, key in enumerate(keys) if key not in self._entries]
+        if missing:
+            computed = analyze_drivers(flat[missing])
+            for position, i in enumerate(missing):
+                self._entries[keys[i]] = tuple(values[position] for values in computed)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        r2 = np.empty(len(flat))
+        shapley = np.empty((len(flat), p))
+        weights = np.empty((len(flat), p))
+        for i, key in enumerate(keys):
+            self._entries.move_to_end(key)
+            r2[i], shapley[i], weights[i] = self._entries[key]
+        return r2.reshape(lead), shapley.reshape(lead + (p,)), weights.reshape(lead + (p,))
+
+
+def analyze_drivers(corr: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    相関行列を積み重ねた配列について R²・Shapley 値・相対重みを計算
+
+    相関が計算できない（NaN を含む）行列の結果は NaN。
+
+    Args:
+        corr: (..., V, V) の相関行列（変数の最後が購買意欲）
+
+    Returns:
+        (R² (...), Shapley 値 (..., V - 1), 相対重み (..., V - 1))
+    """
+    invalid = np.isnan(corr).any(axis=(-2, -1))
+    filled = np.where(invalid[..., None, None], np.eye(corr.shape[-1]), corr)
+    r2 = subset_r2(filled)
+    shapley = shapley_values(r2)
+    weights = relative_weights(filled)
+    full = r2[..., -1]
+    full[invalid] = np.nan
+    shapley[invalid] = np.nan
+    weights[invalid] = np.nan
+    return full, shapley, weights
+
+
+# プロセス内で共有するキャッシュ（ダッシュボード等で繰り返し分析する場合に再計算を省く）
+_cache = DriverCache()
+
+
+def _optional_float(value: float) -> Optional[float]:
+    """NaN を None に変換"""
+    return None if np.isnan(value) else float(value)
+
+
+def driver_summary(
+    axis_ids: List[str],
+    n: float,
+    r2: float,
+    shapley: np.ndarray,
+    weights: np.ndarray,
+) -> Dict[str, Any]:
+    """
+    1つのサンプル・グループのドライバー分析の結果をまとめる
+
+    Returns:
+        {"n", "r2", "axes": [{"axis", "shapley", "shapley_share", "relative_weight",
+                              "relative_weight_share"}, ...]}（Shapley 値の降順）
+    """
+    with np.errstate(invalid="ignore", divide="ignore"):
+        shapley_share = shapley / r2
+        weight_share = weights / r2
+    order = np.argsort(-np.nan_to_num(shapley, nan=-np.inf), kind="stable")
+    return {
+        "n": int(round(n)),
+        "r2": _optional_float(r2),
+        "axes": [
+            {
+                "axis": axis_ids[a],
+                "shapley": _optional_float(shapley[a]),
+                "shapley_share": _optional_float(shapley_share[a]),
+                "relative_weight": _optional_float(weights[a]),
+                "relative_weight_share": _optional_float(weight_share[a]),
+            }
+            for a in order
+        ],
+    }
+
+
+def _drivers_task(
+    arrays: Dict[str, np.ndarray],
+    task: Tuple[List[str], List[str], np.ndarray, np.ndarray, np.ndarray],
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    サンプル × グループのブロックのドライバー分析（ワーカープロセスで実行）
+
+    Returns:
+        (件数, R², Shapley 値, 相対重み)。先頭2次元は (グループ, サンプル)
+    """
+    samples, axis_ids, present, sample_block, group_block = task
+    values, mask = arrays["values"], arrays["mask"]
+    membership = membership_block(arrays["rows"], arrays["offsets"], group_block, len(values))
+    if "weights" in arrays:
+        membership = membership * arrays["weights"]
+    # 特徴量行列は回答者を分割して作り、和を加算する（重みがなければ整数の和のため分割によらず同じ結果）
+    n_vars = len(axis_ids) + 1
+    sums = np.zeros((len(group_block), len(samples) * feature_width(n_vars)))
+    for start in range(0, len(values), DEFAULT_CHUNK_SIZE):
+        rows = slice(start, start + DEFAULT_CHUNK_SIZE)
+        tensor = RatingTensor(samples, axis_ids, values[rows, sample_block], mask[rows, sample_block], present)
+        sums += membership[:, rows] @ covariance_features(tensor)
+    n, corr = correlation_from_sums(sums, len(samples), n_vars)
+    return (n, *_cache.analyze(corr))
+
+
+def run_drivers(
+    table: pd.DataFrame,
+    samples: List[str],
+    axes: List[Dict],
+    segments: List[SegmentSpec],
+    pool: Optional[ProcessPool] = None,
+    min_cell_size: int = DEFAULT_MIN_CELL_SIZE,
+    weights: Optional[np.ndarray] = None,
+    clusters: Optional[np.ndarray] = None,
+) -> Dict[str, Any]:
+    """
+    ドライバー分析ステージ（全体と各セグメントの水準 × サンプル）
+
+    全グループの完全ケースの和を所属行列との1回の行列積で求め、相関行列から R² を分解する。
+    pool を指定した場合は サンプル × グループ をブロックに分けてプロセス並列に計算する。
+
+    Args:
+        table: 回答テーブル
+        samples: サンプルIDのリスト
+        axes: SD評価軸の定義
+        segments: セグメント指定のリスト
+        pool: プロセスプール（Noneの場合は同じプロセスで計算）
+        min_cell_size: これ未満の回答者数のグループは値を秘匿する
+        weights: 回答者の重み（所属行列に掛けて重み付きの相関行列を求める。Noneの場合は重み付けしない）
+        clusters: 回答者のクラスタ番号（cluster 列として segments に使える。clustering.assign_clusters() を参照）
+
+    Returns:
+        {"drivers": {"overall": サンプル -> driver_summary(),
+                     "segments": セグメント名 -> 水準 -> サンプル -> driver_summary()
+                                 （秘匿する水準は {"size", "suppressed": True}）}}
+    """
+    pool = pool or ProcessPool(1)
+    table = assign_clusters(table, clusters)
+    tensor = RatingTensor.from_table(table, samples, axes)
+    groups = segment_groups(table, segments)
+    rows, offsets = group_index(groups)
+    arrays = {"values": tensor.values, "mask": tensor.mask, "rows": rows, "offsets": offsets}
+    if weights is not None:
+        arrays["weights"] = np.asarray(weights, dtype=np.float64)
+    shared = pool.share(**arrays)
+    blocks = grid(len(samples), len(groups), pool.workers)
+    tasks = [
+        ([samples[s] for s in sample_block], tensor.axis_ids, tensor.present[sample_block], sample_block, group_block)
+        for sample_block, group_block in blocks
+    ]
+    n_axes = len(tensor.axis_ids)
+    n = np.zeros((len(groups), len(samples)))
+    r2 = np.full((len(groups), len(samples)), np.nan)
+    shapley = np.full((len(groups), len(samples), n_axes), np.nan)
+    weights = np.full((len(groups), len(samples), n_axes), np.nan)
+    for (sample_block, group_block), block in zip(blocks, pool.map(_drivers_task, shared, tasks)):
+        cells = np.ix_(group_block, sample_block)
+        n[cells], r2[cells], shapley[cells], weights[cells] = block
+    # 列のない変数を含むサンプルは分析しない
+    available = tensor.present.all(axis=1)
+
+    result: Dict[str, Any] = {"overall": {}, "segments": {}}
+    for g, (segment, level, group_rows) in enumerate(groups):
+        if g == 0:
+            target = result["overall"]
+        elif len(group_rows) < min_cell_size:
+            result["segments"].setdefault(segment, {})[level] = {"size": len(group_rows), "suppressed": True}
+            continue
+        else:
+            target = result["segments"].setdefault(segment, {}).setdefault(level, {})
+        for s, sample_id in enumerate(samples):
+            if available[s]:
+                target[sample_id] = driver_summary(tensor.axis_ids, n[g, s], r2[g, s], shapley[g, s], weights[g, s])
+    return {"drivers": result}
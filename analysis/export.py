@@ -0,0 +1,186 @@
+"""
+分析結果の保存（JSON・Excel）
+"""
+import json
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pandas as pd
+
+
+def save_json(results: Dict[str, Any], path: Path) -> None:
+    """
+    分析結果をJSONで保存
+
+    Args:
+        results: 分析結果
+        path: 保存先
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+def save_excel(results: Dict[str, Any], path: Path, samples: List[str], axes: List[Dict]) -> None:
+    """
+    主要結果をテーブル形式でExcelに保存
+
+    実行しなかったレイヤーのシートは出力しない。
+
+    Args:
+        results: 分析結果
+        path: 保存先
+        samples: サンプルIDのリスト
+        axes: SD評価軸の定義
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    descriptive = results.get("layer1_descriptive")
+    correlation = results.get("layer3_correlation")
+
+    with pd.ExcelWriter(path, engine="openpyxl") as writer:
+        if descriptive:
+            # 回答者属性
+            pd.DataFrame([descriptive["demographics"]]).to_excel(writer, sheet_name="回答者属性", index=False)
+
+            # SD評価サマリー
+            sd_summary = descriptive["sd_ratings"]
+            sd_data = []
+            for sample_id in samples:
+                for axis in axes:
+                    if sample_id in sd_summary and axis["id"] in sd_summary[sample_id]:
+                        sd_data.append({
+                            "サンプル": sample_id,
+                            "評価軸": axis["name"],
+                            "平均": sd_summary[sample_id][axis["id"]]["mean"],
+                            "標準偏差": sd_summary[sample_id][axis["id"]]["std"],
+                        })
+            pd.DataFrame(sd_data).to_excel(writer, sheet_name="SD評価", index=False)
+
+            # 購買意欲
+            purchase_summary = descriptive["purchase_intent"]
+            purchase_data = []
+            for sample_id in samples:
+                if sample_id in purchase_summary:
+                    purchase_data.append({
+                        "サンプル": sample_id,
+                        "平均": purchase_summary[sample_id]["mean"],
+                        "標準偏差": purchase_summary[sample_id]["std"],
+                    })
+            pd.DataFrame(purchase_data).to_excel(writer, sheet_name="購買意欲", index=False)
+
+        if correlation:
+            # 重要度ランキング
+            importance_ranking = correlation["importance_ranking"]
+            importance_data = []
+            for sample_id in samples:
+                if sample_id in importance_ranking:
+                    for rank, item in enumerate(importance_ranking[sample_id], 1):
+                        importance_data.append({
+                            "サンプル": sample_id,
+                            "ランク": rank,
+                            "評価軸": item["axis"],
+                            "相関係数": item["correlation"],
+                            "重要度": item["importance"],
+                            "Shapley値の寄与率": item.get("shapley_share"),
+                            "相対重み": item.get("relative_weight"),
+                        })
+            pd.DataFrame(importance_data).to_excel(writer, sheet_name="重要度ランキング", index=False)
+
+        drivers = results.get("drivers")
+        if drivers:
+            # ドライバー分析（全体とセグメントの水準ごと、縦持ち）
+            groups = [("全体", "", drivers["overall"])] + [
+                (segment, level, cell)
+                for segment, levels in drivers["segments"].items()
+                for level, cell in levels.items()
+                if not cell.get("suppressed")
+            ]
+            driver_data = [
+                {
+                    "セグメント": segment,
+                    "水準": level,
+                    "サンプル": sample_id,
+                    "有効回答数": summary["n"],
+                    "R²": summary["r2"],
+                    "評価軸": item["axis"],
+                    "Shapley値": item["shapley"],
+                    "Shapley値の寄与率": item["shapley_share"],
+                    "相対重み": item["relative_weight"],
+                    "相対重みの寄与率": item["relative_weight_share"],
+                }
+                for segment, level, cell in groups
+                for sample_id, summary in cell.items()
+                for item in summary["axes"]
+            ]
+            pd.DataFrame(driver_data).to_excel(writer, sheet_name="ドライバー分析", index=False)
+
+        segmentation = results.get("layer4_segmentation")
+        if segmentation and segmentation.get("cells"):
+            # セグメント別統計量（縦持ち）
+            pd.DataFrame(segmentation["cells"]).rename(columns={
+                "segment": "セグメント", "level": "水準", "metric": "指標", "size": "回答者数",
+                "n": "有効回答数", "mean": "平均", "std": "標準偏差",
+                "ci_low": "95%CI下限", "ci_high": "95%CI上限", "suppressed": "秘匿",
+            }).to_excel(writer, sheet_name="セグメント", index=False)
+
+        text = results.get("text")
+        if text and text.get("fields"):
+            # 自由記述の特徴語（項目・グループごと、縦持ち）
+            text_data = []
+            for field, summary in text["fields"].items():
+                groups = [("全体", "", summary)] + [
+                    (segment, level, cell)
+                    for segment, levels in summary.items()
+                    if isinstance(levels, dict) and segment != "kwic"
+                    for level, cell in levels.items()
+                ]
+                for segment, level, cell in groups:
+                    # 秘匿したグループ（回答者数が最小セルサイズ未満）は特徴語がない
+                    for rank, item in enumerate(cell.get("top_terms", []), 1):
+                        text_data.append({
+                            "項目": field, "セグメント": segment, "水準": level, "文書数": cell["documents"],
+                            "順位": rank, "語": item["term"], "平均TF-IDF": item["score"], "出現文書数": item["documents"],
+                        })
+            pd.DataFrame(text_data).to_excel(writer, sheet_name="テキスト特徴語", index=False)
+
+        wtp = results.get("wtp")
+        if wtp and wtp.get("estimates"):
+            # WTP の区間打ち切り推定（全体・セグメントの水準 × サンプル、縦持ち）
+            pd.DataFrame(wtp["estimates"]).rename(columns={
+                "segment": "セグメント", "level": "水準", "sample": "サンプル", "size": "回答者数", "n": "有効回答数",
+                "mean": "平均", "mean_ci_low": "平均のCI下限", "mean_ci_high": "平均のCI上限",
+                "median": "中央値", "median_ci_low": "中央値のCI下限", "median_ci_high": "中央値のCI上限",
+                "converged": "収束", "suppressed": "秘匿",
+            }).to_excel(writer, sheet_name="WTP推定", index=False)
+
+        correlation_tests = results.get("correlation_tests")
+        if correlation_tests and correlation_tests.get("matrices"):
+            # 相関の検定（グループ × サンプル × 変数ペア、縦持ち。相関行列の上三角）
+            variables = correlation_tests["variables"]
+            pairs = [(i, j) for i in range(len(variables)) for j in range(i + 1, len(variables))]
+            test_data = [
+                {
+                    "セグメント": cell["segment"], "水準": cell["level"], "サンプル": cell["sample"],
+                    "変数1": variables[i], "変数2": variables[j], "有効回答数": cell["n"][i][j],
+                    "相関係数": cell["r"][i][j], "p値": cell["p_value"][i][j], "q値": cell["q_value"][i][j],
+                }
+                for cell in correlation_tests["matrices"]
+                if not cell["suppressed"]
+                for i, j in pairs
+                if cell["r"][i][j] is not None
+            ]
+            pd.DataFrame(test_data).to_excel(writer, sheet_name="相関の検定", index=False)
+
+        factors = results.get("factors")
+        if factors and factors.get("components"):
+            # SD評価軸の因子負荷量（行 = 軸、列 = 成分）と知覚マップ上のサンプルの座標
+            loadings_df = pd.DataFrame({name: c["loadings"] for name, c in factors["components"].items()})
+            loadings_df["共通性"] = pd.Series(factors["communalities"])
+            loadings_df.to_excel(writer, sheet_name="主成分負荷量")
+            pd.DataFrame(factors["perceptual_map"]).T.to_excel(writer, sheet_name="知覚マップ")
+
+        # ステージ実行時間
+        timings = results.get("stage_timings", {})
+        pd.DataFrame(
+            [{"ステージ": name, "秒": seconds} for name, seconds in timings.items()]
+        ).to_excel(writer, sheet_name="ステージ実行時間", index=False)
@@ -0,0 +1,306 @@
+"""
+SD評価軸の主成分分析・因子分析（知覚マップ）
+
+回答者 × サンプルを縦に積み上げた (回答者・サンプル, SD評価軸) の行列について、
+全軸に回答がある行の共偏差積和行列をマージ可能な集計量として求め、
+その相関行列の固有値分解で主成分を抽出する（必要に応じてバリマックス回転する）。
+集計量は回答を分割して読み込みながら加算でき、増分分析の状態として保存すれば
+新規回答を加算するだけで同じ当てはめ結果が得られる（逐次的な近似ではなく、全行で当てはめた結果と一致する）。
+
+サンプルごと（属性別を含む）の軸の平均を主成分得点の係数で射影し、知覚マップ上の座標とする。
+属性別の座標は、回答者数が最小セルサイズ未満のセルを秘匿する。
+"""
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .aggregates import ColumnMoments, CoMoments
+from .clustering import assign_clusters
+from .segmentation import DEFAULT_MIN_CELL_SIZE
+
+
+# 抽出する成分数（Noneの場合は固有値1以上の成分数。知覚マップのため2以上とする）
+DEFAULT_N_COMPONENTS = None
+
+# 回転の方法（"varimax" または None）
+DEFAULT_ROTATION = "varimax"
+
+# バリマックス回転の反復回数の上限と収束判定の閾値
+DEFAULT_MAX_ITER = 100
+DEFAULT_TOL = 1e-8
+
+
+def principal_components(corr: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    相関行列の固有値分解（固有値の降順）
+
+    各固有ベクトルは絶対値最大の要素が正になるように符号をそろえる。
+
+    Args:
+        corr: 相関行列 (変数, 変数)
+
+    Returns:
+        (固有値 (変数,), 固有ベクトル (変数, 成分))
+    """
+    eigenvalues, eigenvectors = np.linalg.eigh(corr)
+    order = np.argsort(eigenvalues)[::-1]
+    eigenvalues, eigenvectors = eigenvalues[order], eigenvectors[:, order]
+    signs = np.sign(eigenvectors[np.abs(eigenvectors).argmax(axis=0), np.arange(eigenvectors.shape[1])])
+    signs[signs == 0] = 1.0
+    return np.clip(eigenvalues, 0.0, None), eigenvectors * signs
+
+
+def varimax(
+    loadings: np.ndarray,
+    max_iter: int = DEFAULT_MAX_ITER,
+    tol: float = DEFAULT_TOL,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    バリマックス回転（Kaiser の正規化あり）
+
+    Args:
+        loadings: 因子負荷量 (変数, 成分)
+        max_iter: 反復回数の上限
+        tol: 基準値の相対的な増分がこれ未満になったら終了
+
+    Returns:
+        (回転後の因子負荷量, 回転行列 (成分, 成分))
+    """
+    p, k = loadings.shape
+    rotation = np.eye(k)
+    if k < 2:
+        return loadings.copy(), rotation
+    h = np.sqrt((loadings ** 2).sum(axis=1))
+    h[h == 0] = 1.0
+    normalized = loadings / h[:, None]
+    criterion = 0.0
+    for _ in range(max_iter):
+        rotated = normalized @ rotation
+        u, s, vt = np.linalg.svd(
+            normalized.T @ (rotated ** 3 - rotated * (rotated ** 2).sum(axis=0) / p)
+        )
+        rotation = u @ vt
+        previous, criterion = criterion, s.sum()
+        if previous != 0 and criterion < previous * (1 + tol):
+            break
+    return (normalized @ rotation) * h[:, None], rotation
+
+
+class FactorMoments:
+    """SD評価軸の主成分分析の集計量（サンプル別・属性値 × サンプル別）"""
+
+    def __init__(self, samples: List[str], axes: List[Dict], segments: Sequence[Any] = ()):
+        """
+        空の集計量を作成
+
+        Args:
+            samples: サンプルIDのリスト
+            axes: SD評価軸の定義
+            segments: 知覚マップを属性別にも求める属性列（組み合わせの指定は対象外）
+        """
+        self.samples = list(samples)
+        self.axis_ids = [axis["id"] for axis in axes]
+        self.segments = [column for column in segments if isinstance(column, str)]
+        k = len(self.axis_ids)
+        # サンプル -> 全軸に回答がある行の共偏差積和
+        self.sample_comoments = {sample_id: CoMoments(k) for sample_id in self.samples}
+        # 属性列 -> 属性値 -> サンプル -> 全軸に回答がある行の平均
+        self.segment_moments: Dict[str, Dict[Any, Dict[str, ColumnMoments]]] = {column: {} for column in self.segments}
+
+    def _sample_columns(self, sample_id: str) -> List[str]:
+        """サンプルのSD評価の列"""
+        return [f"sd_{sample_id}_{axis_id}" for axis_id in self.axis_ids]
+
+    def fold_table(self, df: pd.DataFrame) -> None:
+        """
+        回答テーブルの行を集計量に加算
+
+        Args:
+            df: 回答テーブル（1回答者1行）
+        """
+        k = len(self.axis_ids)
+        segment_codes = {
+            column: pd.factorize(df[column], sort=True) for column in self.segments if column in df.columns
+        }
+        for sample_id in self.samples:
+            values = df.reindex(columns=self._sample_columns(sample_id)).to_numpy(dtype=float, na_value=np.nan)
+            complete = ~np.isnan(values).any(axis=1)
+            self.sample_comoments[sample_id].merge(CoMoments.from_array(values[complete]))
+            for column, (codes, uniques) in segment_codes.items():
+                for code, value in enumerate(uniques):
+                    rows = complete & (codes == code)
+                    if not rows.any():
+                        continue
+                    value = value.item() if isinstance(value, np.generic) else value
+                    by_sample = self.segment_moments[column].setdefault(value, {})
+                    by_sample.setdefault(sample_id, ColumnMoments(k)).merge(ColumnMoments.from_array(values[rows]))
+
+    def merge(self, other: "FactorMoments") -> None:
+        """他の集計量を合算"""
+        for sample_id, moments in other.sample_comoments.items():
+            self.sample_comoments[sample_id].merge(moments)
+        for column, groups in other.segment_moments.items():
+            for value, by_sample in groups.items():
+                target = self.segment_moments.setdefault(column, {}).setdefault(value, {})
+                for sample_id, moments in by_sample.items():
+                    target.setdefault(sample_id, ColumnMoments(len(self.axis_ids))).merge(moments)
+
+    def pooled(self) -> CoMoments:
+        """全サンプルを積み上げた行の共偏差積和"""
+        pooled = CoMoments(len(self.axis_ids))
+        for moments in self.sample_comoments.values():
+            pooled.merge(moments)
+        return pooled
+
+    def fit(
+        self,
+        n_components: Optional[int] = DEFAULT_N_COMPONENTS,
+        rotation: Optional[str] = DEFAULT_ROTATION,
+        min_cell_size: int = DEFAULT_MIN_CELL_SIZE,
+    ) -> Dict[str, Any]:
+        """
+        主成分を抽出し、サンプルを知覚マップ上に射影
+
+        Args:
+            n_components: 抽出する成分数（Noneの場合は固有値1以上の成分数、2以上）
+            rotation: "varimax" または None
+            min_cell_size: 属性別の座標のうち、これ未満の回答者数のセルは値を秘匿する
+
+        Returns:
+            {"n": 当てはめに使った行数, "axes", "rotation", "eigenvalues", "explained_variance_ratio",
+             "n_components", "components": 成分名 -> {"variance", "variance_ratio", "loadings", "score_coefficients"},
+             "communalities", "center": 軸 -> {"mean", "std"}, "perceptual_map": サンプル -> {"n", 成分名 -> 得点},
+             "segments": 属性列 -> 属性値 -> サンプル -> {"n", 成分名 -> 得点}
+                         （秘匿するセルは {"n", "suppressed": True}）}
+            （行が軸数以下、または分散0の軸がある場合は n_components が0で components 等は空）
+        """
+        pooled = self.pooled()
+        p = len(self.axis_ids)
+        result: Dict[str, Any] = {
+            "n": int(pooled.n),
+            "axes": self.axis_ids,
+            "rotation": rotation,
+            "eigenvalues": [],
+            "explained_variance_ratio": [],
+            "n_components": 0,
+            "components": {},
+            "communalities": {},
+            "center": {},
+            "perceptual_map": {},
+            "segments": {},
+        }
+        corr = pooled.correlation()
+        if pooled.n <= p or np.isnan(corr).any():
+            return result
+
+        eigenvalues, eigenvectors = principal_components(corr)
+        if n_components is None:
+            n_components = max(int((eigenvalues >= 1.0).sum()), 2)
+        k = min(int(n_components), p)
+        loadings = eigenvectors[:, :k] * np.sqrt(eigenvalues[:k])
+        if rotation == "varimax":
+            loadings, _ = varimax(loadings)
+        elif rotation is not None:
+            raise ValueError(f"不明な回転の方法です: {rotation}（指定できる方法: varimax）")
+        # 回転後は成分の分散（負荷量の平方和）の降順に並べ替え、負荷量の和が正になるように符号をそろえる
+        variances = (loadings ** 2).sum(axis=0)
+        order = np.argsort(-variances, kind="stable")
+        loadings, variances = loadings[:, order], variances[order]
+        signs = np.where(loadings.sum(axis=0) < 0, -1.0, 1.0)
+        loadings = loadings * signs
+        # 標準化した軸の値から成分得点（平均0・分散1）を求める係数 L (L'L)^-1
+        coefficients = loadings @ np.linalg.pinv(loadings.T @ loadings)
+
+        mean = pooled.mean
+        std = np.sqrt(np.diag(pooled.comoment) / (pooled.n - 1))
+        names = [f"F{i + 1}" for i in range(k)]
+
+        def project(means: np.ndarray) -> Dict[str, float]:
+            scores = ((means - mean) / std) @ coefficients
+            return {name: float(score) for name, score in zip(names, scores)}
+
+        result.update({
+            "eigenvalues": eigenvalues.tolist(),
+            "explained_variance_ratio": (eigenvalues / eigenvalues.sum()).tolist(),
+            "n_components": k,
+            "components": {
+                name: {
+                    "variance": float(variances[i]),
+                    "variance_ratio": float(variances[i] / p),
+                    "loadings": dict(zip(self.axis_ids, loadings[:, i].tolist())),
+                    "score_coefficients": dict(zip(self.axis_ids, coefficients[:, i].tolist())),
+                }
+                for i, name in enumerate(names)
+            },
+            "communalities": dict(zip(self.axis_ids, (loadings ** 2).sum(axis=1).tolist())),
+            "center": {
+                axis_id: {"mean": float(m), "std": float(s)} for axis_id, m, s in zip(self.axis_ids, mean, std)
+            },
+            "perceptual_map": {
+                sample_id: {"n": int(moments.n), **project(moments.mean)}
+                for sample_id, moments in self.sample_comoments.items()
+                if moments.n > 0
+            },
+            "segments": {
+                column: {
+                    value: {
+                        sample_id: (
+                            {"n": int(moments.n[0]), **project(moments.mean)}
+                            if moments.n[0] >= min_cell_size
+                            else {"n": int(moments.n[0]), "suppressed": True}
+                        )
+                        for sample_id, moments in by_sample.items()
+                    }
+                    for value, by_sample in groups.items()
+                }
+                for column, groups in self.segment_moments.items()
+            },
+        })
+        return result
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSONに保存できる形式に変換"""
+        return {
+            "sample_comoments": {s: m.to_dict() for s, m in self.sample_comoments.items()},
+            "segment_moments": {
+                column: [[value, {s: m.to_dict() for s, m in by_sample.items()}] for value, by_sample in groups.items()]
+                for column, groups in self.segment_moments.items()
+            },
+        }
+
+    def load_dict(self, data: Dict[str, Any]) -> None:
+        """to_dict() の結果から集計量を復元"""
+        self.sample_comoments = {s: CoMoments.from_dict(v) for s, v in data["sample_comoments"].items()}
+        self.segment_moments = {
+            column: {value: {s: ColumnMoments.from_dict(v) for s, v in by_sample.items()} for value, by_sample in groups}
+            for column, groups in data["segment_moments"].items()
+        }
+
+
+def run_factors(
+    table: pd.DataFrame,
+    samples: List[str],
+    axes: List[Dict],
+    segments: List[Any],
+    factor_options: Optional[Dict[str, Any]],
+    clusters: Optional[np.ndarray] = None,
+) -> Dict[str, Any]:
+    """
+    SD評価軸の主成分分析ステージ
+
+    Args:
+        table: 回答テーブル
+        samples: サンプルIDのリスト
+        axes: SD評価軸の定義
+        segments: セグメント指定（単一属性列について属性別の知覚マップを求める）
+        factor_options: {"n_components", "rotation"}（FactorMoments.fit() を参照。省略可）
+        clusters: 回答者のクラスタ番号（clustering.run_clustering() を参照。Noneの場合は cluster 列を追加しない）
+
+    Returns:
+        {"factors": FactorMoments.fit() の結果}
+    """
+    table = assign_clusters(table, clusters)
+    moments = FactorMoments(samples, axes, [column for column in segments if column in table.columns])
+    moments.fold_table(table)
+    return {"factors": moments.fit(**(factor_options or {}))}
@@ -0,0 +1,513 @@
+"""
+増分分析
+
+マージ可能な集計量を永続化し、前回の分析以降に追加された回答だけを加算して
+analysis_results.json と同じ構造の結果を出力する。
+回答データは追記だけで更新されるものとし、前回読み込んだ位置（バイト）以降だけを読むため、
+夜間・毎時の再分析のコストが全回答数ではなく新規回答数に比例するようになる。
+"""
+import hashlib
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional
+
+import numpy as np
+import pandas as pd
+
+from .aggregates import ColumnMoments, CoMoments, ValueCounts
+from .clustering import CLUSTER_COLUMN
+from .correlation import rank_importance, sd_axis_correlation, sd_purchase_correlation
+from .drivers import analyze_drivers, driver_summary
+from .factors import FactorMoments
+from .laddering import LADDERS, LadderCounts, breakdown_counts, ladder_counts
+from .loaders import ColumnType, read_records_from, read_signature, read_table_from
+from .segmentation import (
+    SegmentSpec, cell_sums, cells_from_sums, purchase_intent_by_segment, segment_columns, segment_name, to_records,
+)
+from .tensor import RatingMoments, RatingTensor
+
+
+# 度数を集計する回答者属性
+DEMOGRAPHIC_COLUMNS = ["age_group", "gender", "driving_experience", "ev_experience"]
+
+# 保存する状態の形式のバージョン（形式を変えた場合は上げて状態を作り直す）
+STATE_VERSION = 7
+
+# 回答を識別する列
+ID_COLUMN = "session_id"
+
+
+class IncrementalAnalysis:
+    """増分分析の状態（マージ可能な集計量と回答データの読み込み位置）"""
+
+    def __init__(
+        self,
+        samples: List[str],
+        axes: List[Dict],
+        segments: List[SegmentSpec],
+        laddering_vocab: Optional[Dict[str, List[str]]] = None,
+    ):
+        """
+        空の状態を作成
+
+        Args:
+            samples: サンプルIDのリスト
+            axes: SD評価軸の定義
+            segments: セグメント分析に使う属性列、または組み合わせる属性列のタプル
+                （主成分分析の属性別の知覚マップは単一の属性列のみ）
+            laddering_vocab: ラダリングの why_good 等のキー -> 選択肢の語彙
+        """
+        self.laddering_vocab = laddering_vocab or {}
+        self.samples = list(samples)
+        self.axes = list(axes)
+        self.axis_ids = [axis["id"] for axis in axes]
+        self.segment_specs = [spec if isinstance(spec, str) else tuple(spec) for spec in segments]
+        self.segments = [column for column in self.segment_specs if isinstance(column, str)]
+        # セグメント分析の指標（サンプルごとに購買意欲、SD評価の順。segmentation.default_metrics() と同じ順）
+        self.metrics = [
+            column
+            for sample_id in self.samples
+            for column in [f"purchase_intent_{sample_id}"] + [f"sd_{sample_id}_{axis_id}" for axis_id in self.axis_ids]
+        ]
+
+        # 加算した行数・回答数
+        self.n_rows = 0
+        self.n_records = 0
+        # "table" / "records" -> {"offset": 次回の読み込み位置, "signature": read_signature() の結果}
+        self.read_positions: Dict[str, Dict[str, Any]] = {}
+        self.demographics = {column: ValueCounts() for column in DEMOGRAPHIC_COLUMNS}
+        self.sensitivity = ColumnMoments(1)
+        # サンプルごとに [SD各軸..., 購買意欲] の列を集計する
+        k = len(self.axis_ids) + 1
+        self.sample_moments = {sample_id: ColumnMoments(k) for sample_id in self.samples}
+        # ドライバー分析用: 全変数に回答がある行の共偏差積和（通常の分析と同じく完全ケース）
+        self.sample_comoments = {sample_id: CoMoments(k) for sample_id in self.samples}
+        # 相関分析用: ペアワイズの件数・和・平方和・積和（通常の分析と同じく各ペアで両方に回答がある行）
+        self.rating_moments = RatingTensor.from_table(pd.DataFrame(), self.samples, self.axes).moments()
+        self.intent_counts = {sample_id: ValueCounts() for sample_id in self.samples}
+        self.wtp_counts = {sample_id: ValueCounts() for sample_id in self.samples}
+        self.best_sound = ValueCounts()
+        self.worst_sound = ValueCounts()
+        # セグメント名 -> セル（属性値のタプル） -> segmentation.cell_sums() の行（self.metrics の全指標）
+        self.segment_sums: Dict[str, Dict[tuple, np.ndarray]] = {}
+        # 回答テーブルにあった指標の列
+        self.present_metrics: set = set()
+        self.importance = ColumnMoments(1)
+        self.importance_counts = ValueCounts()
+        # ラダリングの種類 -> 理由・気持ちの度数と共起回数
+        self.ladders: Dict[str, LadderCounts] = ladder_counts([], self.laddering_vocab)
+        # ラダリングの内訳を出す属性（cluster 列は回答テーブルにのみあるため除く）
+        self.ladder_segments = [column for column in self.segments if column != CLUSTER_COLUMN]
+        # ラダリングの種類 -> "by_sample" / 属性 -> グループ -> 度数と共起回数
+        self.ladder_groups: Dict[str, Dict[str, Dict[Any, LadderCounts]]] = {
+            key: {name: {} for name in ["by_sample", *self.ladder_segments]} for key in self.ladders
+        }
+        # SD評価軸の主成分分析（知覚マップ）の集計量
+        self.factors = FactorMoments(self.samples, axes, self.segments)
+
+    @property
+    def config_fingerprint(self) -> str:
+        """集計対象の設定の指紋（設定が変わった場合は状態を作り直す）"""
+        encoded = json.dumps([STATE_VERSION, self.samples, self.axis_ids, self.segment_specs], ensure_ascii=False)
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    def _sample_columns(self, sample_id: str) -> List[str]:
+        """サンプルの集計対象列"""
+        return [f"sd_{sample_id}_{axis_id}" for axis_id in self.axis_ids] + [f"purchase_intent_{sample_id}"]
+
+    def read_offset(self, name: str, path: Path) -> Optional[int]:
+        """
+        回答データの前回の読み込み位置
+
+        Args:
+            name: "table" または "records"
+            path: 回答データのパス
+
+        Returns:
+            読み込み位置（未読の場合は0。ファイルが置き換えられて読み込み済みの部分が変わった場合は None）
+        """
+        position = self.read_positions.get(name)
+        if position is None:
+            return 0
+        if read_signature(path, position["offset"]) != position["signature"]:
+            return None
+        return position["offset"]
+
+    def mark_read(self, name: str, path: Path, offset: int) -> None:
+        """回答データの読み込み位置を記録"""
+        self.read_positions[name] = {"offset": offset, "signature": read_signature(path, offset)}
+
+    def fold_table(self, df: pd.DataFrame) -> int:
+        """
+        回答テーブルの行を集計量に加算
+
+        Args:
+            df: 回答テーブル（1回答者1行）
+
+        Returns:
+            加算した行数
+        """
+        if df.empty:
+            return 0
+        self.n_rows += len(df)
+
+        for column, counts in self.demographics.items():
+            if column in df.columns:
+                counts.merge(ValueCounts.from_series(df[column]))
+        if "sound_sensitivity" in df.columns:
+            self.sensitivity.merge(ColumnMoments.from_array(df[["sound_sensitivity"]].to_numpy(dtype=float, na_value=np.nan)))
+
+        self.rating_moments = RatingMoments.combine(
+            [self.rating_moments, RatingTensor.from_table(df, self.samples, self.axes).moments()]
+        )
+        for sample_id in self.samples:
+            values = df.reindex(columns=self._sample_columns(sample_id)).to_numpy(dtype=float, na_value=np.nan)
+            self.sample_moments[sample_id].merge(ColumnMoments.from_array(values))
+            self.sample_comoments[sample_id].merge(CoMoments.from_array(values))
+            intent_col = f"purchase_intent_{sample_id}"
+            wtp_col = f"wtp_{sample_id}"
+            if intent_col in df.columns:
+                self.intent_counts[sample_id].merge(ValueCounts.from_series(df[intent_col]))
+            if wtp_col in df.columns:
+                self.wtp_counts[sample_id].merge(ValueCounts.from_series(df[wtp_col]))
+
+        if "best_sound" in df.columns:
+            self.best_sound.merge(ValueCounts.from_series(df["best_sound"]))
+        if "worst_sound" in df.columns:
+            self.worst_sound.merge(ValueCounts.from_series(df["worst_sound"]))
+
+        self.present_metrics.update(column for column in self.metrics if column in df.columns)
+        for spec in self.segment_specs:
+            if not all(column in df.columns for column in segment_columns(spec)):
+                continue
+            cells = self.segment_sums.setdefault(segment_name(spec), {})
+            totals = cell_sums(df, spec, self.metrics)
+            for key, row in zip(totals.index, totals.to_numpy()):
+                key = tuple(_to_python(value) for value in (key if isinstance(key, tuple) else (key,)))
+                cells[key] = cells[key] + row if key in cells else row
+
+        if "sound_importance" in df.columns:
+            self.importance.merge(ColumnMoments.from_array(df[["sound_importance"]].to_numpy(dtype=float, na_value=np.nan)))
+            self.importance_counts.merge(ValueCounts.from_series(df["sound_importance"]))
+        self.factors.fold_table(df)
+        return len(df)
+
+    def fold_records(self, records: List[Dict[str, Any]]) -> int:
+        """
+        回答データ（JSON）のラダリング度数・共起回数を加算
+
+        Args:
+            records: 回答データのリスト
+
+        Returns:
+            加算した回答数
+        """
+        if not records:
+            return 0
+        self.n_records += len(records)
+        for key, counts in ladder_counts(records, self.laddering_vocab).items():
+            self.ladders[key].merge(counts)
+        for key, groupings in breakdown_counts(records, self.laddering_vocab, self.ladder_segments).items():
+            for name, groups in groupings.items():
+                merged = self.ladder_groups[key][name]
+                for group, counts in groups.items():
+                    if group in merged:
+                        merged[group].merge(counts)
+                    else:
+                        merged[group] = counts
+        return len(records)
+
+    def to_results(self) -> Dict[str, Any]:
+        """
+        集計量から analysis_results.json と同じ構造の結果を作成
+
+        Returns:
+            Layer 1〜5 と SD評価軸の主成分分析（factors）の結果
+        """
+        sd_summary, sd_comparison = {}, {axis_id: {} for axis_id in self.axis_ids}
+        purchase_summary, purchase_comparison, wtp_summary = {}, {}, {}
+        intent_index = len(self.axis_ids)
+
+        for sample_id in self.samples:
+            moments = self.sample_moments[sample_id]
+            means, stds = moments.means(), moments.stds()
+
+            sd_summary[sample_id] = {}
+            for j, axis_id in enumerate(self.axis_ids):
+                if moments.n[j] == 0:
+                    continue
+                sd_summary[sample_id][axis_id] = {
+                    "mean": float(means[j]),
+                    "std": float(stds[j]),
+                    "min": int(moments.min[j]),
+                    "max": int(moments.max[j]),
+                }
+                sd_comparison[axis_id][sample_id] = {"mean": float(means[j]), "std": float(stds[j])}
+
+            if moments.n[intent_index] > 0:
+                purchase_summary[sample_id] = {
+                    "mean": float(means[intent_index]),
+                    "std": float(stds[intent_index]),
+                    "distribution": self.intent_counts[sample_id].to_result(),
+                }
+                purchase_comparison[sample_id] = {
+                    "mean": float(means[intent_index]),
+                    "std": float(stds[intent_index]),
+                }
+            if self.wtp_counts[sample_id].counts:
+                wtp_summary[sample_id] = self.wtp_counts[sample_id].to_result()
+
+        purchase_corr = sd_purchase_correlation(self.rating_moments)
+
+        # 購買意欲の列があるサンプルの相関行列をまとめてドライバー分析する
+        driver_samples = [s for s in self.samples if s in purchase_corr]
+        drivers = {}
+        if driver_samples:
+            r2, shapley, weights = analyze_drivers(
+                np.stack([self.sample_comoments[s].correlation() for s in driver_samples])
+            )
+            for i, sample_id in enumerate(driver_samples):
+                drivers[sample_id] = driver_summary(
+                    self.axis_ids, self.sample_comoments[sample_id].n, r2[i], shapley[i], weights[i]
+                )
+
+        segment_analysis = self._segment_results()
+
+        sensitivity = self.sensitivity
+        laddering = {}
+        for _, why_key, feeling_key, _ in LADDERS:
+            counts = self.ladders[f"{why_key}_{feeling_key}"]
+            laddering[why_key] = counts.item_counts("why")
+            laddering[feeling_key] = counts.item_counts("feeling")
+        laddering["cooccurrence"] = {key: counts.cooccurrence() for key, counts in self.ladders.items()}
+        laddering["breakdown"] = {
+            key: {
+                name: {
+                    group: counts.breakdown(self.ladders[key].why_vocab, self.ladders[key].feeling_vocab)
+                    for group, counts in groups.items()
+                }
+                for name, groups in groupings.items()
+            }
+            for key, groupings in self.ladder_groups.items()
+        }
+
+        return {
+            "layer1_descriptive": {
+                "demographics": {
+                    **{column: counts.to_result() for column, counts in self.demographics.items()},
+                    "sound_sensitivity": {
+                        "mean": float(sensitivity.means()[0]),
+                        "std": float(sensitivity.stds()[0]),
+                        "min": int(sensitivity.min[0]) if sensitivity.n[0] else None,
+                        "max": int(sensitivity.max[0]) if sensitivity.n[0] else None,
+                    },
+                },
+                "sd_ratings": sd_summary,
+                "purchase_intent": purchase_summary,
+                "wtp": wtp_summary,
+            },
+            "layer2_comparative": {
+                "sd_comparison": sd_comparison,
+                "purchase_comparison": purchase_comparison,
+                "best_worst": {
+                    "best_sound": self.best_sound.to_result(),
+                    "worst_sound": self.worst_sound.to_result(),
+                },
+            },
+            "layer3_correlation": {
+                "sd_axis_correlation": sd_axis_correlation(self.rating_moments),
+                "sd_purchase_correlation": purchase_corr,
+                "importance_ranking": rank_importance(purchase_corr, drivers),
+            },
+            "layer4_segmentation": segment_analysis,
+            "layer5_insights": {
+                "laddering": laddering,
+                "interview": {
+                    "sound_importance": {
+                        "mean": float(self.importance.means()[0]) if self.importance.n[0] else 0.0,
+                        "distribution": self.importance_counts.to_result(),
+                    }
+                },
+            },
+            "factors": self.factors.fit(),
+        }
+
+    def _segment_results(self) -> Dict[str, Any]:
+        """セル別の和から Layer 4 の結果を作成（通常の分析と同じく回答者数が最小セル数未満のセルは秘匿する）"""
+        metrics = [column for column in self.metrics if column in self.present_metrics]
+        k = len(self.metrics)
+        selected = [self.metrics.index(column) for column in metrics]
+        layout = [0] + [1 + block * k + j for block in range(5) for j in selected]
+        frames = []
+        for spec in self.segment_specs:
+            cells = self.segment_sums.get(segment_name(spec))
+            if not cells:
+                continue
+            columns = list(segment_columns(spec))
+            if len(columns) > 1:
+                index = pd.MultiIndex.from_tuples(list(cells), names=columns)
+            else:
+                index = pd.Index([key[0] for key in cells], name=columns[0])
+            totals = pd.DataFrame(np.vstack(list(cells.values()))[:, layout], index=index)
+            frames.append(cells_from_sums(totals, spec, metrics))
+        frames = [frame for frame in frames if not frame.empty]
+        cells = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+        result: Dict[str, Any] = {}
+        if not cells.empty:
+            for spec in self.segments:
+                if spec in self.segment_sums:
+                    result[spec] = purchase_intent_by_segment(cells, spec, self.samples)
+        result["cells"] = to_records(cells)
+        return result
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSONに保存できる形式に変換"""
+        return {
+            "config_fingerprint": self.config_fingerprint,
+            "n_rows": self.n_rows,
+            "n_records": self.n_records,
+            "read_positions": self.read_positions,
+            "demographics": {column: counts.to_dict() for column, counts in self.demographics.items()},
+            "sensitivity": self.sensitivity.to_dict(),
+            "sample_moments": {s: m.to_dict() for s, m in self.sample_moments.items()},
+            "sample_comoments": {s: m.to_dict() for s, m in self.sample_comoments.items()},
+            "rating_moments": self.rating_moments.to_dict(),
+            "intent_counts": {s: c.to_dict() for s, c in self.intent_counts.items()},
+            "wtp_counts": {s: c.to_dict() for s, c in self.wtp_counts.items()},
+            "best_sound": self.best_sound.to_dict(),
+            "worst_sound": self.worst_sound.to_dict(),
+            "segment_sums": {
+                name: [[list(key), row.tolist()] for key, row in cells.items()]
+                for name, cells in self.segment_sums.items()
+            },
+            "present_metrics": sorted(self.present_metrics),
+            "importance": self.importance.to_dict(),
+            "importance_counts": self.importance_counts.to_dict(),
+            "ladders": {key: counts.to_dict() for key, counts in self.ladders.items()},
+            "ladder_groups": {
+                key: {name: [[group, counts.to_dict()] for group, counts in groups.items()] for name, groups in groupings.items()}
+                for key, groupings in self.ladder_groups.items()
+            },
+            "factors": self.factors.to_dict(),
+        }
+
+    def load_state(self, data: Dict[str, Any]) -> bool:
+        """
+        to_dict() の結果から状態を復元
+
+        Args:
+            data: 保存済みの状態
+
+        Returns:
+            復元できたか（設定が変わっている場合はFalse）
+        """
+        if data.get("config_fingerprint") != self.config_fingerprint:
+            return False
+        self.n_rows = int(data["n_rows"])
+        self.n_records = int(data["n_records"])
+        self.read_positions = dict(data["read_positions"])
+        self.demographics = {c: ValueCounts.from_dict(v) for c, v in data["demographics"].items()}
+        self.sensitivity = ColumnMoments.from_dict(data["sensitivity"])
+        self.sample_moments = {s: ColumnMoments.from_dict(v) for s, v in data["sample_moments"].items()}
+        self.sample_comoments = {s: CoMoments.from_dict(v) for s, v in data["sample_comoments"].items()}
+        self.rating_moments = RatingMoments.from_dict(data["rating_moments"])
+        self.intent_counts = {s: ValueCounts.from_dict(v) for s, v in data["intent_counts"].items()}
+        self.wtp_counts = {s: ValueCounts.from_dict(v) for s, v in data["wtp_counts"].items()}
+        self.best_sound = ValueCounts.from_dict(data["best_sound"])
+        self.worst_sound = ValueCounts.from_dict(data["worst_sound"])
+        self.segment_sums = {
+            name: {tuple(key): np.asarray(row, dtype=float) for key, row in cells}
+            for name, cells in data["segment_sums"].items()
+        }
+        self.present_metrics = set(data["present_metrics"])
+        self.importance = ColumnMoments.from_dict(data["importance"])
+        self.importance_counts = ValueCounts.from_dict(data["importance_counts"])
+        self.ladders = {k: LadderCounts.from_dict(v) for k, v in data["ladders"].items()}
+        self.ladder_groups = {
+            key: {name: {group: LadderCounts.from_dict(counts) for group, counts in groups} for name, groups in groupings.items()}
+            for key, groupings in data["ladder_groups"].items()
+        }
+        self.factors.load_dict(data["factors"])
+        return True
+
+
+def _to_python(value: Any) -> Any:
+    """NumPyのスカラーをPythonの値に変換"""
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def run_incremental(
+    csv_path: Path,
+    json_path: Path,
+    samples: List[str],
+    axes: List[Dict],
+    state_file: Path,
+    segments: Optional[List[SegmentSpec]] = None,
+    laddering_vocab: Optional[Dict[str, List[str]]] = None,
+    column_types: Optional[Mapping[str, ColumnType]] = None,
+) -> Dict[str, Any]:
+    """
+    増分分析を実行（前回の読み込み位置以降の新規回答のみを集計量に加算し、状態を保存する）
+
+    回答データが追記以外の方法で更新された（読み込み済みの部分が変わった）場合は、状態を破棄して全回答から集計し直す。
+
+    Args:
+        csv_path: 回答データ（CSV）のパス
+        json_path: 回答データ（JSON）のパス
+        samples: 分析対象のサンプルID
+        axes: SD評価軸の定義
+        state_file: 集計量の保存先
+        segments: セグメント分析に使う属性列、または組み合わせる属性列のタプル（Noneの場合は DEFAULT_SEGMENTS）
+        laddering_vocab: ラダリングの why_good 等のキー -> 選択肢の語彙
+        column_types: CSVの列名のパターン -> 型の指定（loaders.read_table_from() を参照）
+
+    Returns:
+        analysis_results.json 形式の結果（incremental に今回加算した件数を含む）
+    """
+    from .stages import DEFAULT_SEGMENTS
+
+    start = time.perf_counter()
+    def new_state() -> IncrementalAnalysis:
+        return IncrementalAnalysis(
+            samples, axes, segments if segments is not None else DEFAULT_SEGMENTS, laddering_vocab
+        )
+
+    state = new_state()
+    state_file = Path(state_file)
+    restored = False
+    if state_file.exists():
+        with open(state_file, "r", encoding="utf-8") as f:
+            restored = state.load_state(json.load(f))
+    table_offset = state.read_offset("table", csv_path)
+    records_offset = state.read_offset("records", json_path)
+    if table_offset is None or records_offset is None:
+        state, restored = new_state(), False
+        table_offset = records_offset = 0
+
+    table, table_offset = read_table_from(csv_path, table_offset, column_types)
+    records, records_offset = read_records_from(json_path, records_offset)
+    new_rows = state.fold_table(table)
+    new_records = state.fold_records(records)
+    state.mark_read("table", csv_path, table_offset)
+    state.mark_read("records", json_path, records_offset)
+
+    state_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = state_file.with_suffix(".tmp")
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(state.to_dict(), f, ensure_ascii=False)
+    tmp_file.replace(state_file)
+
+    return {
+        "analysis_date": datetime.now().isoformat(),
+        "total_responses": state.n_records or state.n_rows,
+        **state.to_results(),
+        "stage_timings": {"incremental": round(time.perf_counter() - start, 6)},
+        "incremental": {
+            "restored_state": restored,
+            "new_rows": new_rows,
+            "new_records": new_records,
+        },
+    }
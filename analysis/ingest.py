@@ -0,0 +1,353 @@
+"""
+回答ストアの取り込み
+
+アンケート本体が保存する回答（DataManager.save_responses_json() の
+{"session_id", "saved_at", "responses": SessionManager.get_all_data()}）を、
+分析が読む回答データ（1回答者1行のCSV と JSON Lines。サンプルデータ生成と同じ形式）に変換する。
+回答は1件ずつ読んで書き出すため、メモリ使用量は回答数によらず一定。
+変換結果は回答ストアの指紋とともに保存し、ストアに変更がなければ変換を省略する。
+"""
+import csv
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .loaders import iter_records
+
+
+# 変換の仕様を変更した場合は上げる（保存済みの変換結果を無効化する）
+INGEST_VERSION = "1"
+
+# 変換結果のファイル名
+TABLE_FILE = "responses.csv"
+RECORDS_FILE = "responses.jsonl"
+MANIFEST_FILE = "ingest_manifest.json"
+
+# 運転歴（年数）-> 運転経験の選択肢（年数がこの値未満の選択肢、最後は上限なし）
+DRIVING_YEAR_BINS = [
+    (1, "1年未満"),
+    (5, "1-5年"),
+    (10, "5-10年"),
+    (20, "10-20年"),
+    (None, "20年以上"),
+]
+
+# EV所有経験（はい／いいえ）-> EV経験の選択肢
+EV_OWNERSHIP_LABELS = {True: "所有している", False: "乗ったことはない"}
+
+# 回答者属性の列（CSVの先頭に並べる）
+DEMOGRAPHIC_COLUMNS = [
+    "age_group", "gender", "prefecture", "driving_experience", "ev_experience", "sound_sensitivity",
+]
+
+
+def table_columns(samples: List[str], axes: List[Dict]) -> List[str]:
+    """
+    回答データ（CSV）の列名（サンプルデータ生成の save_to_csv() と同じ順）
+
+    Args:
+        samples: サンプルID
+        axes: SD評価軸の定義
+
+    Returns:
+        列名のリスト
+    """
+    columns = ["response_id", "session_id", "timestamp", *DEMOGRAPHIC_COLUMNS, "best_sound", "worst_sound"]
+    for sample_id in samples:
+        columns += [f"sd_{sample_id}_{axis['id']}" for axis in axes]
+        columns += [f"purchase_intent_{sample_id}", f"wtp_{sample_id}"]
+    columns.append("sound_importance")
+    return columns
+
+
+def _session_data(record: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[str]]:
+    """保存ファイルの外側（session_id / saved_at）を外して get_all_data() の内容を取り出す"""
+    inner = record.get("responses")
+    if isinstance(inner, dict) and isinstance(inner.get("responses"), dict):
+        return inner, record.get("saved_at")
+    return record, record.get("saved_at")
+
+
+def _driving_experience(years: Any) -> Optional[str]:
+    """運転歴（年数）を運転経験の選択肢に変換（文字列はそのまま）"""
+    if years is None or isinstance(years, str):
+        return years
+    for upper, label in DRIVING_YEAR_BINS:
+        if upper is None or years < upper:
+            return label
+    return None
+
+
+def _option_number(label: Any) -> Optional[int]:
+    """"5: どちらかといえば購入したい" のような選択肢から先頭の数値を取り出す（数値はそのまま）"""
+    if label is None or isinstance(label, int):
+        return label
+    head = str(label).split(":", 1)[0].strip()
+    return int(head) if head.isdigit() else None
+
+
+def canonical_record(record: Dict[str, Any], samples: List[str]) -> Dict[str, Any]:
+    """
+    回答ストアの1件を分析用の回答データ（サンプルデータ生成と同じ構造）に変換
+
+    すでに分析用の構造（evaluations を含む）の場合はそのまま返す。
+
+    Args:
+        record: 保存ファイルの内容、または SessionManager.get_all_data() の結果
+        samples: サンプルID
+
+    Returns:
+        demographics / evaluations / grid_evaluation / interview / summary を含む回答データ
+    """
+    if "evaluations" in record:
+        return record
+    data, saved_at = _session_data(record)
+    responses = data.get("responses") or {}
+    basic = responses.get("basic_info") or {}
+    driving = responses.get("driving_experience") or {}
+    grid = responses.get("grid_selection") or {}
+    good = responses.get("laddering_good")
+    bad = responses.get("laddering_bad")
+    topic1 = responses.get("interview_topic1") or {}
+    topic2 = responses.get("interview_topic2") or {}
+    topic3 = responses.get("interview_topic3") or {}
+    ev_owner = driving.get("ev_experience")
+
+    evaluations: Dict[str, Any] = {
+        "sample_order": data.get("sample_order"),
+        "sd_ratings": {},
+        "purchase_intent": {},
+        "wtp": {},
+        "free_comments": {},
+    }
+    for sample_id in samples:
+        evaluation = responses.get(f"evaluation_{sample_id}")
+        if not evaluation:
+            continue
+        evaluations["sd_ratings"][sample_id] = evaluation.get("sd_scores") or {}
+        evaluations["purchase_intent"][sample_id] = _option_number(evaluation.get("purchase_intent"))
+        evaluations["wtp"][sample_id] = evaluation.get("wtp")
+        evaluations["free_comments"][sample_id] = evaluation.get("free_comment", "")
+
+    grid_evaluation: Dict[str, Any] = {
+        "best_sound": grid.get("best_sound"),
+        "worst_sound": grid.get("worst_sound"),
+        "best_axis": grid.get("best_axis"),
+        "worst_axis": grid.get("worst_axis"),
+    }
+    if good is not None:
+        grid_evaluation["laddering_best"] = {
+            "why_good": good.get("why_good") or [],
+            "feeling_good": good.get("feeling_good") or [],
+        }
+    if bad is not None:
+        grid_evaluation["laddering_worst"] = {
+            "why_bad": bad.get("why_bad") or [],
+            "feeling_bad": bad.get("feeling_bad") or [],
+        }
+
+    canonical = {
+        "session_id": data.get("session_id") or record.get("session_id"),
+        "timestamp": responses.get("completed_at") or saved_at or data.get("start_time"),
+        "completed": bool(data.get("completed")),
+        "group": data.get("group"),
+        "demographics": {
+            "age_group": basic.get("age_group"),
+            "gender": basic.get("gender"),
+            "prefecture": basic.get("prefecture"),
+            "driving_experience": _driving_experience(driving.get("driving_years")),
+            "ev_experience": EV_OWNERSHIP_LABELS.get(ev_owner, ev_owner),
+            "sound_sensitivity": responses.get("sound_sensitivity"),
+        },
+        "evaluations": evaluations,
+        "grid_evaluation": grid_evaluation,
+        "interview": {
+            "topic1": {
+                "most_impressive": topic1.get("impressive_sound"),
+                "impression_detail": topic1.get("impressive_reason", ""),
+                "positive_or_negative": topic1.get("impression_type"),
+                "impression_why": topic1.get("impression_why", ""),
+            },
+            "topic2": {
+                "sound_importance": (topic2.get("importance_comparison") or {}).get("sound"),
+                "importance_comparison": topic2.get("importance_comparison") or {},
+                "comparison_with_others": topic2.get("comparison_comment", ""),
+            },
+            "topic3": {
+                "ideal_sound": topic3.get("ideal_sound_description", ""),
+                "similar_examples": topic3.get("similar_examples", ""),
+            },
+        },
+        "summary": {
+            "overall_impression": (responses.get("overall_impression") or {}).get("impression", ""),
+            "additional_comments": (responses.get("additional_comments") or {}).get("comments", ""),
+        },
+    }
+    if "step_timings" in data:
+        canonical["step_timings"] = data["step_timings"]
+    return canonical
+
+
+def table_row(record: Dict[str, Any], samples: List[str], axes: List[Dict]) -> Dict[str, Any]:
+    """
+    分析用の回答データ1件を回答データ（CSV）の1行に変換（未回答の項目は空欄）
+
+    Args:
+        record: canonical_record() の結果
+        samples: サンプルID
+        axes: SD評価軸の定義
+
+    Returns:
+        列名 -> 値
+    """
+    demographics = record.get("demographics") or {}
+    evaluations = record.get("evaluations") or {}
+    grid = record.get("grid_evaluation") or {}
+    row = {
+        "response_id": record.get("response_id"),
+        "session_id": record.get("session_id"),
+        "timestamp": record.get("timestamp"),
+        **{column: demographics.get(column) for column in DEMOGRAPHIC_COLUMNS},
+        "best_sound": grid.get("best_sound"),
+        "worst_sound": grid.get("worst_sound"),
+    }
+    for sample_id in samples:
+        ratings = (evaluations.get("sd_ratings") or {}).get(sample_id) or {}
+        for axis in axes:
+            row[f"sd_{sample_id}_{axis['id']}"] = ratings.get(axis["id"])
+        row[f"purchase_intent_{sample_id}"] = (evaluations.get("purchase_intent") or {}).get(sample_id)
+        row[f"wtp_{sample_id}"] = (evaluations.get("wtp") or {}).get(sample_id)
+    row["sound_importance"] = (((record.get("interview") or {}).get("topic2")) or {}).get("sound_importance")
+    return row
+
+
+def iter_store(source: Path) -> Iterator[Dict[str, Any]]:
+    """
+    回答ストアの回答を1件ずつ読み込み
+
+    Args:
+        source: 回答ストアのディレクトリ（1セッション1ファイルの *.json）、
+            または回答を並べた JSON 配列 / JSON Lines のファイル
+
+    Yields:
+        保存された回答
+    """
+    source = Path(source)
+    if source.is_dir():
+        for path in sorted(source.glob("*.json")):
+            with open(path, "r", encoding="utf-8") as f:
+                yield json.load(f)
+    else:
+        for chunk in iter_records(source):
+            yield from chunk
+
+
+def store_fingerprint(source: Path) -> str:
+    """
+    回答ストアの指紋（ファイル名・サイズ・更新時刻から計算し、内容は読まない）
+
+    Args:
+        source: 回答ストアのディレクトリまたはファイル
+
+    Returns:
+        指紋（16進文字列）
+    """
+    source = Path(source)
+    paths = sorted(source.glob("*.json")) if source.is_dir() else [source]
+    digest = hashlib.sha256()
+    for path in paths:
+        stat = path.stat()
+        digest.update(f"{path.name}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def ingest_records(
+    records: Iterable[Dict[str, Any]],
+    csv_path: Path,
+    json_path: Path,
+    samples: List[str],
+    axes: List[Dict],
+    completed_only: bool = True,
+) -> int:
+    """
+    回答を1件ずつ変換して回答データ（CSV と JSON Lines）に書き出す
+
+    Args:
+        records: 保存された回答（任意の回答ストアから読み込んだもの）
+        csv_path: 回答データ（CSV）の保存先
+        json_path: 回答データ（JSON Lines）の保存先
+        samples: サンプルID
+        axes: SD評価軸の定義
+        completed_only: 完了していない回答を除くか
+
+    Returns:
+        書き出した回答数
+    """
+    csv_path, json_path = Path(csv_path), Path(json_path)
+    csv_path.parent.mkdir(parents=True, exist_ok=True)
+    json_path.parent.mkdir(parents=True, exist_ok=True)
+    count = 0
+    with open(csv_path, "w", encoding="utf-8-sig", newline="") as table_file, \
+            open(json_path, "w", encoding="utf-8") as records_file:
+        writer = csv.DictWriter(table_file, fieldnames=table_columns(samples, axes), extrasaction="ignore")
+        writer.writeheader()
+        for record in records:
+            canonical = canonical_record(record, samples)
+            if completed_only and not canonical.get("completed", True):
+                continue
+            count += 1
+            canonical = {**canonical, "response_id": canonical.get("response_id") or count}
+            writer.writerow(table_row(canonical, samples, axes))
+            records_file.write(json.dumps(canonical, ensure_ascii=False) + "\n")
+    return count
+
+
+def ingest_store(
+    source: Path,
+    output_dir: Path,
+    samples: List[str],
+    axes: List[Dict],
+    completed_only: bool = True,
+) -> Tuple[Path, Path]:
+    """
+    回答ストアを回答データに変換（ストアと設定が前回と同じ場合は保存済みの変換結果を使う）
+
+    Args:
+        source: 回答ストアのディレクトリまたはファイル（iter_store() を参照）
+        output_dir: 変換結果の保存先
+        samples: サンプルID
+        axes: SD評価軸の定義
+        completed_only: 完了していない回答を除くか
+
+    Returns:
+        (回答データ（CSV）のパス, 回答データ（JSON Lines）のパス)
+    """
+    output_dir = Path(output_dir)
+    csv_path, json_path = output_dir / TABLE_FILE, output_dir / RECORDS_FILE
+    manifest_path = output_dir / MANIFEST_FILE
+    manifest = {
+        "version": INGEST_VERSION,
+        "source": str(Path(source).resolve()),
+        "fingerprint": store_fingerprint(source),
+        "samples": list(samples),
+        "axes": [axis["id"] for axis in axes],
+        "completed_only": completed_only,
+    }
+    if csv_path.exists() and json_path.exists() and manifest_path.exists():
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            saved = json.load(f)
+        if {key: saved.get(key) for key in manifest} == manifest:
+            return csv_path, json_path
+
+    # 書き出しの途中で失敗しても前回の変換結果を壊さないよう、一時ファイルに書いてから置き換える
+    tmp_csv, tmp_json = csv_path.with_suffix(".csv.tmp"), json_path.with_suffix(".jsonl.tmp")
+    manifest["responses"] = ingest_records(
+        iter_store(source), tmp_csv, tmp_json, samples, axes, completed_only=completed_only
+    )
+    os.replace(tmp_csv, csv_path)
+    os.replace(tmp_json, json_path)
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return csv_path, json_path
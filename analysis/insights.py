@@ -0,0 +1,46 @@
+"""
+Layer 5: 統合インサイト（ラダリング・インタビュー）
+"""
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .aggregates import mean_std, value_counts
+from .clustering import CLUSTER_COLUMN
+from .laddering import analyze_laddering
+
+
+def analyze_interview(df: pd.DataFrame, weights: Optional[np.ndarray] = None) -> Dict[str, Any]:
+    """
+    インタビュー回答（音の重要度）の集計
+
+    Args:
+        df: 回答テーブル
+        weights: 回答者の重み（Noneの場合は重み付けしない）
+
+    Returns:
+        {"sound_importance": {"mean", "distribution"}}
+    """
+    has_importance = "sound_importance" in df.columns
+    return {
+        "sound_importance": {
+            "mean": mean_std(df["sound_importance"], weights)[0] if has_importance else 0.0,
+            "distribution": value_counts(df["sound_importance"], weights) if has_importance else {},
+        }
+    }
+
+
+def run_laddering(
+    records: List[Dict[str, Any]],
+    laddering_vocab: Optional[Dict[str, List[str]]],
+    segments: List[Any],
+) -> Dict[str, Any]:
+    """ラダリングステージ（単一属性のセグメントごとの内訳を含む。cluster 列は回答テーブルにのみあるため除く）"""
+    columns = [column for column in segments if isinstance(column, str) and column != CLUSTER_COLUMN]
+    return {"laddering": analyze_laddering(records, laddering_vocab, columns)}
+
+
+def run_interview(table: pd.DataFrame, weights: Optional[np.ndarray] = None) -> Dict[str, Any]:
+    """インタビューステージ"""
+    return {"interview": analyze_interview(table, weights)}
@@ -0,0 +1,381 @@
+"""
+ラダリング分析（疎行列による共起分析）
+
+ラダリング回答（理由・気持ちの複数選択）を固定の選択肢語彙上の
+one-hot 疎行列（回答者 × 選択肢）に変換し、
+度数・共起回数・リフト・PMI とサンプル別／セグメント別の内訳を行列積で求める。
+共起は (行, 列, 重み) の列指向形式で出力する。
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+
+
+# (回答データのキー, 理由のキー, 気持ちのキー, 対象サンプルのキー)
+LADDERS = (
+    ("laddering_best", "why_good", "feeling_good", "best_sound"),
+    ("laddering_worst", "why_bad", "feeling_bad", "worst_sound"),
+)
+
+
+def pair_key(why_key: str, feeling_key: str) -> str:
+    """共起の結果のキー（例: why_good_feeling_good）"""
+    return f"{why_key}_{feeling_key}"
+
+
+def one_hot(answers: Sequence[Sequence[str]], vocabulary: Sequence[str]) -> Tuple[sparse.csr_matrix, List[str]]:
+    """
+    複数選択の回答を one-hot 疎行列に変換
+
+    語彙にない回答（「その他」の自由記述など）は出現順に語彙の末尾へ追加する。
+
+    Args:
+        answers: 回答者ごとの選択肢のリスト
+        vocabulary: 固定の選択肢語彙
+
+    Returns:
+        (回答者 × 選択肢 の0/1行列, 追加分を含む語彙)
+    """
+    vocabulary = list(vocabulary)
+    index = {label: i for i, label in enumerate(vocabulary)}
+    indptr = [0]
+    indices: List[int] = []
+    for selected in answers:
+        columns = set()
+        for label in selected:
+            column = index.get(label)
+            if column is None:
+                column = index[label] = len(vocabulary)
+                vocabulary.append(label)
+            columns.add(column)
+        indices.extend(sorted(columns))
+        indptr.append(len(indices))
+    matrix = sparse.csr_matrix(
+        (np.ones(len(indices), dtype=np.int32), indices, indptr),
+        shape=(len(answers), len(vocabulary)),
+    )
+    return matrix, vocabulary
+
+
+def group_indicator(labels: Sequence[Any]) -> Tuple[sparse.csr_matrix, List[Any]]:
+    """
+    回答者のグループ（サンプル・属性値）を one-hot 疎行列に変換
+
+    Returns:
+        (回答者 × グループ の0/1行列, グループ名（出現順）)、欠損は行を0とする
+    """
+    groups: List[Any] = []
+    index: Dict[Any, int] = {}
+    rows, cols = [], []
+    for row, label in enumerate(labels):
+        if label is None:
+            continue
+        if label not in index:
+            index[label] = len(groups)
+            groups.append(label)
+        rows.append(row)
+        cols.append(index[label])
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.int32), (rows, cols)),
+        shape=(len(labels), len(groups)),
+    )
+    return matrix, groups
+
+
+@dataclass
+class LadderCounts:
+    """理由・気持ちの度数と共起回数（語彙が小さいため密行列で保持し、合算できる）"""
+
+    why_vocab: List[str]
+    feeling_vocab: List[str]
+    why_counts: np.ndarray      # (理由,)
+    feeling_counts: np.ndarray  # (気持ち,)
+    pair_counts: np.ndarray     # (理由, 気持ち)
+    respondents: int
+
+    @classmethod
+    def from_matrices(cls, why: sparse.csr_matrix, feeling: sparse.csr_matrix,
+                      why_vocab: List[str], feeling_vocab: List[str]) -> "LadderCounts":
+        """one-hot 行列から度数と共起回数（W^T F）を計算"""
+        return cls(
+            list(why_vocab), list(feeling_vocab),
+            np.asarray(why.sum(axis=0)).ravel().astype(np.int64),
+            np.asarray(feeling.sum(axis=0)).ravel().astype(np.int64),
+            (why.T @ feeling).toarray().astype(np.int64),
+            why.shape[0],
+        )
+
+    def merge(self, other: "LadderCounts") -> None:
+        """他の度数を合算（語彙は和集合に拡張する）"""
+        why_vocab = self.why_vocab + [v for v in other.why_vocab if v not in self.why_vocab]
+        feeling_vocab = self.feeling_vocab + [v for v in other.feeling_vocab if v not in self.feeling_vocab]
+        why_index = np.array([why_vocab.index(v) for v in other.why_vocab], dtype=np.int64)
+        feeling_index = np.array([feeling_vocab.index(v) for v in other.feeling_vocab], dtype=np.int64)
+
+        why_counts = np.zeros(len(why_vocab), dtype=np.int64)
+        why_counts[:len(self.why_vocab)] = self.why_counts
+        np.add.at(why_counts, why_index, other.why_counts)
+        feeling_counts = np.zeros(len(feeling_vocab), dtype=np.int64)
+        feeling_counts[:len(self.feeling_vocab)] = self.feeling_counts
+        np.add.at(feeling_counts, feeling_index, other.feeling_counts)
+        pair_counts = np.zeros((len(why_vocab), len(feeling_vocab)), dtype=np.int64)
+        pair_counts[:len(self.why_vocab), :len(self.feeling_vocab)] = self.pair_counts
+        pair_counts[np.ix_(why_index, feeling_index)] += other.pair_counts
+
+        self.why_vocab, self.feeling_vocab = why_vocab, feeling_vocab
+        self.why_counts, self.feeling_counts, self.pair_counts = why_counts, feeling_counts, pair_counts
+        self.respondents += other.respondents
+
+    def item_counts(self, which: str) -> Dict[str, int]:
+        """度数（0件の選択肢を除く）。which は "why" または "feeling\""""
+        vocab = self.why_vocab if which == "why" else self.feeling_vocab
+        counts = self.why_counts if which == "why" else self.feeling_counts
+        return {vocab[i]: int(counts[i]) for i in np.flatnonzero(counts)}
+
+    def cooccurrence(self) -> Dict[str, Any]:
+        """
+        共起回数・リフト・PMI を (行, 列, 重み) の列指向形式で出力
+
+        リフト = P(理由, 気持ち) / (P(理由) P(気持ち))、PMI = log2(リフト)。
+        確率はラダリングに回答した回答者数を分母とする。
+
+        Returns:
+            {"rows": 理由の語彙, "cols": 気持ちの語彙, "respondents": 回答者数,
+             "row": [...], "col": [...], "count": [...], "lift": [...], "pmi": [...]}
+            （共起回数の降順）
+        """
+        row, col = np.nonzero(self.pair_counts)
+        count = self.pair_counts[row, col]
+        order = np.lexsort((col, row, -count))
+        row, col, count = row[order], col[order], count[order]
+        expected = self.why_counts[row] * self.feeling_counts[col] / max(self.respondents, 1)
+        lift = count / expected
+        return {
+            "rows": self.why_vocab,
+            "cols": self.feeling_vocab,
+            "respondents": self.respondents,
+            "row": row.tolist(),
+            "col": col.tolist(),
+            "count": count.tolist(),
+            "lift": lift.tolist(),
+            "pmi": np.log2(lift).tolist(),
+        }
+
+    def breakdown(self, why_vocab: List[str], feeling_vocab: List[str]) -> Dict[str, Any]:
+        """
+        グループ別の内訳として、全体の語彙の順に度数と共起回数を並べる
+
+        Args:
+            why_vocab: 全体の理由の語彙（このグループの語彙を含む）
+            feeling_vocab: 全体の気持ちの語彙（このグループの語彙を含む）
+
+        Returns:
+            {"respondents", "why_counts", "feeling_counts", "row", "col", "count"}
+            （度数は語彙の順に並べたリスト、共起は行・列の順）
+        """
+        why_index = [why_vocab.index(v) for v in self.why_vocab]
+        feeling_index = [feeling_vocab.index(v) for v in self.feeling_vocab]
+        why_counts = np.zeros(len(why_vocab), dtype=np.int64)
+        why_counts[why_index] = self.why_counts
+        feeling_counts = np.zeros(len(feeling_vocab), dtype=np.int64)
+        feeling_counts[feeling_index] = self.feeling_counts
+        pair_counts = np.zeros((len(why_vocab), len(feeling_vocab)), dtype=np.int64)
+        pair_counts[np.ix_(why_index, feeling_index)] = self.pair_counts
+        row, col = np.nonzero(pair_counts)
+        return {
+            "respondents": self.respondents,
+            "why_counts": why_counts.tolist(),
+            "feeling_counts": feeling_counts.tolist(),
+            "row": row.tolist(),
+            "col": col.tolist(),
+            "count": pair_counts[row, col].tolist(),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSONに保存できる形式に変換"""
+        return {
+            "why_vocab": self.why_vocab,
+            "feeling_vocab": self.feeling_vocab,
+            "why_counts": self.why_counts.tolist(),
+            "feeling_counts": self.feeling_counts.tolist(),
+            "pair_counts": self.pair_counts.tolist(),
+            "respondents": self.respondents,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LadderCounts":
+        """to_dict() の結果から復元"""
+        n_why, n_feeling = len(data["why_vocab"]), len(data["feeling_vocab"])
+        return cls(
+            list(data["why_vocab"]), list(data["feeling_vocab"]),
+            np.asarray(data["why_counts"], dtype=np.int64).reshape(n_why),
+            np.asarray(data["feeling_counts"], dtype=np.int64).reshape(n_feeling),
+            np.asarray(data["pair_counts"], dtype=np.int64).reshape(n_why, n_feeling),
+            int(data["respondents"]),
+        )
+
+
+def encode_ladder(
+    records: List[Dict[str, Any]],
+    ladder_key: str,
+    why_key: str,
+    feeling_key: str,
+    vocabulary: Dict[str, List[str]],
+) -> Tuple[List[int], sparse.csr_matrix, sparse.csr_matrix, List[str], List[str]]:
+    """
+    1種類のラダリング（良い音／悪い音）を one-hot 行列に変換
+
+    Returns:
+        (回答した回答者の records 上の位置, 理由の行列, 気持ちの行列, 理由の語彙, 気持ちの語彙)
+    """
+    positions, why_answers, feeling_answers = [], [], []
+    for position, record in enumerate(records):
+        ladder = (record.get("grid_evaluation") or {}).get(ladder_key)
+        if ladder is None:
+            continue
+        positions.append(position)
+        why_answers.append(ladder.get(why_key, []))
+        feeling_answers.append(ladder.get(feeling_key, []))
+    why, why_vocab = one_hot(why_answers, vocabulary.get(why_key, []))
+    feeling, feeling_vocab = one_hot(feeling_answers, vocabulary.get(feeling_key, []))
+    return positions, why, feeling, why_vocab, feeling_vocab
+
+
+def group_counts(
+    labels: List[Any],
+    why: sparse.csr_matrix,
+    feeling: sparse.csr_matrix,
+    why_vocab: List[str],
+    feeling_vocab: List[str],
+) -> Dict[Any, LadderCounts]:
+    """
+    グループ別の度数と共起回数（グループの行に限った W^T F）
+
+    Returns:
+        グループ（出現順） -> LadderCounts（合算できるため、増分分析でもグループ別に加算する）
+    """
+    indicator, groups = group_indicator(labels)
+    indicator = indicator.tocsc()
+    result = {}
+    for g, group in enumerate(groups):
+        rows = indicator[:, g].nonzero()[0]
+        result[group] = LadderCounts.from_matrices(why[rows], feeling[rows], why_vocab, feeling_vocab)
+    return result
+
+
+def _groupings(selected: List[Dict[str, Any]], sample_key: str, segments: Sequence[str]) -> Dict[str, List[Any]]:
+    """内訳の切り口（"by_sample" と回答者属性）ごとの各回答のグループ"""
+    groupings = {"by_sample": [(r.get("grid_evaluation") or {}).get(sample_key) for r in selected]}
+    for column in segments:
+        groupings[column] = [(r.get("demographics") or {}).get(column) for r in selected]
+    return groupings
+
+
+def breakdown_counts(
+    records: List[Dict[str, Any]],
+    vocabulary: Optional[Dict[str, List[str]]] = None,
+    segments: Sequence[str] = (),
+) -> Dict[str, Dict[str, Dict[Any, LadderCounts]]]:
+    """
+    ラダリングの種類ごとの、サンプル別・属性別の合算可能な度数
+
+    Args:
+        records: 回答データ（grid_evaluation・demographics を含む）
+        vocabulary: why_good 等のキー -> 固定の選択肢語彙
+        segments: 内訳を出す回答者属性（demographics のキー）
+
+    Returns:
+        why_good_feeling_good 等のキー -> "by_sample" / 属性 -> グループ -> LadderCounts
+    """
+    vocabulary = vocabulary or {}
+    result: Dict[str, Dict[str, Dict[Any, LadderCounts]]] = {}
+    for ladder_key, why_key, feeling_key, sample_key in LADDERS:
+        positions, why, feeling, why_vocab, feeling_vocab = encode_ladder(
+            records, ladder_key, why_key, feeling_key, vocabulary
+        )
+        groupings = _groupings([records[p] for p in positions], sample_key, segments)
+        result[pair_key(why_key, feeling_key)] = {
+            name: group_counts(labels, why, feeling, why_vocab, feeling_vocab) for name, labels in groupings.items()
+        }
+    return result
+
+
+def analyze_laddering(
+    records: List[Dict[str, Any]],
+    vocabulary: Optional[Dict[str, List[str]]] = None,
+    segments: Sequence[str] = (),
+) -> Dict[str, Any]:
+    """
+    ラダリング回答の度数・共起分析
+
+    Args:
+        records: 回答データ（grid_evaluation を含む）
+        vocabulary: why_good 等のキー -> 固定の選択肢語彙
+        segments: 内訳を出す回答者属性（demographics のキー）
+
+    Returns:
+        why_good/feeling_good/why_bad/feeling_bad の度数、
+        cooccurrence（共起の列指向形式）、breakdown（サンプル別・属性別の内訳）
+    """
+    vocabulary = vocabulary or {}
+    result: Dict[str, Any] = {}
+    cooccurrence: Dict[str, Any] = {}
+    breakdown: Dict[str, Any] = {}
+    for ladder_key, why_key, feeling_key, sample_key in LADDERS:
+        positions, why, feeling, why_vocab, feeling_vocab = encode_ladder(
+            records, ladder_key, why_key, feeling_key, vocabulary
+        )
+        counts = LadderCounts.from_matrices(why, feeling, why_vocab, feeling_vocab)
+        result[why_key] = counts.item_counts("why")
+        result[feeling_key] = counts.item_counts("feeling")
+        key = pair_key(why_key, feeling_key)
+        cooccurrence[key] = counts.cooccurrence()
+        groupings = _groupings([records[p] for p in positions], sample_key, segments)
+        breakdown[key] = {
+            name: {
+                group: part.breakdown(why_vocab, feeling_vocab)
+                for group, part in group_counts(labels, why, feeling, why_vocab, feeling_vocab).items()
+            }
+            for name, labels in groupings.items()
+        }
+
+    result["cooccurrence"] = cooccurrence
+    result["breakdown"] = breakdown
+    return result
+
+
+def ladder_counts(records: List[Dict[str, Any]], vocabulary: Optional[Dict[str, List[str]]] = None) -> Dict[str, LadderCounts]:
+    """
+    増分分析用: ラダリングの種類ごとの合算可能な度数
+
+    Returns:
+        why_good_feeling_good 等のキー -> LadderCounts
+    """
+    vocabulary = vocabulary or {}
+    counts = {}
+    for ladder_key, why_key, feeling_key, _ in LADDERS:
+        _, why, feeling, why_vocab, feeling_vocab = encode_ladder(
+            records, ladder_key, why_key, feeling_key, vocabulary
+        )
+        counts[pair_key(why_key, feeling_key)] = LadderCounts.from_matrices(why, feeling, why_vocab, feeling_vocab)
+    return counts
+
+
+def cooccurrence_edges(pairs: Dict[str, Any], limit: Optional[int] = None) -> List[Tuple[str, str, int]]:
+    """
+    共起の列指向形式を (理由, 気持ち, 共起回数) のリストに変換（グラフ描画用）
+
+    Args:
+        pairs: cooccurrence の1要素
+        limit: 上位何件まで返すか（共起回数の降順）
+
+    Returns:
+        (理由, 気持ち, 共起回数) のリスト
+    """
+    edges = [
+        (pairs["rows"][r], pairs["cols"][c], count)
+        for r, c, count in zip(pairs["row"], pairs["col"], pairs["count"])
+    ]
+    return edges[:limit] if limit is not None else edges
@@ -0,0 +1,353 @@
+"""
+分析用データの読み込み
+"""
+import fnmatch
+import hashlib
+import io
+import json
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence, TextIO, Tuple, Union
+
+import pandas as pd
+
+
+# 分割読み込みの1回あたりの回答者数（既定）
+DEFAULT_CHUNK_SIZE = 50_000
+
+# 回答データ（JSON）の分割読み込みの1回あたりの件数（既定）
+# 1件あたりのPythonオブジェクトが数KBになるため、CSVより小さくする
+DEFAULT_RECORD_CHUNK_SIZE = 10_000
+
+# JSON配列を分割して読む際の1回の読み込みサイズ（文字数）
+_READ_BLOCK = 1 << 20
+
+# 配列要素の間の空白・区切り
+_SEPARATOR = re.compile(r"[\s,]*")
+
+# 読み込み位置の署名に使う、ファイル先頭と読み込み位置の直前のバイト数
+_SIGNATURE_BYTES = 4096
+
+# 列の型の指定: "int8"（欠損を許容する8ビット整数）、または {"categories": 選択肢, "ordered": 順序の有無}
+ColumnType = Union[str, Mapping[str, Any]]
+
+# "int8" 指定の列の dtype（回答の欠損を扱えるよう nullable 整数とする）
+_INTEGER_DTYPE = "Int8"
+
+# "int8" 指定の列を read_csv() で解析する dtype
+# （nullable 整数の解析は遅いため、欠損を NaN として読んでから apply_column_types() で変換する）
+_INTEGER_PARSE_DTYPE = "float32"
+
+
+def column_dtypes(columns: Sequence[str], column_types: Mapping[str, ColumnType]) -> Dict[str, Any]:
+    """
+    列の型の指定（列名のパターン -> 型）を、実際の列名 -> 読み込み時の dtype に展開
+
+    パターンは fnmatch 形式（"sd_*" など）で、最初に一致したものを使う。
+    整数の列は float32、カテゴリの列は "category" としていったん読み込み、
+    apply_column_types() で Int8 への変換と選択肢の順への並べ替えを行う。
+
+    Args:
+        columns: CSVの列名
+        column_types: 列名のパターン -> 型の指定
+
+    Returns:
+        列名 -> dtype（一致しない列は含まない）
+    """
+    dtypes = {}
+    for column in columns:
+        for pattern, column_type in column_types.items():
+            if fnmatch.fnmatchcase(column, pattern):
+                dtypes[column] = _INTEGER_PARSE_DTYPE if column_type == "int8" else "category"
+                break
+    return dtypes
+
+
+def apply_column_types(df: pd.DataFrame, column_types: Mapping[str, ColumnType]) -> pd.DataFrame:
+    """
+    回答テーブルの列を指定の型に変換（読み込み済みのテーブルや生成したデータにも使う）
+
+    カテゴリは選択肢の順に並べ、選択肢にない値は欠損にせず末尾のカテゴリとして残す。
+
+    Args:
+        df: 回答テーブル
+        column_types: 列名のパターン -> 型の指定
+
+    Returns:
+        変換したテーブル（元のテーブルは変更しない）
+    """
+    df = df.copy(deep=False)
+    for column in df.columns:
+        for pattern, column_type in column_types.items():
+            if not fnmatch.fnmatchcase(column, pattern):
+                continue
+            if column_type == "int8":
+                df[column] = df[column].astype(_INTEGER_DTYPE)
+            else:
+                categories = list(column_type["categories"])
+                known = set(categories)
+                values = df[column].astype("category")
+                extra = [value for value in values.cat.categories if value not in known]
+                df[column] = values.cat.set_categories(
+                    categories + extra, ordered=bool(column_type.get("ordered", False))
+                )
+            break
+    return df
+
+
+def undeclared_values(df: pd.DataFrame, column_types: Mapping[str, ColumnType]) -> Dict[str, List[Any]]:
+    """
+    カテゴリの列のうち、選択肢にない値（apply_column_types() で末尾に追加されたカテゴリ）
+
+    Args:
+        df: apply_column_types() / load_table() の結果
+        column_types: 列名のパターン -> 型の指定
+
+    Returns:
+        列名 -> 選択肢にない値のリスト（該当がない列は含まない）
+    """
+    result = {}
+    for column, dtype in column_dtypes(df.columns, column_types).items():
+        if dtype != "category":
+            continue
+        column_type = next(t for p, t in column_types.items() if fnmatch.fnmatchcase(column, p))
+        known = set(column_type["categories"])
+        extra = [value for value in df[column].cat.categories if value not in known]
+        if extra:
+            result[column] = extra
+    return result
+
+
+def _read_csv_options(csv_path: Path, column_types: Optional[Mapping[str, ColumnType]]) -> Dict[str, Any]:
+    """read_csv() の共通の引数（列の型の指定がある場合はヘッダーから dtype を決める）"""
+    options: Dict[str, Any] = {"encoding": "utf-8-sig"}
+    if column_types:
+        header = pd.read_csv(csv_path, encoding="utf-8-sig", nrows=0).columns
+        options["dtype"] = column_dtypes(header, column_types)
+    return options
+
+
+def load_table(csv_path: Path, column_types: Optional[Mapping[str, ColumnType]] = None) -> pd.DataFrame:
+    """
+    回答データ（1回答者1行のCSV）を読み込み
+
+    Args:
+        csv_path: CSVファイルのパス
+        column_types: 列名のパターン -> 型の指定（Noneの場合は pandas の推定に任せる）
+
+    Returns:
+        回答テーブル
+    """
+    df = pd.read_csv(csv_path, **_read_csv_options(csv_path, column_types))
+    return apply_column_types(df, column_types) if column_types else df
+
+
+def load_records(json_path: Path) -> List[Dict[str, Any]]:
+    """
+    回答データ（JSON）を読み込み
+
+    拡張子が .jsonl の場合は1行1件のJSON Lines、それ以外はJSON配列として読み込む。
+
+    Args:
+        json_path: JSON / JSON Lines ファイルのパス
+
+    Returns:
+        回答データのリスト
+    """
+    with open(json_path, "r", encoding="utf-8") as f:
+        if Path(json_path).suffix == ".jsonl":
+            return [json.loads(line) for line in f if line.strip()]
+        return json.load(f)
+
+
+def iter_table(
+    csv_path: Path,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    column_types: Optional[Mapping[str, ColumnType]] = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    回答データ（CSV）を chunk_size 行ずつ読み込み
+
+    Args:
+        csv_path: CSVファイルのパス
+        chunk_size: 1回に読み込む行数
+        column_types: 列名のパターン -> 型の指定（Noneの場合は pandas の推定に任せる）
+
+    Yields:
+        回答テーブルの一部
+    """
+    options = _read_csv_options(csv_path, column_types)
+    with pd.read_csv(csv_path, chunksize=chunk_size, **options) as reader:
+        for chunk in reader:
+            yield apply_column_types(chunk, column_types) if column_types else chunk
+
+
+def _iter_json_array(f: TextIO) -> Iterator[Any]:
+    """
+    JSON配列の要素を、ファイル全体を読み込まずに1つずつ取り出す
+
+    Args:
+        f: 先頭が "[" のテキストファイル
+
+    Yields:
+        配列の要素
+    """
+    decoder = json.JSONDecoder()
+    buffer = f.read(_READ_BLOCK).lstrip()
+    if not buffer.startswith("["):
+        raise ValueError("回答データはJSON配列である必要があります")
+    pos = 1
+    eof = False
+    while True:
+        pos = _SEPARATOR.match(buffer, pos).end()
+        if pos < len(buffer) and buffer[pos] == "]":
+            return
+        try:
+            if pos == len(buffer):
+                raise json.JSONDecodeError("要素の途中で読み込みが終わりました", buffer, pos)
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            more = f.read(_READ_BLOCK)
+            eof = not more
+            buffer, pos = buffer[pos:] + more, 0
+            continue
+        yield item
+        pos = end
+
+
+def iter_records(
+    json_path: Path,
+    chunk_size: int = DEFAULT_RECORD_CHUNK_SIZE,
+    keys: Optional[Sequence[str]] = None,
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    回答データを chunk_size 件ずつ読み込み
+
+    拡張子が .jsonl の場合は1行1件のJSON Lines、それ以外はJSON配列として、
+    いずれもファイル全体をメモリに載せずに読み込む。
+
+    Args:
+        json_path: JSON / JSON Lines ファイルのパス
+        chunk_size: 1回に返す件数
+        keys: 残すキー（インタビュー本文など使わない項目を読み込み直後に捨てる。Noneの場合はすべて残す）
+
+    Yields:
+        回答データのリスト
+    """
+    json_path = Path(json_path)
+    with open(json_path, "r", encoding="utf-8") as f:
+        if json_path.suffix == ".jsonl":
+            items = (json.loads(line) for line in f if line.strip())
+        else:
+            items = _iter_json_array(f)
+        chunk: List[Dict[str, Any]] = []
+        for item in items:
+            if keys is not None:
+                item = {key: item[key] for key in keys if key in item}
+            chunk.append(item)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def read_signature(path: Path, offset: int) -> str:
+    """
+    ファイルの先頭と読み込み位置 offset の直前のバイト列のハッシュ
+
+    追記だけで更新されるファイルでは読み込み済みの部分が変わらないため、
+    保存した署名と一致しない場合はファイルが置き換えられたとみなせる。
+
+    Args:
+        path: ファイルのパス
+        offset: 読み込み位置（バイト）
+
+    Returns:
+        署名（16進文字列。ファイルがない、または offset より短い場合は空文字列）
+    """
+    path = Path(path)
+    if not path.is_file() or path.stat().st_size < offset:
+        return ""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        digest.update(f.read(min(_SIGNATURE_BYTES, offset)))
+        tail = max(offset - _SIGNATURE_BYTES, 0)
+        f.seek(tail)
+        digest.update(f.read(offset - tail))
+    return digest.hexdigest()
+
+
+def read_table_from(
+    csv_path: Path,
+    offset: int = 0,
+    column_types: Optional[Mapping[str, ColumnType]] = None,
+) -> Tuple[pd.DataFrame, int]:
+    """
+    回答データ（CSV）のうち、バイト位置 offset 以降に追記された行を読み込み
+
+    書き込み途中の可能性がある最後の改行以降は読まずに次回に回す。
+
+    Args:
+        csv_path: CSVファイルのパス
+        offset: 前回読み込んだ位置（0の場合は先頭から）
+        column_types: 列名のパターン -> 型の指定（Noneの場合は pandas の推定に任せる）
+
+    Returns:
+        (追記された行の回答テーブル, 次回の読み込み位置)
+    """
+    with open(csv_path, "rb") as f:
+        header = f.readline()
+        start = max(offset, len(header))
+        f.seek(start)
+        data = f.read()
+    data = data[:data.rfind(b"\n") + 1]
+    df = pd.read_csv(io.BytesIO(header + data), **_read_csv_options(csv_path, column_types))
+    df = apply_column_types(df, column_types) if column_types else df
+    return df, start + len(data)
+
+
+def read_records_from(json_path: Path, offset: int = 0) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    回答データ（JSON配列、または拡張子 .jsonl の JSON Lines）のうち、バイト位置 offset 以降の回答を読み込み
+
+    JSON配列は末尾の "]" の前に要素が追記されるものとし、読み込み位置は最後に読んだ要素の直後とする。
+    書き込み途中の行・要素は読まずに次回に回す。
+
+    Args:
+        json_path: JSON / JSON Lines ファイルのパス
+        offset: 前回読み込んだ位置（0の場合は先頭から）
+
+    Returns:
+        (追加された回答データのリスト, 次回の読み込み位置)
+    """
+    json_path = Path(json_path)
+    with open(json_path, "rb") as f:
+        f.seek(offset)
+        data = f.read()
+    if json_path.suffix == ".jsonl":
+        data = data[:data.rfind(b"\n") + 1]
+        records = [json.loads(line) for line in data.decode("utf-8").splitlines() if line.strip()]
+        return records, offset + len(data)
+
+    text = data.decode("utf-8")
+    pos = 0
+    if offset == 0:
+        text = text.lstrip()
+        if not text.startswith("["):
+            raise ValueError("回答データはJSON配列である必要があります")
+        offset, pos = len(data) - len(text.encode("utf-8")), 1
+    decoder = json.JSONDecoder()
+    records, end = [], pos
+    while True:
+        pos = _SEPARATOR.match(text, end).end()
+        if pos >= len(text) or text[pos] == "]":
+            break
+        try:
+            item, end = decoder.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            break
+        records.append(item)
+    return records, offset + len(text[:end].encode("utf-8"))
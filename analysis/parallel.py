@@ -0,0 +1,194 @@
+"""
+サンプル・セグメント単位の処理のプロセス並列実行
+
+サンプルごとの相関行列・ドライバー分析、セグメントごとの統計量は互いに独立している。
+評価値テンソルなどの読み取り専用の配列を一時ディレクトリに .npy として1度だけ書き出し、
+ワーカープロセスはメモリマップで開いて共有する（DataFrame を pickle して送らない）。
+並列数が1の場合は同じ処理を同じプロセスで順に実行する。
+"""
+import math
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+# ワーカープロセス内で開いたメモリマップ（パス -> 配列）
+_opened: Dict[str, np.ndarray] = {}
+
+
+@dataclass
+class SharedArrays:
+    """ワーカープロセスと共有する読み取り専用の配列（タスクと一緒に送る小さなハンドル）"""
+
+    paths: Dict[str, str] = field(default_factory=dict)
+    arrays: Dict[str, np.ndarray] = field(default_factory=dict)  # 並列数1の場合はメモリ上の配列をそのまま使う
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # メモリ上の配列はプロセス間で送らない
+        return {"paths": self.paths, "arrays": {}}
+
+    def load(self) -> Dict[str, np.ndarray]:
+        """
+        配列を取得（ファイルの場合はプロセスごとに1度だけメモリマップで開く）
+
+        Returns:
+            名前 -> 配列
+        """
+        if self.arrays:
+            return self.arrays
+        for path in self.paths.values():
+            if path not in _opened:
+                _opened[path] = np.load(path, mmap_mode="r")
+        return {name: _opened[path] for name, path in self.paths.items()}
+
+
+def _run_task(func: Callable[..., Any], shared: SharedArrays, task: Any) -> Any:
+    """ワーカープロセスで1タスクを実行"""
+    return func(shared.load(), task)
+
+
+class ProcessPool:
+    """読み取り専用の配列を共有するプロセスプール"""
+
+    def __init__(self, workers: int = 1, directory: Optional[Path] = None):
+        """
+        プロセスプールの初期化（プロセスは最初の並列実行時に起動する）
+
+        Args:
+            workers: プロセス数（1の場合は同じプロセスで順に実行）
+            directory: 共有配列の書き出し先（Noneの場合は一時ディレクトリ）
+        """
+        self.workers = max(1, int(workers))
+        self._directory = Path(directory) if directory is not None else None
+        self._temp_dir: Optional[Path] = None
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._count = 0
+
+    def __enter__(self) -> "ProcessPool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def fingerprint(self) -> str:
+        """キャッシュの指紋（並列数は結果に影響しないため含めない）"""
+        return "process_pool"
+
+    def close(self) -> None:
+        """プロセスを終了し、共有配列のファイルを削除"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        if self._temp_dir is not None:
+            shutil.rmtree(self._temp_dir, ignore_errors=True)
+            self._temp_dir = None
+
+    def share(self, **arrays: np.ndarray) -> SharedArrays:
+        """
+        配列をワーカープロセスと共有
+
+        Args:
+            arrays: 名前 -> 配列
+
+        Returns:
+            タスク実行時に渡すハンドル
+        """
+        if self.workers <= 1:
+            return SharedArrays(arrays=dict(arrays))
+        if self._temp_dir is None:
+            if self._directory is not None:
+                self._directory.mkdir(parents=True, exist_ok=True)
+            self._temp_dir = Path(tempfile.mkdtemp(prefix="shared_", dir=self._directory))
+        paths = {}
+        for name, array in arrays.items():
+            self._count += 1
+            path = self._temp_dir / f"{self._count}_{name}.npy"
+            np.save(path, np.ascontiguousarray(array))
+            paths[name] = str(path)
+        return SharedArrays(paths=paths)
+
+    def map(self, func: Callable[[Dict[str, np.ndarray], Any], Any], shared: SharedArrays,
+            tasks: Sequence[Any]) -> List[Any]:
+        """
+        タスクを実行して結果をタスクの順に返す
+
+        Args:
+            func: (共有配列, タスク) を受け取るモジュールレベルの関数
+            shared: share() の結果
+            tasks: タスクのリスト（小さな値のみ。配列は shared で渡す）
+
+        Returns:
+            結果のリスト
+        """
+        if self.workers <= 1 or len(tasks) <= 1:
+            arrays = shared.load() if shared.paths else shared.arrays
+            return [func(arrays, task) for task in tasks]
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        futures = [self._executor.submit(_run_task, func, shared, task) for task in tasks]
+        return [future.result() for future in futures]
+
+
+def split(n: int, parts: int) -> List[np.ndarray]:
+    """
+    0..n-1 を連続した parts 個以下の区間に分割（空の区間は除く）
+
+    Returns:
+        インデックス配列のリスト
+    """
+    return [block for block in np.array_split(np.arange(n), max(1, min(parts, n))) if len(block)]
+
+
+def grid(n_rows: int, n_cols: int, workers: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    n_rows × n_cols の独立なタスクを、行（サンプル）を優先して約 workers 個のブロックに分割
+
+    Returns:
+        [(行インデックス, 列インデックス), ...]（行ブロック優先の順）
+    """
+    row_parts = max(1, min(workers, n_rows))
+    col_parts = math.ceil(workers / row_parts) if workers > 1 else 1
+    return [(rows, cols) for rows in split(n_rows, row_parts) for cols in split(n_cols, col_parts)]
+
+
+def group_index(groups: Sequence[Tuple[str, str, np.ndarray]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    グループの行番号のリストを連結した配列とオフセットに変換（共有配列として渡すため）
+
+    Returns:
+        (連結した行番号, オフセット (グループ数 + 1))
+    """
+    sizes = [len(rows) for _, _, rows in groups]
+    rows = [np.asarray(rows, dtype=np.int64) for _, _, rows in groups]
+    concatenated = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+    return concatenated, np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+
+
+def membership_block(rows: np.ndarray, offsets: np.ndarray, groups: np.ndarray, n_respondents: int) -> np.ndarray:
+    """
+    group_index() の配列から、指定したグループの所属行列を作成
+
+    Args:
+        rows: 連結した行番号
+        offsets: オフセット
+        groups: グループのインデックス
+        n_respondents: 回答者数
+
+    Returns:
+        float64 (len(groups), N)
+    """
+    membership = np.zeros((len(groups), n_respondents))
+    for i, g in enumerate(groups):
+        membership[i, rows[offsets[g]:offsets[g + 1]]] = 1.0
+    return membership
+
+
+def default_workers() -> int:
+    """利用できるCPU数"""
+    return len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
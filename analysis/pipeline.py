@@ -0,0 +1,253 @@
+"""
+分析ステージグラフの実行エンジン
+
+各分析レイヤーを「入力・出力を宣言したステージ」として定義し、
+依存関係（DAG）に従って実行する。互いに依存しないステージは並列に実行する。
+"""
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+if TYPE_CHECKING:
+    from .cache import StageCache
+
+
+class PipelineError(Exception):
+    """ステージグラフの構成・実行に失敗した場合の例外"""
+
+
+@dataclass(frozen=True)
+class Stage:
+    """分析ステージ
+
+    func は inputs と同名のキーワード引数を受け取り、
+    outputs の各名前をキーとする辞書を返す。
+    集計ロジックを変更した場合は version を上げてキャッシュを無効化する。
+    """
+
+    name: str
+    func: Callable[..., Dict[str, Any]]
+    inputs: Tuple[str, ...]
+    outputs: Tuple[str, ...]
+    label: str = ""
+    version: str = "1"
+    cacheable: bool = True
+
+    def run(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        ステージを実行
+
+        Args:
+            values: 入力名 -> 値（inputs を全て含むこと）
+
+        Returns:
+            出力名 -> 値
+        """
+        result = self.func(**{name: values[name] for name in self.inputs})
+        missing = [name for name in self.outputs if name not in result]
+        if missing:
+            raise PipelineError(f"ステージ {self.name} が出力 {missing} を返しませんでした")
+        return {name: result[name] for name in self.outputs}
+
+
+def select_stages(
+    stages: Iterable[Stage],
+    targets: Optional[Iterable[str]] = None,
+) -> List[Stage]:
+    """
+    指定した出力（またはステージ名）を得るために必要なステージを選択
+
+    Args:
+        stages: 全ステージ
+        targets: 必要な出力名またはステージ名（Noneの場合は全ステージ）
+
+    Returns:
+        必要なステージ（定義順）
+    """
+    stages = list(stages)
+    if targets is None:
+        return stages
+
+    selected = set()
+    queue = [stage.name for stage in _target_stages(stages, targets)]
+    by_name = {stage.name: stage for stage in stages}
+    producers = {output: stage for stage in stages for output in stage.outputs}
+    while queue:
+        name = queue.pop()
+        if name in selected:
+            continue
+        selected.add(name)
+        for input_name in by_name[name].inputs:
+            if input_name in producers:
+                queue.append(producers[input_name].name)
+    return [stage for stage in stages if stage.name in selected]
+
+
+def run_stages(
+    stages: Iterable[Stage],
+    inputs: Dict[str, Any],
+    targets: Optional[Iterable[str]] = None,
+    max_workers: Optional[int] = None,
+    on_stage_done: Optional[Callable[[Stage, float], None]] = None,
+    cache: Optional["StageCache"] = None,
+    on_stage_start: Optional[Callable[[Stage], None]] = None,
+) -> Tuple[Dict[str, Any], Dict[str, float], Dict[str, str]]:
+    """
+    ステージグラフを実行
+
+    cache を指定した場合、入力の指紋が変わっていないステージはキャッシュから出力を読み込み、
+    キャッシュヒットしたステージだけが必要とする上流ステージ（データ読み込み等）は実行しない。
+
+    Args:
+        stages: 全ステージ
+        inputs: 初期入力（ファイルパスや設定値）
+        targets: 必要な出力名またはステージ名（Noneの場合は全ステージ）
+        max_workers: 並列実行するスレッド数
+        on_stage_done: ステージ完了時のコールバック（ステージ, 所要秒数）
+        cache: ステージ出力のキャッシュ
+        on_stage_start: ステージの実行開始時に実行スレッドで呼ばれるコールバック（キャッシュヒット時は呼ばれない）
+
+    Returns:
+        (全ての値, ステージ名 -> 所要秒数, ステージ名 -> "hit" / "miss")
+        キャッシュを使わない場合、3番目の要素は空の辞書
+
+    Raises:
+        PipelineError: 入力が不足している、または依存関係が循環している場合
+    """
+    stages = list(stages)
+    selected = _topological_order(select_stages(stages, targets), inputs)
+    wanted = _target_stages(selected, targets) if targets is not None else selected
+
+    values = dict(inputs)
+    timings: Dict[str, float] = {}
+    cache_status: Dict[str, str] = {}
+    fingerprints: Dict[str, str] = {}
+    to_run = {stage.name for stage in wanted}
+
+    if cache is not None:
+        fingerprints = _fingerprint_stages(selected, inputs, cache)
+        # 下流から順に、キャッシュから読めないステージの入力元を実行対象に加える
+        for stage in reversed(selected):
+            if stage.name not in to_run:
+                continue
+            start = time.perf_counter()
+            cached = None
+            if stage.cacheable and cache.has(stage, fingerprints[stage.name]):
+                cached = cache.load(stage, fingerprints[stage.name])
+            if cached is not None:
+                values.update(cached)
+                to_run.discard(stage.name)
+                timings[stage.name] = time.perf_counter() - start
+                cache_status[stage.name] = "hit"
+                if on_stage_done:
+                    on_stage_done(stage, timings[stage.name])
+                continue
+            cache_status[stage.name] = "miss"
+            to_run.update(_producers_of(stage, selected))
+    else:
+        for stage in reversed(selected):
+            if stage.name in to_run:
+                to_run.update(_producers_of(stage, selected))
+
+    pending = {stage.name: stage for stage in selected if stage.name in to_run}
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            for name, stage in list(pending.items()):
+                if all(key in values for key in stage.inputs):
+                    future = executor.submit(_timed_run, stage, values, on_stage_start)
+                    running[future] = stage
+                    del pending[name]
+
+            if not running:
+                raise PipelineError(f"依存関係が解決できないステージがあります: {sorted(pending)}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                outputs, seconds = future.result()
+                values.update(outputs)
+                timings[stage.name] = seconds
+                if cache is not None:
+                    cache_status[stage.name] = "miss"
+                    if stage.cacheable:
+                        cache.store(stage, fingerprints[stage.name], outputs)
+                if on_stage_done:
+                    on_stage_done(stage, seconds)
+
+    return values, timings, cache_status
+
+
+def _timed_run(
+    stage: Stage,
+    values: Dict[str, Any],
+    on_stage_start: Optional[Callable[[Stage], None]] = None,
+) -> Tuple[Dict[str, Any], float]:
+    """ステージを実行して所要時間を計測"""
+    if on_stage_start:
+        on_stage_start(stage)
+    start = time.perf_counter()
+    outputs = stage.run(values)
+    return outputs, time.perf_counter() - start
+
+
+def _target_stages(stages: List[Stage], targets: Iterable[str]) -> List[Stage]:
+    """ステージ名または出力名で指定されたステージ"""
+    targets = set(targets)
+    return [
+        stage for stage in stages
+        if stage.name in targets or targets.intersection(stage.outputs)
+    ]
+
+
+def _producers_of(stage: Stage, stages: List[Stage]) -> Set[str]:
+    """ステージの入力を生成するステージ名"""
+    return {other.name for other in stages if set(other.outputs) & set(stage.inputs)}
+
+
+def _fingerprint_stages(stages: List[Stage], inputs: Dict[str, Any], cache: "StageCache") -> Dict[str, str]:
+    """全ステージの指紋を計算（stages はトポロジカル順であること）"""
+    value_fingerprints = {
+        name: cache.fingerprint_value(value) for name, value in inputs.items()
+    }
+    stage_fingerprints = {}
+    for stage in stages:
+        fingerprint = cache.fingerprint_stage(stage, value_fingerprints)
+        stage_fingerprints[stage.name] = fingerprint
+        for output in stage.outputs:
+            value_fingerprints[output] = hashlib.sha256(f"{fingerprint}:{output}".encode("utf-8")).hexdigest()
+    return stage_fingerprints
+
+
+def _topological_order(stages: List[Stage], inputs: Dict[str, Any]) -> List[Stage]:
+    """
+    ステージを依存関係の順に並べる
+
+    Raises:
+        PipelineError: 入力が不足している、出力が重複している、または循環している場合
+    """
+    producers: Dict[str, Stage] = {}
+    for stage in stages:
+        for output in stage.outputs:
+            if output in producers or output in inputs:
+                raise PipelineError(f"出力 {output} を複数の箇所で生成しています")
+            producers[output] = stage
+    for stage in stages:
+        missing = [name for name in stage.inputs if name not in producers and name not in inputs]
+        if missing:
+            raise PipelineError(f"ステージ {stage.name} の入力 {missing} がありません")
+
+    ordered: List[Stage] = []
+    available = set(inputs)
+    remaining = list(stages)
+    while remaining:
+        ready = [stage for stage in remaining if all(name in available for name in stage.inputs)]
+        if not ready:
+            raise PipelineError(f"依存関係が循環しています: {[stage.name for stage in remaining]}")
+        for stage in ready:
+            ordered.append(stage)
+            available.update(stage.outputs)
+            remaining.remove(stage)
+    return ordered
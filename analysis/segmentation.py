@@ -0,0 +1,394 @@
+"""
+Layer 4: セグメント分析
+
+任意の属性列とその組み合わせ（例: 年齢層 × EV経験）ごとに、
+全指標の件数・平均・標準偏差・信頼区間を1回の groupby で求める。
+回答者数が最小セル数に満たないセルは値を秘匿する。
+"""
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from .clustering import assign_clusters
+from .parallel import ProcessPool, grid
+from .tensor import RatingTensor
+
+# セグメント指定: 属性列名、または組み合わせる属性列名のタプル
+SegmentSpec = Union[str, Sequence[str]]
+
+# 値を出力する最小の回答者数
+DEFAULT_MIN_CELL_SIZE = 5
+
+# 信頼区間の信頼水準
+DEFAULT_CONFIDENCE = 0.95
+
+# 組み合わせセグメントの名前・水準の区切り文字
+COMBINATION_SEPARATOR = "×"
+
+
+def segment_columns(spec: SegmentSpec) -> Tuple[str, ...]:
+    """セグメント指定を属性列名のタプルに変換"""
+    return (spec,) if isinstance(spec, str) else tuple(spec)
+
+
+def segment_name(spec: SegmentSpec) -> str:
+    """セグメントの名前（組み合わせの場合は属性列名を×で連結）"""
+    return COMBINATION_SEPARATOR.join(segment_columns(spec))
+
+
+def default_metrics(df: pd.DataFrame, samples: List[str], axes: List[Dict]) -> List[str]:
+    """
+    セグメント分析の対象指標（購買意欲とSD評価の列のうちテーブルにあるもの）
+
+    Returns:
+        列名のリスト
+    """
+    columns = []
+    for sample_id in samples:
+        columns.append(f"purchase_intent_{sample_id}")
+        columns.extend(f"sd_{sample_id}_{axis['id']}" for axis in axes)
+    return [column for column in columns if column in df.columns]
+
+
+def cell_sums(
+    df: pd.DataFrame,
+    spec: SegmentSpec,
+    metrics: List[str],
+    weights: Optional[np.ndarray] = None,
+) -> pd.DataFrame:
+    """
+    1つのセグメント指定について、セルごとの件数・重みの和・重み付きの和・平方和を1回の groupby で計算
+
+    和はすべて行について加算できるため、回答を分割して求めた結果を合算すれば全回答の結果と一致する。
+
+    Args:
+        df: 回答テーブル
+        spec: 属性列名、または属性列名のタプル
+        metrics: 集計する指標の列名（テーブルにない列は回答なしとして扱う）
+        weights: 回答者の重み（df の行の順。Noneの場合は重み付けしない）
+
+    Returns:
+        行 = セル（属性列の値のインデックス、出現順）、列 = [回答者数, 回答数 × 指標, 重みの和 × 指標,
+        重み付きの和 × 指標, 重み付きの平方和 × 指標, 重みの平方和 × 指標] のテーブル
+    """
+    columns = list(segment_columns(spec))
+    x = df.reindex(columns=metrics).to_numpy(dtype=float, na_value=np.nan)
+    valid = ~np.isnan(x)
+    w = np.ones(len(df)) if weights is None else np.asarray(weights, dtype=float)
+    wv = valid * w[:, None]
+    xz = np.where(valid, x, 0.0)
+    sums = pd.DataFrame(
+        np.hstack([np.ones((len(df), 1)), valid, wv, wv * xz, wv * xz * xz, wv * w[:, None]]),
+        index=df.index,
+    )
+    return sums.groupby([df[column] for column in columns], sort=False, dropna=True, observed=True).sum()
+
+
+def cells_from_sums(
+    totals: pd.DataFrame,
+    spec: SegmentSpec,
+    metrics: List[str],
+    min_cell_size: int = DEFAULT_MIN_CELL_SIZE,
+    confidence: float = DEFAULT_CONFIDENCE,
+) -> pd.DataFrame:
+    """
+    cell_sums() の結果から、セル × 指標の統計量を縦持ちで計算
+
+    重みは平均1の頻度重みとして扱い（分散の分母は重みの和 - 1）、信頼区間には Kish の有効サンプルサイズを使う。
+    重みがない場合（すべて1）は通常の平均・不偏標準偏差・t 分布の信頼区間になる。
+
+    Args:
+        totals: cell_sums() の結果
+        spec: 属性列名、または属性列名のタプル
+        metrics: 集計した指標の列名
+        min_cell_size: これ未満の回答者数のセルは値を秘匿する
+        confidence: 信頼区間の信頼水準
+
+    Returns:
+        segment, level, 各属性列, metric, n, mean, std, size, ci_low, ci_high, suppressed の列を持つテーブル
+        （n は回答者数。重み付けした場合も件数）
+    """
+    columns = list(segment_columns(spec))
+    if totals.empty or not metrics:
+        return pd.DataFrame()
+    k = len(metrics)
+    blocks = totals.to_numpy()
+    size = blocks[:, 0].astype(np.int64)
+    n, w_sum, s, ss, w2 = (blocks[:, 1 + i * k:1 + (i + 1) * k] for i in range(5))
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(w_sum > 0, s / w_sum, np.nan)
+        var = (ss - w_sum * mean * mean) / (w_sum - 1)
+        std = np.where(w_sum > 1, np.sqrt(np.maximum(var, 0)), np.nan)
+        effective_n = np.where(w2 > 0, w_sum * w_sum / w2, 0.0)
+        t = stats.t.ppf(0.5 + confidence / 2, effective_n - 1)
+        half_width = t * std / np.sqrt(effective_n)
+
+    # セル × 指標の縦持ちに並べる（指標ごとに全セルを並べる）
+    n_cells = len(totals)
+    tidy = totals.index.to_frame(index=False)
+    tidy.columns = columns
+    tidy = tidy.iloc[np.tile(np.arange(n_cells), k)].reset_index(drop=True)
+    tidy["metric"] = np.repeat(metrics, n_cells)
+    tidy["n"] = n.T.ravel().astype(np.int64)
+    tidy["mean"] = mean.T.ravel()
+    tidy["std"] = std.T.ravel()
+
+    levels = tidy[columns].astype(str).agg(COMBINATION_SEPARATOR.join, axis=1)
+    tidy.insert(0, "level", levels)
+    tidy.insert(0, "segment", segment_name(spec))
+    tidy["size"] = np.tile(size, k)
+    tidy["ci_low"] = tidy["mean"] - half_width.T.ravel()
+    tidy["ci_high"] = tidy["mean"] + half_width.T.ravel()
+
+    suppressed = tidy["size"].to_numpy() < min_cell_size
+    tidy["suppressed"] = suppressed
+    tidy.loc[suppressed, ["mean", "std", "ci_low", "ci_high"]] = np.nan
+    return tidy
+
+
+def segment_cells(
+    df: pd.DataFrame,
+    spec: SegmentSpec,
+    metrics: List[str],
+    min_cell_size: int = DEFAULT_MIN_CELL_SIZE,
+    confidence: float = DEFAULT_CONFIDENCE,
+    weights: Optional[np.ndarray] = None,
+) -> pd.DataFrame:
+    """
+    1つのセグメント指定について、セル × 指標の統計量を縦持ちで計算
+
+    Args:
+        df: 回答テーブル
+        spec: 属性列名、または属性列名のタプル
+        metrics: 集計する指標の列名
+        min_cell_size: これ未満の回答者数のセルは値を秘匿する
+        confidence: 信頼区間の信頼水準
+        weights: 回答者の重み（df の行の順。Noneの場合は重み付けしない）
+
+    Returns:
+        cells_from_sums() の結果
+    """
+    if df.empty or not metrics:
+        return pd.DataFrame()
+    return cells_from_sums(cell_sums(df, spec, metrics, weights), spec, metrics, min_cell_size, confidence)
+
+
+def segment_analysis(
+    df: pd.DataFrame,
+    segments: List[SegmentSpec],
+    metrics: List[str],
+    min_cell_size: int = DEFAULT_MIN_CELL_SIZE,
+    confidence: float = DEFAULT_CONFIDENCE,
+    weights: Optional[np.ndarray] = None,
+) -> pd.DataFrame:
+    """
+    全セグメント指定のセル統計量をまとめて計算
+
+    Args:
+        df: 回答テーブル
+        segments: セグメント指定のリスト
+        metrics: 集計する指標の列名
+        min_cell_size: これ未満の回答者数のセルは値を秘匿する
+        confidence: 信頼区間の信頼水準
+        weights: 回答者の重み（Noneの場合は重み付けしない）
+
+    Returns:
+        segment_cells() の結果を縦に連結したテーブル
+    """
+    frames = [
+        segment_cells(df, spec, metrics, min_cell_size, confidence, weights)
+        for spec in segments
+        if all(column in df.columns for column in segment_columns(spec))
+    ]
+    frames = [frame for frame in frames if not frame.empty]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def _optional_float(value: Any) -> Any:
+    """NaN を None に変換"""
+    return None if pd.isna(value) else float(value)
+
+
+def to_records(cells: pd.DataFrame) -> List[Dict[str, Any]]:
+    """
+    セル統計量をJSONに保存できるレコードのリストに変換（レポート・グラフ用）
+
+    Returns:
+        [{"segment", "level", "metric", "size", "n", "mean", "std", "ci_low", "ci_high", "suppressed"}, ...]
+    """
+    if cells.empty:
+        return []
+    return [
+        {
+            "segment": row.segment,
+            "level": row.level,
+            "metric": row.metric,
+            "size": int(row.size),
+            "n": int(row.n),
+            "mean": _optional_float(row.mean),
+            "std": _optional_float(row.std),
+            "ci_low": _optional_float(row.ci_low),
+            "ci_high": _optional_float(row.ci_high),
+            "suppressed": bool(row.suppressed),
+        }
+        for row in cells.itertuples(index=False)
+    ]
+
+
+def purchase_intent_by_segment(cells: pd.DataFrame, column: str, samples: List[str]) -> Dict[str, Any]:
+    """
+    単一属性のセグメントについて、属性値 -> サンプル -> 購買意欲の統計量 の形式に変換
+
+    Args:
+        cells: segment_analysis() の結果
+        column: 属性列名
+        samples: サンプルIDのリスト
+
+    Returns:
+        属性値 -> サンプル -> {"mean", "count", "ci_low", "ci_high", "suppressed"}
+        （秘匿したセルの mean 等は None）
+    """
+    rows = cells[cells["segment"] == column]
+    metric_samples = {f"purchase_intent_{sample_id}": sample_id for sample_id in samples}
+    result: Dict[str, Any] = {}
+    for row in rows.itertuples(index=False):
+        value = getattr(row, column)
+        value = value.item() if isinstance(value, np.generic) else value
+        group = result.setdefault(value, {})
+        sample_id = metric_samples.get(row.metric)
+        if sample_id is None:
+            continue
+        group[sample_id] = {
+            "mean": _optional_float(row.mean),
+            "count": int(row.size),
+            "ci_low": _optional_float(row.ci_low),
+            "ci_high": _optional_float(row.ci_high),
+            "suppressed": bool(row.suppressed),
+        }
+    return result
+
+
+def _segment_task(arrays: Dict[str, np.ndarray], task: Tuple[Any, ...]) -> pd.DataFrame:
+    """
+    サンプル × セグメント指定のブロックのセル統計量（ワーカープロセスで実行）
+
+    共有配列の評価値と属性のコードから、必要な列だけの回答テーブルを組み立てて segment_analysis() を呼ぶ。
+    """
+    samples, axes, present, sample_block, specs, categories, min_cell_size = task
+    values, mask = arrays["values"], arrays["mask"]
+    columns: Dict[str, Any] = {}
+    for column, uniques in categories.items():
+        codes = np.asarray(arrays[f"codes_{column}"])
+        columns[column] = pd.Series(uniques).reindex(codes).to_numpy()
+    axis_ids = [axis["id"] for axis in axes]
+    for i, (sample_id, s) in enumerate(zip(samples, sample_block)):
+        for j, name in enumerate([f"sd_{sample_id}_{axis_id}" for axis_id in axis_ids] + [f"purchase_intent_{sample_id}"]):
+            if present[i, j]:
+                columns[name] = np.where(mask[:, s, j], values[:, s, j], np.nan)
+    df = pd.DataFrame(columns)
+    weights = arrays["weights"] if "weights" in arrays else None
+    return segment_analysis(df, specs, default_metrics(df, samples, axes), min_cell_size, weights=weights)
+
+
+def parallel_segment_analysis(
+    table: pd.DataFrame,
+    samples: List[str],
+    axes: List[Dict],
+    segments: List[SegmentSpec],
+    pool: ProcessPool,
+    min_cell_size: int = DEFAULT_MIN_CELL_SIZE,
+    weights: Optional[np.ndarray] = None,
+) -> pd.DataFrame:
+    """
+    サンプル × セグメント指定をブロックに分けて segment_analysis() をプロセス並列に計算
+
+    評価値はテンソル、属性列は pd.factorize() のコードとして共有し、
+    結果は segment_analysis(table, segments, default_metrics(...)) と同じ行の順に並べる。
+
+    Args:
+        table: 回答テーブル
+        samples: サンプルIDのリスト
+        axes: SD評価軸の定義
+        segments: セグメント指定のリスト
+        pool: プロセスプール
+        min_cell_size: これ未満の回答者数のセルは値を秘匿する
+        weights: 回答者の重み（Noneの場合は重み付けしない）
+
+    Returns:
+        segment_analysis() と同じ形式のテーブル
+    """
+    specs = [spec for spec in segments if all(column in table.columns for column in segment_columns(spec))]
+    tensor = RatingTensor.from_table(table, samples, axes)
+    attributes = sorted({column for spec in specs for column in segment_columns(spec)})
+    codes, categories = {}, {}
+    for column in attributes:
+        codes[f"codes_{column}"], categories[column] = pd.factorize(table[column])
+    if weights is not None:
+        codes["weights"] = np.asarray(weights, dtype=np.float64)
+    shared = pool.share(values=tensor.values, mask=tensor.mask, **codes)
+    blocks = grid(len(samples), len(specs), pool.workers)
+    tasks = [
+        (
+            [samples[s] for s in sample_block], axes, tensor.present[sample_block], sample_block,
+            [specs[k] for k in spec_block],
+            {column: categories[column] for k in spec_block for column in segment_columns(specs[k])},
+            min_cell_size,
+        )
+        for sample_block, spec_block in blocks
+    ]
+    results = pool.map(_segment_task, shared, tasks)
+    # セグメント指定ごとに、サンプルの順に連結する（指標はサンプル順に並ぶため元の順と一致する）
+    frames = []
+    for k, spec in enumerate(specs):
+        name = segment_name(spec)
+        for (_, spec_block), frame in zip(blocks, results):
+            if k in spec_block and not frame.empty:
+                frames.append(frame[frame["segment"] == name])
+    frames = [frame for frame in frames if not frame.empty]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def run_segmentation(
+    table: pd.DataFrame,
+    samples: List[str],
+    axes: List[Dict],
+    segments: List[SegmentSpec],
+    pool: Optional[ProcessPool] = None,
+    min_cell_size: int = DEFAULT_MIN_CELL_SIZE,
+    weights: Optional[np.ndarray] = None,
+    clusters: Optional[np.ndarray] = None,
+) -> Dict[str, Any]:
+    """
+    Layer 4 ステージ
+
+    Args:
+        table: 回答テーブル
+        samples: サンプルIDのリスト
+        axes: SD評価軸の定義
+        segments: セグメント指定（属性列名、または組み合わせる属性列名のタプル）
+        pool: プロセスプール（並列数が2以上の場合は parallel_segment_analysis() で計算）
+        min_cell_size: これ未満の回答者数のセルは値を秘匿する
+        weights: 回答者の重み（Noneの場合は重み付けしない）
+        clusters: 回答者のクラスタ番号（cluster 列として segments に使える。clustering.assign_clusters() を参照）
+
+    Returns:
+        {"layer4_segmentation": {単一属性列 -> 属性値 -> サンプル -> 購買意欲の統計量,
+                                 "cells": 全セグメント・全指標の縦持ちレコード}}
+    """
+    table = assign_clusters(table, clusters)
+    if pool is not None and pool.workers > 1:
+        cells = parallel_segment_analysis(table, samples, axes, segments, pool, min_cell_size, weights)
+    else:
+        cells = segment_analysis(
+            table, segments, default_metrics(table, samples, axes), min_cell_size, weights=weights
+        )
+    result: Dict[str, Any] = {}
+    if not cells.empty:
+        for spec in segments:
+            if isinstance(spec, str) and spec in table.columns:
+                result[spec] = purchase_intent_by_segment(cells, spec, samples)
+    result["cells"] = to_records(cells)
+    return {"layer4_segmentation": result}
@@ -0,0 +1,418 @@
+"""
+サンプル間比較の有意性検定（回答者内計画）
+
+各回答者が全サンプルを評価しているため、評価軸・購買意欲ごとに
+Friedman 検定、サンプル対ごとの Wilcoxon 符号付き順位検定、符号反転による並べ替え検定を行う。
+全体と各セグメントの水準を「グループ」とし、回答者 × グループの所属行列との行列積で
+全グループ・全変数・全サンプル対の統計量を一括で求める。
+評価値は小さな整数なので、Wilcoxon 検定の順位は差の絶対値の度数から求める。
+多重比較の補正（Holm / Benjamini-Hochberg）は、グループごと・検定ごとの族に対して行う。
+"""
+from itertools import combinations
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from .clustering import assign_clusters
+from .segmentation import (
+    COMBINATION_SEPARATOR, DEFAULT_MIN_CELL_SIZE, SegmentSpec, segment_columns, segment_name,
+)
+from .tensor import RatingTensor
+
+
+DEFAULT_PERMUTATIONS = 2000
+DEFAULT_SEED = 20260109
+
+# 全回答者のグループのセグメント名・水準名
+OVERALL = "全体"
+
+# 購買意欲の変数名（SD評価軸IDの後に並ぶ）
+PURCHASE_INTENT = "purchase_intent"
+
+# 1回に処理する回答者数、並べ替えの符号行列・列ブロックの要素数の上限
+_CHUNK_SIZE = 8192
+_BLOCK_ELEMENTS = 12_000_000
+
+# float32 の行列積で整数の和が誤差なく求まる上限
+_FLOAT32_EXACT = 2 ** 24
+
+
+def segment_groups(df: pd.DataFrame, segments: List[SegmentSpec]) -> List[Tuple[str, str, np.ndarray]]:
+    """
+    全体と各セグメントの水準を回答者の行番号のリストに変換
+
+    Args:
+        df: 回答テーブル
+        segments: セグメント指定のリスト
+
+    Returns:
+        [(セグメント名, 水準名, 行番号), ...]（先頭は全体）
+    """
+    groups = [(OVERALL, OVERALL, np.arange(len(df)))]
+    for spec in segments:
+        columns = list(segment_columns(spec))
+        if not all(column in df.columns for column in columns):
+            continue
+        indices = df.groupby(columns, sort=False, dropna=True, observed=True).indices
+        for key, rows in indices.items():
+            key = key if isinstance(key, tuple) else (key,)
+            level = COMBINATION_SEPARATOR.join(str(value) for value in key)
+            groups.append((segment_name(spec), level, np.asarray(rows)))
+    return groups
+
+
+def membership_matrix(groups: List[Tuple[str, str, np.ndarray]], n_respondents: int) -> np.ndarray:
+    """
+    グループ × 回答者 の所属行列
+
+    Returns:
+        float64 (グループ数, N)
+    """
+    membership = np.zeros((len(groups), n_respondents))
+    for g, (_, _, rows) in enumerate(groups):
+        membership[g, rows] = 1.0
+    return membership
+
+
+def holm(p_values: np.ndarray) -> np.ndarray:
+    """
+    Holm 法で補正した p 値（最後の軸を1つの族とする。NaN は族に含めない）
+
+    Args:
+        p_values: (..., 検定数)
+
+    Returns:
+        補正後の p 値（同じ形状）
+    """
+    p = np.asarray(p_values, dtype=np.float64)
+    valid = ~np.isnan(p)
+    m = valid.sum(axis=-1, keepdims=True)
+    order = np.argsort(np.where(valid, p, np.inf), axis=-1, kind="stable")
+    ranked = np.take_along_axis(p, order, axis=-1)
+    with np.errstate(invalid="ignore"):
+        adjusted = np.maximum.accumulate(np.fmin(ranked * (m - np.arange(p.shape[-1])), 1.0), axis=-1)
+    result = np.empty_like(p)
+    np.put_along_axis(result, order, adjusted, axis=-1)
+    return np.where(valid, result, np.nan)
+
+
+def benjamini_hochberg(p_values: np.ndarray) -> np.ndarray:
+    """
+    Benjamini-Hochberg 法で補正した p 値（q 値。最後の軸を1つの族とする。NaN は族に含めない）
+
+    Args:
+        p_values: (..., 検定数)
+
+    Returns:
+        補正後の p 値（同じ形状）
+    """
+    p = np.asarray(p_values, dtype=np.float64)
+    valid = ~np.isnan(p)
+    m = valid.sum(axis=-1, keepdims=True)
+    order = np.argsort(np.where(valid, p, np.inf), axis=-1, kind="stable")
+    ranked = np.where(np.arange(p.shape[-1]) < m, np.take_along_axis(p, order, axis=-1), np.inf)
+    with np.errstate(invalid="ignore"):
+        scaled = ranked * m / np.arange(1, p.shape[-1] + 1)
+    adjusted = np.fmin(np.minimum.accumulate(scaled[..., ::-1], axis=-1)[..., ::-1], 1.0)
+    result = np.empty_like(p)
+    np.put_along_axis(result, order, adjusted, axis=-1)
+    return np.where(valid, result, np.nan)
+
+
+def _grouped_sums(membership: np.ndarray, features: np.ndarray) -> np.ndarray:
+    """所属行列 × 特徴量 を回答者のチャンクごとに加算"""
+    total = np.zeros((membership.shape[0],) + features.shape[1:])
+    flat = total.reshape(membership.shape[0], -1)
+    for start in range(0, features.shape[0], _CHUNK_SIZE):
+        chunk = features[start:start + _CHUNK_SIZE]
+        flat += membership[:, start:start + _CHUNK_SIZE] @ chunk.reshape(len(chunk), -1)
+    return total
+
+
+def _grouped_magnitude_counts(membership: np.ndarray, d: np.ndarray, max_abs: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    差の絶対値（1〜max_abs）の正負別の度数をグループごとに集計（one-hot は回答者のチャンクごとに作る）
+
+    Returns:
+        (正の差の度数, 負の差の度数)、いずれも (グループ, 対, 変数, max_abs)
+    """
+    signed = np.arange(-max_abs, max_abs + 1, dtype=np.float64)
+    total = np.zeros((membership.shape[0],) + d.shape[1:] + (len(signed),))
+    flat = total.reshape(membership.shape[0], -1)
+    for start in range(0, d.shape[0], _CHUNK_SIZE):
+        chunk = d[start:start + _CHUNK_SIZE]
+        one_hot = (chunk[..., None] == signed).astype(np.float64)
+        flat += membership[:, start:start + _CHUNK_SIZE] @ one_hot.reshape(len(chunk), -1)
+    return total[..., max_abs + 1:], total[..., max_abs - 1::-1] if max_abs else total[..., :0]
+
+
+def friedman(values: np.ndarray, membership: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Friedman 検定（全サンプルに回答した回答者のみ。同順位の補正あり）
+
+    Args:
+        values: float64 (N, サンプル数, 変数)、欠損は NaN
+        membership: (グループ数, N) の所属行列
+
+    Returns:
+        n, statistic, p_value, kendall_w は (グループ, 変数)、mean_ranks は (グループ, サンプル, 変数)
+    """
+    k = values.shape[1]
+    complete = ~np.isnan(values).any(axis=1)
+    x = np.where(complete[:, None, :], values, 0.0)
+    # 行内の順位（同順位は平均順位）と、同順位の補正項 Σ(t³ - t) = Σ_i t_i² - k
+    less = (x[:, None, :, :] < x[:, :, None, :]).sum(axis=2)
+    ties = (x[:, None, :, :] == x[:, :, None, :]).sum(axis=2)
+    ranks = (1 + less + 0.5 * (ties - 1)) * complete[:, None, :]
+    tie_term = ((ties ** 2).sum(axis=1) - k) * complete
+
+    n = _grouped_sums(membership, complete.astype(np.float64))
+    rank_sums = _grouped_sums(membership, ranks)
+    tie_sums = _grouped_sums(membership, tie_term.astype(np.float64))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        chi2 = 12.0 / (n * k * (k + 1)) * (rank_sums ** 2).sum(axis=1) - 3.0 * n * (k + 1)
+        correction = 1.0 - tie_sums / (n * k * (k * k - 1))
+        chi2 = chi2 / correction
+        chi2[(n < 2) | (correction <= 0)] = np.nan
+        kendall_w = chi2 / (n * (k - 1))
+        mean_ranks = rank_sums / n[:, None, :]
+    return {
+        "n": n,
+        "statistic": chi2,
+        "p_value": stats.chi2.sf(chi2, k - 1),
+        "kendall_w": kendall_w,
+        "mean_ranks": mean_ranks,
+    }
+
+
+def paired_differences(values: np.ndarray) -> Tuple[List[Tuple[int, int]], np.ndarray]:
+    """
+    サンプル対ごとの回答者内の差
+
+    Returns:
+        (サンプル対の添字のリスト, float64 (N, 対, 変数) の差。どちらかが欠損なら NaN)
+    """
+    pairs = list(combinations(range(values.shape[1]), 2))
+    a, b = (np.asarray(index) for index in zip(*pairs))
+    return pairs, values[:, a, :] - values[:, b, :]
+
+
+def wilcoxon(differences: np.ndarray, membership: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Wilcoxon 符号付き順位検定（差が0の回答者は除外。同順位の補正ありの正規近似、連続性補正なし）
+
+    scipy.stats.wilcoxon(method="approx") と同じ統計量・p 値を、
+    差の絶対値（1〜最大値の整数）の正負別の度数から求める。
+
+    Args:
+        differences: (N, 対, 変数) の差、欠損は NaN
+        membership: (グループ数, N) の所属行列
+
+    Returns:
+        n, n_nonzero, mean_difference, statistic（min(W+, W-)）, z, p_value, rank_biserial
+        （いずれも (グループ, 対, 変数)）
+    """
+    valid = ~np.isnan(differences)
+    d = np.where(valid, differences, 0.0)
+    max_abs = int(np.abs(d).max()) if d.size else 0
+
+    n = _grouped_sums(membership, valid.astype(np.float64))
+    total = _grouped_sums(membership, d)
+    positive, negative = _grouped_magnitude_counts(membership, d, max_abs)
+
+    # 差の絶対値 v の平均順位 = v 未満の件数 + (v の件数 + 1) / 2
+    counts = positive + negative
+    below = np.cumsum(counts, axis=-1) - counts
+    mean_rank = below + (counts + 1) / 2
+    w_plus = (positive * mean_rank).sum(axis=-1)
+    w_minus = (negative * mean_rank).sum(axis=-1)
+    n_nonzero = counts.sum(axis=-1)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        expected = n_nonzero * (n_nonzero + 1) / 4
+        variance = n_nonzero * (n_nonzero + 1) * (2 * n_nonzero + 1) / 24 - (counts ** 3 - counts).sum(axis=-1) / 48
+        z = (w_plus - expected) / np.sqrt(variance)
+        z[(n_nonzero < 1) | (variance <= 0)] = np.nan
+        rank_biserial = (w_plus - w_minus) / (2 * expected)
+        mean_difference = total / n
+    return {
+        "n": n,
+        "n_nonzero": n_nonzero,
+        "mean_difference": mean_difference,
+        "statistic": np.minimum(w_plus, w_minus),
+        "z": z,
+        "p_value": 2 * stats.norm.sf(np.abs(z)),
+        "rank_biserial": rank_biserial,
+    }
+
+
+def sign_flip_test(
+    differences: np.ndarray,
+    membership: np.ndarray,
+    permutations: int = DEFAULT_PERMUTATIONS,
+    seed: int = DEFAULT_SEED,
+) -> np.ndarray:
+    """
+    符号反転による並べ替え検定（平均差が0かどうかの両側検定）
+
+    全グループ・全検定で同じ符号行列を使い、符号行列 × (所属 ⊙ 差) の行列積で統計量を一括計算する。
+    符号行列は回答者数のみで決まるブロックごとに SeedSequence から生成する。
+
+    Args:
+        differences: (N, 対, 変数) の差、欠損は NaN
+        membership: (グループ数, N) の所属行列
+        permutations: 並べ替えの回数
+        seed: 乱数シード
+
+    Returns:
+        (グループ, 対, 変数) の p 値 (1 + 観測値以上の回数) / (1 + 並べ替えの回数)
+    """
+    n_groups, n_respondents = membership.shape
+    tests = differences.shape[1:]
+    d = np.where(np.isnan(differences), 0.0, differences).reshape(n_respondents, -1)
+    dtype = np.float32 if np.abs(d).sum(axis=0).max(initial=0) < _FLOAT32_EXACT else np.float64
+    # (N, グループ × 検定) の列をブロックに分けて処理する
+    columns = n_groups * d.shape[1]
+    column_block = max(1, _BLOCK_ELEMENTS // max(n_respondents, 1))
+    observed = np.abs(membership @ d).ravel()
+    exceed = np.zeros(columns)
+
+    size = max(1, min(permutations, _BLOCK_ELEMENTS // max(n_respondents, 1)))
+    sizes = [min(size, permutations - start) for start in range(0, permutations, size)]
+    for b, seed_sequence in zip(sizes, np.random.SeedSequence(seed).spawn(len(sizes))):
+        rng = np.random.default_rng(seed_sequence)
+        signs = (rng.integers(0, 2, size=(b, n_respondents), dtype=np.int8) * 2 - 1).astype(dtype)
+        for start in range(0, columns, column_block):
+            stop = min(columns, start + column_block)
+            group, test = np.divmod(np.arange(start, stop), d.shape[1])
+            weighted = (membership[group].T * d[:, test]).astype(dtype)
+            flipped = np.abs(signs @ weighted)
+            exceed[start:stop] += (flipped >= observed[start:stop] - 1e-9).sum(axis=0)
+    return ((1 + exceed) / (1 + permutations)).reshape((n_groups,) + tests)
+
+
+def _optional_float(value: float) -> Optional[float]:
+    """NaN を None に変換"""
+    return None if np.isnan(value) else float(value)
+
+
+def compare_samples(
+    table: pd.DataFrame,
+    samples: List[str],
+    axes: List[Dict],
+    segments: List[SegmentSpec],
+    permutations: int = DEFAULT_PERMUTATIONS,
+    seed: int = DEFAULT_SEED,
+    min_cell_size: int = DEFAULT_MIN_CELL_SIZE,
+) -> Dict[str, Any]:
+    """
+    全体・各セグメントについて、SD評価軸・購買意欲ごとのサンプル間比較の検定を行う
+
+    Args:
+        table: 回答テーブル
+        samples: サンプルIDのリスト
+        axes: SD評価軸の定義
+        segments: セグメント指定のリスト
+        permutations: 並べ替え検定の回数（0の場合は行わない）
+        seed: 並べ替え検定の乱数シード
+        min_cell_size: これ未満の回答者数のグループは値を秘匿する
+
+    Returns:
+        {"permutations", "seed", "min_cell_size",
+         "friedman": [{"segment", "level", "variable", "size", "n", "statistic", "p_value", "p_holm", "p_bh",
+                       "kendall_w", "mean_ranks", "suppressed"}, ...],
+         "pairwise": [{"segment", "level", "variable", "sample_a", "sample_b", "size", "n", "n_nonzero",
+                       "mean_difference", "statistic", "z", "p_value", "p_holm", "p_bh", "rank_biserial",
+                       "p_permutation", "p_permutation_holm", "p_permutation_bh", "suppressed"}, ...]}
+    """
+    tensor = RatingTensor.from_table(table, samples, axes)
+    values = np.where(tensor.mask, tensor.values, np.nan)
+    variables = tensor.axis_ids + [PURCHASE_INTENT]
+    present = tensor.present.all(axis=0)
+
+    groups = segment_groups(table, segments)
+    membership = membership_matrix(groups, len(table))
+    sizes = membership.sum(axis=1)
+    suppressed = sizes < min_cell_size
+    # 秘匿するグループと列のない変数は補正の族に含めない
+    excluded = suppressed[:, None] | ~present[None, :]
+
+    overall = friedman(values, membership)
+    overall["p_value"][excluded] = np.nan
+    overall["p_holm"] = holm(overall["p_value"])
+    overall["p_bh"] = benjamini_hochberg(overall["p_value"])
+
+    pairs, differences = paired_differences(values)
+    pairwise = wilcoxon(differences, membership)
+    family_shape = (len(groups), -1)
+    pairwise["p_value"][np.broadcast_to(excluded[:, None, :], pairwise["p_value"].shape)] = np.nan
+    p_flat = pairwise["p_value"].reshape(family_shape)
+    pairwise["p_holm"] = holm(p_flat).reshape(pairwise["p_value"].shape)
+    pairwise["p_bh"] = benjamini_hochberg(p_flat).reshape(pairwise["p_value"].shape)
+    if permutations > 0:
+        p_permutation = sign_flip_test(differences, membership, permutations, seed)
+        p_permutation[pairwise["n"] < 1] = np.nan
+        p_permutation[np.broadcast_to(excluded[:, None, :], p_permutation.shape)] = np.nan
+    else:
+        p_permutation = np.full(pairwise["p_value"].shape, np.nan)
+    pairwise["p_permutation"] = p_permutation
+    pairwise["p_permutation_holm"] = holm(p_permutation.reshape(family_shape)).reshape(p_permutation.shape)
+    pairwise["p_permutation_bh"] = benjamini_hochberg(p_permutation.reshape(family_shape)).reshape(p_permutation.shape)
+
+    friedman_records, pairwise_records = [], []
+    for g, (segment, level, _) in enumerate(groups):
+        hidden = bool(suppressed[g])
+        for v, variable in enumerate(variables):
+            if not present[v]:
+                continue
+            record = {"segment": segment, "level": level, "variable": variable,
+                      "size": int(sizes[g]), "n": int(overall["n"][g, v])}
+            for key in ("statistic", "p_value", "p_holm", "p_bh", "kendall_w"):
+                record[key] = None if hidden else _optional_float(overall[key][g, v])
+            record["mean_ranks"] = None if hidden else {
+                sample_id: _optional_float(overall["mean_ranks"][g, s, v]) for s, sample_id in enumerate(samples)
+            }
+            record["suppressed"] = hidden
+            friedman_records.append(record)
+
+            for p, (a, b) in enumerate(pairs):
+                record = {"segment": segment, "level": level, "variable": variable,
+                          "sample_a": samples[a], "sample_b": samples[b], "size": int(sizes[g]),
+                          "n": int(pairwise["n"][g, p, v]), "n_nonzero": int(pairwise["n_nonzero"][g, p, v])}
+                for key in ("mean_difference", "statistic", "z", "p_value", "p_holm", "p_bh", "rank_biserial",
+                            "p_permutation", "p_permutation_holm", "p_permutation_bh"):
+                    record[key] = None if hidden else _optional_float(pairwise[key][g, p, v])
+                record["suppressed"] = hidden
+                pairwise_records.append(record)
+
+    return {
+        "permutations": int(permutations),
+        "seed": int(seed),
+        "min_cell_size": int(min_cell_size),
+        "friedman": friedman_records,
+        "pairwise": pairwise_records,
+    }
+
+
+def run_significance(
+    table: pd.DataFrame,
+    samples: List[str],
+    axes: List[Dict],
+    segments: List[SegmentSpec],
+    significance_options: Dict[str, Any],
+    clusters: Optional[np.ndarray] = None,
+) -> Dict[str, Any]:
+    """
+    サンプル間比較の検定ステージ
+
+    Args:
+        significance_options: compare_samples() のキーワード引数（permutations, seed, min_cell_size）
+        clusters: 回答者のクラスタ番号（cluster 列として segments に使える。clustering.assign_clusters() を参照）
+
+    Returns:
+        {"significance": 検定結果}
+    """
+    table = assign_clusters(table, clusters)
+    return {"significance": compare_samples(table, samples, axes, segments, **significance_options)}
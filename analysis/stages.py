@@ -0,0 +1,312 @@
+"""
+標準の分析ステージグラフ
+"""
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from .pipeline import Stage, run_stages
+from .cache import StageCache
+from .loaders import load_table, load_records
+from .descriptive import run_descriptive
+from .comparative import run_comparative
+from .correlation import run_correlation, run_correlation_tests
+from .segmentation import DEFAULT_MIN_CELL_SIZE, run_segmentation
+from .insights import run_laddering, run_interview
+from .tensor import RatingTensor
+from .bootstrap import DEFAULT_RESAMPLES, DEFAULT_SEED, DEFAULT_CONFIDENCE, run_bootstrap
+from .significance import DEFAULT_PERMUTATIONS, run_significance
+from .drivers import run_drivers
+from .weighting import run_weighting
+from .text import run_text
+from .clustering import run_clustering
+from .factors import DEFAULT_N_COMPONENTS, DEFAULT_ROTATION, run_factors
+from .wtp import DEFAULT_CONFIDENCE as DEFAULT_WTP_CONFIDENCE, run_wtp
+from .parallel import ProcessPool
+
+
+# セグメント分析に使う属性列と組み合わせ（既定）
+DEFAULT_SEGMENTS = ["age_group", "gender", "ev_experience", ("age_group", "ev_experience")]
+
+# analysis_results.json に含めるレイヤー出力（出力名 -> 結果のキー）
+LAYER_OUTPUTS = [
+    "layer1_descriptive",
+    "layer2_comparative",
+    "layer3_correlation",
+    "layer4_segmentation",
+    "layer5_insights",
+    "bootstrap",
+    "significance",
+    "drivers",
+    "text",
+    "clustering",
+    "factors",
+    "wtp",
+    "correlation_tests",
+]
+
+# レイヤーの短縮名（コマンドラインでの指定用） -> 出力名
+# laddering / interview は Layer 5 の一部だけを実行する
+LAYER_NAMES = {
+    "descriptive": "layer1_descriptive",
+    "comparative": "layer2_comparative",
+    "correlation": "layer3_correlation",
+    "segmentation": "layer4_segmentation",
+    "insights": "layer5_insights",
+    "laddering": "laddering",
+    "interview": "interview",
+    "bootstrap": "bootstrap",
+    "significance": "significance",
+    "drivers": "drivers",
+    "text": "text",
+    "clustering": "clustering",
+    "factors": "factors",
+    "wtp": "wtp",
+    "correlation_tests": "correlation_tests",
+}
+
+# Layer 5 を構成する出力
+_INSIGHT_PARTS = ("laddering", "interview")
+
+# ブートストラップ信頼区間の既定の設定（bootstrap_intervals() のキーワード引数）
+DEFAULT_BOOTSTRAP_OPTIONS = {
+    "resamples": DEFAULT_RESAMPLES,
+    "seed": DEFAULT_SEED,
+    "confidence": DEFAULT_CONFIDENCE,
+}
+
+# サンプル間比較の検定の既定の設定（compare_samples() のキーワード引数）
+DEFAULT_SIGNIFICANCE_OPTIONS = {
+    "permutations": DEFAULT_PERMUTATIONS,
+    "seed": DEFAULT_SEED,
+}
+
+# テキスト分析の既定の設定（text.analyze_text() の options）。vocabulary_path は語彙の保存先
+DEFAULT_TEXT_OPTIONS: Dict[str, Any] = {
+    "vocabulary_path": None,
+}
+
+
+# SD評価軸の主成分分析の既定の設定（factors.FactorMoments.fit() のキーワード引数）
+DEFAULT_FACTOR_OPTIONS: Dict[str, Any] = {
+    "n_components": DEFAULT_N_COMPONENTS,
+    "rotation": DEFAULT_ROTATION,
+    "min_cell_size": DEFAULT_MIN_CELL_SIZE,
+}
+
+
+# WTP 推定の既定の設定（wtp.run_wtp() の wtp_options）。labels は WTP の選択肢（Noneの場合は推定しない）
+DEFAULT_WTP_OPTIONS: Dict[str, Any] = {
+    "labels": None,
+    "confidence": DEFAULT_WTP_CONFIDENCE,
+    "min_cell_size": DEFAULT_MIN_CELL_SIZE,
+}
+
+
+# 相関の検定の既定の設定（correlation.run_correlation_tests() の correlation_test_options）
+DEFAULT_CORRELATION_TEST_OPTIONS: Dict[str, Any] = {
+    "min_cell_size": DEFAULT_MIN_CELL_SIZE,
+}
+
+
+def _assemble_insights(laddering: Dict[str, Any], interview: Dict[str, Any]) -> Dict[str, Any]:
+    """Layer 5 の結果をまとめる"""
+    return {"layer5_insights": {"laddering": laddering, "interview": interview}}
+
+
+def _rating_moments(table, samples: List[str], axes: List[Dict], pool: ProcessPool, weights) -> Dict[str, Any]:
+    """SD評価・購買意欲をテンソル化して集計量を計算（回答者を分割してプロセス並列に計算）"""
+    return {"rating_moments": RatingTensor.from_table(table, samples, axes).parallel_moments(pool, weights)}
+
+
+def resolve_layers(names: Iterable[str]) -> List[str]:
+    """
+    レイヤーの指定（短縮名・番号・出力名）を出力名に変換
+
+    Args:
+        names: "correlation"、"3"、"layer3_correlation" など
+
+    Returns:
+        出力名のリスト（指定順、重複を除く）
+
+    Raises:
+        ValueError: 不明なレイヤーが含まれる場合
+    """
+    by_number = {name.split("_")[0][len("layer"):]: name for name in LAYER_OUTPUTS if name.startswith("layer")}
+    known = set(LAYER_OUTPUTS) | set(_INSIGHT_PARTS)
+    resolved: List[str] = []
+    for name in names:
+        output = LAYER_NAMES.get(name) or by_number.get(name) or (name if name in known else None)
+        if output is None:
+            raise ValueError(
+                f"不明なレイヤーです: {name}（指定できる名前: {', '.join(LAYER_NAMES)}、または 1〜{len(by_number)}）"
+            )
+        if output not in resolved:
+            resolved.append(output)
+    return resolved
+
+
+def build_stages() -> List[Stage]:
+    """
+    標準の分析ステージを構築
+
+    Returns:
+        ステージのリスト（定義順）
+    """
+    return [
+        Stage("load_table", lambda csv_path, column_types: {"table": load_table(csv_path, column_types)},
+              ("csv_path", "column_types"), ("table",), "データ読み込み（CSV）", cacheable=False),
+        Stage("load_records", lambda json_path: {"records": load_records(json_path)},
+              ("json_path",), ("records",), "データ読み込み（JSON）", cacheable=False),
+        Stage("response_count", lambda records: {"response_count": len(records)},
+              ("records",), ("response_count",), "回答数"),
+        Stage("weighting", run_weighting,
+              ("table", "weighting_options"), ("weights", "weighting"), "ウェイトバック（レイキング）"),
+        Stage("clustering", run_clustering,
+              ("table", "samples", "axes", "segments", "clustering_options", "weights"), ("clusters", "clustering"),
+              "クラスタリング（ミニバッチ k-means）"),
+        Stage("rating_moments", _rating_moments,
+              ("table", "samples", "axes", "pool", "weights"), ("rating_moments",), "SD評価・購買意欲の集計量"),
+        Stage("descriptive", run_descriptive,
+              ("table", "rating_moments", "weights"), ("layer1_descriptive",), "Layer 1: 記述統計分析"),
+        Stage("comparative", run_comparative,
+              ("table", "rating_moments", "weights"), ("layer2_comparative",), "Layer 2: 比較分析"),
+        Stage("drivers", run_drivers,
+              ("table", "samples", "axes", "segments", "pool", "weights", "clusters"), ("drivers",),
+              "ドライバー分析（Shapley 値回帰・相対重み）"),
+        Stage("correlation", run_correlation,
+              ("rating_moments", "drivers"), ("layer3_correlation",), "Layer 3: 相関・回帰分析"),
+        Stage("segmentation", run_segmentation,
+              ("table", "samples", "axes", "segments", "pool", "weights", "clusters"), ("layer4_segmentation",),
+              "Layer 4: セグメント分析"),
+        Stage("laddering", run_laddering,
+              ("records", "laddering_vocab", "segments"), ("laddering",), "Layer 5: ラダリング分析"),
+        Stage("interview", run_interview,
+              ("table", "weights"), ("interview",), "Layer 5: インタビュー分析"),
+        Stage("insights", _assemble_insights,
+              ("laddering", "interview"), ("layer5_insights",), "Layer 5: 統合インサイト"),
+        Stage("bootstrap", run_bootstrap,
+              ("table", "samples", "axes", "bootstrap_options", "pool", "wtp_options"), ("bootstrap",),
+              "ブートストラップ信頼区間"),
+        Stage("significance", run_significance,
+              ("table", "samples", "axes", "segments", "significance_options", "clusters"), ("significance",),
+              "サンプル間比較の検定"),
+        Stage("text", run_text,
+              ("records", "samples", "segments", "text_options"), ("text",), "テキスト分析（文字 n-gram TF-IDF）"),
+        Stage("factors", run_factors,
+              ("table", "samples", "axes", "segments", "factor_options", "clusters"), ("factors",),
+              "SD評価軸の主成分分析（知覚マップ）"),
+        Stage("wtp", run_wtp,
+              ("table", "samples", "segments", "wtp_options", "weights", "clusters"), ("wtp",),
+              "WTP の区間打ち切り推定"),
+        Stage("correlation_tests", run_correlation_tests,
+              ("table", "samples", "axes", "segments", "wtp_options", "correlation_test_options", "weights", "clusters"),
+              ("correlation_tests",),
+              "相関の検定（p 値・BH 法の q 値）"),
+    ]
+
+
+def run_analysis(
+    csv_path: Path,
+    json_path: Path,
+    samples: List[str],
+    axes: List[Dict],
+    segments: Optional[List[str]] = None,
+    laddering_vocab: Optional[Dict[str, List[str]]] = None,
+    layers: Optional[Iterable[str]] = None,
+    max_workers: Optional[int] = None,
+    on_stage_done: Optional[Callable[[Stage, float], None]] = None,
+    cache_dir: Optional[Path] = None,
+    bootstrap_options: Optional[Dict[str, Any]] = None,
+    significance_options: Optional[Dict[str, Any]] = None,
+    workers: int = 1,
+    column_types: Optional[Dict[str, Any]] = None,
+    on_stage_start: Optional[Callable[[Stage], None]] = None,
+    weighting: Optional[Dict[str, Any]] = None,
+    text_options: Optional[Dict[str, Any]] = None,
+    clustering: Optional[Dict[str, Any]] = None,
+    factor_options: Optional[Dict[str, Any]] = None,
+    wtp_options: Optional[Dict[str, Any]] = None,
+    correlation_test_options: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    分析を実行して analysis_results.json 形式の結果を返す
+
+    Args:
+        csv_path: 回答データ（CSV）のパス
+        json_path: 回答データ（JSON）のパス
+        samples: 分析対象のサンプルID
+        axes: SD評価軸の定義
+        segments: セグメント分析に使う属性列、または組み合わせる属性列のタプル
+            （Noneの場合は DEFAULT_SEGMENTS）
+        laddering_vocab: ラダリングの why_good 等のキー -> 選択肢の語彙
+        layers: 実行するレイヤー出力名（Noneの場合は全レイヤー）。"laddering" / "interview" を指定した場合は
+            layer5_insights にその部分だけを含める
+        max_workers: 並列実行するスレッド数（独立したステージの並列実行）
+        on_stage_done: ステージ完了時のコールバック
+        cache_dir: ステージ出力のキャッシュ保存先（Noneの場合はキャッシュしない）
+        bootstrap_options: ブートストラップの設定（DEFAULT_BOOTSTRAP_OPTIONS の一部を上書き）
+        significance_options: サンプル間比較の検定の設定（DEFAULT_SIGNIFICANCE_OPTIONS の一部を上書き）
+        workers: サンプル・セグメント単位の処理（集計量・ドライバー分析・セグメント分析・ブートストラップ）の
+            プロセス数。結果は並列数によらず同じ
+        column_types: CSVの列名のパターン -> 型の指定（loaders.load_table() を参照。Noneの場合は型を推定）
+        on_stage_start: ステージの実行開始時のコールバック（run_stages() を参照）
+        weighting: ウェイトバックの設定（weighting.run_weighting() を参照。Noneの場合は重み付けしない）。
+            Layer 1〜4・ドライバー分析・インタビュー分析・WTP 推定・相関の検定を重み付きで集計する
+            （ラダリング・ブートストラップ・サンプル間比較の検定・テキスト分析・主成分分析は重み付けしない）
+        text_options: テキスト分析の設定（DEFAULT_TEXT_OPTIONS の一部を上書き。text.analyze_text() を参照）
+        clustering: クラスタリングの設定（clustering.run_clustering() を参照。Noneの場合はクラスタリングしない）。
+            回答テーブルに cluster 列を追加し、segments に "cluster" を含めるとセグメントとして集計する
+        factor_options: SD評価軸の主成分分析の設定（DEFAULT_FACTOR_OPTIONS の一部を上書き）
+        wtp_options: WTP 推定の設定（DEFAULT_WTP_OPTIONS の一部を上書き）。"labels" に WTP の選択肢を
+            指定した場合は WTP の区間打ち切り推定を行い、ブートストラップで平均・中央値の信頼区間も求める
+            （相関の検定でも選択肢の番号を WTP の変数として加える）
+        correlation_test_options: 相関の検定の設定（DEFAULT_CORRELATION_TEST_OPTIONS の一部を上書き）
+
+    Returns:
+        分析結果（stage_timings、キャッシュ使用時は stage_cache、重み付け時は weighting を含む）
+    """
+    targets = (list(layers) if layers is not None else LAYER_OUTPUTS) + ["response_count"]
+    inputs = {
+        "csv_path": Path(csv_path),
+        "json_path": Path(json_path),
+        "samples": list(samples),
+        "axes": list(axes),
+        "segments": list(segments) if segments is not None else DEFAULT_SEGMENTS,
+        "laddering_vocab": laddering_vocab or {},
+        "column_types": column_types or {},
+        "bootstrap_options": {**DEFAULT_BOOTSTRAP_OPTIONS, **(bootstrap_options or {})},
+        "significance_options": {**DEFAULT_SIGNIFICANCE_OPTIONS, **(significance_options or {})},
+        "weighting_options": weighting,
+        "text_options": {**DEFAULT_TEXT_OPTIONS, **(text_options or {})},
+        "clustering_options": clustering,
+        "factor_options": {**DEFAULT_FACTOR_OPTIONS, **(factor_options or {})},
+        "wtp_options": {**DEFAULT_WTP_OPTIONS, **(wtp_options or {})},
+        "correlation_test_options": {**DEFAULT_CORRELATION_TEST_OPTIONS, **(correlation_test_options or {})},
+    }
+    cache = StageCache(cache_dir) if cache_dir is not None else None
+    with ProcessPool(workers) as pool:
+        inputs["pool"] = pool
+        values, timings, cache_status = run_stages(
+            build_stages(), inputs, targets=targets,
+            max_workers=max_workers, on_stage_done=on_stage_done, cache=cache,
+            on_stage_start=on_stage_start,
+        )
+
+    total_responses = values["response_count"] if "response_count" in values else 0
+
+    results = {
+        "analysis_date": datetime.now().isoformat(),
+        "total_responses": total_responses,
+    }
+    for name in LAYER_OUTPUTS:
+        if values.get(name) is not None:
+            results[name] = values[name]
+    if "layer5_insights" not in values and any(part in values for part in _INSIGHT_PARTS):
+        results["layer5_insights"] = {part: values[part] for part in _INSIGHT_PARTS if part in values}
+    if values.get("weighting") is not None:
+        results["weighting"] = values["weighting"]
+    results["stage_timings"] = {name: round(seconds, 6) for name, seconds in timings.items()}
+    if cache is not None:
+        results["stage_cache"] = cache_status
+    return results
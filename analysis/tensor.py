@@ -0,0 +1,294 @@
+"""
+SD評価・購買意欲のテンソル表現
+
+回答テーブルの sd_{サンプル}_{軸} / purchase_intent_{サンプル} 列を
+(回答者, サンプル, 変数) の int8 配列と欠損マスクに変換し、
+平均・標準偏差・最小値・最大値・相関行列を1回の走査で求める。
+変数は SD評価軸（axes の順）の後に購買意欲を並べたもの。
+ウェイトバックの重み（平均1の頻度重み）を与えた場合は、件数・和をすべて重み付きで求める。
+"""
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .parallel import split
+
+if TYPE_CHECKING:
+    from .parallel import ProcessPool
+
+
+# 1回の走査で処理する回答者数（作業用配列のメモリ使用量を抑える）
+DEFAULT_CHUNK_SIZE = 8192
+
+# 購買意欲の度数を数える最大値
+_MAX_INTENT = 127
+
+
+@dataclass
+class RatingTensor:
+    """回答者 × サンプル × 変数 の評価値"""
+
+    samples: List[str]
+    axis_ids: List[str]
+    values: np.ndarray   # int8 (N, サンプル数, 軸数 + 1)、欠損は0
+    mask: np.ndarray     # bool (N, サンプル数, 軸数 + 1)、回答ありがTrue
+    present: np.ndarray  # bool (サンプル数, 軸数 + 1)、元のテーブルに列があるか
+
+    @classmethod
+    def from_table(cls, df: pd.DataFrame, samples: List[str], axes: List[Dict]) -> "RatingTensor":
+        """
+        回答テーブルからテンソルを作成
+
+        Args:
+            df: 回答テーブル
+            samples: サンプルIDのリスト
+            axes: SD評価軸の定義
+
+        Returns:
+            評価値テンソル
+        """
+        axis_ids = [axis["id"] for axis in axes]
+        columns = [
+            column
+            for sample_id in samples
+            for column in [f"sd_{sample_id}_{axis_id}" for axis_id in axis_ids] + [f"purchase_intent_{sample_id}"]
+        ]
+        shape = (len(df), len(samples), len(axis_ids) + 1)
+        raw = df.reindex(columns=columns).to_numpy(dtype=np.float32, na_value=np.nan).reshape(shape)
+        mask = ~np.isnan(raw)
+        values = np.where(mask, raw, 0).astype(np.int8)
+        present = np.asarray([column in df.columns for column in columns]).reshape(shape[1:])
+        return cls(list(samples), axis_ids, values, mask, present)
+
+    @property
+    def n_variables(self) -> int:
+        """サンプルあたりの変数の数（SD評価軸 + 購買意欲）"""
+        return len(self.axis_ids) + 1
+
+    def moments(self, chunk_size: int = DEFAULT_CHUNK_SIZE, weights: Optional[np.ndarray] = None) -> "RatingMoments":
+        """
+        ペアワイズの件数・和・平方和・積和と最小値・最大値、購買意欲の度数を1回の走査で計算
+
+        評価値は小さな整数なので、重みがない場合の float64 の和は 2**53 まで誤差なく求まる。
+
+        Args:
+            chunk_size: 1回に処理する回答者数
+            weights: 回答者の重み (N,)（Noneの場合は重み付けしない）。件数・和・度数は重みの和になる
+
+        Returns:
+            集計量
+        """
+        n_samples, n_vars = self.values.shape[1:]
+        pair_shape = (n_samples, n_vars, n_vars)
+        n = np.zeros(pair_shape)
+        sx = np.zeros(pair_shape)
+        sxx = np.zeros(pair_shape)
+        sxy = np.zeros(pair_shape)
+        vmin = np.full((n_samples, n_vars), np.iinfo(np.int8).max, dtype=np.int8)
+        vmax = np.full((n_samples, n_vars), np.iinfo(np.int8).min, dtype=np.int8)
+        intent_counts = np.zeros((n_samples, _MAX_INTENT + 1), dtype=np.int64 if weights is None else np.float64)
+        sample_offset = np.arange(n_samples) * (_MAX_INTENT + 1)
+
+        for start in range(0, len(self.values), chunk_size):
+            values = self.values[start:start + chunk_size]
+            mask = self.mask[start:start + chunk_size]
+            # (サンプル, 回答者, 変数) の配列に並べ替え、サンプルごとの行列積でペアワイズの和を求める
+            m = np.ascontiguousarray(mask.transpose(1, 0, 2), dtype=np.float64)
+            x = np.ascontiguousarray(values.transpose(1, 0, 2), dtype=np.float64)
+            if weights is None:
+                w = None
+                xw, mw = x, m
+            else:
+                w = np.asarray(weights[start:start + chunk_size], dtype=np.float64)
+                xw, mw = x * w[None, :, None], m * w[None, :, None]
+            # 左側の因子だけに重みを掛け、ペアワイズの重み付き和を求める
+            xt = x.transpose(0, 2, 1)
+            xwt = xw.transpose(0, 2, 1)
+            n += mw.transpose(0, 2, 1) @ m
+            sx += xwt @ m
+            sxx += (xwt * xt) @ m
+            sxy += xwt @ x
+
+            # 欠損は0で埋めてあるため、最小値は欠損を最大値に置き換えて求める
+            vmin = np.minimum(vmin, np.where(mask, values, np.iinfo(np.int8).max).min(axis=0))
+            vmax = np.maximum(vmax, np.where(mask, values, np.iinfo(np.int8).min).max(axis=0))
+
+            intent = values[:, :, -1].astype(np.int64)
+            intent_mask = mask[:, :, -1] & (intent >= 0)
+            flat = (intent + sample_offset)[intent_mask]
+            flat_weights = None if w is None else np.broadcast_to(w[:, None], intent.shape)[intent_mask]
+            intent_counts += np.bincount(
+                flat, weights=flat_weights, minlength=intent_counts.size
+            ).reshape(intent_counts.shape)
+
+        count = np.diagonal(n, axis1=1, axis2=2)
+        vmin = np.where(count > 0, vmin, np.nan)
+        vmax = np.where(count > 0, vmax, np.nan)
+        return RatingMoments(
+            self.samples, self.axis_ids, self.present.copy(),
+            n, sx, sxx, sxy, vmin, vmax, intent_counts,
+        )
+
+
+    def parallel_moments(self, pool: "ProcessPool", weights: Optional[np.ndarray] = None) -> "RatingMoments":
+        """
+        回答者を分割して moments() をプロセス並列に計算し、合算
+
+        重みがない場合、和はすべて整数値のため、分割によらず moments() と同じ結果になる。
+
+        Args:
+            pool: プロセスプール
+            weights: 回答者の重み (N,)（Noneの場合は重み付けしない）
+
+        Returns:
+            集計量
+        """
+        blocks = split(len(self.values), pool.workers)
+        if len(blocks) <= 1:
+            return self.moments(weights=weights)
+        arrays = {"values": self.values, "mask": self.mask}
+        if weights is not None:
+            arrays["weights"] = np.asarray(weights, dtype=np.float64)
+        shared = pool.share(**arrays)
+        tasks = [(self.samples, self.axis_ids, self.present, int(block[0]), int(block[-1]) + 1) for block in blocks]
+        return RatingMoments.combine(pool.map(_moments_task, shared, tasks))
+
+
+def _moments_task(arrays: Dict[str, np.ndarray], task: Tuple[List[str], List[str], np.ndarray, int, int]) -> "RatingMoments":
+    """回答者の範囲 [start, stop) の集計量（ワーカープロセスで実行）"""
+    samples, axis_ids, present, start, stop = task
+    tensor = RatingTensor(samples, axis_ids, arrays["values"][start:stop], arrays["mask"][start:stop], present)
+    weights = arrays["weights"][start:stop] if "weights" in arrays else None
+    return tensor.moments(weights=weights)
+
+
+def pairwise_correlation(n: np.ndarray, sx: np.ndarray, sxx: np.ndarray, sxy: np.ndarray) -> np.ndarray:
+    """
+    ペアワイズの件数・和・平方和・積和からピアソン相関行列を計算
+
+    Args:
+        n, sx, sxx, sxy: (..., 変数i, 変数j) の集計量（RatingMoments を参照）
+
+    Returns:
+        相関行列 (..., 変数, 変数)（件数が2未満・分散0のペアは NaN）
+    """
+    sy = np.swapaxes(sx, -1, -2)
+    syy = np.swapaxes(sxx, -1, -2)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cov = sxy - sx * sy / n
+        var_x = sxx - sx * sx / n
+        var_y = syy - sy * sy / n
+        corr = cov / np.sqrt(var_x * var_y)
+    corr[(n < 2) | ~np.isfinite(corr)] = np.nan
+    return np.clip(corr, -1.0, 1.0)
+
+
+@dataclass
+class RatingMoments:
+    """RatingTensor.moments() の結果
+
+    ペアワイズの配列は (サンプル, 変数i, 変数j) で、変数i・jの両方に回答がある回答者について
+    n: 件数, sx: 変数iの和, sxx: 変数iの平方和, sxy: 変数iと変数jの積和。
+    重み付きの場合はいずれも重み付きの和で、分散の分母は頻度重みとして n - 1 とする。
+    """
+
+    samples: List[str]
+    axis_ids: List[str]
+    present: np.ndarray
+    n: np.ndarray
+    sx: np.ndarray
+    sxx: np.ndarray
+    sxy: np.ndarray
+    min: np.ndarray
+    max: np.ndarray
+    intent_counts: np.ndarray
+
+    @classmethod
+    def combine(cls, parts: Sequence["RatingMoments"]) -> "RatingMoments":
+        """
+        回答者を分割して求めた集計量を合算
+
+        Args:
+            parts: 同じサンプル・変数の集計量のリスト（present はいずれかの部分に列があれば True）
+
+        Returns:
+            合算した集計量
+        """
+        first = parts[0]
+        return cls(
+            first.samples, first.axis_ids, np.logical_or.reduce([part.present for part in parts]),
+            sum(part.n for part in parts),
+            sum(part.sx for part in parts),
+            sum(part.sxx for part in parts),
+            sum(part.sxy for part in parts),
+            np.fmin.reduce([part.min for part in parts]),
+            np.fmax.reduce([part.max for part in parts]),
+            sum(part.intent_counts for part in parts),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSONに保存できる形式に変換（増分分析の状態の保存用）"""
+        return {
+            "samples": self.samples,
+            "axis_ids": self.axis_ids,
+            "present": self.present.tolist(),
+            "n": self.n.tolist(),
+            "sx": self.sx.tolist(),
+            "sxx": self.sxx.tolist(),
+            "sxy": self.sxy.tolist(),
+            "min": np.where(np.isnan(self.min), None, self.min).tolist(),
+            "max": np.where(np.isnan(self.max), None, self.max).tolist(),
+            "intent_counts": self.intent_counts.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RatingMoments":
+        """to_dict() の結果から復元"""
+        return cls(
+            list(data["samples"]), list(data["axis_ids"]), np.asarray(data["present"], dtype=bool),
+            *(np.asarray(data[key], dtype=np.float64) for key in ("n", "sx", "sxx", "sxy", "min", "max")),
+            np.asarray(data["intent_counts"]),
+        )
+
+    def column_name(self, sample_index: int, variable_index: int) -> str:
+        """変数に対応する元の列名"""
+        sample_id = self.samples[sample_index]
+        if variable_index == len(self.axis_ids):
+            return f"purchase_intent_{sample_id}"
+        return f"sd_{sample_id}_{self.axis_ids[variable_index]}"
+
+    def count(self) -> np.ndarray:
+        """変数ごとの回答数 (サンプル, 変数)"""
+        return np.diagonal(self.n, axis1=1, axis2=2)
+
+    def mean(self) -> np.ndarray:
+        """変数ごとの平均 (サンプル, 変数)"""
+        n = self.count()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.diagonal(self.sx, axis1=1, axis2=2) / n
+
+    def std(self) -> np.ndarray:
+        """変数ごとの不偏標準偏差 (サンプル, 変数)（pandas の std() と同じ ddof=1）"""
+        n = self.count()
+        s = np.diagonal(self.sx, axis1=1, axis2=2)
+        ss = np.diagonal(self.sxx, axis1=1, axis2=2)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            var = (ss - s * s / n) / (n - 1)
+        return np.sqrt(np.maximum(var, 0))
+
+    def correlation(self) -> np.ndarray:
+        """
+        ペアワイズのピアソン相関行列 (サンプル, 変数, 変数)
+
+        pandas の DataFrame.corr() と同様に、各ペアで両方に回答がある回答者のみを使う。
+        """
+        return pairwise_correlation(self.n, self.sx, self.sxx, self.sxy)
+
+    def intent_distribution(self, sample_index: int) -> Dict[int, int]:
+        """購買意欲の度数（度数の降順、pandas の value_counts().to_dict() と同じ形式。重み付きの場合は重みの和）"""
+        counts = self.intent_counts[sample_index]
+        values = np.flatnonzero(counts)
+        order = np.argsort(-counts[values], kind="stable")
+        return {int(values[i]): counts[values[i]].item() for i in order}
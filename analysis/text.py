@@ -0,0 +1,529 @@
+"""
+自由記述のテキスト分析（文字 n-gram TF-IDF）
+
+サンプルごとの自由コメント・インタビュー回答（印象に残った理由・理想の音）・全体の感想を
+1つの文書集合にまとめ、文字 n-gram の TF-IDF 疎行列（文書 × 語）を1回の走査で作る。
+分かち書きの辞書を使わず、句読点・記号で区切った文字列の n-gram を語とする
+（語の境界をまたぐ断片と、定型句を含む n-gram は語彙から除く）。
+サンプル別・属性別の特徴語はグループの one-hot 行列との積（G^T X）で求め、
+上位語の用例（KWIC: 前後の文脈）を元の文から取り出す。
+回答者数が最小セルサイズ未満のグループの特徴語は秘匿し、用例には回答者を識別する情報を含めない。
+
+学習した語彙と IDF は JSON に保存し、次回以降は同じ語彙で変換する
+（回答が増えても語のIDを固定し、前回の結果と比較できるようにする）。
+語彙には学習した文書集合の指紋を保存し、今回の文書集合の先頭がそれと一致しない場合
+（別の回答データを分析した場合など）は学習し直す。
+"""
+import hashlib
+import json
+import re
+import unicodedata
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import CountVectorizer, TfidfTransformer
+
+from .clustering import CLUSTER_COLUMN
+from .laddering import group_indicator
+from .segmentation import DEFAULT_MIN_CELL_SIZE
+
+
+# 分析する自由記述（結果のキー）。free_comment はサンプルごと、impression_detail は最も印象に残ったサンプルの回答
+TEXT_FIELDS = ("free_comment", "impression_detail", "ideal_sound", "overall_impression")
+
+# 保存する語彙の形式のバージョン（変更時は保存済みの語彙を使わずに学習し直す）
+VOCABULARY_VERSION = 2
+
+# 文字 n-gram の長さ（最小, 最大）
+DEFAULT_NGRAM_RANGE = (2, 3)
+
+# 語彙に含める語の最小文書数・最大文書割合・最大語数
+DEFAULT_MIN_DF = 2
+DEFAULT_MAX_DF = 0.5
+DEFAULT_MAX_FEATURES = 100_000
+
+# グループごとに出力する特徴語の数
+DEFAULT_TOP_TERMS = 20
+
+# KWIC: 前後の文脈の文字数と、語ごとの用例数
+DEFAULT_KWIC_WIDTH = 15
+DEFAULT_KWIC_LIMIT = 5
+
+# 保存済みの語彙を使う文書数の上限（学習時の文書数に対する倍率。超えた場合は学習し直す）
+DEFAULT_REFIT_GROWTH = 2.0
+
+# ひらがなだけの n-gram（「ました」「います」など活用語尾・助詞の断片）を語彙から除くか（既定）
+DEFAULT_SKIP_HIRAGANA = True
+
+# 語の境界をまたぐ n-gram（「と思」「う少」「この走」「行音は」「感で」など、前後の語の送り仮名・助詞を含む断片）を除くか（既定）
+DEFAULT_SKIP_FRAGMENTS = True
+
+# 定型句（「〜と思います」「〜と感じました」など）の一部。これを含む n-gram は語彙から除く
+DEFAULT_STOP_WORDS = ("思", "感じ")
+
+# n-gram の区切り（空白・句読点・括弧・記号。長音符「ー」は語の一部として残す）
+_BOUNDARY = re.compile(r"[\s!-/:-@\[-`{-~　-〿・！-／：-＠［-｀｛-･]+")
+
+# 英数字の連続（n-gram に分けずに1語とする）と、それ以外の文字の連続
+_RUNS = re.compile(r"([a-z0-9]+)")
+
+# ひらがな（と長音符）だけの文字列
+_HIRAGANA = re.compile(r"[ぁ-ゖゝゞー]+")
+
+# 語の境界をまたぐ n-gram: ひらがなで始まる（前の語の送り仮名・助詞から始まる）か、
+# 漢字・カタカナ・英数字の直後に助詞・助動詞が続く（「入を検」「音が理」）か、助詞・助動詞で終わる（「良いと」「的な」）
+_FRAGMENT = re.compile(r"^[ぁ-ゖゝゞ]|[^ぁ-ゖゝゞ][はがをにでとのもへやだ]|[はがをにでとのもへやだな]$")
+
+
+def normalize_text(text: Any) -> str:
+    """
+    自由記述を正規化（NFKC で全角英数を半角に、英字を小文字に、前後の空白を除く）
+
+    Returns:
+        正規化した文字列（文字列でない値は空文字列）
+    """
+    if not isinstance(text, str):
+        return ""
+    return unicodedata.normalize("NFKC", text).lower().strip()
+
+
+def char_ngrams(
+    text: str,
+    ngram_range: Tuple[int, int] = DEFAULT_NGRAM_RANGE,
+    skip_hiragana: bool = DEFAULT_SKIP_HIRAGANA,
+    skip_fragments: bool = DEFAULT_SKIP_FRAGMENTS,
+    stop_words: Sequence[str] = DEFAULT_STOP_WORDS,
+) -> List[str]:
+    """
+    句読点・記号で区切った各部分の文字 n-gram（CountVectorizer の analyzer として使う）
+
+    英数字の連続（"model3"、"ev" など）は n-gram に分けずに1語とする。
+
+    Args:
+        text: 正規化済みの文字列
+        ngram_range: n-gram の長さ（最小, 最大）
+        skip_hiragana: ひらがなだけの n-gram を除くか
+        skip_fragments: 語の境界をまたぐ n-gram を除くか（英数字の語は対象外）
+        stop_words: これを含む n-gram を除く（定型句の一部）
+
+    Returns:
+        n-gram のリスト（出現順、重複を含む）
+    """
+    low, high = ngram_range
+    grams: List[str] = []
+    for segment in _BOUNDARY.split(text):
+        # split() の結果は 英数字以外, 英数字, 英数字以外, ... の順に並ぶ
+        for position, part in enumerate(_RUNS.split(segment)):
+            length = len(part)
+            if position % 2:
+                grams.append(part)
+                continue
+            for n in range(low, min(high, length) + 1):
+                grams.extend(part[i:i + n] for i in range(length - n + 1))
+    if skip_hiragana:
+        grams = [gram for gram in grams if not _HIRAGANA.fullmatch(gram)]
+    if skip_fragments:
+        grams = [gram for gram in grams if not _FRAGMENT.search(gram)]
+    if stop_words:
+        grams = [gram for gram in grams if not any(word in gram for word in stop_words)]
+    return grams
+
+
+@dataclass
+class TextDocuments:
+    """自由記述の文書集合（1文書 = 1回答者の1項目）"""
+
+    texts: List[str]                 # 正規化済みの本文
+    fields: np.ndarray               # int8 (D,)、TEXT_FIELDS の位置
+    samples: List[Optional[str]]     # 対象のサンプル（サンプルによらない項目は None）
+    respondents: np.ndarray          # int64 (D,)、records 上の位置
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+
+def _record_texts(record: Dict[str, Any], samples: Sequence[str]) -> Iterator[Tuple[int, Optional[str], Any]]:
+    """1件の回答データから (項目の位置, サンプル, 本文) を取り出す"""
+    free_comments = (record.get("evaluations") or {}).get("free_comments") or {}
+    for sample_id in samples:
+        yield 0, sample_id, free_comments.get(sample_id)
+    interview = record.get("interview") or {}
+    topic1 = interview.get("topic1") or {}
+    yield 1, topic1.get("most_impressive"), topic1.get("impression_detail")
+    yield 2, None, (interview.get("topic3") or {}).get("ideal_sound")
+    yield 3, None, (record.get("summary") or {}).get("overall_impression")
+
+
+def collect_documents(records: List[Dict[str, Any]], samples: Sequence[str]) -> TextDocuments:
+    """
+    回答データから自由記述を集める（空欄の回答は除く）
+
+    Args:
+        records: 回答データ
+        samples: 分析対象のサンプルID（free_comment を集めるサンプル）
+
+    Returns:
+        文書集合
+    """
+    texts: List[str] = []
+    fields: List[int] = []
+    document_samples: List[Optional[str]] = []
+    respondents: List[int] = []
+    for position, record in enumerate(records):
+        for field, sample_id, text in _record_texts(record, samples):
+            text = normalize_text(text)
+            if not text:
+                continue
+            texts.append(text)
+            fields.append(field)
+            document_samples.append(sample_id)
+            respondents.append(position)
+    return TextDocuments(
+        texts,
+        np.asarray(fields, dtype=np.int8),
+        document_samples,
+        np.asarray(respondents, dtype=np.int64),
+    )
+
+
+def vectorizer_settings(options: Dict[str, Any]) -> Dict[str, Any]:
+    """語彙の学習の設定（保存済みの語彙が使えるかの判定に使う）"""
+    return {
+        "version": VOCABULARY_VERSION,
+        "ngram_range": list(options.get("ngram_range", DEFAULT_NGRAM_RANGE)),
+        "min_df": options.get("min_df", DEFAULT_MIN_DF),
+        "max_df": options.get("max_df", DEFAULT_MAX_DF),
+        "max_features": options.get("max_features", DEFAULT_MAX_FEATURES),
+        "skip_hiragana": options.get("skip_hiragana", DEFAULT_SKIP_HIRAGANA),
+        "skip_fragments": options.get("skip_fragments", DEFAULT_SKIP_FRAGMENTS),
+        "stop_words": list(options.get("stop_words", DEFAULT_STOP_WORDS)),
+    }
+
+
+def _count_vectorizer(settings: Dict[str, Any], vocabulary: Optional[List[str]] = None) -> CountVectorizer:
+    """文字 n-gram の CountVectorizer（vocabulary を指定した場合は学習せずに変換する）"""
+    analyzer = partial(
+        char_ngrams, ngram_range=tuple(settings["ngram_range"]), skip_hiragana=settings["skip_hiragana"],
+        skip_fragments=settings["skip_fragments"], stop_words=tuple(settings["stop_words"]),
+    )
+    if vocabulary is not None:
+        return CountVectorizer(analyzer=analyzer, vocabulary=vocabulary, dtype=np.float32)
+    return CountVectorizer(
+        analyzer=analyzer, min_df=settings["min_df"], max_df=settings["max_df"],
+        max_features=settings["max_features"], dtype=np.float32,
+    )
+
+
+def corpus_fingerprint(texts: Sequence[str]) -> str:
+    """文書集合の指紋（本文の並びの SHA-256）"""
+    digest = hashlib.sha256()
+    for text in texts:
+        encoded = text.encode("utf-8")
+        digest.update(len(encoded).to_bytes(8, "little"))
+        digest.update(encoded)
+    return digest.hexdigest()
+
+
+def load_vocabulary(path: Path, settings: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    保存済みの語彙を読み込み
+
+    Returns:
+        {"settings", "terms", "idf", "documents", "corpus"}（ファイルがない・設定が異なる場合はNone）
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if saved.get("settings") != settings or not saved.get("terms"):
+        return None
+    return saved
+
+
+def save_vocabulary(
+    path: Path, settings: Dict[str, Any], terms: List[str], idf: np.ndarray, documents: int, corpus: str
+) -> None:
+    """学習した語彙と IDF を、学習した文書集合の指紋とともに保存（一時ファイルに書いてから置き換える）"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {"settings": settings, "terms": terms, "idf": idf.tolist(), "documents": documents, "corpus": corpus},
+            f, ensure_ascii=False,
+        )
+    tmp_path.replace(path)
+
+
+def vectorize(
+    texts: List[str],
+    options: Optional[Dict[str, Any]] = None,
+    vocabulary_path: Optional[Path] = None,
+) -> Tuple[sparse.csr_matrix, List[str], Dict[str, Any]]:
+    """
+    文書集合を文字 n-gram の TF-IDF 疎行列に変換（全文書を1回だけ走査する）
+
+    TF は 1 + log(出現回数)、各文書の行は L2 正規化する。
+    vocabulary_path に同じ設定の語彙が保存されていればその語彙と IDF で変換し、
+    なければ（または文書数が学習時の refit_growth 倍を超えた場合、先頭の文書が学習した文書集合と
+    一致しない場合は）学習して保存する。
+
+    Args:
+        texts: 正規化済みの本文
+        options: ngram_range, min_df, max_df, max_features, skip_hiragana, skip_fragments, stop_words,
+            refit_growth（省略時は既定値）
+        vocabulary_path: 語彙の保存先（Noneの場合は毎回学習し、保存しない）
+
+    Returns:
+        (文書 × 語 の TF-IDF 行列 float32, 語彙, {"terms", "documents", "reused", "fitted_documents"})
+    """
+    options = options or {}
+    settings = vectorizer_settings(options)
+    saved = load_vocabulary(Path(vocabulary_path), settings) if vocabulary_path is not None else None
+    growth = options.get("refit_growth", DEFAULT_REFIT_GROWTH)
+    if saved is not None and len(texts) > saved["documents"] * growth:
+        saved = None
+    # 学習した文書集合に回答を追加した場合のみ再利用する（別の回答データでは学習し直す）
+    if saved is not None and (
+        len(texts) < saved["documents"] or corpus_fingerprint(texts[:saved["documents"]]) != saved.get("corpus")
+    ):
+        saved = None
+
+    if saved is not None:
+        terms = saved["terms"]
+        counts = _count_vectorizer(settings, terms).transform(texts)
+        transformer = TfidfTransformer(sublinear_tf=True)
+        transformer.idf_ = np.asarray(saved["idf"], dtype=np.float64)
+        fitted_documents = saved["documents"]
+    else:
+        vectorizer = _count_vectorizer(settings)
+        try:
+            counts = vectorizer.fit_transform(texts)
+        except ValueError:
+            # 文書が少なく min_df / max_df を満たす語がない
+            info = {"terms": 0, "documents": len(texts), "reused": False, "fitted_documents": len(texts)}
+            return sparse.csr_matrix((len(texts), 0), dtype=np.float32), [], info
+        terms = vectorizer.get_feature_names_out().tolist()
+        transformer = TfidfTransformer(sublinear_tf=True).fit(counts)
+        fitted_documents = len(texts)
+        if vocabulary_path is not None:
+            save_vocabulary(
+                Path(vocabulary_path), settings, terms, transformer.idf_, fitted_documents, corpus_fingerprint(texts)
+            )
+
+    matrix = sparse.csr_matrix(transformer.transform(counts), dtype=np.float32)
+    info = {
+        "terms": len(terms),
+        "documents": len(texts),
+        "reused": saved is not None,
+        "fitted_documents": fitted_documents,
+    }
+    return matrix, terms, info
+
+
+def _select_terms(
+    scores: np.ndarray,
+    columns: np.ndarray,
+    document_counts: np.ndarray,
+    terms: List[str],
+    top_n: int,
+) -> List[Dict[str, Any]]:
+    """
+    スコアの降順に特徴語を選ぶ（選んだ語と包含関係にある n-gram は重複として除く）
+
+    Args:
+        scores: 候補の語のスコア
+        columns: 候補の語の列番号
+        document_counts: 候補の語を含む文書数
+        terms: 語彙
+        top_n: 選ぶ語の数
+
+    Returns:
+        [{"term", "score", "documents"}, ...]
+    """
+    selected: List[Dict[str, Any]] = []
+    for i in np.lexsort((columns, -scores)):
+        term = terms[columns[i]]
+        if any(term in chosen["term"] or chosen["term"] in term for chosen in selected):
+            continue
+        selected.append({"term": term, "score": float(scores[i]), "documents": int(document_counts[i])})
+        if len(selected) >= top_n:
+            break
+    return selected
+
+
+def top_terms_by_group(
+    matrix: sparse.csr_matrix,
+    presence: sparse.csr_matrix,
+    labels: Sequence[Any],
+    terms: List[str],
+    top_n: int = DEFAULT_TOP_TERMS,
+    respondents: Optional[np.ndarray] = None,
+    min_cell_size: int = 0,
+) -> Dict[Any, Dict[str, Any]]:
+    """
+    グループごとの特徴語（グループ内の文書の平均 TF-IDF が高い語）
+
+    Args:
+        matrix: 文書 × 語 の TF-IDF 行列
+        presence: 文書 × 語 の出現の有無（0/1）
+        labels: 文書ごとのグループ（None の文書は除く）
+        terms: 語彙
+        top_n: グループごとの語の数
+        respondents: 文書ごとの回答者（records 上の位置。min_cell_size の判定に使う）
+        min_cell_size: これ未満の回答者数のグループは特徴語を秘匿する
+
+    Returns:
+        グループ -> {"documents": 文書数, "top_terms": [{"term", "score", "documents"}, ...]}
+        （秘匿するグループは {"documents", "respondents", "suppressed": True}）
+    """
+    indicator, groups = group_indicator(labels)
+    sums = sparse.csr_matrix(indicator.T @ matrix)
+    document_counts = sparse.csr_matrix(indicator.T @ presence)
+    sizes = np.asarray(indicator.sum(axis=0)).ravel()
+    members = indicator.tocsc()
+    result = {}
+    for g, group in enumerate(groups):
+        key = group.item() if isinstance(group, np.generic) else group
+        if respondents is not None and min_cell_size > 0:
+            n_respondents = np.unique(respondents[members.indices[members.indptr[g]:members.indptr[g + 1]]]).size
+            if n_respondents < min_cell_size:
+                result[key] = {"documents": int(sizes[g]), "respondents": int(n_respondents), "suppressed": True}
+                continue
+        start, end = sums.indptr[g], sums.indptr[g + 1]
+        columns = sums.indices[start:end]
+        counts = document_counts[g].toarray().ravel()[columns]
+        result[key] = {
+            "documents": int(sizes[g]),
+            "top_terms": _select_terms(sums.data[start:end] / sizes[g], columns, counts, terms, top_n),
+        }
+    return result
+
+
+def keyword_in_context(
+    texts: Sequence[str],
+    term: str,
+    rows: Sequence[int],
+    width: int = DEFAULT_KWIC_WIDTH,
+) -> List[Dict[str, Any]]:
+    """
+    語の用例（KWIC）を取り出す（文書ごとに最初の出現のみ）
+
+    Args:
+        texts: 正規化済みの本文
+        term: 語
+        rows: 語を含む文書の位置
+        width: 前後の文脈の文字数
+
+    Returns:
+        [{"document": 文書の位置, "left", "keyword", "right"}, ...]
+    """
+    contexts = []
+    for row in rows:
+        text = texts[row]
+        start = text.find(term)
+        if start < 0:
+            continue
+        end = start + len(term)
+        contexts.append({
+            "document": int(row),
+            "left": text[max(start - width, 0):start],
+            "keyword": term,
+            "right": text[end:end + width],
+        })
+    return contexts
+
+
+def analyze_text(
+    records: List[Dict[str, Any]],
+    samples: Sequence[str],
+    segments: Sequence[str] = (),
+    options: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    自由記述の特徴語・用例の分析
+
+    Args:
+        records: 回答データ
+        samples: 分析対象のサンプルID
+        segments: 内訳を出す回答者属性（demographics のキー）
+        options: vectorize() の設定に加え、top_terms, kwic_width, kwic_limit,
+            min_cell_size（サンプル別・属性別の特徴語を秘匿する回答者数。既定は DEFAULT_MIN_CELL_SIZE）,
+            vocabulary_path（語彙の保存先。Noneの場合は保存しない）
+
+    Returns:
+        {"documents": 文書数, "vocabulary": 語彙の情報,
+         "fields": 項目 -> {"documents", "top_terms", "by_sample", 属性 -> 内訳, "kwic": 語 -> 用例}}
+        （by_sample は free_comment / impression_detail のみ。用例は {"left", "keyword", "right", "sample"}）
+    """
+    options = options or {}
+    top_n = options.get("top_terms", DEFAULT_TOP_TERMS)
+    width = options.get("kwic_width", DEFAULT_KWIC_WIDTH)
+    limit = options.get("kwic_limit", DEFAULT_KWIC_LIMIT)
+    min_cell_size = options.get("min_cell_size", DEFAULT_MIN_CELL_SIZE)
+    documents = collect_documents(records, samples)
+    vocabulary_path = options.get("vocabulary_path")
+    matrix, terms, info = vectorize(
+        documents.texts, options, Path(vocabulary_path) if vocabulary_path else None
+    )
+    presence = matrix.copy()
+    presence.data[:] = 1
+    by_column = presence.tocsc()
+    term_index = {term: j for j, term in enumerate(terms)}
+    demographics = [record.get("demographics") or {} for record in records]
+
+    fields: Dict[str, Any] = {}
+    for code, field in enumerate(TEXT_FIELDS):
+        in_field = documents.fields == code
+        if not in_field.any():
+            continue
+        overall = top_terms_by_group(
+            matrix, presence, [field if selected else None for selected in in_field], terms, top_n
+        )[field]
+        summary: Dict[str, Any] = {"documents": overall["documents"], "top_terms": overall["top_terms"]}
+        if any(documents.samples[i] is not None for i in np.flatnonzero(in_field)):
+            summary["by_sample"] = top_terms_by_group(
+                matrix, presence,
+                [sample_id if selected else None for sample_id, selected in zip(documents.samples, in_field)],
+                terms, top_n, documents.respondents, min_cell_size,
+            )
+        for column in segments:
+            summary[column] = top_terms_by_group(
+                matrix, presence,
+                [demographics[p].get(column) if selected else None
+                 for p, selected in zip(documents.respondents, in_field)],
+                terms, top_n, documents.respondents, min_cell_size,
+            )
+
+        kwic = {}
+        for item in overall["top_terms"]:
+            j = term_index[item["term"]]
+            rows = by_column.indices[by_column.indptr[j]:by_column.indptr[j + 1]]
+            rows = np.sort(rows[in_field[rows]])[:limit]
+            contexts = keyword_in_context(documents.texts, item["term"], rows, width)
+            for context in contexts:
+                context["sample"] = documents.samples[context.pop("document")]
+            kwic[item["term"]] = contexts
+        summary["kwic"] = kwic
+        fields[field] = summary
+
+    return {
+        "documents": len(documents),
+        "vocabulary": {**info, "ngram_range": vectorizer_settings(options)["ngram_range"]},
+        "fields": fields,
+    }
+
+
+def run_text(
+    records: List[Dict[str, Any]],
+    samples: List[str],
+    segments: List[Any],
+    text_options: Optional[Dict[str, Any]],
+) -> Dict[str, Any]:
+    """テキスト分析ステージ（単一属性のセグメントごとの内訳を含む。cluster 列は回答テーブルにのみあるため除く）"""
+    columns = [column for column in segments if isinstance(column, str) and column != CLUSTER_COLUMN]
+    return {"text": analyze_text(records, samples, columns, text_options)}
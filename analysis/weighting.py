@@ -0,0 +1,327 @@
+"""
+ウェイトバック（レイキング）
+
+回答者の属性構成（年齢層・性別・地域など）を母集団の構成比に合わせる重みを、
+反復比例当てはめ（IPF / レイキング）で求める。各反復は属性ごとの np.bincount と
+因子の参照だけで行い、回答者についてのループを持たない。
+重みは平均1（合計が回答者数）に正規化した頻度重みとして各レイヤーの集計に渡す。
+極端な重みは上下限で切り詰めてから再度レイキングする（トリミング）。
+最終的な重みは平均1のまま上下限の範囲に収める（切り詰めた分は範囲内の重みに配分する）。
+"""
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+# レイキングの最大反復回数
+DEFAULT_MAX_ITERATIONS = 100
+
+# 収束の判定: 全属性の重み付き構成比と目標構成比の差の最大値
+DEFAULT_TOLERANCE = 1e-6
+
+# トリミング: 平均1の重みの下限・上限
+DEFAULT_TRIM = (0.3, 3.0)
+
+# トリミングと再レイキングを繰り返す最大回数
+DEFAULT_TRIM_ROUNDS = 5
+
+
+@dataclass
+class RakingResult:
+    """rake() の結果"""
+
+    weights: np.ndarray                       # float64 (N,)、平均1
+    iterations: int                           # 全ラウンドの反復回数の合計
+    converged: bool                           # 最終的な重み（トリミング後）の max_error が tolerance 未満か
+    max_error: float                          # 重み付き構成比と目標構成比の差の最大値
+    trimmed: int                              # 最終的な重みが上下限に切り詰められた回答者数
+    errors: List[float] = field(default_factory=list)  # 反復ごとの max_error
+    margins: Dict[str, Dict[Any, Dict[str, float]]] = field(default_factory=dict)
+    unmatched: Dict[str, List[Any]] = field(default_factory=dict)
+
+    def diagnostics(self) -> Dict[str, Any]:
+        """
+        収束・重みの分布の診断情報（JSONに保存できる形式）
+
+        Returns:
+            {"iterations", "converged", "max_error", "trimmed", "effective_n", "design_effect",
+             "min_weight", "max_weight", "errors", "margins", "unmatched"}
+        """
+        w = self.weights
+        n = len(w)
+        sum_w2 = float(np.dot(w, w))
+        effective_n = float(w.sum() ** 2 / sum_w2) if sum_w2 > 0 else 0.0
+        return {
+            "iterations": self.iterations,
+            "converged": self.converged,
+            "max_error": self.max_error,
+            "trimmed": self.trimmed,
+            "effective_n": effective_n,
+            "design_effect": n / effective_n if effective_n > 0 else None,
+            "min_weight": float(w.min()) if n else None,
+            "max_weight": float(w.max()) if n else None,
+            "errors": self.errors,
+            "margins": self.margins,
+            "unmatched": self.unmatched,
+        }
+
+
+def _normalize(weights: np.ndarray) -> np.ndarray:
+    """平均1に正規化"""
+    mean = weights.mean() if len(weights) else 1.0
+    return weights / mean if mean > 0 else weights
+
+
+def trim_weights(weights: np.ndarray, low: float, high: float) -> np.ndarray:
+    """
+    平均1の重みを [low, high] に収める
+
+    clip(c * weights, low, high) の平均が1になる倍率 c を二分法で求める
+    （平均は c について単調増加で、下限が1以下・上限が1以上なら解がある）。
+    上下限に切り詰めた分は、範囲内の重みを一様に拡大・縮小して配分することになる。
+
+    Args:
+        weights: 重み（正の値）
+        low: 下限（1以下）
+        high: 上限（1以上）
+
+    Returns:
+        平均1で、すべて [low, high] に収まる重み
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    positive = weights[weights > 0]
+    if not len(positive):
+        return np.full(len(weights), 1.0)
+    # c が lower 以下なら全員が下限、upper 以上なら全員が上限（正の重み）になる
+    lower, upper = low / positive.max(), high / positive.min()
+    for _ in range(DEFAULT_MAX_ITERATIONS):
+        scale = 0.5 * (lower + upper)
+        if np.clip(scale * weights, low, high).mean() < 1.0:
+            lower = scale
+        else:
+            upper = scale
+    scaled = scale * weights
+    trimmed = np.clip(scaled, low, high)
+    # 二分法の誤差は範囲内の重みで補正する
+    free = (scaled > low) & (scaled < high)
+    if free.any():
+        trimmed[free] *= (len(weights) - trimmed[~free].sum()) / trimmed[free].sum()
+    return np.clip(trimmed, low, high)
+
+
+def _margin_errors(
+    weights: np.ndarray,
+    codes: Sequence[np.ndarray],
+    shares: Sequence[np.ndarray],
+) -> float:
+    """全属性の重み付き構成比と目標構成比の差の最大値（属性が欠損の回答者は除く）"""
+    error = 0.0
+    for c, share in zip(codes, shares):
+        valid = c >= 0
+        totals = np.bincount(c[valid], weights=weights[valid], minlength=len(share))
+        total = totals.sum()
+        if total > 0:
+            error = max(error, float(np.abs(totals / total - share).max()))
+    return error
+
+
+def rake_codes(
+    codes: Sequence[np.ndarray],
+    shares: Sequence[np.ndarray],
+    base_weights: Optional[np.ndarray] = None,
+    max_iterations: int = DEFAULT_MAX_ITERATIONS,
+    tolerance: float = DEFAULT_TOLERANCE,
+) -> Tuple[np.ndarray, int, bool, List[float]]:
+    """
+    属性のコードと目標構成比から、レイキングで重みを求める
+
+    属性が欠損（コード -1）の回答者は、その属性の調整では重みを変えない。
+
+    Args:
+        codes: 属性ごとのコード int (N,)（0〜カテゴリ数-1、欠損は -1）
+        shares: 属性ごとの目標構成比 (カテゴリ数,)（合計1）
+        base_weights: 初期の重み（Noneの場合は全員1）
+        max_iterations: 最大反復回数
+        tolerance: 収束の判定に使う構成比の差
+
+    Returns:
+        (重み（平均1）, 反復回数, 収束したか, 反復ごとの構成比の差の最大値)
+    """
+    n = len(codes[0]) if codes else 0
+    weights = np.ones(n) if base_weights is None else np.asarray(base_weights, dtype=float).copy()
+    valid = [c >= 0 for c in codes]
+    errors: List[float] = []
+    for iteration in range(1, max_iterations + 1):
+        for c, share, v in zip(codes, shares, valid):
+            totals = np.bincount(c[v], weights=weights[v], minlength=len(share))
+            with np.errstate(invalid="ignore", divide="ignore"):
+                factor = np.where(totals > 0, share * totals.sum() / totals, 1.0)
+            weights[v] *= factor[c[v]]
+        errors.append(_margin_errors(weights, codes, shares))
+        if errors[-1] < tolerance:
+            return _normalize(weights), iteration, True, errors
+    return _normalize(weights), max_iterations, False, errors
+
+
+def margin_codes(
+    table: pd.DataFrame,
+    targets: Mapping[str, Mapping[Any, float]],
+) -> Tuple[List[np.ndarray], List[np.ndarray], Dict[str, List[Any]], Dict[str, List[Any]]]:
+    """
+    回答テーブルの属性列を目標のカテゴリ順のコードに変換
+
+    回答のないカテゴリは目標から除き、残りのカテゴリで構成比を合計1に正規化する。
+    目標にない値（「回答しない」など）は欠損として扱う。
+
+    Args:
+        table: 回答テーブル
+        targets: 属性列名 -> カテゴリ -> 目標構成比
+
+    Returns:
+        (コードのリスト, 構成比のリスト, 属性列名 -> 使ったカテゴリ, 属性列名 -> 回答がなく除いたカテゴリ)
+    """
+    codes, shares, categories, unmatched = [], [], {}, {}
+    for column, target in targets.items():
+        levels = list(target)
+        c = pd.Categorical(table[column], categories=levels).codes.astype(np.int64)
+        counts = np.bincount(c[c >= 0], minlength=len(levels))
+        keep = np.flatnonzero(counts > 0)
+        if len(keep) < len(levels):
+            unmatched[column] = [levels[i] for i in np.flatnonzero(counts == 0)]
+            remap = np.full(len(levels), -1, dtype=np.int64)
+            remap[keep] = np.arange(len(keep))
+            c = np.where(c >= 0, remap[np.maximum(c, 0)], -1)
+        share = np.asarray([float(target[levels[i]]) for i in keep])
+        codes.append(c)
+        shares.append(share / share.sum() if share.sum() > 0 else share)
+        categories[column] = [levels[i] for i in keep]
+    return codes, shares, categories, unmatched
+
+
+def rake(
+    table: pd.DataFrame,
+    targets: Mapping[str, Mapping[Any, float]],
+    max_iterations: int = DEFAULT_MAX_ITERATIONS,
+    tolerance: float = DEFAULT_TOLERANCE,
+    trim: Optional[Tuple[float, float]] = DEFAULT_TRIM,
+    trim_rounds: int = DEFAULT_TRIM_ROUNDS,
+) -> RakingResult:
+    """
+    回答テーブルの属性構成を目標構成比に合わせる重みを求める
+
+    レイキングの後、重みが trim の範囲を外れる回答者がいれば切り詰めて再度レイキングする
+    （最大 trim_rounds 回）。それでも範囲を外れる重みは trim_weights() で平均1のまま範囲内に収め、
+    上下限に切り詰めた回答者数を trimmed に記録する。
+    converged は最後のレイキングではなく、切り詰めて正規化した最終的な重みの構成比の差で判定する。
+
+    Args:
+        table: 回答テーブル
+        targets: 属性列名 -> カテゴリ -> 目標構成比
+        max_iterations: 1回のレイキングの最大反復回数
+        tolerance: 収束の判定に使う構成比の差
+        trim: 平均1の重みの (下限, 上限)（Noneの場合は切り詰めない。下限は1以下、上限は1以上）
+        trim_rounds: トリミングと再レイキングの最大回数
+
+    Returns:
+        重みと診断情報
+    """
+    if trim is not None and not trim[0] <= 1.0 <= trim[1]:
+        raise ValueError(f"重みの上下限は平均1を含む範囲で指定してください: {trim}")
+    codes, shares, categories, unmatched = margin_codes(table, targets)
+    weights, iterations, _, errors = rake_codes(codes, shares, None, max_iterations, tolerance)
+    trimmed = 0
+    if trim is not None:
+        low, high = trim
+        for _ in range(trim_rounds):
+            outside = (weights < low) | (weights > high)
+            trimmed = int(outside.sum())
+            if not trimmed:
+                break
+            weights, more, _, more_errors = rake_codes(
+                codes, shares, np.clip(weights, low, high), max_iterations, tolerance
+            )
+            iterations += more
+            errors += more_errors
+        # 再レイキングで範囲を外れた分は切り詰める（構成比の差は max_error に残る）
+        if ((weights < low) | (weights > high)).any():
+            weights = trim_weights(weights, low, high)
+            trimmed = int(((weights <= low) | (weights >= high)).sum())
+        else:
+            trimmed = 0
+    max_error = _margin_errors(weights, codes, shares)
+
+    margins: Dict[str, Dict[Any, Dict[str, float]]] = {}
+    for (column, levels), c, share in zip(categories.items(), codes, shares):
+        valid = c >= 0
+        sample = np.bincount(c[valid], minlength=len(share)).astype(float)
+        weighted = np.bincount(c[valid], weights=weights[valid], minlength=len(share))
+        sample /= max(sample.sum(), 1.0)
+        weighted /= max(weighted.sum(), 1e-300)
+        margins[column] = {
+            level: {"target": float(share[i]), "sample": float(sample[i]), "weighted": float(weighted[i])}
+            for i, level in enumerate(levels)
+        }
+    return RakingResult(
+        weights=weights,
+        iterations=iterations,
+        converged=bool(max_error < tolerance),
+        max_error=max_error,
+        trimmed=trimmed,
+        errors=errors,
+        margins=margins,
+        unmatched=unmatched,
+    )
+
+
+def derive_columns(table: pd.DataFrame, derived: Mapping[str, Tuple[str, Mapping[Any, Any]]]) -> pd.DataFrame:
+    """
+    目標構成比を与える派生属性列（都道府県 -> 地域など）を追加
+
+    Args:
+        table: 回答テーブル
+        derived: 派生列名 -> (元の列名, 元の値 -> 派生列の値)
+
+    Returns:
+        派生列を追加したテーブル（元のテーブルは変更しない）
+    """
+    if not derived:
+        return table
+    table = table.copy(deep=False)
+    for name, (source, mapping) in derived.items():
+        table[name] = table[source].astype(object).map(mapping)
+    return table
+
+
+def run_weighting(table: pd.DataFrame, weighting_options: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    ウェイトバックステージ
+
+    Args:
+        table: 回答テーブル
+        weighting_options: {"targets": 属性列名 -> カテゴリ -> 目標構成比,
+                    "derived": 派生列名 -> (元の列名, 対応表)（省略可）,
+                    "trim": (下限, 上限), "max_iterations", "tolerance"（省略可）}
+            （Noneの場合は重み付けしない）
+
+    Returns:
+        {"weights": 重み（平均1。重み付けしない場合は None）,
+         "weighting": 診断情報（RakingResult.diagnostics()。重み付けしない場合は None）}
+    """
+    if not weighting_options:
+        return {"weights": None, "weighting": None}
+    derived = {name: (source, mapping) for name, (source, mapping) in (weighting_options.get("derived") or {}).items()}
+    targets = dict(weighting_options["targets"])
+    columns = derive_columns(table, derived)
+    missing = [column for column in targets if column not in columns.columns]
+    if missing:
+        raise ValueError(f"ウェイトバックの属性列が回答データにありません: {', '.join(missing)}")
+    trim = weighting_options.get("trim", DEFAULT_TRIM)
+    result = rake(
+        columns, targets,
+        max_iterations=weighting_options.get("max_iterations", DEFAULT_MAX_ITERATIONS),
+        tolerance=weighting_options.get("tolerance", DEFAULT_TOLERANCE),
+        trim=tuple(trim) if trim is not None else None,
+    )
+    return {"weights": result.weights, "weighting": result.diagnostics()}
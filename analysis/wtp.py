@@ -0,0 +1,364 @@
+"""
+WTP（追加で支払ってもよい金額）の区間打ち切り推定
+
+WTP は選択肢（"1万円まで" など）のどれか1つとして回答されるため、回答者の真の WTP は
+「選んだ金額以上、次に高い選択肢の金額未満」の区間にあるとみなし（支払カード方式）、
+対数正規分布を最尤法（Fisher のスコア法）で当てはめて WTP の平均・中央値と信頼区間を求める。
+尤度は選択肢ごとの回答者数（重み付けした場合は重みの和）だけで決まるので、
+全体・セグメントの水準・ブートストラップの再標本の度数をまとめた配列 (..., 選択肢数) について一括で当てはめる。
+"""
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import special, stats
+
+from .clustering import assign_clusters
+from .segmentation import DEFAULT_MIN_CELL_SIZE, SegmentSpec
+from .significance import segment_groups
+
+
+# 信頼区間の信頼水準
+DEFAULT_CONFIDENCE = 0.95
+
+# スコア法の反復回数の上限と収束判定の閾値（パラメータの変化量）
+DEFAULT_MAX_ITER = 100
+DEFAULT_TOL = 1e-9
+
+# 1回の反復でのパラメータ（対数スケールの位置・尺度の対数）の変化量の上限
+_MAX_STEP = 1.0
+
+# 選択肢の金額（"3万円まで" -> 30000、"0円（...）" -> 0）
+_AMOUNT = re.compile(r"(\d+(?:\.\d+)?)\s*(万)?円")
+
+
+def parse_amount(label: str) -> float:
+    """
+    選択肢の文字列から金額（円）を取り出す
+
+    Raises:
+        ValueError: 金額が含まれない場合
+    """
+    match = _AMOUNT.search(label)
+    if match is None:
+        raise ValueError(f"WTPの選択肢から金額を読み取れません: {label}")
+    return float(match.group(1)) * (10_000 if match.group(2) else 1)
+
+
+def wtp_intervals(labels: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    選択肢を WTP の区間 [下限, 上限) に変換
+
+    選択肢は金額の昇順に並んでいるものとし、各選択肢の区間は「その金額以上、次の選択肢の金額未満」、
+    最後の選択肢（"30万円以上" など）は上限なしとする。
+
+    Args:
+        labels: WTPの選択肢（config.WTP_OPTIONS）
+
+    Returns:
+        (下限 (選択肢数,), 上限 (選択肢数,)、上限なしは inf)
+
+    Raises:
+        ValueError: 金額が読み取れない、または昇順でない場合
+    """
+    lower = np.array([parse_amount(label) for label in labels])
+    if np.any(np.diff(lower) <= 0):
+        raise ValueError(f"WTPの選択肢が金額の昇順になっていません: {list(labels)}")
+    upper = np.append(lower[1:], np.inf)
+    return lower, upper
+
+
+def wtp_codes(table: pd.DataFrame, samples: List[str], labels: Sequence[str]) -> np.ndarray:
+    """
+    回答テーブルの wtp_{サンプル} 列を選択肢の番号に変換
+
+    Returns:
+        int8 (N, サンプル数)、欠損・選択肢にない値・列がない場合は -1
+    """
+    codes = np.full((len(table), len(samples)), -1, dtype=np.int8)
+    for s, sample_id in enumerate(samples):
+        column = f"wtp_{sample_id}"
+        if column in table.columns:
+            codes[:, s] = pd.Categorical(table[column], categories=list(labels)).codes
+    return codes
+
+
+def bracket_counts(
+    codes: np.ndarray,
+    n_brackets: int,
+    groups: List[Tuple[str, str, np.ndarray]],
+    weights: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    グループ × サンプル × 選択肢 の回答者数（重みの和）
+
+    Args:
+        codes: 選択肢の番号 (N, サンプル数)、欠損は -1
+        n_brackets: 選択肢数
+        groups: segment_groups() の結果
+        weights: 回答者の重み（Noneの場合は重み付けしない）
+
+    Returns:
+        float64 (グループ数, サンプル数, 選択肢数)
+    """
+    n_samples = codes.shape[1]
+    flat = codes.astype(np.int64) + n_brackets * np.arange(n_samples)
+    valid = codes >= 0
+    w = np.ones(len(codes)) if weights is None else np.asarray(weights, dtype=float)
+    counts = np.zeros((len(groups), n_samples, n_brackets))
+    for g, (_, _, rows) in enumerate(groups):
+        mask = valid[rows]
+        counts[g] = np.bincount(
+            flat[rows][mask], weights=np.broadcast_to(w[rows, None], mask.shape)[mask],
+            minlength=n_samples * n_brackets,
+        ).reshape(n_samples, n_brackets)
+    return counts
+
+
+def _bracket_terms(
+    mu: np.ndarray, log_sigma: np.ndarray, log_lower: np.ndarray, log_upper: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """各区間の確率と、位置・尺度の対数についての微分 (..., 選択肢数)"""
+    sigma = np.exp(log_sigma)[..., None]
+    z_lower = (log_lower - mu[..., None]) / sigma
+    z_upper = (log_upper - mu[..., None]) / sigma
+    # 上側の区間は生存関数の差で求めて桁落ちを避ける
+    prob = np.where(
+        z_lower > 0,
+        special.ndtr(-z_lower) - special.ndtr(-z_upper),
+        special.ndtr(z_upper) - special.ndtr(z_lower),
+    )
+    pdf_lower, pdf_upper = stats.norm.pdf(z_lower), stats.norm.pdf(z_upper)
+    with np.errstate(invalid="ignore"):
+        zpdf_lower = np.where(np.isfinite(z_lower), z_lower * pdf_lower, 0.0)
+        zpdf_upper = np.where(np.isfinite(z_upper), z_upper * pdf_upper, 0.0)
+    d_mu = -(pdf_upper - pdf_lower) / sigma
+    d_log_sigma = -(zpdf_upper - zpdf_lower)
+    return prob, d_mu, d_log_sigma
+
+
+def fit_lognormal(
+    counts: np.ndarray,
+    lower: np.ndarray,
+    upper: np.ndarray,
+    max_iter: int = DEFAULT_MAX_ITER,
+    tol: float = DEFAULT_TOL,
+) -> Dict[str, np.ndarray]:
+    """
+    区間打ち切りデータに対数正規分布を最尤法で当てはめる（先頭の軸について一括）
+
+    回答のある選択肢が3つ以上の区間にまたがらない場合（隣り合う2区間だけなど）は
+    尺度が0に縮退して推定できないため、estimable を False とする。推定できない・収束しなかった要素の結果は NaN とする。
+
+    Args:
+        counts: 選択肢ごとの回答者数 (..., 選択肢数)
+        lower: 区間の下限（円）(選択肢数,)
+        upper: 区間の上限（円、上限なしは inf）(選択肢数,)
+        max_iter: 反復回数の上限
+        tol: 収束判定の閾値
+
+    Returns:
+        {"n": 回答者数, "mu": log(WTP) の平均, "sigma": log(WTP) の標準偏差,
+         "covariance": (mu, log(sigma)) の漸近共分散 (..., 2, 2), "log_likelihood",
+         "converged", "estimable"}（形状は counts の最後の軸を除いたもの）
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    with np.errstate(divide="ignore"):
+        log_lower, log_upper = np.log(lower), np.log(upper)
+    n = counts.sum(axis=-1)
+    nonempty = counts > 0
+    k = counts.shape[-1]
+    first = nonempty.argmax(axis=-1)
+    last = k - 1 - nonempty[..., ::-1].argmax(axis=-1)
+    estimable = (n > 0) & (last - first >= 2)
+
+    # 初期値: 区間の代表値（対数スケールの中点。片側が開いた区間は隣の区間の幅だけ外側）の平均・標準偏差
+    finite_lower = np.isfinite(log_lower)
+    finite_upper = np.isfinite(log_upper)
+    width = np.median((log_upper - log_lower)[finite_lower & finite_upper])
+    points = np.where(
+        finite_lower & finite_upper, (log_lower + log_upper) / 2,
+        np.where(finite_upper, log_upper - width, log_lower + width),
+    )
+    safe_n = np.where(n > 0, n, 1.0)
+    mu = (counts * points).sum(axis=-1) / safe_n
+    variance = (counts * (points - mu[..., None]) ** 2).sum(axis=-1) / safe_n
+    log_sigma = np.log(np.sqrt(np.maximum(variance, width ** 2 / 4)))
+
+    # 推定できない、または収束・発散して更新を終えたもの
+    done = ~estimable
+    converged = np.zeros(n.shape, dtype=bool)
+    for _ in range(max_iter):
+        prob, d_mu, d_log_sigma = _bracket_terms(mu, log_sigma, log_lower, log_upper)
+        prob = np.maximum(prob, np.finfo(float).tiny)
+        score_mu = (counts * d_mu / prob).sum(axis=-1)
+        score_sigma = (counts * d_log_sigma / prob).sum(axis=-1)
+        i_mm = n * (d_mu * d_mu / prob).sum(axis=-1)
+        i_ms = n * (d_mu * d_log_sigma / prob).sum(axis=-1)
+        i_ss = n * (d_log_sigma * d_log_sigma / prob).sum(axis=-1)
+        det = i_mm * i_ss - i_ms * i_ms
+        with np.errstate(invalid="ignore", divide="ignore"):
+            step_mu = (i_ss * score_mu - i_ms * score_sigma) / det
+            step_sigma = (i_mm * score_sigma - i_ms * score_mu) / det
+        finite = np.isfinite(step_mu) & np.isfinite(step_sigma)
+        active = ~done & finite
+        step_mu = np.where(active, np.clip(step_mu, -_MAX_STEP, _MAX_STEP), 0.0)
+        step_sigma = np.where(active, np.clip(step_sigma, -_MAX_STEP, _MAX_STEP), 0.0)
+        mu = mu + step_mu
+        log_sigma = log_sigma + step_sigma
+        converged |= active & (np.maximum(np.abs(step_mu), np.abs(step_sigma)) < tol)
+        done |= converged | ~finite
+        if done.all():
+            break
+
+    prob, d_mu, d_log_sigma = _bracket_terms(mu, log_sigma, log_lower, log_upper)
+    prob = np.maximum(prob, np.finfo(float).tiny)
+    info = np.stack([
+        np.stack([(d_mu * d_mu / prob).sum(axis=-1), (d_mu * d_log_sigma / prob).sum(axis=-1)], axis=-1),
+        np.stack([(d_mu * d_log_sigma / prob).sum(axis=-1), (d_log_sigma * d_log_sigma / prob).sum(axis=-1)], axis=-1),
+    ], axis=-2) * n[..., None, None]
+    covariance = np.full(info.shape, np.nan)
+    if converged.any():
+        covariance[converged] = np.linalg.pinv(info[converged])
+    log_likelihood = (counts * np.log(prob)).sum(axis=-1)
+
+    nan = np.where(converged, 1.0, np.nan)
+    return {
+        "n": n,
+        "mu": mu * nan,
+        "sigma": np.exp(log_sigma) * nan,
+        "covariance": covariance,
+        "log_likelihood": log_likelihood * nan,
+        "converged": converged,
+        "estimable": estimable,
+    }
+
+
+def wtp_statistics(fit: Dict[str, np.ndarray], confidence: float = DEFAULT_CONFIDENCE) -> Dict[str, np.ndarray]:
+    """
+    当てはめた対数正規分布の WTP の平均・中央値と信頼区間（対数スケールのデルタ法）
+
+    Args:
+        fit: fit_lognormal() の結果
+        confidence: 信頼水準
+
+    Returns:
+        {"mean", "mean_ci_low", "mean_ci_high", "median", "median_ci_low", "median_ci_high"}（円）
+    """
+    mu, sigma, covariance = fit["mu"], fit["sigma"], fit["covariance"]
+    z = stats.norm.ppf(0.5 + confidence / 2)
+    log_mean = mu + sigma ** 2 / 2
+    # log(平均) = mu + exp(2 log(sigma)) / 2 の勾配は (1, sigma²)
+    var_log_mean = (
+        covariance[..., 0, 0] + 2 * sigma ** 2 * covariance[..., 0, 1] + sigma ** 4 * covariance[..., 1, 1]
+    )
+    se_log_mean = np.sqrt(np.maximum(var_log_mean, 0.0))
+    se_mu = np.sqrt(np.maximum(covariance[..., 0, 0], 0.0))
+    with np.errstate(over="ignore"):
+        return {
+            "mean": np.exp(log_mean),
+            "mean_ci_low": np.exp(log_mean - z * se_log_mean),
+            "mean_ci_high": np.exp(log_mean + z * se_log_mean),
+            "median": np.exp(mu),
+            "median_ci_low": np.exp(mu - z * se_mu),
+            "median_ci_high": np.exp(mu + z * se_mu),
+        }
+
+
+def _optional_float(value: float) -> Optional[float]:
+    """NaN・無限大を None に変換"""
+    return float(value) if np.isfinite(value) else None
+
+
+def estimate_wtp(
+    table: pd.DataFrame,
+    samples: List[str],
+    labels: Sequence[str],
+    segments: List[SegmentSpec],
+    confidence: float = DEFAULT_CONFIDENCE,
+    min_cell_size: int = DEFAULT_MIN_CELL_SIZE,
+    weights: Optional[np.ndarray] = None,
+) -> Dict[str, Any]:
+    """
+    全体・各セグメントの水準について、サンプルごとの WTP を推定
+
+    Args:
+        table: 回答テーブル
+        samples: サンプルIDのリスト
+        labels: WTPの選択肢（金額の昇順）
+        segments: セグメント指定のリスト
+        confidence: 信頼水準
+        min_cell_size: これ未満の回答者数のグループは値を秘匿する
+        weights: 回答者の重み（Noneの場合は重み付けしない。信頼区間は重みを度数とみなして求める）
+
+    Returns:
+        {"distribution": "lognormal", "confidence", "min_cell_size",
+         "intervals": 選択肢 -> [下限, 上限]（上限なしは None）,
+         "estimates": [{"segment", "level", "sample", "size", "n", "mu", "sigma", "mean", "mean_ci_low",
+                        "mean_ci_high", "median", "median_ci_low", "median_ci_high", "converged", "suppressed"}, ...]}
+        （size はグループの回答者数、n は WTP の回答者数（重み付けした場合は重みの和）、
+         mu・sigma は log(WTP) の平均・標準偏差、金額は円）
+    """
+    lower, upper = wtp_intervals(labels)
+    codes = wtp_codes(table, samples, labels)
+    groups = segment_groups(table, segments)
+    counts = bracket_counts(codes, len(labels), groups, weights)
+    sizes = np.array([len(rows) for _, _, rows in groups])
+    fit = fit_lognormal(counts, lower, upper)
+    summary = wtp_statistics(fit, confidence)
+    present = [f"wtp_{sample_id}" in table.columns for sample_id in samples]
+
+    estimates = []
+    for g, (segment, level, _) in enumerate(groups):
+        hidden = bool(sizes[g] < min_cell_size)
+        for s, sample_id in enumerate(samples):
+            if not present[s]:
+                continue
+            record = {"segment": segment, "level": level, "sample": sample_id,
+                      "size": int(sizes[g]), "n": float(fit["n"][g, s])}
+            for key, values in [("mu", fit["mu"]), ("sigma", fit["sigma"])] + list(summary.items()):
+                record[key] = None if hidden else _optional_float(values[g, s])
+            record["converged"] = bool(fit["converged"][g, s])
+            record["suppressed"] = hidden
+            estimates.append(record)
+
+    return {
+        "distribution": "lognormal",
+        "confidence": float(confidence),
+        "min_cell_size": int(min_cell_size),
+        "intervals": {
+            label: [float(low), _optional_float(high)] for label, low, high in zip(labels, lower, upper)
+        },
+        "estimates": estimates,
+    }
+
+
+def run_wtp(
+    table: pd.DataFrame,
+    samples: List[str],
+    segments: List[SegmentSpec],
+    wtp_options: Dict[str, Any],
+    weights: Optional[np.ndarray] = None,
+    clusters: Optional[np.ndarray] = None,
+) -> Dict[str, Any]:
+    """
+    WTP 推定ステージ
+
+    Args:
+        table: 回答テーブル
+        samples: サンプルIDのリスト
+        segments: セグメント指定のリスト
+        wtp_options: {"labels": WTPの選択肢（Noneの場合は推定しない）, "confidence", "min_cell_size"}
+        weights: 回答者の重み（Noneの場合は重み付けしない）
+        clusters: 回答者のクラスタ番号（cluster 列として segments に使える。clustering.assign_clusters() を参照）
+
+    Returns:
+        {"wtp": estimate_wtp() の結果（推定しない場合は None）}
+    """
+    options = dict(wtp_options)
+    labels = options.pop("labels", None)
+    if not labels:
+        return {"wtp": None}
+    table = assign_clusters(table, clusters)
+    return {"wtp": estimate_wtp(table, samples, labels, segments, weights=weights, **options)}
@@ -3,21 +3,60 @@ EV走行音アンケートアプリケーション
 
 メインエントリーポイント
 """
+import hmac
 import streamlit as st
-import streamlit.components.v1 as components
+from functools import lru_cache
 from pathlib import Path
 
 # パスの設定
 import sys
 sys.path.insert(0, str(Path(__file__).parent))
 
-from config import DATA_DIR, THEME, SURVEY_CONFIG
+from config import (
+    DATA_DIR, THEME, SURVEY_CONFIG, MEDIA_STRICT_VALIDATION,
+    ADMIN_TOKEN, FIELDWORK_STATS_FILE,
+)
 from services.session_manager import SessionManager
 from services.data_manager import DataManager
-from pages.phase1_introduction import render_phase1
-from pages.phase2_evaluation import render_phase2
-from pages.phase3_interview import render_phase3
-from pages.phase5_summary import render_phase5
+from services.fieldwork_stats import FieldworkStats
+from services.media_registry import MediaRegistryError
+# 各フェーズのページは初回表示時に読み込む（起動時間短縮のため）
+from pages import get_page_renderer
+from components.survey_components import inject_scroll_to_top, get_media_registry
+
+
+# 再実行のたびに送信される固定HTML断片は、起動時に一度だけ組み立てる
+# （空白を詰めて再実行あたりの送信バイト数を抑える）
+CUSTOM_CSS = (
+    "<style>"
+    ".stApp{max-width:1200px;margin:0 auto}"
+    ".main .block-container{padding-top:2rem;padding-bottom:2rem}"
+    "h1,h2,h3{color:#1E88E5}"
+    ".stProgress>div>div>div>div{background-color:#1E88E5}"
+    ".stRadio>div{gap:.5rem}"
+    ".stCheckbox>div{gap:.5rem}"
+    # フェーズインジケーター
+    ".pi-row{display:grid;grid-template-columns:repeat(4,1fr);gap:1rem;margin-bottom:1rem}"
+    ".pi{text-align:center;padding:10px;border-radius:5px}"
+    ".pi-done{background-color:#E8F5E9}"
+    ".pi-cur{background-color:#E3F2FD;border:2px solid #1E88E5;color:#1E88E5}"
+    ".pi-todo{background-color:#F5F5F5;color:#9E9E9E}"
+    "</style>"
+)
+
+FOOTER_HTML = (
+    '<div style="text-align:center;color:#9E9E9E;font-size:.8em">'
+    "EV走行音アンケート調査 | © 2026"
+    "</div>"
+)
+
+# フェーズインジケーターの表示項目
+PHASE_INDICATOR_STEPS = [
+    ("Step1", "導入"),
+    ("Step2", "評価"),
+    ("Step3", "詳細調査"),
+    ("Step4", "まとめ"),
+]
 
 
 def main():
@@ -30,35 +69,27 @@ def main():
         initial_sidebar_state="collapsed",
     )
     
+    # 実査集計（全セッションで共有し、保存・ページ遷移時に差分更新）
+    fieldwork_stats = get_fieldwork_stats()
+    
+    # 管理者用ダッシュボード（?admin=<トークン> でアクセス）
+    if _is_admin_request():
+        st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
+        get_page_renderer("admin_dashboard")(fieldwork_stats)
+        return
+    
+    # 素材ファイルの検証（レジストリはプロセスごとに一度だけ構築）
+    _validate_media()
+    
     # セッション管理とデータ管理の初期化
     session = SessionManager()
-    data_manager = DataManager(DATA_DIR)
-    
-    # カスタムCSS
-    st.markdown("""
-    <style>
-        .stApp {
-            max-width: 1200px;
-            margin: 0 auto;
-        }
-        .main .block-container {
-            padding-top: 2rem;
-            padding-bottom: 2rem;
-        }
-        h1, h2, h3 {
-            color: #1E88E5;
-        }
-        .stProgress > div > div > div > div {
-            background-color: #1E88E5;
-        }
-        .stRadio > div {
-            gap: 0.5rem;
-        }
-        .stCheckbox > div {
-            gap: 0.5rem;
-        }
-    </style>
-    """, unsafe_allow_html=True)
+    data_manager = DataManager(DATA_DIR, fieldwork_stats=fieldwork_stats)
+    
+    # 離脱位置の集計用にページ遷移を記録
+    _track_progress(session, fieldwork_stats)
+    
+    # カスタムCSS（事前に最小化した固定文字列）
+    st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
     
     # ヘッダー
     _render_header(session)
@@ -70,6 +101,55 @@ def main():
     _render_footer()
 
 
+@st.cache_resource(show_spinner=False)
+def get_fieldwork_stats() -> FieldworkStats:
+    """
+    実査集計を取得（プロセスごとに一度だけ生成）
+    
+    集計ファイルがない初回起動時のみ、保存済みの回答から再構築する。
+    """
+    stats = FieldworkStats(FIELDWORK_STATS_FILE)
+    if stats.is_empty:
+        responses = DataManager(DATA_DIR).get_all_responses()
+        if responses:
+            stats.rebuild(responses)
+    return stats
+
+
+def _is_admin_request() -> bool:
+    """管理者トークン付きのアクセスかどうか"""
+    if not ADMIN_TOKEN:
+        return False
+    token = st.query_params.get("admin", "")
+    return hmac.compare_digest(token, ADMIN_TOKEN)
+
+
+def _track_progress(session: SessionManager, fieldwork_stats: FieldworkStats) -> None:
+    """ページが変わった時のみ現在位置を実査集計へ記録"""
+    if session.is_completed:
+        return
+    position = (session.current_phase, session.current_step)
+    last_position = st.session_state.get("_tracked_position")
+    if position == last_position:
+        return
+    if last_position is None:
+        fieldwork_stats.record_start(session.session_id, session.group, *position)
+    else:
+        fieldwork_stats.record_position(session.session_id, *position)
+    st.session_state["_tracked_position"] = position
+
+
+def _validate_media() -> None:
+    """素材ファイルの欠損を検出し、厳格モードではアンケートを開始させない"""
+    try:
+        get_media_registry().validate()
+    except MediaRegistryError as e:
+        if MEDIA_STRICT_VALIDATION:
+            st.error(f"{e}\n\n管理者にお問い合わせください。")
+            st.stop()
+        st.warning(str(e))
+
+
 def _render_header(session: SessionManager) -> None:
     """ヘッダーをレンダリング"""
     col1, col2 = st.columns([3, 1])
@@ -102,54 +182,48 @@ def _render_main_content(session: SessionManager, data_manager: DataManager) ->
     
     # 各フェーズのレンダリング（Phase4削除、4がまとめに）
     if phase == 1:
-        render_phase1(session)
+        get_page_renderer("phase1")(session)
     elif phase == 2:
-        render_phase2(session)
+        get_page_renderer("phase2")(session)
     elif phase == 3:
-        render_phase3(session)
+        get_page_renderer("phase3")(session)
     elif phase == 4:
-        render_phase5(session, data_manager)
+        get_page_renderer("phase5")(session, data_manager)
     else:
         st.error("不明なフェーズです")
 
 
 def _render_phase_indicator(current_phase: int) -> None:
     """フェーズインジケーターをレンダリング"""
-    phases = [
-        ("Step1", "導入"),
-        ("Step2", "評価"),
-        ("Step3", "詳細調査"),
-        ("Step4", "まとめ"),
-    ]
-    
-    cols = st.columns(len(phases))
+    st.markdown(_phase_indicator_html(current_phase), unsafe_allow_html=True)
+
+
+@lru_cache(maxsize=None)
+def _phase_indicator_html(current_phase: int) -> str:
+    """
+    フェーズインジケーターのHTMLを生成（フェーズごとに一度だけ生成してキャッシュ）
     
-    for i, (step_name, phase_name) in enumerate(phases):
+    Args:
+        current_phase: 現在のフェーズ
+        
+    Returns:
+        4つのフェーズを1要素にまとめたHTML
+    """
+    items = []
+    for i, (step_name, _phase_name) in enumerate(PHASE_INDICATOR_STEPS):
         phase_index = i + 1
-        with cols[i]:
-            if phase_index < current_phase:
-                # 完了したフェーズ
-                st.markdown(f"""
-                <div style="text-align: center; padding: 10px; background-color: #E8F5E9; border-radius: 5px;">
-                    <span style="color: #4CAF50;">✓</span> {step_name}
-                </div>
-                """, unsafe_allow_html=True)
-            elif phase_index == current_phase:
-                # 現在のフェーズ
-                st.markdown(f"""
-                <div style="text-align: center; padding: 10px; background-color: #E3F2FD; border-radius: 5px; border: 2px solid #1E88E5;">
-                    <strong style="color: #1E88E5;">{step_name}</strong>
-                </div>
-                """, unsafe_allow_html=True)
-            else:
-                # 未完了のフェーズ
-                st.markdown(f"""
-                <div style="text-align: center; padding: 10px; background-color: #F5F5F5; border-radius: 5px;">
-                    <span style="color: #9E9E9E;">{step_name}</span>
-                </div>
-                """, unsafe_allow_html=True)
-    
-    st.markdown("")
+        if phase_index < current_phase:
+            # 完了したフェーズ
+            items.append(
+                f'<div class="pi pi-done"><span style="color:#4CAF50">✓</span> {step_name}</div>'
+            )
+        elif phase_index == current_phase:
+            # 現在のフェーズ
+            items.append(f'<div class="pi pi-cur"><strong>{step_name}</strong></div>')
+        else:
+            # 未完了のフェーズ
+            items.append(f'<div class="pi pi-todo">{step_name}</div>')
+    return f'<div class="pi-row">{"".join(items)}</div>'
 
 
 def _auto_scroll_to_top(phase: int, step: int) -> None:
@@ -167,50 +241,13 @@ def _auto_scroll_to_top(phase: int, step: int) -> None:
     # ページが変わった時のみスクロール実行
     if current_key != last_key:
         st.session_state['_last_scroll_key'] = current_key
-        components.html(
-            """
-            <script>
-                (function() {
-                    try {
-                        // 複数のコンテナをスクロールトップ
-                        var selectors = [
-                            '[data-testid="stAppViewContainer"]',
-                            'section.main',
-                            '.main',
-                            '.stApp'
-                        ];
-                        for (var i = 0; i < selectors.length; i++) {
-                            var el = window.parent.document.querySelector(selectors[i]);
-                            if (el) {
-                                el.scrollTop = 0;
-                            }
-                        }
-                        // ウィンドウ自体もスクロール
-                        window.parent.scrollTo(0, 0);
-                        if (window.parent.document.body) {
-                            window.parent.document.body.scrollTop = 0;
-                        }
-                        if (window.parent.document.documentElement) {
-                            window.parent.document.documentElement.scrollTop = 0;
-                        }
-                    } catch (e) {
-                        // エラーは無視
-                    }
-                })();
-            </script>
-            """,
-            height=0,
-        )
+        inject_scroll_to_top(current_key)
 
 
 def _render_footer() -> None:
     """フッターをレンダリング"""
     st.markdown("---")
-    st.markdown("""
-    <div style="text-align: center; color: #9E9E9E; font-size: 0.8em;">
-        EV走行音アンケート調査 | © 2026
-    </div>
-    """, unsafe_allow_html=True)
+    st.markdown(FOOTER_HTML, unsafe_allow_html=True)
 
 
 if __name__ == "__main__":
@@ -1,11 +1,29 @@
 """
 アンケートUIコンポーネント
 """
+import inspect
 import streamlit as st
 import streamlit.components.v1 as components
-from pathlib import Path
 from typing import List, Optional, Tuple, Callable
 
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config import MEDIA_ASSETS
+from services.media_registry import MediaRegistry
+
+
+@st.cache_resource(show_spinner=False)
+def get_media_registry() -> MediaRegistry:
+    """
+    メディアレジストリを取得（プロセスごとに一度だけ構築）
+    
+    Returns:
+        素材ファイルのメタデータを保持するレジストリ
+    """
+    return MediaRegistry.build(MEDIA_ASSETS)
+
 
 def render_page_top_anchor() -> None:
     """
@@ -15,6 +33,42 @@ def render_page_top_anchor() -> None:
     st.markdown('<div id="page-top"></div>', unsafe_allow_html=True)
 
 
+# ページトップへスクロールするスクリプト（最小化済み）
+# メインドキュメント（st.html）とiframe（フォールバック）の両方で動作する
+# （メインドキュメントでは window.parent は window 自身を指す）
+_SCROLL_TO_TOP_SCRIPT = (
+    "<script data-page=\"{page_key}\">(function(){{try{{"
+    "var s=['[data-testid=\"stAppViewContainer\"]','section.main','.main','.stApp'];"
+    "var d=window.parent.document||document;"
+    "for(var i=0;i<s.length;i++){{var e=d.querySelector(s[i]);if(e)e.scrollTop=0;}}"
+    "window.parent.scrollTo(0,0);"
+    "if(d.body)d.body.scrollTop=0;if(d.documentElement)d.documentElement.scrollTop=0;"
+    "}}catch(e){{}}}})();</script>"
+)
+
+# st.html(unsafe_allow_javascript=...) はStreamlit 1.50以降で利用可能
+_HTML_SUPPORTS_JS = (
+    hasattr(st, "html")
+    and "unsafe_allow_javascript" in inspect.signature(st.html).parameters
+)
+
+
+def inject_scroll_to_top(page_key: str) -> None:
+    """
+    ページトップへスクロールするスクリプトを挿入
+    
+    対応するStreamlitではiframeを作らず、軽量なスクリプト片のみを送信する。
+    
+    Args:
+        page_key: ページ識別キー（同一内容の要素として再利用されないよう埋め込む）
+    """
+    script = _SCROLL_TO_TOP_SCRIPT.format(page_key=page_key)
+    if _HTML_SUPPORTS_JS:
+        st.html(script, unsafe_allow_javascript=True)
+    else:
+        components.html(script, height=0)
+
+
 def render_scroll_to_top_script() -> None:
     """
     自動スクロールトップのJavaScriptを挿入（B案）
@@ -27,31 +81,7 @@ def render_scroll_to_top_script() -> None:
     if current_key != last_key:
         st.session_state['_last_scroll_key'] = current_key
         # ページが変わった時のみスクロール実行
-        components.html(
-            """
-            <script>
-                (function() {
-                    try {
-                        // Streamlitのメインコンテナを取得してスクロール
-                        var containers = [
-                            window.parent.document.querySelector('[data-testid="stAppViewContainer"]'),
-                            window.parent.document.querySelector('section.main'),
-                            window.parent.document.querySelector('.main')
-                        ];
-                        for (var i = 0; i < containers.length; i++) {
-                            if (containers[i]) {
-                                containers[i].scrollTop = 0;
-                            }
-                        }
-                        window.parent.scrollTo(0, 0);
-                    } catch (e) {
-                        console.log('Auto scroll error:', e);
-                    }
-                })();
-            </script>
-            """,
-            height=0,
-        )
+        inject_scroll_to_top(current_key)
 
 
 def render_progress_bar(progress: float) -> None:
@@ -231,7 +261,7 @@ def render_navigation_buttons(
 
 
 def render_audio_player(
-    audio_path: Path,
+    media_key: str,
     label: Optional[str] = None,
     autoplay: bool = False,
 ) -> bool:
@@ -239,7 +269,7 @@ def render_audio_player(
     音声プレイヤーを表示
     
     Args:
-        audio_path: 音声ファイルのパス
+        media_key: メディアレジストリの素材キー
         label: ラベル
         autoplay: 自動再生するか
         
@@ -249,15 +279,15 @@ def render_audio_player(
     if label:
         st.markdown(f"**{label}**")
     
-    if not audio_path.exists():
-        st.error(f"音声ファイルが見つかりません: {audio_path}")
+    registry = get_media_registry()
+    asset = registry.get(media_key)
+    if asset is None:
+        path = registry.missing.get(media_key, media_key)
+        st.error(f"音声ファイルが見つかりません: {path}")
         return False
     
     try:
-        with open(audio_path, "rb") as f:
-            audio_bytes = f.read()
-        
-        st.audio(audio_bytes, format=f"audio/{audio_path.suffix[1:]}")
+        st.audio(registry.read_bytes(media_key), format=asset.mime_type)
         return True
     except Exception as e:
         st.error(f"音声ファイルの読み込みに失敗しました: {e}")
@@ -265,7 +295,7 @@ def render_audio_player(
 
 
 def render_video_player(
-    video_path: Path,
+    media_key: str,
     label: Optional[str] = None,
     autoplay: bool = False,
 ) -> bool:
@@ -273,7 +303,7 @@ def render_video_player(
     動画プレイヤーを表示
     
     Args:
-        video_path: 動画ファイルのパス
+        media_key: メディアレジストリの素材キー
         label: ラベル
         autoplay: 自動再生するか
         
@@ -283,30 +313,20 @@ def render_video_player(
     if label:
         st.markdown(f"**{label}**")
     
-    if not video_path.exists():
-        st.error(f"動画ファイルが見つかりません: {video_path}")
+    registry = get_media_registry()
+    asset = registry.get(media_key)
+    if asset is None:
+        path = registry.missing.get(media_key, media_key)
+        st.error(f"動画ファイルが見つかりません: {path}")
         return False
     
     try:
-        with open(video_path, "rb") as f:
-            video_bytes = f.read()
-        
-        # 動画ファイルの拡張子に応じてフォーマットを決定
-        suffix = video_path.suffix.lower()
-        if suffix in [".mp4", ".m4v"]:
-            video_format = "video/mp4"
-        elif suffix == ".webm":
-            video_format = "video/webm"
-        elif suffix == ".ogg":
-            video_format = "video/ogg"
-        elif suffix in [".wav", ".mp3"]:
+        media_bytes = registry.read_bytes(media_key)
+        if asset.is_audio:
             # 音声ファイルの場合は音声プレイヤーを使用
-            st.audio(video_bytes, format=f"audio/{suffix[1:]}")
-            return True
+            st.audio(media_bytes, format=asset.mime_type)
         else:
-            video_format = "video/mp4"
-        
-        st.video(video_bytes, format=video_format)
+            st.video(media_bytes, format=asset.mime_type)
         return True
     except Exception as e:
         st.error(f"動画ファイルの読み込みに失敗しました: {e}")
@@ -18,6 +18,8 @@ DATA_DIR = BASE_DIR / "data"
 RESPONSES_DIR = DATA_DIR / "responses"
 EXPORTS_DIR = DATA_DIR / "exports"
 
+AGGREGATES_DIR = DATA_DIR / "aggregates"
+
 # ディレクトリ作成
 DATA_DIR.mkdir(exist_ok=True)
 RESPONSES_DIR.mkdir(exist_ok=True)
@@ -43,6 +45,17 @@ AUDIO_SAMPLES = {
 # 走行音サンプル名リスト（分析用）
 SOUND_SAMPLES = list(VIDEO_SAMPLES.keys())
 
+# メディアレジストリに登録する素材（キー -> ファイルパス）
+# 起動時に一度だけ検査し、プレイヤーはキーで参照する
+MEDIA_ASSETS = {
+    "test_audio": TEST_AUDIO_FILE,
+    **VIDEO_SAMPLES,
+}
+
+# 素材ファイルが欠けている場合に起動時点でアンケートを停止するか
+# （開発時などは環境変数 EV_SURVEY_MEDIA_STRICT=0 で警告表示のみにできる）
+MEDIA_STRICT_VALIDATION = os.environ.get("EV_SURVEY_MEDIA_STRICT", "1") != "0"
+
 # アンケート設定
 SURVEY_CONFIG = {
     "total_phases": 5,
@@ -103,6 +116,69 @@ PREFECTURES = [
     "福岡県", "佐賀県", "長崎県", "熊本県", "大分県", "宮崎県", "鹿児島県", "沖縄県",
 ]
 
+# 地域区分（都道府県 -> 地域。ウェイトバックの地域の構成比に使う）
+PREFECTURE_REGIONS = {
+    prefecture: region
+    for region, prefectures in {
+        "北海道": ["北海道"],
+        "東北": ["青森県", "岩手県", "宮城県", "秋田県", "山形県", "福島県"],
+        "関東": ["茨城県", "栃木県", "群馬県", "埼玉県", "千葉県", "東京都", "神奈川県"],
+        "中部": ["新潟県", "富山県", "石川県", "福井県", "山梨県", "長野県", "岐阜県", "静岡県", "愛知県"],
+        "近畿": ["三重県", "滋賀県", "京都府", "大阪府", "兵庫県", "奈良県", "和歌山県"],
+        "中国": ["鳥取県", "島根県", "岡山県", "広島県", "山口県"],
+        "四国": ["徳島県", "香川県", "愛媛県", "高知県"],
+        "九州・沖縄": ["福岡県", "佐賀県", "長崎県", "熊本県", "大分県", "宮崎県", "鹿児島県", "沖縄県"],
+    }.items()
+    for prefecture in prefectures
+}
+
+# 運転経験選択肢
+DRIVING_EXPERIENCE_OPTIONS = ["1年未満", "1-5年", "5-10年", "10-20年", "20年以上"]
+
+# EV経験選択肢
+EV_EXPERIENCE_OPTIONS = ["所有している", "試乗したことがある", "乗ったことはない"]
+
+# 回答データ（CSV）の列の型（analysis.loaders.load_table() に渡す）
+# 列名のパターン -> "int8"（欠損を許容する8ビット整数）、または選択肢のカテゴリ
+RESPONSE_COLUMN_TYPES = {
+    "sd_*": "int8",
+    "purchase_intent_*": "int8",
+    "sound_sensitivity": "int8",
+    "sound_importance": "int8",
+    "age_group": {"categories": AGE_GROUPS, "ordered": True},
+    "gender": {"categories": GENDER_OPTIONS, "ordered": False},
+    "prefecture": {"categories": PREFECTURES, "ordered": False},
+    "driving_experience": {"categories": DRIVING_EXPERIENCE_OPTIONS, "ordered": True},
+    "ev_experience": {"categories": EV_EXPERIENCE_OPTIONS, "ordered": True},
+    "wtp_*": {"categories": WTP_OPTIONS, "ordered": True},
+}
+
+# ウェイトバック（run_analysis.py --weight）の目標構成比
+# 20〜70歳の運転免許保有者の構成を想定した目安の値。本調査の集計前に最新の運転免許統計・人口推計で更新すること
+# （構成比は属性ごとに合計1に正規化して使う。目標にない値の回答者はその属性では調整しない）
+WEIGHTING_TARGETS = {
+    "age_group": {"20-29歳": 0.14, "30-39歳": 0.17, "40-49歳": 0.22, "50-59歳": 0.21, "60-70歳": 0.26},
+    "gender": {"男性": 0.55, "女性": 0.45},
+    "region": {
+        "北海道": 0.041, "東北": 0.068, "関東": 0.346, "中部": 0.169,
+        "近畿": 0.176, "中国": 0.058, "四国": 0.029, "九州・沖縄": 0.113,
+    },
+}
+
+# ウェイトバックの設定（analysis.weighting.run_weighting() に渡す）
+WEIGHTING = {
+    "targets": WEIGHTING_TARGETS,
+    "derived": {"region": ("prefecture", PREFECTURE_REGIONS)},
+    "trim": (0.3, 3.0),
+}
+
+# クラスタリング（run_analysis.py --cluster）の設定（analysis.clustering.run_clustering() に渡す）
+# クラスタ数は k_range の候補から、silhouette_sample 名を抽出したシルエット係数で選ぶ（"k" を指定すると固定）
+CLUSTERING = {
+    "k_range": (2, 8),
+    "silhouette_sample": 5000,
+}
+
 # 音声チェック選択肢
 AUDIO_CHECK_OPTIONS = [
     "猫の鳴き声",
@@ -209,6 +285,14 @@ LADDERING_FEELING_BAD_OPTIONS = [
     "長く使いたくない",
 ]
 
+# ラダリング分析の語彙（回答データのキー -> 選択肢）
+LADDERING_VOCABULARY = {
+    "why_good": LADDERING_WHY_GOOD_OPTIONS,
+    "feeling_good": LADDERING_FEELING_GOOD_OPTIONS,
+    "why_bad": LADDERING_WHY_BAD_OPTIONS,
+    "feeling_bad": LADDERING_FEELING_BAD_OPTIONS,
+}
+
 # インタビュー質問
 INTERVIEW_QUESTIONS = {
     "topic1": [
@@ -229,6 +313,27 @@ INTERVIEW_QUESTIONS = {
     ],
 }
 
+# スピーダー判定: 総回答時間（または相対速度指標）が中央値のこの倍率未満の回答者
+SPEEDER_RATIO = 0.5
+
+# 分析結果の出力先と、分析ステージ出力のキャッシュ
+ANALYSIS_DIR = DATA_DIR / "analysis"
+ANALYSIS_CACHE_DIR = ANALYSIS_DIR / "cache"
+# 増分分析（--incremental）の集計量の保存先
+ANALYSIS_STATE_FILE = ANALYSIS_CACHE_DIR / "incremental_state.json"
+# 回答ストア（data/responses など）を分析用の回答データに変換した結果の保存先
+ANALYSIS_INGEST_DIR = ANALYSIS_CACHE_DIR / "ingest"
+# テキスト分析の語彙（文字 n-gram）と IDF の保存先（次回以降は同じ語彙で変換する）
+ANALYSIS_TEXT_VOCABULARY_FILE = ANALYSIS_CACHE_DIR / "text_vocabulary.json"
+
+# 実査ダッシュボード設定
+# 管理者用URL: http://localhost:8501/?admin=<EV_SURVEY_ADMIN_TOKEN>
+# （環境変数が未設定の場合、ダッシュボードは無効）
+ADMIN_TOKEN = os.environ.get("EV_SURVEY_ADMIN_TOKEN", "")
+FIELDWORK_STATS_FILE = AGGREGATES_DIR / "fieldwork_stats.json"
+DASHBOARD_REFRESH_SECONDS = 5
+DROPOUT_IDLE_MINUTES = 30
+
 # UIテーマ設定
 THEME = {
     "primary_color": "#1E88E5",
@@ -1,16 +1,61 @@
 """
 ページモジュール
+
+各フェーズのページモジュールは初回利用時に読み込む（起動時間短縮のため）。
 """
-from .phase1_introduction import render_phase1
-from .phase2_evaluation import render_phase2
-from .phase3_interview import render_phase3
-from .phase4_rct import render_phase4
-from .phase5_summary import render_phase5
+import importlib
+from typing import Callable, Dict, Tuple
+
+# ページ名 -> (モジュール名, レンダリング関数名)
+PAGE_REGISTRY: Dict[str, Tuple[str, str]] = {
+    "phase1": ("phase1_introduction", "render_phase1"),
+    "phase2": ("phase2_evaluation", "render_phase2"),
+    "phase3": ("phase3_interview", "render_phase3"),
+    "phase4": ("phase4_rct", "render_phase4"),
+    "phase5": ("phase5_summary", "render_phase5"),
+    "admin_dashboard": ("admin_dashboard", "render_admin_dashboard"),
+}
+
+# 読み込み済みのレンダリング関数
+_loaded_renderers: Dict[str, Callable] = {}
+
+
+def get_page_renderer(page_name: str) -> Callable:
+    """
+    ページのレンダリング関数を取得（初回呼び出し時にモジュールを読み込む）
+
+    Args:
+        page_name: PAGE_REGISTRYに登録されたページ名
+
+    Returns:
+        レンダリング関数
+    """
+    renderer = _loaded_renderers.get(page_name)
+    if renderer is None:
+        if page_name not in PAGE_REGISTRY:
+            raise KeyError(f"未登録のページです: {page_name}")
+        module_name, func_name = PAGE_REGISTRY[page_name]
+        module = importlib.import_module(f"{__name__}.{module_name}")
+        renderer = getattr(module, func_name)
+        _loaded_renderers[page_name] = renderer
+    return renderer
+
+
+def __getattr__(name: str) -> Callable:
+    """`from pages import render_phase1` 形式の遅延インポートに対応"""
+    for page_name, (_, func_name) in PAGE_REGISTRY.items():
+        if func_name == name:
+            return get_page_renderer(page_name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 __all__ = [
+    "PAGE_REGISTRY",
+    "get_page_renderer",
     "render_phase1",
     "render_phase2",
     "render_phase3",
     "render_phase4",
     "render_phase5",
+    "render_admin_dashboard",
 ]
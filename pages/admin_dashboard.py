@@ -0,0 +1,92 @@
+"""
+管理者用: 実査ダッシュボード
+"""
+import streamlit as st
+from datetime import datetime
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from services.fieldwork_stats import FieldworkStats
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config import SD_AXES, DASHBOARD_REFRESH_SECONDS, DROPOUT_IDLE_MINUTES
+
+
+def render_admin_dashboard(stats: "FieldworkStats") -> None:
+    """
+    実査ダッシュボードをレンダリング
+
+    集計値は回答保存・ページ遷移時に差分更新されているため、
+    ここでは回答ストアを読み直さずにスナップショットを表示するだけでよい。
+
+    Args:
+        stats: 実査集計
+    """
+    st.markdown("## 📊 実査ダッシュボード（管理者用）")
+    st.caption(f"{DASHBOARD_REFRESH_SECONDS}秒ごとに自動更新されます")
+
+    # st.fragment(run_every=...) はStreamlit 1.37以降で利用可能
+    fragment = getattr(st, "fragment", None)
+    if fragment is not None:
+        fragment(run_every=DASHBOARD_REFRESH_SECONDS)(_render_dashboard_body)(stats)
+    else:
+        if st.button("更新"):
+            st.rerun()
+        _render_dashboard_body(stats)
+
+
+def _render_dashboard_body(stats: "FieldworkStats") -> None:
+    """ダッシュボード本体（定期的に再描画される部分）"""
+    snapshot = stats.snapshot(idle_minutes=DROPOUT_IDLE_MINUTES)
+
+    if snapshot["updated_at"]:
+        updated_at = datetime.fromtimestamp(snapshot["updated_at"]).strftime("%H:%M:%S")
+        st.caption(f"最終更新: {updated_at}")
+
+    # 回答状況
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("開始", snapshot["started"])
+    col2.metric("完了", snapshot["completed"])
+    col3.metric("回答中", snapshot["active"])
+    dropout_total = sum(snapshot["dropout"].values())
+    col4.metric("離脱", dropout_total, help=f"{DROPOUT_IDLE_MINUTES}分以上操作のない未完了セッション")
+
+    # グループバランス
+    st.markdown("### グループバランス")
+    group_rows = [
+        {"グループ": group, "開始": counts["started"], "完了": counts["completed"]}
+        for group, counts in sorted(snapshot["groups"].items())
+    ]
+    if group_rows:
+        st.table(group_rows)
+    else:
+        st.info("まだ回答がありません")
+
+    # 離脱位置
+    st.markdown("### 離脱位置（フェーズ・ステップ別）")
+    dropout_rows = [
+        {"フェーズ": phase, "ステップ": step, "離脱数": count}
+        for phase, step, count in sorted(
+            (*map(int, key.split("_")), count) for key, count in snapshot["dropout"].items()
+        )
+    ]
+    if dropout_rows:
+        st.table(dropout_rows)
+    else:
+        st.caption("離脱はありません")
+
+    # サンプル別の平均値（完了回答の累積）
+    st.markdown("### サンプル別平均（完了回答）")
+    sample_rows = []
+    for sample_id, sample in sorted(snapshot["samples"].items()):
+        row = {"サンプル": sample_id, "n": sample["n"], "購買意欲": sample["purchase_intent_mean"]}
+        for axis in SD_AXES:
+            row[axis["name"]] = sample["sd_means"].get(axis["id"])
+        sample_rows.append(row)
+    if sample_rows:
+        st.dataframe(sample_rows, hide_index=True, use_container_width=True)
+    else:
+        st.caption("完了した回答がありません")
@@ -13,7 +13,7 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from config import (
     AGE_GROUPS, GENDER_OPTIONS, PREFECTURES,
-    AUDIO_CHECK_OPTIONS, AUDIO_CHECK_CORRECT, TEST_AUDIO_FILE,
+    AUDIO_CHECK_OPTIONS, AUDIO_CHECK_CORRECT,
 )
 from components.survey_components import (
     render_audio_player, render_navigation_buttons,
@@ -237,7 +237,7 @@ def _render_audio_check(session: "SessionManager") -> None:
     st.markdown("### テスト音声を再生してください")
     
     # 音声プレイヤー
-    audio_played = render_audio_player(TEST_AUDIO_FILE, label="▶️ テスト音声")
+    audio_played = render_audio_player("test_audio", label="▶️ テスト音声")
     
     if audio_played:
         st.markdown("---")
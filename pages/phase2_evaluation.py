@@ -155,10 +155,9 @@ def _render_sd_evaluation(session: "SessionManager", sample_id: str, current_num
     動画は何度でも再生できます。
     """)
     
-    # 動画プレイヤー
-    video_path = AUDIO_SAMPLES.get(sample_id)
-    if video_path:
-        render_video_player(video_path, label=f"▶️ 走行音 {ordinal}")
+    # 動画プレイヤー（メタデータはメディアレジストリから参照）
+    if sample_id in AUDIO_SAMPLES:
+        render_video_player(sample_id, label=f"▶️ 走行音 {ordinal}")
     else:
         st.error(f"音声ファイルが見つかりません: {sample_id}")
         return
@@ -0,0 +1,79 @@
+"""
+ブートストラップ信頼区間ベンチマーク
+
+合成した N 名分の回答テーブルについて、B 回の再標本から
+SD評価・購買意欲の平均、SD評価-購買意欲相関、重要度順位、最良／最悪音の選択率、
+WTP の平均・中央値（区間打ち切り推定）の信頼区間を求める
+所要時間を計測する。所要時間が閾値を超えた場合に失敗する。
+
+使い方:
+    python scripts/benchmarks/bench_bootstrap.py [--respondents 100000] [--resamples 10000] [--workers 1] [--threshold-sec 60]
+"""
+import argparse
+import sys
+import io
+import time
+from pathlib import Path
+
+import numpy as np
+
+# 標準出力のエンコーディングをUTF-8に設定
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from config import SD_AXES, SOUND_SAMPLES, WTP_OPTIONS
+from analysis.bootstrap import BootstrapFeatures, bootstrap_intervals
+from bench_tensor_stats import make_table
+
+# 所要時間の上限（秒）
+DEFAULT_THRESHOLD_SEC = 60.0
+
+
+def main() -> int:
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description="ブートストラップ信頼区間ベンチマーク")
+    parser.add_argument("--respondents", type=int, default=100_000, help="回答者数")
+    parser.add_argument("--resamples", type=int, default=10_000, help="再標本数")
+    parser.add_argument("--workers", type=int, default=1, help="プロセス数")
+    parser.add_argument("--threshold-sec", type=float, default=DEFAULT_THRESHOLD_SEC,
+                        help="所要時間の上限（秒）")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("ブートストラップ信頼区間ベンチマーク")
+    print("=" * 60)
+    df = make_table(args.respondents)
+    rng = np.random.default_rng(1)
+    df["best_sound"] = rng.choice(SOUND_SAMPLES, size=len(df))
+    df["worst_sound"] = rng.choice(SOUND_SAMPLES, size=len(df))
+    for sample_id in SOUND_SAMPLES:
+        df[f"wtp_{sample_id}"] = rng.choice(WTP_OPTIONS, size=len(df), p=[0.06, 0.15, 0.25, 0.33, 0.13, 0.06, 0.02])
+    print(f"回答者数: {args.respondents:,} / 再標本数: {args.resamples:,} / プロセス数: {args.workers}")
+
+    start = time.perf_counter()
+    features = BootstrapFeatures.from_table(df, SOUND_SAMPLES, SD_AXES, WTP_OPTIONS)
+    prepare_sec = time.perf_counter() - start
+    result = bootstrap_intervals(features, resamples=args.resamples, workers=args.workers)
+    total_sec = time.perf_counter() - start
+    print(f"特徴量行列: {features.matrix.shape[1]} 列 ({prepare_sec:.2f} 秒)")
+    print(f"所要時間: {total_sec:.2f} 秒 (閾値: {args.threshold_sec:.1f} 秒, "
+          f"{total_sec / args.resamples * 1000:.2f} ミリ秒/再標本)")
+    sample_id = SOUND_SAMPLES[0]
+    ci = result["purchase_intent"][sample_id]
+    print(f"購買意欲 ({sample_id}): {ci['estimate']:.3f} [{ci['ci_low']:.3f}, {ci['ci_high']:.3f}]")
+    ci = result["wtp_mean"][sample_id]
+    print(f"WTPの平均 ({sample_id}): {ci['estimate']:,.0f}円 [{ci['ci_low']:,.0f}, {ci['ci_high']:,.0f}]")
+    print()
+
+    if total_sec > args.threshold_sec:
+        print(f"NG: 所要時間が閾値を超えています ({total_sec:.2f} 秒 > {args.threshold_sec:.1f} 秒)")
+        return 1
+    print("OK: 所要時間は閾値内です")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+"""
+分割実行（アウトオブコア分析）ベンチマーク
+
+合成した N 名分の回答データ（CSV と JSON Lines）をファイルに書き出し、
+別プロセスで run_chunked() を実行して所要時間とピークメモリ（最大常駐セットサイズ）を計測する。
+ピークメモリが閾値を超えた場合に失敗する。
+
+使い方:
+    python scripts/benchmarks/bench_chunked.py [--respondents 5000000] [--chunk-size 50000] [--record-chunk-size 10000] [--threshold-mb 1024]
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import io
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# 標準出力のエンコーディングをUTF-8に設定
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from config import (
+    SD_AXES, SOUND_SAMPLES, AGE_GROUPS, GENDER_OPTIONS, PREFECTURES, WTP_OPTIONS, LADDERING_VOCABULARY,
+    DRIVING_EXPERIENCE_OPTIONS, EV_EXPERIENCE_OPTIONS,
+)
+from analysis.chunked import run_chunked
+from analysis.loaders import DEFAULT_RECORD_CHUNK_SIZE
+
+# ピークメモリの上限（MB）
+DEFAULT_THRESHOLD_MB = 1024.0
+
+# 合成データを書き出す1回あたりの回答者数
+WRITE_CHUNK = 100_000
+
+
+def make_chunk(start: int, n: int, rng: np.random.Generator) -> pd.DataFrame:
+    """
+    合成回答テーブルの一部を作成
+
+    Args:
+        start: 先頭の回答者番号
+        n: 回答者数
+        rng: 乱数生成器
+
+    Returns:
+        run_analysis.py の入力CSVと同じ列を持つテーブル
+    """
+    columns = {
+        "session_id": [f"bench-{i}" for i in range(start, start + n)],
+        "age_group": rng.choice(AGE_GROUPS, n),
+        "gender": rng.choice(GENDER_OPTIONS, n),
+        "prefecture": rng.choice(PREFECTURES, n),
+        "driving_experience": rng.choice(DRIVING_EXPERIENCE_OPTIONS, n),
+        "ev_experience": rng.choice(EV_EXPERIENCE_OPTIONS, n),
+        "sound_sensitivity": rng.integers(1, 11, n),
+        "best_sound": rng.choice(SOUND_SAMPLES, n),
+        "worst_sound": rng.choice(SOUND_SAMPLES, n),
+    }
+    for sample_id in SOUND_SAMPLES:
+        for axis in SD_AXES:
+            columns[f"sd_{sample_id}_{axis['id']}"] = rng.integers(1, 8, n)
+        columns[f"purchase_intent_{sample_id}"] = rng.integers(1, 8, n)
+        columns[f"wtp_{sample_id}"] = rng.choice(WTP_OPTIONS, n)
+    columns["sound_importance"] = rng.integers(1, 11, n)
+    return pd.DataFrame(columns)
+
+
+def write_records(f, table: pd.DataFrame, rng: np.random.Generator) -> None:
+    """合成テーブルに対応するラダリング回答を JSON Lines で書き出し"""
+    vocab = {key: np.asarray(options, dtype=object) for key, options in LADDERING_VOCABULARY.items()}
+    picks = {key: rng.integers(0, len(options), (len(table), 3)) for key, options in vocab.items()}
+    counts = rng.integers(1, 4, (len(table), 4))
+    for i, row in enumerate(table[["session_id", "age_group", "gender", "ev_experience",
+                                   "best_sound", "worst_sound"]].itertuples(index=False)):
+        chosen = [list(vocab[key][picks[key][i, :counts[i, k]]]) for k, key in enumerate(vocab)]
+        record = {
+            "session_id": row.session_id,
+            "demographics": {"age_group": row.age_group, "gender": row.gender, "ev_experience": row.ev_experience},
+            "grid_evaluation": {
+                "best_sound": row.best_sound,
+                "worst_sound": row.worst_sound,
+                "laddering_best": {"why_good": chosen[0], "feeling_good": chosen[1]},
+                "laddering_worst": {"why_bad": chosen[2], "feeling_bad": chosen[3]},
+            },
+        }
+        f.write(json.dumps(record, ensure_ascii=False))
+        f.write("\n")
+
+
+def write_dataset(directory: Path, n: int, seed: int = 0) -> tuple:
+    """
+    合成回答データを WRITE_CHUNK 件ずつファイルに書き出し
+
+    Returns:
+        (CSVのパス, JSON Linesのパス)
+    """
+    rng = np.random.default_rng(seed)
+    csv_path = directory / "responses.csv"
+    jsonl_path = directory / "responses.jsonl"
+    with open(jsonl_path, "w", encoding="utf-8") as f:
+        for start in range(0, n, WRITE_CHUNK):
+            table = make_chunk(start, min(WRITE_CHUNK, n - start), rng)
+            table.to_csv(csv_path, mode="a", header=start == 0, index=False, encoding="utf-8")
+            write_records(f, table, rng)
+    return csv_path, jsonl_path
+
+
+def analyze(csv_path: Path, jsonl_path: Path, chunk_size: int, record_chunk_size: int) -> None:
+    """（子プロセス）分割実行の所要時間とピークメモリをJSONで出力"""
+    start = time.perf_counter()
+    results = run_chunked(csv_path, jsonl_path, SOUND_SAMPLES, SD_AXES,
+                          laddering_vocab=LADDERING_VOCABULARY, chunk_size=chunk_size,
+                          record_chunk_size=record_chunk_size)
+    seconds = time.perf_counter() - start
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({
+        "seconds": seconds,
+        "peak_mb": peak_mb,
+        "total_responses": results["total_responses"],
+        "stage_timings": results["stage_timings"],
+    }))
+
+
+def main() -> int:
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description="分割実行（アウトオブコア分析）ベンチマーク")
+    parser.add_argument("--respondents", type=int, default=5_000_000, help="回答者数")
+    parser.add_argument("--chunk-size", type=int, default=50_000, help="CSVを1回に読み込む行数")
+    parser.add_argument("--record-chunk-size", type=int, default=DEFAULT_RECORD_CHUNK_SIZE,
+                        help="JSON Linesを1回に読み込む件数")
+    parser.add_argument("--threshold-mb", type=float, default=DEFAULT_THRESHOLD_MB,
+                        help="ピークメモリの上限（MB）")
+    parser.add_argument("--analyze", nargs=2, metavar=("CSV", "JSONL"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.analyze:
+        analyze(Path(args.analyze[0]), Path(args.analyze[1]), args.chunk_size, args.record_chunk_size)
+        return 0
+
+    print("=" * 60)
+    print("分割実行（アウトオブコア分析）ベンチマーク")
+    print("=" * 60)
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        csv_path, jsonl_path = write_dataset(Path(tmp), args.respondents)
+        size_mb = (csv_path.stat().st_size + jsonl_path.stat().st_size) / 1024 ** 2
+        print(f"回答者数: {args.respondents:,} / 合成データ: {size_mb:,.0f} MB "
+              f"({time.perf_counter() - start:.1f} 秒で作成)")
+
+        completed = subprocess.run(
+            [sys.executable, __file__, "--analyze", str(csv_path), str(jsonl_path),
+             "--chunk-size", str(args.chunk_size), "--record-chunk-size", str(args.record_chunk_size)],
+            check=True, capture_output=True, text=True, encoding="utf-8",
+        )
+    measured = json.loads(completed.stdout.strip().splitlines()[-1])
+    timings = measured["stage_timings"]
+    print(f"所要時間: {measured['seconds']:.1f} 秒 "
+          f"(CSV {timings['chunked_table']:.1f} 秒 / JSON Lines {timings['chunked_records']:.1f} 秒, "
+          f"{args.respondents / measured['seconds']:,.0f} 人/秒)")
+    print(f"ピークメモリ: {measured['peak_mb']:.0f} MB (閾値: {args.threshold_mb:.0f} MB, "
+          f"CSV {args.chunk_size:,}行 / JSON Lines {args.record_chunk_size:,}件ずつ読み込み)")
+    print()
+
+    if measured["total_responses"] != args.respondents:
+        print(f"NG: 集計件数が一致しません ({measured['total_responses']} != {args.respondents})")
+        return 1
+    if measured["peak_mb"] > args.threshold_mb:
+        print(f"NG: ピークメモリが閾値を超えています ({measured['peak_mb']:.0f} MB > {args.threshold_mb:.0f} MB)")
+        return 1
+    print("OK: ピークメモリは閾値内です")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
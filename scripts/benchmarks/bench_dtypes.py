@@ -0,0 +1,94 @@
+"""
+回答データの型指定読み込みベンチマーク
+
+合成した N 名分の回答データ（CSV）について、pandas の型推定による読み込み（int64・文字列）と、
+config.RESPONSE_COLUMN_TYPES による型指定の読み込み（Int8・カテゴリ）の
+所要時間・メモリ使用量、セグメント分析（groupby）の所要時間を比較する。
+型指定時のメモリ使用量が型推定時の閾値（割合）を超えた場合に失敗する。
+
+使い方:
+    python scripts/benchmarks/bench_dtypes.py [--respondents 1000000] [--threshold-ratio 0.3]
+"""
+import argparse
+import sys
+import io
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# 標準出力のエンコーディングをUTF-8に設定
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from config import SD_AXES, SOUND_SAMPLES, RESPONSE_COLUMN_TYPES
+from analysis.loaders import load_table
+from analysis.segmentation import default_metrics, segment_analysis
+from analysis.stages import DEFAULT_SEGMENTS
+from bench_chunked import WRITE_CHUNK, make_chunk
+
+# 型指定時のメモリ使用量の上限（型推定時に対する割合）
+DEFAULT_THRESHOLD_RATIO = 0.3
+
+
+def write_csv(path: Path, n: int, seed: int = 0) -> None:
+    """合成回答データを WRITE_CHUNK 件ずつCSVに書き出し"""
+    rng = np.random.default_rng(seed)
+    for start in range(0, n, WRITE_CHUNK):
+        table = make_chunk(start, min(WRITE_CHUNK, n - start), rng)
+        table.to_csv(path, mode="a", header=start == 0, index=False, encoding="utf-8")
+
+
+def measure(csv_path: Path, column_types) -> dict:
+    """読み込みとセグメント分析の所要時間、メモリ使用量を計測"""
+    start = time.perf_counter()
+    df = load_table(csv_path, column_types)
+    load_sec = time.perf_counter() - start
+    memory = df.memory_usage(deep=True).sum()
+
+    start = time.perf_counter()
+    segment_analysis(df, DEFAULT_SEGMENTS, default_metrics(df, SOUND_SAMPLES, SD_AXES))
+    groupby_sec = time.perf_counter() - start
+    return {"load_sec": load_sec, "memory_mb": memory / 1024 ** 2, "groupby_sec": groupby_sec}
+
+
+def main() -> int:
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description="回答データの型指定読み込みベンチマーク")
+    parser.add_argument("--respondents", type=int, default=1_000_000, help="回答者数")
+    parser.add_argument("--threshold-ratio", type=float, default=DEFAULT_THRESHOLD_RATIO,
+                        help="型指定時のメモリ使用量の上限（型推定時に対する割合）")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("回答データの型指定読み込みベンチマーク")
+    print("=" * 60)
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = Path(tmp) / "responses.csv"
+        write_csv(csv_path, args.respondents)
+        print(f"回答者数: {args.respondents:,} / CSV: {csv_path.stat().st_size / 1024 ** 2:.1f} MB")
+        print()
+        inferred = measure(csv_path, None)
+        typed = measure(csv_path, RESPONSE_COLUMN_TYPES)
+
+    for label, result in (("型推定", inferred), ("型指定", typed)):
+        print(f"  {label}: 読み込み {result['load_sec']:6.2f} 秒 / メモリ {result['memory_mb']:8.1f} MB / "
+              f"セグメント分析 {result['groupby_sec']:6.2f} 秒")
+    ratio = typed["memory_mb"] / inferred["memory_mb"]
+    print(f"  メモリ使用量の比: {ratio:.1%} (閾値: {args.threshold_ratio:.0%}) / "
+          f"セグメント分析の速度向上: {inferred['groupby_sec'] / typed['groupby_sec']:.2f} 倍")
+    print()
+
+    if ratio > args.threshold_ratio:
+        print(f"NG: メモリ使用量の比が閾値を超えています ({ratio:.1%} > {args.threshold_ratio:.0%})")
+        return 1
+    print("OK: メモリ使用量の比は閾値内です")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""
+プロセス並列のスケーリングベンチマーク
+
+合成した N 名分の回答テーブルについて、サンプル・セグメント単位の処理
+（SD評価・購買意欲の集計量、ドライバー分析、セグメント分析）をプロセス数 1/2/4/8 で実行し、
+所要時間と1プロセスに対する速度向上率を計測する。
+いずれかのプロセス数で結果が1プロセスの場合と一致しない場合に失敗する。
+
+使い方:
+    python scripts/benchmarks/bench_parallel.py [--respondents 500000] [--workers 1 2 4 8]
+"""
+import argparse
+import sys
+import io
+import time
+from pathlib import Path
+
+import numpy as np
+
+# 標準出力のエンコーディングをUTF-8に設定
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from config import SD_AXES, SOUND_SAMPLES, AGE_GROUPS, GENDER_OPTIONS, EV_EXPERIENCE_OPTIONS
+from analysis.drivers import run_drivers
+from analysis.parallel import ProcessPool, default_workers
+from analysis.segmentation import run_segmentation
+from analysis.stages import DEFAULT_SEGMENTS
+from analysis.tensor import RatingTensor
+from bench_tensor_stats import make_table
+
+
+def run_all(df, pool: ProcessPool) -> dict:
+    """計測対象の処理を実行"""
+    moments = RatingTensor.from_table(df, SOUND_SAMPLES, SD_AXES).parallel_moments(pool)
+    return {
+        "correlation": moments.correlation(),
+        **run_drivers(df, SOUND_SAMPLES, SD_AXES, DEFAULT_SEGMENTS, pool),
+        **run_segmentation(df, SOUND_SAMPLES, SD_AXES, DEFAULT_SEGMENTS, pool),
+    }
+
+
+def same_results(a: dict, b: dict) -> bool:
+    """結果が一致するか"""
+    return (
+        np.array_equal(a["correlation"], b["correlation"], equal_nan=True)
+        and a["drivers"] == b["drivers"]
+        and a["layer4_segmentation"] == b["layer4_segmentation"]
+    )
+
+
+def main() -> int:
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description="プロセス並列のスケーリングベンチマーク")
+    parser.add_argument("--respondents", type=int, default=500_000, help="回答者数")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8], help="計測するプロセス数")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("プロセス並列のスケーリングベンチマーク")
+    print("=" * 60)
+    df = make_table(args.respondents)
+    rng = np.random.default_rng(1)
+    df["age_group"] = rng.choice(AGE_GROUPS, size=len(df))
+    df["gender"] = rng.choice(GENDER_OPTIONS, size=len(df))
+    df["ev_experience"] = rng.choice(EV_EXPERIENCE_OPTIONS, size=len(df))
+    print(f"回答者数: {args.respondents:,} / 利用できるCPU数: {default_workers()}")
+    print()
+
+    baseline, baseline_sec, failed = None, None, False
+    for workers in args.workers:
+        with ProcessPool(workers) as pool:
+            start = time.perf_counter()
+            result = run_all(df, pool)
+            seconds = time.perf_counter() - start
+        if baseline is None:
+            baseline, baseline_sec = result, seconds
+        matched = same_results(baseline, result)
+        failed |= not matched
+        print(f"  {workers}プロセス: {seconds:7.2f} 秒 (速度向上 {baseline_sec / seconds:.2f} 倍)"
+              f"{'' if matched else '  NG: 結果が一致しません'}")
+    print()
+
+    if failed:
+        print("NG: プロセス数によって結果が異なります")
+        return 1
+    print("OK: すべてのプロセス数で結果が一致しました")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
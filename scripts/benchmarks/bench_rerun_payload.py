@@ -0,0 +1,120 @@
+"""
+再実行（rerun）あたりの送信バイト数ベンチマーク
+
+Streamlit の AppTest で app.py を実行し、ブラウザへWebSocketで送信される
+ForwardMsg のバイト数を再実行ごとに集計する。
+各フェーズについて「ページ遷移直後の初回実行」と「同一ページでの再実行」を計測する。
+
+使い方:
+    python scripts/benchmarks/bench_rerun_payload.py [--threshold-bytes 8000]
+"""
+import argparse
+import os
+import sys
+import io
+from pathlib import Path
+from typing import Dict, List
+
+# 標準出力のエンコーディングをUTF-8に設定
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+APP_FILE = PROJECT_ROOT / "app.py"
+
+# 同一ページでの再実行1回あたりの送信バイト数の上限
+DEFAULT_THRESHOLD_BYTES = 8000
+
+# 計測対象のフェーズ（Phase4削除後、4がまとめ）
+PHASES = [1, 2, 3, 4]
+
+
+class ForwardMsgRecorder:
+    """ForwardMsgQueueへの投入をフックして送信バイト数を記録する"""
+
+    def __init__(self):
+        self.sizes: List[int] = []
+        self._original = None
+
+    def __enter__(self) -> "ForwardMsgRecorder":
+        from streamlit.runtime.forward_msg_queue import ForwardMsgQueue
+
+        self._original = ForwardMsgQueue.enqueue
+        recorder = self
+
+        def enqueue(queue, msg):
+            # スクリプト実行中の要素（delta）のみを対象とする
+            if msg.WhichOneof("type") == "delta":
+                recorder.sizes.append(msg.ByteSize())
+            return recorder._original(queue, msg)
+
+        ForwardMsgQueue.enqueue = enqueue
+        return self
+
+    def __exit__(self, *exc) -> None:
+        from streamlit.runtime.forward_msg_queue import ForwardMsgQueue
+
+        ForwardMsgQueue.enqueue = self._original
+
+    def take(self) -> Dict[str, int]:
+        """記録済みのメッセージ数と合計バイト数を取得してリセット"""
+        result = {"messages": len(self.sizes), "bytes": sum(self.sizes)}
+        self.sizes = []
+        return result
+
+
+def measure() -> List[Dict[str, int]]:
+    """
+    各フェーズの送信バイト数を計測
+
+    Returns:
+        フェーズごとの計測結果
+    """
+    from streamlit.testing.v1 import AppTest
+
+    # 素材ファイルが揃っていない環境でも計測できるよう、警告表示のみにする
+    os.environ.setdefault("EV_SURVEY_MEDIA_STRICT", "0")
+
+    results = []
+    with ForwardMsgRecorder() as recorder:
+        at = AppTest.from_file(str(APP_FILE), default_timeout=30)
+        for phase in PHASES:
+            at.session_state["current_phase"] = phase
+            at.session_state["current_step"] = 1
+            at.run()
+            first = recorder.take()
+            at.run()
+            steady = recorder.take()
+            results.append({"phase": phase, "first": first, "steady": steady})
+    return results
+
+
+def main() -> int:
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description="再実行あたりの送信バイト数ベンチマーク")
+    parser.add_argument("--threshold-bytes", type=int, default=DEFAULT_THRESHOLD_BYTES,
+                        help="同一ページでの再実行1回あたりの送信バイト数の上限")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("再実行あたりの送信バイト数 (ForwardMsg)")
+    print("=" * 60)
+
+    results = measure()
+    print(f"{'フェーズ':<8}{'遷移直後 (件/バイト)':>24}{'再実行 (件/バイト)':>24}")
+    for r in results:
+        first = f"{r['first']['messages']} / {r['first']['bytes']:,}"
+        steady = f"{r['steady']['messages']} / {r['steady']['bytes']:,}"
+        print(f"{r['phase']:<10}{first:>24}{steady:>24}")
+
+    worst = max(r["steady"]["bytes"] for r in results)
+    print()
+    if worst > args.threshold_bytes:
+        print(f"NG: 再実行あたりの送信バイト数が閾値を超えています ({worst:,} > {args.threshold_bytes:,})")
+        return 1
+    print(f"OK: 再実行あたりの送信バイト数は閾値内です (最大 {worst:,} バイト)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""
+起動時間ベンチマーク
+
+`python -X importtime` で app.py のインポート時間を計測し、
+プロジェクト自身のインポートコストが閾値を超えた場合や
+重いライブラリ（pandas等）が起動時に読み込まれた場合に失敗する。
+
+使い方:
+    python scripts/benchmarks/bench_startup.py [--runs 5] [--threshold-ms 100]
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import io
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+# 標準出力のエンコーディングをUTF-8に設定
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+
+# プロジェクト自身のトップレベルモジュール
+PROJECT_MODULES = {"app", "config", "services", "pages", "components"}
+
+# 起動時に読み込まれてはならないモジュール（エクスポート・分析時のみ使用）
+FORBIDDEN_MODULES = ["pandas", "matplotlib", "scipy", "sklearn", "openpyxl"]
+
+# プロジェクト自身のインポートコストの上限（ミリ秒）
+DEFAULT_THRESHOLD_MS = 100.0
+
+
+def parse_importtime(stderr: str) -> List[Tuple[int, int, str]]:
+    """
+    -X importtime の出力を解析
+
+    Args:
+        stderr: 標準エラー出力
+
+    Returns:
+        (階層の深さ, 累積時間[us], モジュール名) のリスト（出力順）
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name_part = line[len("import time:"):].split("|")
+        name = name_part.strip()
+        depth = (len(name_part) - len(name_part.lstrip(" ")) - 1) // 2
+        entries.append((depth, int(cumulative), name))
+    return entries
+
+
+def measure_once() -> Dict[str, float]:
+    """
+    app.py のインポートを1回計測
+
+    Returns:
+        計測結果（total_ms, own_ms, imported）
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+        encoding="utf-8",
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"app.py のインポートに失敗しました:\n{result.stderr[-2000:]}")
+
+    entries = parse_importtime(result.stderr)
+    app_index = next(i for i, (depth, _, name) in enumerate(entries) if depth == 0 and name == "app")
+    total_us = entries[app_index][1]
+
+    # app直下でインポートされたサードパーティ（streamlit等）の時間を差し引く
+    third_party_us = 0
+    for depth, cumulative, name in reversed(entries[:app_index]):
+        if depth == 0:
+            break
+        if depth == 1 and name.split(".")[0] not in PROJECT_MODULES:
+            third_party_us += cumulative
+
+    imported = {name.split(".")[0] for _, _, name in entries}
+    return {
+        "total_ms": total_us / 1000,
+        "own_ms": (total_us - third_party_us) / 1000,
+        "imported": imported,
+    }
+
+
+def main() -> int:
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description="app.py の起動時間ベンチマーク")
+    parser.add_argument("--runs", type=int, default=5, help="計測回数")
+    parser.add_argument("--threshold-ms", type=float, default=DEFAULT_THRESHOLD_MS,
+                        help="プロジェクト自身のインポート時間の上限（ミリ秒）")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("起動時間ベンチマーク (python -X importtime)")
+    print("=" * 60)
+
+    runs = [measure_once() for _ in range(args.runs)]
+    total_ms = statistics.median(r["total_ms"] for r in runs)
+    own_ms = statistics.median(r["own_ms"] for r in runs)
+    forbidden = sorted(set().union(*(r["imported"] for r in runs)) & set(FORBIDDEN_MODULES))
+
+    print(f"計測回数: {args.runs}")
+    print(f"app.py インポート時間（中央値）: {total_ms:.1f} ms")
+    print(f"  うちプロジェクト自身: {own_ms:.1f} ms (閾値: {args.threshold_ms:.1f} ms)")
+    print(f"起動時に読み込まれた重いモジュール: {', '.join(forbidden) if forbidden else 'なし'}")
+    print()
+
+    failed = False
+    if forbidden:
+        print(f"NG: 起動時に読み込まれてはならないモジュールがあります: {', '.join(forbidden)}")
+        failed = True
+    if own_ms > args.threshold_ms:
+        print(f"NG: プロジェクト自身のインポート時間が閾値を超えています ({own_ms:.1f} ms > {args.threshold_ms:.1f} ms)")
+        failed = True
+    if not failed:
+        print("OK: 起動時間は閾値内です")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
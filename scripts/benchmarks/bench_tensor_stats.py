@@ -0,0 +1,123 @@
+"""
+SD評価テンソル集計ベンチマーク
+
+合成した N 名分の回答テーブルについて、
+列ごとに pandas で集計する従来方式と、RatingTensor による一括集計
+（Layer 1〜3 の SD評価・購買意欲の統計量と相関行列）の所要時間を比較する。
+一括集計の所要時間が閾値を超えた場合に失敗する。
+
+使い方:
+    python scripts/benchmarks/bench_tensor_stats.py [--respondents 1000000] [--threshold-sec 10]
+"""
+import argparse
+import sys
+import io
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# 標準出力のエンコーディングをUTF-8に設定
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from config import SD_AXES, SOUND_SAMPLES
+from analysis.tensor import RatingTensor
+from analysis.descriptive import describe_sd_ratings
+from analysis.comparative import compare_sd, compare_purchase
+from analysis.correlation import sd_axis_correlation, sd_purchase_correlation
+
+# 一括集計の所要時間の上限（秒）
+DEFAULT_THRESHOLD_SEC = 10.0
+
+# 欠損させる割合
+MISSING_RATE = 0.01
+
+
+def make_table(n: int, seed: int = 0) -> pd.DataFrame:
+    """
+    合成回答テーブルを作成
+
+    Args:
+        n: 回答者数
+        seed: 乱数シード
+
+    Returns:
+        sd_{サンプル}_{軸} と purchase_intent_{サンプル} の列を持つテーブル
+    """
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for sample_id in SOUND_SAMPLES:
+        for axis in SD_AXES:
+            values = rng.integers(1, 8, size=n).astype(float)
+            values[rng.random(n) < MISSING_RATE] = np.nan
+            columns[f"sd_{sample_id}_{axis['id']}"] = values
+        columns[f"purchase_intent_{sample_id}"] = rng.integers(1, 8, size=n)
+    return pd.DataFrame(columns)
+
+
+def legacy_stats(df: pd.DataFrame) -> None:
+    """従来方式（サンプル × 軸ごとに列を取り出して集計）"""
+    for sample_id in SOUND_SAMPLES:
+        intent_col = f"purchase_intent_{sample_id}"
+        for axis in SD_AXES:
+            col_name = f"sd_{sample_id}_{axis['id']}"
+            df[col_name].mean(), df[col_name].std(), df[col_name].min(), df[col_name].max()
+            df[col_name].mean(), df[col_name].std()  # sd_comparison での再計算
+            df[col_name].corr(df[intent_col])
+        df[intent_col].mean(), df[intent_col].std(), df[intent_col].value_counts()
+        df[[f"sd_{sample_id}_{axis['id']}" for axis in SD_AXES]].corr()
+
+
+def tensor_stats(df: pd.DataFrame) -> None:
+    """テンソル方式（1回の走査で集計量を求め、各レイヤーの結果を作成）"""
+    moments = RatingTensor.from_table(df, SOUND_SAMPLES, SD_AXES).moments()
+    describe_sd_ratings(moments)
+    compare_sd(moments)
+    compare_purchase(moments)
+    sd_axis_correlation(moments)
+    sd_purchase_correlation(moments)
+
+
+def timed(func, *args) -> float:
+    """関数の所要時間（秒）"""
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def main() -> int:
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description="SD評価テンソル集計ベンチマーク")
+    parser.add_argument("--respondents", type=int, default=1_000_000, help="回答者数")
+    parser.add_argument("--threshold-sec", type=float, default=DEFAULT_THRESHOLD_SEC,
+                        help="テンソル方式の所要時間の上限（秒）")
+    parser.add_argument("--skip-legacy", action="store_true", help="従来方式の計測を省略する")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("SD評価テンソル集計ベンチマーク")
+    print("=" * 60)
+    df = make_table(args.respondents)
+    print(f"回答者数: {args.respondents:,} / サンプル: {len(SOUND_SAMPLES)} / 評価軸: {len(SD_AXES)}")
+
+    tensor_sec = timed(tensor_stats, df)
+    print(f"テンソル方式: {tensor_sec:.2f} 秒 (閾値: {args.threshold_sec:.1f} 秒)")
+    if not args.skip_legacy:
+        legacy_sec = timed(legacy_stats, df)
+        print(f"従来方式:     {legacy_sec:.2f} 秒 ({legacy_sec / tensor_sec:.1f}倍)")
+    print()
+
+    if tensor_sec > args.threshold_sec:
+        print(f"NG: テンソル方式の所要時間が閾値を超えています ({tensor_sec:.2f} 秒 > {args.threshold_sec:.1f} 秒)")
+        return 1
+    print("OK: 所要時間は閾値内です")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""
+テキスト分析ベンチマーク
+
+合成した N 名分の自由記述（サンプルごとの自由コメント・インタビュー回答・全体の感想）について、
+文字 n-gram TF-IDF の語彙の学習・変換と、サンプル別・属性別の特徴語・用例の抽出の所要時間を計測する。
+語彙を学習する初回と、保存した語彙で変換する2回目を計測し、いずれかが閾値を超えた場合に失敗する。
+
+使い方:
+    python scripts/benchmarks/bench_text.py [--respondents 20000] [--threshold-sec 60]
+"""
+import argparse
+import sys
+import io
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# 標準出力のエンコーディングをUTF-8に設定
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from config import SOUND_SAMPLES, AGE_GROUPS, GENDER_OPTIONS, EV_EXPERIENCE_OPTIONS
+from analysis.text import analyze_text
+
+# 所要時間の上限（秒）
+DEFAULT_THRESHOLD_SEC = 60.0
+
+# 自由記述を組み立てる語句
+SUBJECTS = ["この走行音", "音", "加速時の音", "低い音", "高い音", "音の立ち上がり", "響き", "音色"]
+IMPRESSIONS = [
+    "静か", "力強い", "高級感がある", "未来的", "落ち着く", "うるさい", "安っぽい", "自然",
+    "心地よい", "耳障り", "先進的", "上品", "物足りない", "存在感がある", "不安になる",
+]
+ENDINGS = ["と感じました。", "と思います。", "です。", "でした。", "なのが良いです。", "なのが気になります。"]
+ADDITIONS = ["", "", "もう少し音量が欲しいです。", "長時間だと疲れそう。", "EVらしさがあります。", "歩行者にも気づかれそう。"]
+
+
+def make_records(respondents: int, seed: int = 0):
+    """自由記述を含む合成の回答データ"""
+    rng = np.random.default_rng(seed)
+
+    def sentences(size):
+        subjects = rng.choice(SUBJECTS, size)
+        impressions = rng.choice(IMPRESSIONS, size)
+        endings = rng.choice(ENDINGS, size)
+        additions = rng.choice(ADDITIONS, size)
+        return [f"{s}は{i}{e}{a}" for s, i, e, a in zip(subjects, impressions, endings, additions)]
+
+    comments = {sample_id: sentences(respondents) for sample_id in SOUND_SAMPLES}
+    details, ideals, overalls = sentences(respondents), sentences(respondents), sentences(respondents)
+    most_impressive = rng.choice(SOUND_SAMPLES, respondents)
+    ages = rng.choice(AGE_GROUPS, respondents)
+    genders = rng.choice(GENDER_OPTIONS, respondents)
+    ev = rng.choice(EV_EXPERIENCE_OPTIONS, respondents)
+    return [
+        {
+            "session_id": f"bench-{i}",
+            "demographics": {"age_group": ages[i], "gender": genders[i], "ev_experience": ev[i]},
+            "evaluations": {"free_comments": {sample_id: comments[sample_id][i] for sample_id in SOUND_SAMPLES}},
+            "interview": {
+                "topic1": {"most_impressive": most_impressive[i], "impression_detail": details[i]},
+                "topic3": {"ideal_sound": ideals[i]},
+            },
+            "summary": {"overall_impression": overalls[i]},
+        }
+        for i in range(respondents)
+    ]
+
+
+def main() -> int:
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description="テキスト分析ベンチマーク")
+    parser.add_argument("--respondents", type=int, default=20_000, help="回答者数")
+    parser.add_argument("--threshold-sec", type=float, default=DEFAULT_THRESHOLD_SEC,
+                        help="所要時間の上限（秒）")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("テキスト分析ベンチマーク")
+    print("=" * 60)
+    records = make_records(args.respondents)
+    segments = ["age_group", "gender", "ev_experience"]
+
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        options = {"vocabulary_path": str(Path(tmp) / "text_vocabulary.json")}
+        for label in ("語彙の学習", "保存した語彙で変換"):
+            start = time.perf_counter()
+            result = analyze_text(records, SOUND_SAMPLES, segments, options)
+            seconds = time.perf_counter() - start
+            vocabulary = result["vocabulary"]
+            print(f"{label}: {seconds:.2f} 秒 (閾値: {args.threshold_sec:.1f} 秒) / "
+                  f"文書数: {result['documents']:,} / 語彙: {vocabulary['terms']:,} 語"
+                  f"{'（再利用）' if vocabulary['reused'] else ''}")
+            failed |= seconds > args.threshold_sec
+    top_terms = result["fields"]["free_comment"]["top_terms"][:5]
+    print(f"自由コメントの特徴語: {'、'.join(item['term'] for item in top_terms)}")
+    print()
+
+    if failed:
+        print("NG: 所要時間が閾値を超えています")
+        return 1
+    print("OK: 所要時間は閾値内です")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -23,9 +23,11 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 from config import (
     SD_AXES, PURCHASE_INTENT_OPTIONS, WTP_OPTIONS,
     AGE_GROUPS, GENDER_OPTIONS, PREFECTURES,
+    DRIVING_EXPERIENCE_OPTIONS, EV_EXPERIENCE_OPTIONS, RESPONSE_COLUMN_TYPES,
     LADDERING_WHY_GOOD_OPTIONS, LADDERING_FEELING_GOOD_OPTIONS,
     LADDERING_WHY_BAD_OPTIONS, LADDERING_FEELING_BAD_OPTIONS,
 )
+from analysis.loaders import load_table, undeclared_values
 
 # 出力ディレクトリ
 OUTPUT_DIR = Path(__file__).parent.parent / "data" / "sample_data"
@@ -74,12 +76,6 @@ SAMPLE_CHARACTERISTICS = {
     },
 }
 
-# 運転経験オプション
-DRIVING_EXPERIENCE_OPTIONS = ["1年未満", "1-5年", "5-10年", "10-20年", "20年以上"]
-
-# EV経験オプション
-EV_EXPERIENCE_OPTIONS = ["所有している", "試乗したことがある", "乗ったことはない"]
-
 # 分布設定
 AGE_DISTRIBUTION = [0.15, 0.25, 0.30, 0.20, 0.10]
 GENDER_DISTRIBUTION = [0.55, 0.40, 0.025, 0.025]
@@ -411,6 +407,13 @@ def main():
     
     save_to_json(responses, json_path)
     save_to_csv(responses, csv_path)
+
+    # 分析と同じ型で読み込めるか確認（選択肢にない値があれば設定との不一致）
+    table = load_table(csv_path, RESPONSE_COLUMN_TYPES)
+    undeclared = undeclared_values(table, RESPONSE_COLUMN_TYPES)
+    if undeclared:
+        print(f"Warning: values not declared in config: {undeclared}")
+    print(f"Typed table: {table.memory_usage(deep=True).sum() / 1024:.1f} KB in memory")
     
     # 統計情報を表示
     print("\n" + "=" * 50)
@@ -218,8 +218,12 @@ if "Prius" in importance and importance["Prius"]:
 """
     for i, item in enumerate(importance["Prius"][:3], 1):
         axis_name = next((ax["name"] for ax in SD_AXES if ax["id"] == item["axis"]), item["axis"])
+        if item.get("shapley_share") is not None:
+            importance_text = f"R²への寄与率 {item['shapley_share']:.1%}（相関係数 {item['correlation']:.3f}）"
+        else:
+            importance_text = f"相関係数 {item['correlation']:.3f}"
         html_content += f"""
-                <li>{axis_name}: 相関係数 {item['correlation']:.3f}</li>
+                <li>{axis_name}: {importance_text}</li>
 """
     html_content += """
             </ol>
@@ -301,19 +305,71 @@ for sample_id in SOUND_SAMPLES:
 
 # 購買意欲
 purchase = results["layer1_descriptive"]["purchase_intent"]
-html_content += """
+# ブートストラップ信頼区間（増分分析の結果には含まれない）
+bootstrap = results.get("bootstrap", {})
+purchase_ci = bootstrap.get("purchase_intent", {})
+ci_label = f"{bootstrap['confidence']:.0%}信頼区間" if bootstrap else "信頼区間"
+html_content += f"""
         <h3>購買意欲</h3>
         <table>
-            <tr><th>サンプル</th><th>平均</th><th>標準偏差</th></tr>
+            <tr><th>サンプル</th><th>平均</th><th>標準偏差</th><th>{ci_label}</th></tr>
 """
 for sample_id in SOUND_SAMPLES:
     if sample_id in purchase:
         stats = purchase[sample_id]
+        ci = purchase_ci.get(sample_id)
+        ci_text = f"[{ci['ci_low']:.2f}, {ci['ci_high']:.2f}]" if ci and ci["ci_low"] is not None else "—"
         html_content += f"""
-            <tr><td>{sample_id}</td><td>{stats['mean']:.2f}</td><td>{stats['std']:.2f}</td></tr>
+            <tr><td>{sample_id}</td><td>{stats['mean']:.2f}</td><td>{stats['std']:.2f}</td><td>{ci_text}</td></tr>
 """
 html_content += """
         </table>
+"""
+
+# サンプル間の差の検定（全体）
+significance = results.get("significance")
+if significance:
+    variable_names = {axis["id"]: axis["name"] for axis in SD_AXES}
+    variable_names["purchase_intent"] = "購買意欲"
+    friedman_rows = {
+        row["variable"]: row for row in significance["friedman"] if row["segment"] == "全体"
+    }
+    pair_rows = {}
+    for row in significance["pairwise"]:
+        if row["segment"] == "全体":
+            pair_rows.setdefault(row["variable"], []).append(row)
+    pair_names = [f"{row['sample_a']} − {row['sample_b']}" for row in next(iter(pair_rows.values()), [])]
+    html_content += """
+        <h3>サンプル間の差の検定（全体）</h3>
+        <p><small>Friedman検定（Kendall の W）と、サンプル対ごとの Wilcoxon 符号付き順位検定（平均差・順位双列相関）。
+        p値は Friedman 検定では全変数、サンプル対の検定では全変数 × 全サンプル対を1つの族として Holm 法で補正（* p&lt;0.05, ** p&lt;0.01）。</small></p>
+        <table>
+            <tr><th>変数</th><th>Friedman p</th><th>W</th>"""
+    for name in pair_names:
+        html_content += f"<th>{name}</th>"
+    html_content += "</tr>"
+
+    def stars(p_value):
+        if p_value is None:
+            return ""
+        return "**" if p_value < 0.01 else "*" if p_value < 0.05 else ""
+
+    for variable, row in friedman_rows.items():
+        p_text = f"{row['p_holm']:.3f}{stars(row['p_holm'])}" if row["p_holm"] is not None else "—"
+        w_text = f"{row['kendall_w']:.2f}" if row["kendall_w"] is not None else "—"
+        html_content += f"<tr><td>{variable_names.get(variable, variable)}</td><td>{p_text}</td><td>{w_text}</td>"
+        for pair in pair_rows.get(variable, []):
+            if pair["mean_difference"] is None or pair["rank_biserial"] is None:
+                html_content += "<td>—</td>"
+            else:
+                html_content += (f"<td>{pair['mean_difference']:+.2f}{stars(pair['p_holm'])}"
+                                 f"<br><small>r={pair['rank_biserial']:+.2f}</small></td>")
+        html_content += "</tr>"
+    html_content += """
+        </table>
+"""
+
+html_content += """
         <div class="chart">
             <img src="charts/""" + chart_files['C03'] + """" alt="購買意欲分布">
         </div>
@@ -360,11 +416,11 @@ html_content += """
                     </ul>
                 </li>
                 <li><strong>たとえば：</strong> 「高級感」の棒が一番長かったら、「高級感がある走行音だと、多くの人が車を買いたくなる」という意味です。</li>
-                <li><strong>横軸の数字（相関係数）は？</strong> 
+                <li><strong>横軸の数字（R²への寄与率）は？</strong> 
                     <ul>
-                        <li>0.3以上 = 結構重要</li>
-                        <li>0.5以上 = とても重要</li>
-                        <li>-0.3以下 = 逆に影響する（高くなると買いたくなくなる）</li>
+                        <li>評価項目全体で説明できる「買いたい気持ち」の違いのうち、その項目が受け持つ割合です</li>
+                        <li>評価項目どうしは似た動きをしやすいため、重なった分はすべての組み合わせで公平に分け合っています（Shapley 値）</li>
+                        <li>寄与率をすべて足すと100%になります</li>
                     </ul>
                 </li>
             </ul>
@@ -389,12 +445,25 @@ for sample_id in SOUND_SAMPLES:
         html_content += f"""
         <h4>{sample_id} の購買意欲への重要度 TOP5</h4>
         <table>
-            <tr><th>ランク</th><th>評価軸</th><th>相関係数</th></tr>
+            <tr><th>ランク</th><th>評価軸</th><th>R²への寄与率</th><th>相対重みの寄与率</th><th>相関係数</th><th>相関係数の{ci_label}</th><th>ランクの{ci_label}</th><th>1位となる確率</th></tr>
 """
+        corr_ci = bootstrap.get("sd_purchase_correlation", {}).get(sample_id, {})
+        rank_ci = {item["axis"]: item for item in bootstrap.get("importance_rank", {}).get(sample_id, [])}
         for rank, item in enumerate(importance[sample_id][:5], 1):
             axis_name = next((ax["name"] for ax in SD_AXES if ax["id"] == item["axis"]), item["axis"])
+            ci = corr_ci.get(item["axis"])
+            ci_text = f"[{ci['ci_low']:.3f}, {ci['ci_high']:.3f}]" if ci and ci["ci_low"] is not None else "—"
+            ranked = rank_ci.get(item["axis"])
+            if ranked and ranked["ci_low"] is not None:
+                rank_text = f"{ranked['ci_low']:.0f}〜{ranked['ci_high']:.0f}位"
+                top_text = f"{ranked['p_top']:.0%}"
+            else:
+                rank_text = top_text = "—"
+            share = item.get("shapley_share")
+            share_text = f"{share:.1%}" if share is not None else "—"
+            weight_text = f"{item['relative_weight_share']:.1%}" if item.get("relative_weight_share") is not None else "—"
             html_content += f"""
-            <tr><td>{rank}</td><td>{axis_name}</td><td>{item['correlation']:.3f}</td></tr>
+            <tr><td>{rank}</td><td>{axis_name}</td><td>{share_text}</td><td>{weight_text}</td><td>{item['correlation']:.3f}</td><td>{ci_text}</td><td>{rank_text}</td><td>{top_text}</td></tr>
 """
         html_content += """
         </table>
@@ -416,7 +485,7 @@ html_content += """
 # 年齢層別分析
 age_seg = results["layer4_segmentation"].get("age_group", {})
 html_content += """
-        <h3>年齢層別購買意欲</h3>
+        <h3>年齢層別購買意欲（平均 [95%信頼区間]）</h3>
         <table>
             <tr><th>年齢層</th>"""
 for sample_id in SOUND_SAMPLES:
@@ -426,8 +495,15 @@ html_content += "</tr>"
 for age_group in age_seg.keys():
     html_content += f"<tr><td>{age_group}</td>"
     for sample_id in SOUND_SAMPLES:
-        mean = age_seg[age_group].get(sample_id, {}).get("mean", 0)
-        html_content += f"<td>{mean:.2f}</td>"
+        cell = age_seg[age_group].get(sample_id, {})
+        mean = cell.get("mean", 0)
+        if mean is None:
+            # 回答者数が最小セル数未満のため秘匿
+            html_content += f"<td>—（n={cell.get('count', 0)}）</td>"
+        elif cell.get("ci_low") is not None:
+            html_content += f"<td>{mean:.2f}<br><small>[{cell['ci_low']:.2f}, {cell['ci_high']:.2f}]</small></td>"
+        else:
+            html_content += f"<td>{mean:.2f}</td>"
     html_content += "</tr>"
 
 html_content += """
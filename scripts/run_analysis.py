@@ -1,14 +1,16 @@
 """
 EV走行音アンケート 統合分析スクリプト
 データ分析計画書に基づく全分析を実行
+
+分析処理本体は analysis パッケージのステージグラフとして実装されている。
 """
+import argparse
 import json
-import pandas as pd
-import numpy as np
 from pathlib import Path
 import sys
 import io
-from datetime import datetime
+import time
+import tracemalloc
 
 # 標準出力のエンコーディングをUTF-8に設定
 if sys.stdout.encoding != 'utf-8':
@@ -19,408 +21,451 @@ if sys.stderr.encoding != 'utf-8':
 # プロジェクトルートをパスに追加
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from config import SD_AXES, SOUND_SAMPLES
+from config import (
+    SD_AXES, SOUND_SAMPLES, LADDERING_VOCABULARY, ANALYSIS_CACHE_DIR, ANALYSIS_STATE_FILE,
+    ANALYSIS_INGEST_DIR, ANALYSIS_TEXT_VOCABULARY_FILE, RESPONSE_COLUMN_TYPES, WEIGHTING, CLUSTERING,
+    WTP_OPTIONS,
+)
+from analysis import (
+    DEFAULT_SEGMENTS, LAYER_NAMES, LAYER_OUTPUTS, build_stages, ingest_store, resolve_layers, run_analysis, run_incremental,
+    run_chunked, save_json, save_excel, select_stages,
+)
+from analysis.parallel import default_workers
 
 # 出力ディレクトリ
 OUTPUT_DIR = Path(__file__).parent.parent / "data" / "analysis"
-OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 CHARTS_DIR = OUTPUT_DIR / "charts"
-CHARTS_DIR.mkdir(parents=True, exist_ok=True)
 
 # データ読み込み
 DATA_DIR = Path(__file__).parent.parent / "data" / "sample_data"
 JSON_FILE = DATA_DIR / "sample_responses.json"
 CSV_FILE = DATA_DIR / "sample_responses.csv"
 
-print("=" * 60)
-print("EV走行音アンケート データ分析")
-print("=" * 60)
-print(f"データファイル: {JSON_FILE}")
-print(f"出力ディレクトリ: {OUTPUT_DIR}")
-print()
-
-# データ読み込み
-print("[1/7] データ読み込み中...")
-with open(JSON_FILE, "r", encoding="utf-8") as f:
-    responses = json.load(f)
-
-df = pd.read_csv(CSV_FILE, encoding="utf-8-sig")
-print(f"  読み込み完了: {len(responses)}件の回答データ")
-print()
-
-# ============================================================================
-# Layer 1: 記述統計分析
-# ============================================================================
-print("[2/7] Layer 1: 記述統計分析を実行中...")
-
-# 1.1 回答者属性の集計
-demographics_summary = {
-    "age_group": df["age_group"].value_counts().to_dict(),
-    "gender": df["gender"].value_counts().to_dict(),
-    "driving_experience": df["driving_experience"].value_counts().to_dict(),
-    "ev_experience": df["ev_experience"].value_counts().to_dict(),
-    "sound_sensitivity": {
-        "mean": float(df["sound_sensitivity"].mean()),
-        "std": float(df["sound_sensitivity"].std()),
-        "min": int(df["sound_sensitivity"].min()),
-        "max": int(df["sound_sensitivity"].max()),
-    }
-}
-
-# 1.2 SD法評価の集計
-sd_summary = {}
-for sample_id in SOUND_SAMPLES:
-    sd_summary[sample_id] = {}
-    for axis in SD_AXES:
-        col_name = f"sd_{sample_id}_{axis['id']}"
-        if col_name in df.columns:
-            sd_summary[sample_id][axis["id"]] = {
-                "mean": float(df[col_name].mean()),
-                "std": float(df[col_name].std()),
-                "min": int(df[col_name].min()),
-                "max": int(df[col_name].max()),
-            }
-
-# 1.3 購買意欲・WTPの集計
-purchase_summary = {}
-wtp_summary = {}
-for sample_id in SOUND_SAMPLES:
-    intent_col = f"purchase_intent_{sample_id}"
-    wtp_col = f"wtp_{sample_id}"
-    
-    if intent_col in df.columns:
-        purchase_summary[sample_id] = {
-            "mean": float(df[intent_col].mean()),
-            "std": float(df[intent_col].std()),
-            "distribution": df[intent_col].value_counts().to_dict(),
-        }
-    
-    if wtp_col in df.columns:
-        wtp_summary[sample_id] = df[wtp_col].value_counts().to_dict()
-
-print("  記述統計分析完了")
-print()
-
-# ============================================================================
-# Layer 2: 比較分析
-# ============================================================================
-print("[3/7] Layer 2: 比較分析を実行中...")
-
-# 2.1 サンプル間比較（SD評価）
-sd_comparison = {}
-for axis in SD_AXES:
-    axis_id = axis["id"]
-    axis_data = {}
-    for sample_id in SOUND_SAMPLES:
-        col_name = f"sd_{sample_id}_{axis_id}"
-        if col_name in df.columns:
-            axis_data[sample_id] = {
-                "mean": float(df[col_name].mean()),
-                "std": float(df[col_name].std()),
-            }
-    sd_comparison[axis_id] = axis_data
-
-# 2.2 購買意欲比較
-purchase_comparison = {}
-for sample_id in SOUND_SAMPLES:
-    intent_col = f"purchase_intent_{sample_id}"
-    if intent_col in df.columns:
-        purchase_comparison[sample_id] = {
-            "mean": float(df[intent_col].mean()),
-            "std": float(df[intent_col].std()),
-        }
-
-# 2.3 最良・最悪音の分析
-best_worst_analysis = {
-    "best_sound": df["best_sound"].value_counts().to_dict(),
-    "worst_sound": df["worst_sound"].value_counts().to_dict(),
-}
-
-print("  比較分析完了")
-print()
-
-# ============================================================================
-# Layer 3: 相関・因果分析
-# ============================================================================
-print("[4/7] Layer 3: 相関・回帰分析を実行中...")
-
-# 3.1 SD軸間相関（Priusを例に）
-correlation_matrix = {}
-for sample_id in SOUND_SAMPLES:
-    axis_cols = [f"sd_{sample_id}_{axis['id']}" for axis in SD_AXES]
-    available_cols = [col for col in axis_cols if col in df.columns]
-    if available_cols:
-        corr = df[available_cols].corr()
-        correlation_matrix[sample_id] = corr.to_dict()
-
-# 3.2 SD評価-購買意欲相関
-sd_purchase_correlation = {}
-for sample_id in SOUND_SAMPLES:
-    intent_col = f"purchase_intent_{sample_id}"
-    if intent_col in df.columns:
-        axis_corrs = {}
-        for axis in SD_AXES:
-            sd_col = f"sd_{sample_id}_{axis['id']}"
-            if sd_col in df.columns:
-                corr = df[sd_col].corr(df[intent_col])
-                axis_corrs[axis["id"]] = float(corr) if not pd.isna(corr) else 0.0
-        sd_purchase_correlation[sample_id] = axis_corrs
-
-# 3.3 購買意欲への重要度分析（相関係数の絶対値でランキング）
-importance_ranking = {}
-for sample_id in SOUND_SAMPLES:
-    if sample_id in sd_purchase_correlation:
-        corrs = sd_purchase_correlation[sample_id]
-        # 絶対値でソート
-        sorted_corrs = sorted(corrs.items(), key=lambda x: abs(x[1]), reverse=True)
-        importance_ranking[sample_id] = [
-            {"axis": axis_id, "correlation": corr, "importance": abs(corr)}
-            for axis_id, corr in sorted_corrs
-        ]
-
-print("  相関・回帰分析完了")
-print()
-
-# ============================================================================
-# Layer 4: セグメント分析
-# ============================================================================
-print("[5/7] Layer 4: セグメント分析を実行中...")
-
-# 4.1 属性別セグメント分析
-segment_analysis = {}
-
-# 年齢層別
-age_segments = {}
-for age_group in df["age_group"].unique():
-    age_df = df[df["age_group"] == age_group]
-    age_segments[age_group] = {}
-    for sample_id in SOUND_SAMPLES:
-        intent_col = f"purchase_intent_{sample_id}"
-        if intent_col in age_df.columns:
-            age_segments[age_group][sample_id] = {
-                "mean": float(age_df[intent_col].mean()),
-                "count": len(age_df),
-            }
-segment_analysis["age_group"] = age_segments
-
-# 性別
-gender_segments = {}
-for gender in df["gender"].unique():
-    gender_df = df[df["gender"] == gender]
-    gender_segments[gender] = {}
-    for sample_id in SOUND_SAMPLES:
-        intent_col = f"purchase_intent_{sample_id}"
-        if intent_col in gender_df.columns:
-            gender_segments[gender][sample_id] = {
-                "mean": float(gender_df[intent_col].mean()),
-                "count": len(gender_df),
-            }
-segment_analysis["gender"] = gender_segments
-
-# EV経験別
-ev_segments = {}
-for ev_exp in df["ev_experience"].unique():
-    ev_df = df[df["ev_experience"] == ev_exp]
-    ev_segments[ev_exp] = {}
-    for sample_id in SOUND_SAMPLES:
-        intent_col = f"purchase_intent_{sample_id}"
-        if intent_col in ev_df.columns:
-            ev_segments[ev_exp][sample_id] = {
-                "mean": float(ev_df[intent_col].mean()),
-                "count": len(ev_df),
-            }
-segment_analysis["ev_experience"] = ev_segments
-
-print("  セグメント分析完了")
-print()
-
-# ============================================================================
-# Layer 5: 統合インサイト
-# ============================================================================
-print("[6/7] Layer 5: 統合インサイト分析を実行中...")
-
-# 5.1 ラダリング分析
-laddering_analysis = {
-    "why_good": {},
-    "feeling_good": {},
-    "why_bad": {},
-    "feeling_bad": {},
-}
-
-# ネットワーク分析用：共起関係を計算
-laddering_cooccurrence = {
-    "why_good_feeling_good": {},  # why_goodとfeeling_goodの共起
-    "why_bad_feeling_bad": {},     # why_badとfeeling_badの共起
-}
-
-for resp in responses:
-    if "grid_evaluation" in resp and "laddering_best" in resp["grid_evaluation"]:
-        ladder = resp["grid_evaluation"]["laddering_best"]
-        why_list = ladder.get("why_good", [])
-        feeling_list = ladder.get("feeling_good", [])
-        
-        for reason in why_list:
-            laddering_analysis["why_good"][reason] = laddering_analysis["why_good"].get(reason, 0) + 1
-        for feeling in feeling_list:
-            laddering_analysis["feeling_good"][feeling] = laddering_analysis["feeling_good"].get(feeling, 0) + 1
-        
-        # 共起関係を計算
-        for why in why_list:
-            for feeling in feeling_list:
-                key = f"{why} → {feeling}"
-                laddering_cooccurrence["why_good_feeling_good"][key] = \
-                    laddering_cooccurrence["why_good_feeling_good"].get(key, 0) + 1
-    
-    if "grid_evaluation" in resp and "laddering_worst" in resp["grid_evaluation"]:
-        ladder = resp["grid_evaluation"]["laddering_worst"]
-        why_list = ladder.get("why_bad", [])
-        feeling_list = ladder.get("feeling_bad", [])
-        
-        for reason in why_list:
-            laddering_analysis["why_bad"][reason] = laddering_analysis["why_bad"].get(reason, 0) + 1
-        for feeling in feeling_list:
-            laddering_analysis["feeling_bad"][feeling] = laddering_analysis["feeling_bad"].get(feeling, 0) + 1
-        
-        # 共起関係を計算
-        for why in why_list:
-            for feeling in feeling_list:
-                key = f"{why} → {feeling}"
-                laddering_cooccurrence["why_bad_feeling_bad"][key] = \
-                    laddering_cooccurrence["why_bad_feeling_bad"].get(key, 0) + 1
-
-# ラダリング分析にネットワーク情報を追加
-laddering_analysis["cooccurrence"] = laddering_cooccurrence
-
-# 5.2 インタビュー分析
-interview_analysis = {
-    "sound_importance": {
-        "mean": float(df["sound_importance"].mean()) if "sound_importance" in df.columns else 0.0,
-        "distribution": df["sound_importance"].value_counts().to_dict() if "sound_importance" in df.columns else {},
-    }
-}
-
-print("  統合インサイト分析完了")
-print()
-
-# ============================================================================
-# 結果の保存
-# ============================================================================
-print("[7/7] 分析結果を保存中...")
-
-analysis_results = {
-    "analysis_date": datetime.now().isoformat(),
-    "total_responses": len(responses),
-    "layer1_descriptive": {
-        "demographics": demographics_summary,
-        "sd_ratings": sd_summary,
-        "purchase_intent": purchase_summary,
-        "wtp": wtp_summary,
-    },
-    "layer2_comparative": {
-        "sd_comparison": sd_comparison,
-        "purchase_comparison": purchase_comparison,
-        "best_worst": best_worst_analysis,
-    },
-    "layer3_correlation": {
-        "sd_axis_correlation": correlation_matrix,
-        "sd_purchase_correlation": sd_purchase_correlation,
-        "importance_ranking": importance_ranking,
-    },
-    "layer4_segmentation": segment_analysis,
-    "layer5_insights": {
-        "laddering": laddering_analysis,
-        "interview": interview_analysis,
-    },
-}
-
-# JSON保存
-json_output = OUTPUT_DIR / "analysis_results.json"
-with open(json_output, "w", encoding="utf-8") as f:
-    json.dump(analysis_results, f, ensure_ascii=False, indent=2)
-
-print(f"  JSON保存完了: {json_output}")
-
-# Excel保存（主要結果をテーブル形式で）
-excel_output = OUTPUT_DIR / "analysis_results.xlsx"
-with pd.ExcelWriter(excel_output, engine="openpyxl") as writer:
-    # 回答者属性
-    pd.DataFrame([demographics_summary]).to_excel(writer, sheet_name="回答者属性", index=False)
-    
-    # SD評価サマリー
-    sd_data = []
-    for sample_id in SOUND_SAMPLES:
-        for axis in SD_AXES:
-            if sample_id in sd_summary and axis["id"] in sd_summary[sample_id]:
-                row = {
-                    "サンプル": sample_id,
-                    "評価軸": axis["name"],
-                    "平均": sd_summary[sample_id][axis["id"]]["mean"],
-                    "標準偏差": sd_summary[sample_id][axis["id"]]["std"],
-                }
-                sd_data.append(row)
-    pd.DataFrame(sd_data).to_excel(writer, sheet_name="SD評価", index=False)
-    
-    # 購買意欲
-    purchase_data = []
-    for sample_id in SOUND_SAMPLES:
-        if sample_id in purchase_summary:
-            row = {
-                "サンプル": sample_id,
-                "平均": purchase_summary[sample_id]["mean"],
-                "標準偏差": purchase_summary[sample_id]["std"],
-            }
-            purchase_data.append(row)
-    pd.DataFrame(purchase_data).to_excel(writer, sheet_name="購買意欲", index=False)
-    
-    # 重要度ランキング
-    importance_data = []
-    for sample_id in SOUND_SAMPLES:
-        if sample_id in importance_ranking:
-            for rank, item in enumerate(importance_ranking[sample_id], 1):
-                row = {
-                    "サンプル": sample_id,
-                    "ランク": rank,
-                    "評価軸": item["axis"],
-                    "相関係数": item["correlation"],
-                    "重要度": item["importance"],
-                }
-                importance_data.append(row)
-    pd.DataFrame(importance_data).to_excel(writer, sheet_name="重要度ランキング", index=False)
-
-print(f"  Excel保存完了: {excel_output}")
-print()
-
-# ============================================================================
-# サマリー表示
-# ============================================================================
-print("=" * 60)
-print("分析完了サマリー")
-print("=" * 60)
-print(f"総回答数: {len(responses)}名")
-print()
-print("【主要発見事項】")
-print()
-
-# 最良音
-if best_worst_analysis["best_sound"]:
-    best = max(best_worst_analysis["best_sound"].items(), key=lambda x: x[1])
-    print(f"最も好まれた走行音: {best[0]} ({best[1]}名, {best[1]/len(responses)*100:.1f}%)")
-
-# 購買意欲が最も高いサンプル
-if purchase_comparison:
-    best_purchase = max(purchase_comparison.items(), key=lambda x: x[1]["mean"])
-    print(f"購買意欲が最も高いサンプル: {best_purchase[0]} (平均: {best_purchase[1]['mean']:.2f})")
-
-# 重要度TOP3（Priusを例に）
-if "Prius" in importance_ranking and importance_ranking["Prius"]:
-    print("\n【購買意欲への重要度 TOP3 (Prius)】")
-    for i, item in enumerate(importance_ranking["Prius"][:3], 1):
-        axis_name = next((ax["name"] for ax in SD_AXES if ax["id"] == item["axis"]), item["axis"])
-        print(f"  {i}. {axis_name}: 相関係数 {item['correlation']:.3f}")
-
-print()
-print("=" * 60)
-print(f"分析結果は以下に保存されました:")
-print(f"  - {json_output}")
-print(f"  - {excel_output}")
-print("=" * 60)
+# 回答データ（JSON）として扱う拡張子（優先順）
+RECORD_SUFFIXES = (".json", ".jsonl")
+
+# --cluster でセグメントに加える属性列（analysis.clustering.CLUSTER_COLUMN）
+CLUSTER_SEGMENT = "cluster"
+
+# 結果のうちレイヤー出力以外の項目（部分実行の結果を既存の結果に反映する際は今回の値で置き換える）
+RESULT_METADATA = (
+    "analysis_date", "total_responses", "stage_timings", "stage_cache", "incremental", "chunked", "weighting",
+)
+
+
+class StageProfiler:
+    """ステージごとの所要時間とピークメモリ（tracemalloc）を記録"""
+
+    def __init__(self):
+        self.seconds = {}
+        self.peaks = {}
+        self.labels = {}
+        self._current = None
+
+    def start(self, stage):
+        """ステージの開始（ステージは1つずつ順に実行すること）"""
+        self._close()
+        tracemalloc.reset_peak()
+        self._current = stage.name
+
+    def done(self, stage, seconds):
+        """ステージの完了（キャッシュヒットの場合は開始が呼ばれない）"""
+        self.labels[stage.name] = stage.label or stage.name
+        self.seconds[stage.name] = seconds
+
+    def _close(self):
+        if self._current is not None:
+            self.peaks[self._current] = tracemalloc.get_traced_memory()[1]
+            self._current = None
+
+    def rows(self):
+        """(ラベル, 所要秒数, ピークメモリ（バイト、キャッシュヒットは None）) のリスト（完了順）"""
+        self._close()
+        return [(self.labels[name], seconds, self.peaks.get(name)) for name, seconds in self.seconds.items()]
+
+
+def is_response_store(path):
+    """
+    --input が回答ストア（アンケート本体が保存した回答）か
+
+    ディレクトリ、または同じ名前のCSVがない JSON / JSON Lines を回答ストアとして扱う。
+    """
+    path = Path(path)
+    return path.is_dir() or (path.suffix in RECORD_SUFFIXES and not path.with_suffix(".csv").exists())
+
+
+def resolve_input(path):
+    """
+    --input の回答データから CSV と JSON のパスを決める
+
+    一方のファイルを指定すると、同じ名前で拡張子の異なるもう一方のファイルを使う。
+
+    Args:
+        path: 回答データ（.csv / .json / .jsonl）のパス、または拡張子を除いたパス
+
+    Returns:
+        (CSVのパス, JSONのパス)
+
+    Raises:
+        FileNotFoundError: CSV または JSON が見つからない場合
+    """
+    path = Path(path)
+    stem = path.with_suffix("") if path.suffix in (".csv",) + RECORD_SUFFIXES else path
+    csv_path = stem.with_suffix(".csv")
+    if not csv_path.exists():
+        raise FileNotFoundError(f"回答データ（CSV）が見つかりません: {csv_path}")
+    candidates = [path] if path.suffix in RECORD_SUFFIXES else [stem.with_suffix(s) for s in RECORD_SUFFIXES]
+    json_path = next((candidate for candidate in candidates if candidate.exists()), None)
+    if json_path is None:
+        raise FileNotFoundError(f"回答データ（JSON）が見つかりません: {candidates[0]}")
+    return csv_path, json_path
+
+
+def parse_segment(value):
+    """--segments の1項目（"age_group" または組み合わせの "age_group+ev_experience"）"""
+    columns = tuple(column for column in value.split("+") if column)
+    if not columns:
+        raise argparse.ArgumentTypeError(f"セグメントの指定が不正です: {value!r}")
+    return columns[0] if len(columns) == 1 else columns
+
+
+def merge_results(previous, results):
+    """
+    部分実行の結果を既存の結果に反映（実行したレイヤーのみ置き換える）
+
+    Args:
+        previous: 既存の analysis_results.json の内容
+        results: 今回の結果
+
+    Returns:
+        反映した結果
+    """
+    merged = {key: value for key, value in previous.items() if key not in RESULT_METADATA}
+    for key, value in results.items():
+        if key == "layer5_insights" and isinstance(merged.get(key), dict):
+            merged[key] = {**merged[key], **value}
+        else:
+            merged[key] = value
+    return merged
+
+
+def print_summary(results):
+    """主要発見事項を表示"""
+    total = results["total_responses"]
+    print("=" * 60)
+    print("分析完了サマリー")
+    print("=" * 60)
+    print(f"総回答数: {total}名")
+    print()
+    print("【主要発見事項】")
+    print()
+
+    comparative = results.get("layer2_comparative", {})
+    correlation = results.get("layer3_correlation", {})
+
+    # 最良音
+    best_sound = comparative.get("best_worst", {}).get("best_sound")
+    if best_sound:
+        best = max(best_sound.items(), key=lambda x: x[1])
+        print(f"最も好まれた走行音: {best[0]} ({best[1]:.0f}名, {best[1]/total*100:.1f}%)")
+
+    # 購買意欲が最も高いサンプル
+    purchase_comparison = comparative.get("purchase_comparison")
+    if purchase_comparison:
+        best_purchase = max(purchase_comparison.items(), key=lambda x: x[1]["mean"])
+        print(f"購買意欲が最も高いサンプル: {best_purchase[0]} (平均: {best_purchase[1]['mean']:.2f})")
+
+    # 重要度TOP3（Priusを例に）
+    importance_ranking = correlation.get("importance_ranking", {})
+    if importance_ranking.get("Prius"):
+        print("\n【購買意欲への重要度 TOP3 (Prius)】")
+        for i, item in enumerate(importance_ranking["Prius"][:3], 1):
+            axis_name = next((ax["name"] for ax in SD_AXES if ax["id"] == item["axis"]), item["axis"])
+            if item.get("shapley_share") is not None:
+                print(f"  {i}. {axis_name}: R²への寄与 {item['shapley_share']:.1%} (相関係数 {item['correlation']:.3f})")
+            else:
+                print(f"  {i}. {axis_name}: 相関係数 {item['correlation']:.3f}")
+
+    # 自由コメントの特徴語
+    free_comment = results.get("text", {}).get("fields", {}).get("free_comment")
+    if free_comment and free_comment["top_terms"]:
+        terms = "、".join(item["term"] for item in free_comment["top_terms"][:5])
+        print(f"\n自由コメントの特徴語: {terms}（{free_comment['documents']}件）")
+
+    # WTP の推定値（全体）
+    wtp = results.get("wtp")
+    if wtp:
+        overall = [e for e in wtp["estimates"] if e["segment"] == "全体" and e["mean"] is not None]
+        if overall:
+            print("\n【WTP の推定（区間打ち切り・対数正規分布）】")
+            for e in overall:
+                print(f"  {e['sample']}: 平均 {e['mean']:,.0f}円 ({wtp['confidence']:.0%}CI {e['mean_ci_low']:,.0f}〜{e['mean_ci_high']:,.0f}円)"
+                      f" / 中央値 {e['median']:,.0f}円")
+
+    # 相関の検定（全体、q 値 < 0.05 の変数ペアの数）
+    correlation_tests = results.get("correlation_tests")
+    if correlation_tests:
+        overall = [m for m in correlation_tests["matrices"] if m["segment"] == "全体" and not m["suppressed"]]
+        if overall:
+            counts = []
+            for m in overall:
+                q = [v for i, row in enumerate(m["q_value"]) for v in row[i + 1:] if v is not None]
+                counts.append(f"{m['sample']} {sum(v < 0.05 for v in q)}/{len(q)}")
+            print(f"\n有意な相関（BH法 q<0.05）の変数ペア: {'、'.join(counts)}")
+
+    # SD評価軸の主成分（各成分の負荷量が最大の軸）
+    factors = results.get("factors")
+    if factors and factors["components"]:
+        axis_names = {axis["id"]: axis["name"] for axis in SD_AXES}
+        labels = []
+        for name, component in factors["components"].items():
+            top = max(component["loadings"].items(), key=lambda x: abs(x[1]))
+            labels.append(f"{name}: {axis_names.get(top[0], top[0])} {component['variance_ratio']:.1%}")
+        print(f"\nSD評価軸の主成分: {'、'.join(labels)}（{factors['n']}件）")
+    print()
+
+
+def parse_args(argv=None):
+    """コマンドライン引数を解析"""
+    parser = argparse.ArgumentParser(description="EV走行音アンケート データ分析")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="ステージ出力のキャッシュを使わずに全ステージを再計算する")
+    parser.add_argument("--incremental", action="store_true",
+                        help="前回の分析以降に追加された回答だけを集計量に加算する（Layer 1〜5）")
+    parser.add_argument("--reset-state", action="store_true",
+                        help="増分分析の集計量を破棄して全回答から作り直す")
+    parser.add_argument("--chunked", action="store_true",
+                        help="回答データを分割して読み込み、メモリ使用量を一定に保って集計する（Layer 1〜5）")
+    parser.add_argument("--chunk-size", type=int, default=50_000,
+                        help="--chunked でCSVを1回に読み込む行数")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="サンプル・セグメント単位の処理のプロセス数（0の場合は利用できるCPU数）")
+    parser.add_argument("--layers", nargs="+", metavar="LAYER",
+                        help=f"実行するレイヤー（{', '.join(LAYER_NAMES)}、または 1〜5）。"
+                             "出力先に既存の結果がある場合は、指定したレイヤーだけを置き換える")
+    parser.add_argument("--samples", nargs="+", metavar="SAMPLE",
+                        help=f"分析するサンプル（既定: {' '.join(SOUND_SAMPLES)}）")
+    parser.add_argument("--segments", nargs="+", type=parse_segment, metavar="COLUMN",
+                        help="セグメント分析に使う属性列（\"age_group+ev_experience\" で組み合わせ）")
+    parser.add_argument("--input", type=Path, default=CSV_FILE,
+                        help="回答データ（.csv / .json / .jsonl。同じ名前のCSVとJSONを組で使う）、"
+                             "または回答ストア（data/responses などのディレクトリ、同じ名前のCSVがないJSON）")
+    parser.add_argument("--output", type=Path, default=OUTPUT_DIR,
+                        help="分析結果（analysis_results.json / .xlsx）の出力ディレクトリ")
+    parser.add_argument("--no-excel", action="store_true", help="Excelを出力しない")
+    parser.add_argument("--weight", action="store_true",
+                        help="config.WEIGHTING_TARGETS の構成比にレイキングした重みで集計する（Layer 1〜4・ドライバー分析）")
+    parser.add_argument("--cluster", action="store_true",
+                        help="SD評価・購買意欲で回答者をクラスタリングし、cluster 列をセグメントに加える")
+    parser.add_argument("--profile", action="store_true",
+                        help="ステージごとの所要時間とピークメモリを表示する（ステージは順に実行。計測のため遅くなる）")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="実行するステージを表示して終了する（分析・保存は行わない）")
+    args = parser.parse_args(argv)
+
+    try:
+        args.layers = resolve_layers(args.layers) if args.layers else None
+        if is_response_store(args.input):
+            if not args.input.exists():
+                raise FileNotFoundError(f"回答ストアが見つかりません: {args.input}")
+            args.store, args.csv_path, args.json_path = args.input, None, None
+        else:
+            args.store = None
+            args.csv_path, args.json_path = resolve_input(args.input)
+    except (ValueError, FileNotFoundError) as e:
+        parser.error(str(e))
+    unknown = [sample for sample in args.samples or [] if sample not in SOUND_SAMPLES]
+    if unknown:
+        parser.error(f"不明なサンプルです: {', '.join(unknown)}（指定できるサンプル: {', '.join(SOUND_SAMPLES)}）")
+    if args.layers and (args.incremental or args.chunked):
+        parser.error("--layers は --incremental / --chunked と同時に指定できません（Layer 1〜5 をまとめて集計します）")
+    if args.weight and (args.incremental or args.chunked):
+        parser.error("--weight は --incremental / --chunked と同時に指定できません（重みは全回答から求めます）")
+    if args.layers and "clustering" in args.layers:
+        args.cluster = True
+    if args.cluster and (args.incremental or args.chunked):
+        parser.error("--cluster は --incremental / --chunked と同時に指定できません（全回答からクラスタを求めます）")
+    if args.cluster:
+        segments = args.segments or list(DEFAULT_SEGMENTS)
+        args.segments = segments if CLUSTER_SEGMENT in segments else segments + [CLUSTER_SEGMENT]
+    return args
+
+
+def print_profile(rows, peak):
+    """--profile の計測結果を表示（rows は StageProfiler.rows() と同じ形式）"""
+    print("=" * 60)
+    print("プロファイル（所要時間・ピークメモリ）")
+    print("=" * 60)
+    for label, seconds, stage_peak in rows:
+        memory = f"{stage_peak / 1024 ** 2:9.1f} MB" if stage_peak is not None else "   キャッシュ"
+        print(f"  {seconds:8.3f} 秒 {memory}  {label}")
+    print(f"  全体のピークメモリ: {peak / 1024 ** 2:.1f} MB（--workers のワーカープロセス分は含まない）")
+    print()
+
+
+def print_plan(args, samples):
+    """--dry-run: 実行するステージを表示"""
+    print("実行予定（--dry-run のため分析・保存は行いません）")
+    if args.store:
+        print(f"  回答ストアの変換: {args.store} -> {ANALYSIS_INGEST_DIR}（変更がなければ前回の変換結果を使用）")
+    print(f"  サンプル: {', '.join(samples)}")
+    if args.segments:
+        print(f"  セグメント: {', '.join('×'.join(s) if isinstance(s, tuple) else s for s in args.segments)}")
+    if args.incremental:
+        print("  増分分析（Layer 1〜5）")
+    elif args.chunked:
+        print(f"  分割実行（Layer 1〜5、{args.chunk_size:,}件ずつ）")
+    else:
+        targets = (args.layers or LAYER_OUTPUTS) + ["response_count"]
+        for stage in select_stages(build_stages(), targets):
+            print(f"  - {stage.label or stage.name}")
+    if args.weight:
+        print(f"  ウェイトバック: {', '.join(WEIGHTING['targets'])} の構成比にレイキング")
+    if args.cluster:
+        low, high = CLUSTERING["k_range"]
+        print(f"  クラスタリング: クラスタ数 {CLUSTERING.get('k') or f'{low}〜{high}（シルエット係数で選択）'}")
+    print(f"  保存: {'JSON' if args.no_excel else 'JSON・Excel'}")
+
+
+def main(argv=None):
+    """メイン処理"""
+    args = parse_args(argv)
+    samples = args.samples or SOUND_SAMPLES
+    output_dir = args.output
+    print("=" * 60)
+    print("EV走行音アンケート データ分析")
+    print("=" * 60)
+    print(f"データファイル: {args.store or args.json_path}")
+    print(f"出力ディレクトリ: {output_dir}")
+    print()
+
+    if args.dry_run:
+        print_plan(args, samples)
+        return
+
+    if args.store:
+        print("回答ストアを分析用の回答データに変換中...")
+        args.csv_path, args.json_path = ingest_store(args.store, ANALYSIS_INGEST_DIR, samples, SD_AXES)
+        print(f"  変換結果: {args.csv_path}")
+        print()
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    (output_dir / CHARTS_DIR.name).mkdir(parents=True, exist_ok=True)
+
+    profiler = StageProfiler() if args.profile else None
+    extra_rows = []
+    if profiler:
+        tracemalloc.start()
+
+    def on_stage_done(stage, seconds):
+        if profiler:
+            profiler.done(stage, seconds)
+        print(f"  完了: {stage.label or stage.name} ({seconds:.3f}秒)")
+
+    start = time.perf_counter()
+    if args.incremental:
+        if args.reset_state:
+            ANALYSIS_STATE_FILE.unlink(missing_ok=True)
+        print("増分分析を実行中...")
+        results = run_incremental(
+            args.csv_path, args.json_path, samples, SD_AXES, ANALYSIS_STATE_FILE,
+            segments=args.segments, laddering_vocab=LADDERING_VOCABULARY, column_types=RESPONSE_COLUMN_TYPES,
+        )
+        incremental = results["incremental"]
+        if not incremental["restored_state"]:
+            print("  保存済みの集計量がない（または回答データが置き換えられた）ため、全回答から集計しました")
+        print(f"  新規回答: {incremental['new_rows']}件（累計 {results['total_responses']}件）")
+    elif args.chunked:
+        print(f"分割実行で分析中（{args.chunk_size:,}件ずつ）...")
+        results = run_chunked(
+            args.csv_path, args.json_path, samples, SD_AXES,
+            segments=args.segments, laddering_vocab=LADDERING_VOCABULARY, chunk_size=args.chunk_size,
+            column_types=RESPONSE_COLUMN_TYPES,
+        )
+        chunked = results["chunked"]
+        print(f"  CSV: {chunked['rows']}行（{chunked['table_chunks']}回） / "
+              f"JSON: {chunked['records']}件（{chunked['record_chunks']}回）")
+    else:
+        print("分析ステージを実行中...")
+        results = run_analysis(
+            args.csv_path, args.json_path, samples, SD_AXES,
+            segments=args.segments,
+            laddering_vocab=LADDERING_VOCABULARY,
+            layers=args.layers,
+            # ピークメモリをステージごとに測るため、計測時はステージを1つずつ実行する
+            max_workers=1 if profiler else None,
+            column_types=RESPONSE_COLUMN_TYPES,
+            on_stage_done=on_stage_done,
+            on_stage_start=profiler.start if profiler else None,
+            cache_dir=None if args.no_cache else ANALYSIS_CACHE_DIR,
+            workers=args.workers or default_workers(),
+            weighting=WEIGHTING if args.weight else None,
+            # --no-cache の場合は保存済みの語彙を使わずに学習する（保存もしない）
+            text_options=None if args.no_cache else {"vocabulary_path": str(ANALYSIS_TEXT_VOCABULARY_FILE)},
+            clustering=CLUSTERING if args.cluster else None,
+            wtp_options={"labels": WTP_OPTIONS},
+        )
+        cache_status = results.get("stage_cache", {})
+        if cache_status:
+            hits = [name for name, status in cache_status.items() if status == "hit"]
+            misses = [name for name, status in cache_status.items() if status == "miss"]
+            print(f"  キャッシュヒット: {', '.join(hits) or 'なし'}")
+            print(f"  再計算: {', '.join(misses) or 'なし'}")
+        weighting = results.get("weighting")
+        if weighting:
+            status = "収束" if weighting["converged"] else "未収束"
+            print(f"  ウェイトバック: {status}（反復 {weighting['iterations']}回、構成比の最大誤差 {weighting['max_error']:.2e}、"
+                  f"有効サンプルサイズ {weighting['effective_n']:.1f}、重み {weighting['min_weight']:.2f}〜{weighting['max_weight']:.2f}）")
+        clustering = results.get("clustering")
+        if clustering:
+            if clustering["k"] is None:
+                print("  クラスタリング: 回答者が少ないためクラスタに分けられませんでした")
+            else:
+                sizes = "、".join(f"{c}: {profile['size']}名" for c, profile in clustering["clusters"].items())
+                print(f"  クラスタリング: {clustering['k']}クラスタ"
+                      f"（シルエット係数 {clustering['silhouette'][str(clustering['k'])]:.3f}、{sizes}）")
+    if profiler and (args.incremental or args.chunked):
+        extra_rows.append(("増分分析" if args.incremental else "分割実行", time.perf_counter() - start,
+                           tracemalloc.get_traced_memory()[1]))
+    print()
+
+    json_output = output_dir / "analysis_results.json"
+    if args.layers and json_output.exists():
+        with open(json_output, "r", encoding="utf-8") as f:
+            results = merge_results(json.load(f), results)
+        print(f"既存の結果のうち {', '.join(args.layers)} を置き換えます")
+
+    if profiler:
+        profile_rows = profiler.rows() + extra_rows
+        analysis_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.reset_peak()
+
+    print("分析結果を保存中...")
+    outputs = [json_output]
+    save_start = time.perf_counter()
+    save_json(results, json_output)
+    print(f"  JSON保存完了: {json_output}")
+
+    if not args.no_excel:
+        excel_output = output_dir / "analysis_results.xlsx"
+        save_excel(results, excel_output, samples, SD_AXES)
+        outputs.append(excel_output)
+        print(f"  Excel保存完了: {excel_output}")
+    print()
+
+    if profiler:
+        save_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        profile_rows.append(("結果の保存", time.perf_counter() - save_start, save_peak))
+        print_profile(profile_rows, max(analysis_peak, save_peak))
+
+    print_summary(results)
+    print("=" * 60)
+    print(f"分析結果は以下に保存されました:")
+    for output in outputs:
+        print(f"  - {output}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+EV走行音アンケート ページ滞在時間分析スクリプト
+回答データの step_timings から、ページごとの滞在時間分布と
+回答が速すぎる回答者（スピーダー）を抽出する
+"""
+import json
+import sys
+import io
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+# 標準出力のエンコーディングをUTF-8に設定
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+if sys.stderr.encoding != 'utf-8':
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8')
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config import DATA_DIR, SPEEDER_RATIO
+from services.data_manager import DataManager
+
+# 出力ファイル
+OUTPUT_DIR = Path(__file__).parent.parent / "data" / "analysis"
+OUTPUT_FILE = OUTPUT_DIR / "step_timing.json"
+
+
+def build_timing_table(records: List[Dict[str, Any]]) -> pd.DataFrame:
+    """
+    回答データのページ入退室時刻を1本の縦持ちテーブルに変換
+
+    Args:
+        records: SessionManager.get_all_data() 形式の回答データ
+
+    Returns:
+        respondent（回答者番号）, session_id, page（phase * 100 + step）, duration_ms の列を持つテーブル
+    """
+    session_ids = []
+    pages, enter, leave, lengths = [], [], [], []
+    for record in records:
+        timings = record.get("step_timings")
+        if not timings or not timings.get("pages"):
+            continue
+        n = min(len(timings["pages"]), len(timings["enter_ms"]), len(timings["leave_ms"]))
+        session_ids.append(record.get("session_id"))
+        pages.append(timings["pages"][:n])
+        enter.append(timings["enter_ms"][:n])
+        leave.append(timings["leave_ms"][:n])
+        lengths.append(n)
+
+    if not lengths:
+        return pd.DataFrame(columns=["respondent", "session_id", "page", "duration_ms"])
+
+    lengths = np.asarray(lengths)
+    respondent = np.repeat(np.arange(len(lengths)), lengths)
+    duration = np.concatenate(leave).astype(np.int64) - np.concatenate(enter).astype(np.int64)
+    return pd.DataFrame({
+        "respondent": respondent,
+        "session_id": np.asarray(session_ids, dtype=object)[respondent],
+        "page": np.concatenate(pages).astype(np.int16),
+        "duration_ms": duration,
+    })
+
+
+def page_time_distribution(table: pd.DataFrame) -> Dict[str, Dict[str, float]]:
+    """
+    ページごとの滞在時間分布（秒）
+
+    同一ページを複数回訪れた場合は回答者ごとに合算する。
+    """
+    per_visit = table.groupby(["respondent", "page"], sort=False)["duration_ms"].sum() / 1000
+    grouped = per_visit.groupby(level="page")
+    stats = pd.DataFrame({
+        "n": grouped.size(),
+        "mean": grouped.mean(),
+        "p10": grouped.quantile(0.1),
+        "median": grouped.median(),
+        "p90": grouped.quantile(0.9),
+    })
+    return {
+        f"{page // 100}_{page % 100}": {k: float(v) for k, v in row.items()}
+        for page, row in stats.iterrows()
+    }
+
+
+def detect_speeders(table: pd.DataFrame, ratio: float = SPEEDER_RATIO) -> pd.DataFrame:
+    """
+    スピーダー判定
+
+    以下のいずれかに当てはまる回答者をスピーダーとする。
+    - 総回答時間が全体の中央値の ratio 倍未満
+    - ページごとの「滞在時間 / そのページの中央値」の中央値（相対速度指標）が ratio 未満
+
+    Returns:
+        回答者ごとの total_sec, relative_speed, is_speeder
+    """
+    per_visit = table.groupby(["respondent", "page"], sort=False)["duration_ms"].sum().reset_index()
+    page_median = per_visit.groupby("page")["duration_ms"].transform("median")
+    per_visit["relative"] = per_visit["duration_ms"] / page_median.where(page_median > 0)
+
+    by_respondent = per_visit.groupby("respondent")
+    result = pd.DataFrame({
+        "total_sec": by_respondent["duration_ms"].sum() / 1000,
+        "relative_speed": by_respondent["relative"].median(),
+    })
+    session_ids = table.drop_duplicates("respondent").set_index("respondent")["session_id"]
+    result["session_id"] = session_ids
+    result["is_speeder"] = (
+        (result["total_sec"] < ratio * result["total_sec"].median())
+        | (result["relative_speed"] < ratio)
+    )
+    return result
+
+
+def main():
+    """メイン処理"""
+    print("=" * 60)
+    print("EV走行音アンケート ページ滞在時間分析")
+    print("=" * 60)
+
+    records = [saved.get("responses", saved) for saved in DataManager(DATA_DIR).get_all_responses()]
+    table = build_timing_table(records)
+    respondents = table["respondent"].nunique()
+    print(f"ページ入退室データ: {respondents}名 / {len(table)}ページ")
+    if table.empty:
+        print("step_timings を含む回答がありません")
+        return
+
+    distribution = page_time_distribution(table)
+    speeders = detect_speeders(table)
+
+    results = {
+        "analysis_date": datetime.now().isoformat(),
+        "respondents": int(respondents),
+        "speeder_ratio": SPEEDER_RATIO,
+        "page_time_sec": distribution,
+        "speeders": speeders.loc[speeders["is_speeder"], "session_id"].tolist(),
+    }
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+
+    print()
+    print("【滞在時間の長いページ TOP5（中央値）】")
+    slowest = sorted(distribution.items(), key=lambda x: x[1]["median"], reverse=True)[:5]
+    for page, stats in slowest:
+        print(f"  Phase{page.replace('_', ' Step')}: 中央値 {stats['median']:.1f}秒 (n={stats['n']:.0f})")
+    print()
+    print(f"スピーダー: {len(results['speeders'])}名 / {respondents}名")
+    print(f"結果を保存しました: {OUTPUT_FILE}")
+
+
+if __name__ == "__main__":
+    main()
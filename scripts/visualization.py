@@ -3,7 +3,6 @@ EV走行音アンケート 可視化スクリプト
 データ分析計画書に基づくチャート生成
 """
 import json
-import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 from pathlib import Path
@@ -159,7 +158,9 @@ if HAS_SEABORN:
 # プロジェクトルートをパスに追加
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from config import SD_AXES, SOUND_SAMPLES
+from config import SD_AXES, SOUND_SAMPLES, RESPONSE_COLUMN_TYPES
+from analysis.laddering import cooccurrence_edges
+from analysis.loaders import load_table
 
 # 出力ディレクトリ
 OUTPUT_DIR = Path(__file__).parent.parent / "data" / "analysis"
@@ -176,7 +177,7 @@ print("EV走行音アンケート 可視化生成")
 print("=" * 60)
 
 # データ読み込み
-df = pd.read_csv(CSV_FILE, encoding="utf-8-sig")
+df = load_table(CSV_FILE, RESPONSE_COLUMN_TYPES)
 with open(ANALYSIS_FILE, "r", encoding="utf-8") as f:
     analysis_results = json.load(f)
 
@@ -350,7 +351,7 @@ print("  C04保存完了")
 # ============================================================================
 print("[5/8] C05: 購買意欲要因分析を生成中...")
 fig, axes = plt.subplots(1, 3, figsize=(18, 6))
-fig.suptitle("購買意欲への重要度（相関係数）", fontsize=16, fontweight="bold", fontproperties=JAPANESE_FONT_PROP)
+fig.suptitle("購買意欲への重要度（Shapley 値による R² への寄与）", fontsize=16, fontweight="bold", fontproperties=JAPANESE_FONT_PROP)
 
 importance_ranking = analysis_results["layer3_correlation"]["importance_ranking"]
 
@@ -359,15 +360,17 @@ for idx, sample_id in enumerate(SOUND_SAMPLES):
         ranking = importance_ranking[sample_id][:9]  # TOP9
         axis_names = [next((ax["name"] for ax in SD_AXES if ax["id"] == item["axis"]), item["axis"]) 
                      for item in ranking]
-        correlations = [item["correlation"] for item in ranking]
+        # ドライバー分析の結果がない場合は相関係数を表示
+        use_shapley = all(item.get("shapley_share") is not None for item in ranking)
+        values = [item["shapley_share"] if use_shapley else item["correlation"] for item in ranking]
         
         y_pos = np.arange(len(axis_names))
-        colors = ['red' if x < 0 else 'blue' for x in correlations]
+        colors = ['red' if item["correlation"] < 0 else 'blue' for item in ranking]
         
-        axes[idx].barh(y_pos, correlations, color=colors, alpha=0.7)
+        axes[idx].barh(y_pos, values, color=colors, alpha=0.7)
         axes[idx].set_yticks(y_pos)
         axes[idx].set_yticklabels(axis_names, fontsize=10, fontproperties=JAPANESE_FONT_PROP)
-        axes[idx].set_xlabel("相関係数", fontsize=11, fontproperties=JAPANESE_FONT_PROP)
+        axes[idx].set_xlabel("R²への寄与率" if use_shapley else "相関係数", fontsize=11, fontproperties=JAPANESE_FONT_PROP)
         axes[idx].set_title(sample_id, fontsize=13, fontweight="bold", fontproperties=JAPANESE_FONT_PROP)
         apply_japanese_font(axes[idx])
         axes[idx].axvline(x=0, color='black', linestyle='-', linewidth=0.5)
@@ -393,9 +396,15 @@ x = np.arange(len(SOUND_SAMPLES))
 width = 0.8 / len(age_groups)
 
 for i, age_group in enumerate(age_groups):
-    means = [age_segments[age_group].get(sample_id, {}).get("mean", 0) 
-             for sample_id in SOUND_SAMPLES]
-    ax.bar(x + i * width, means, width, label=age_group, alpha=0.8)
+    cells = [age_segments[age_group].get(sample_id, {}) for sample_id in SOUND_SAMPLES]
+    # 秘匿されたセル（mean が None）は描画しない
+    means = np.array([np.nan if cell.get("mean") is None else cell.get("mean", 0) for cell in cells])
+    errors = np.array([
+        [mean - cell["ci_low"], cell["ci_high"] - mean]
+        if cell.get("ci_low") is not None else [0, 0]
+        for mean, cell in zip(means, cells)
+    ]).T
+    ax.bar(x + i * width, means, width, yerr=errors, capsize=3, label=age_group, alpha=0.8)
 
 ax.set_xlabel("サンプル", fontproperties=JAPANESE_FONT_PROP)
 ax.set_ylabel("平均購買意欲", fontproperties=JAPANESE_FONT_PROP)
@@ -492,20 +501,18 @@ if HAS_NETWORKX:
         G_good = nx.DiGraph()
         edge_data = cooccurrence["why_good_feeling_good"]
         
-        # TOP20の共起関係を抽出
-        sorted_edges = sorted(edge_data.items(), key=lambda x: x[1], reverse=True)[:20]
+        # TOP20の共起関係を抽出（共起回数の降順で格納されている）
+        sorted_edges = cooccurrence_edges(edge_data, limit=20)
         
         # ノードの出現回数をカウント
         node_counts = {}
         edge_weights_dict = {}
         
-        for edge_key, weight in sorted_edges:
-            if " → " in edge_key:
-                why, feeling = edge_key.split(" → ", 1)
-                G_good.add_edge(why, feeling, weight=weight)
-                edge_weights_dict[(why, feeling)] = weight
-                node_counts[why] = node_counts.get(why, 0) + weight
-                node_counts[feeling] = node_counts.get(feeling, 0) + weight
+        for why, feeling, weight in sorted_edges:
+            G_good.add_edge(why, feeling, weight=weight)
+            edge_weights_dict[(why, feeling)] = weight
+            node_counts[why] = node_counts.get(why, 0) + weight
+            node_counts[feeling] = node_counts.get(feeling, 0) + weight
         
         # レイアウト計算
         pos = nx.spring_layout(G_good, k=2, iterations=50)
@@ -551,19 +558,17 @@ if HAS_NETWORKX:
         G_bad = nx.DiGraph()
         edge_data = cooccurrence["why_bad_feeling_bad"]
         
-        sorted_edges = sorted(edge_data.items(), key=lambda x: x[1], reverse=True)[:20]
+        sorted_edges = cooccurrence_edges(edge_data, limit=20)
         
         # ノードの出現回数をカウント
         node_counts = {}
         edge_weights_dict = {}
         
-        for edge_key, weight in sorted_edges:
-            if " → " in edge_key:
-                why, feeling = edge_key.split(" → ", 1)
-                G_bad.add_edge(why, feeling, weight=weight)
-                edge_weights_dict[(why, feeling)] = weight
-                node_counts[why] = node_counts.get(why, 0) + weight
-                node_counts[feeling] = node_counts.get(feeling, 0) + weight
+        for why, feeling, weight in sorted_edges:
+            G_bad.add_edge(why, feeling, weight=weight)
+            edge_weights_dict[(why, feeling)] = weight
+            node_counts[why] = node_counts.get(why, 0) + weight
+            node_counts[feeling] = node_counts.get(feeling, 0) + weight
         
         pos = nx.spring_layout(G_bad, k=2, iterations=50)
         
@@ -616,10 +621,10 @@ else:
     # 良い理由→良い気持ち
     if "why_good_feeling_good" in cooccurrence:
         edge_data = cooccurrence["why_good_feeling_good"]
-        sorted_edges = sorted(edge_data.items(), key=lambda x: x[1], reverse=True)[:15]
+        sorted_edges = cooccurrence_edges(edge_data, limit=15)
         
-        edges = [x[0] for x in sorted_edges]
-        weights = [x[1] for x in sorted_edges]
+        edges = [f"{why} → {feeling}" for why, feeling, _ in sorted_edges]
+        weights = [weight for _, _, weight in sorted_edges]
         
         y_pos = np.arange(len(edges))
         axes[0].barh(y_pos, weights, color="lightblue", alpha=0.7)
@@ -633,10 +638,10 @@ else:
     # 悪い理由→悪い気持ち
     if "why_bad_feeling_bad" in cooccurrence:
         edge_data = cooccurrence["why_bad_feeling_bad"]
-        sorted_edges = sorted(edge_data.items(), key=lambda x: x[1], reverse=True)[:15]
+        sorted_edges = cooccurrence_edges(edge_data, limit=15)
         
-        edges = [x[0] for x in sorted_edges]
-        weights = [x[1] for x in sorted_edges]
+        edges = [f"{why} → {feeling}" for why, feeling, _ in sorted_edges]
+        weights = [weight for _, _, weight in sorted_edges]
         
         y_pos = np.arange(len(edges))
         axes[1].barh(y_pos, weights, color="lightcoral", alpha=0.7)
@@ -684,6 +689,90 @@ plt.savefig(CHARTS_DIR / "C08_最良最悪音選択.png", dpi=300, bbox_inches="
 plt.close()
 print("  C08保存完了")
 
+# ============================================================================
+# C09: クラスタ特性（run_analysis.py --cluster を実行した場合のみ）
+# ============================================================================
+clustering = analysis_results.get("clustering")
+if clustering and clustering.get("clusters"):
+    print("[8.5/9] C09: クラスタ特性を生成中...")
+    cluster_ids = list(clustering["clusters"].keys())
+    axis_labels = [axis["name"] for axis in SD_AXES]
+    fig, axes = plt.subplots(1, len(SOUND_SAMPLES), figsize=(6 * len(SOUND_SAMPLES), 1.2 * len(cluster_ids) + 3))
+    axes = np.atleast_1d(axes)
+    fig.suptitle(f"クラスタ特性（SD評価の平均、{clustering['k']}クラスタ）", fontsize=16, fontweight="bold",
+                 fontproperties=JAPANESE_FONT_PROP)
+
+    for idx, sample_id in enumerate(SOUND_SAMPLES):
+        # 欠損（None）は NaN として描画しない
+        means = np.array([
+            [clustering["clusters"][c]["means"].get(f"sd_{sample_id}_{axis['id']}") for axis in SD_AXES]
+            for c in cluster_ids
+        ], dtype=float)
+        row_labels = []
+        for c in cluster_ids:
+            profile = clustering["clusters"][c]
+            intent = profile["means"].get(f"purchase_intent_{sample_id}")
+            intent_label = f"、購買意欲 {intent:.2f}" if intent is not None else ""
+            row_labels.append(f"クラスタ{c}（{profile['size']}名{intent_label}）")
+        im = axes[idx].imshow(means, cmap="coolwarm", vmin=-3, vmax=3, aspect="auto")
+        axes[idx].grid(False)
+        axes[idx].set_xticks(range(len(axis_labels)))
+        axes[idx].set_yticks(range(len(row_labels)))
+        axes[idx].set_xticklabels(axis_labels, rotation=45, ha="right", fontsize=9, fontproperties=JAPANESE_FONT_PROP)
+        axes[idx].set_yticklabels(row_labels, fontsize=9, fontproperties=JAPANESE_FONT_PROP)
+        for i in range(len(row_labels)):
+            for j in range(len(axis_labels)):
+                if not np.isnan(means[i, j]):
+                    axes[idx].text(j, i, f"{means[i, j]:.1f}", ha="center", va="center", color="black", fontsize=9)
+        plt.colorbar(im, ax=axes[idx], shrink=0.8)
+        axes[idx].set_title(sample_id, fontsize=13, fontweight="bold", fontproperties=JAPANESE_FONT_PROP)
+        apply_japanese_font(axes[idx])
+
+    plt.tight_layout()
+    plt.savefig(CHARTS_DIR / "C09_クラスタ特性.png", dpi=300, bbox_inches="tight")
+    plt.close()
+    print("  C09保存完了")
+
+# ============================================================================
+# C10: 知覚マップ（SD評価軸の第1・第2主成分）
+# ============================================================================
+factors = analysis_results.get("factors")
+if factors and factors.get("n_components", 0) >= 2:
+    print("[8.6/9] C10: 知覚マップを生成中...")
+    names = list(factors["components"].keys())[:2]
+    axis_labels = {axis["id"]: axis["name"] for axis in SD_AXES}
+    fig, ax = plt.subplots(figsize=(9, 8))
+    fig.suptitle("知覚マップ（SD評価軸の主成分）", fontsize=16, fontweight="bold", fontproperties=JAPANESE_FONT_PROP)
+
+    # 軸の負荷量（矢印）とサンプルの平均の射影（点）
+    for axis_id in factors["axes"]:
+        x, y = (factors["components"][name]["loadings"][axis_id] for name in names)
+        ax.annotate("", xy=(x, y), xytext=(0, 0), arrowprops=dict(arrowstyle="->", color="gray", alpha=0.6))
+        ax.text(x * 1.08, y * 1.08, axis_labels.get(axis_id, axis_id), color="dimgray", fontsize=9,
+                ha="center", va="center", fontproperties=JAPANESE_FONT_PROP)
+    points = factors["perceptual_map"]
+    for idx, (sample_id, point) in enumerate(points.items()):
+        ax.scatter(point[names[0]], point[names[1]], s=150, color=plt.cm.tab10(idx % 10), zorder=3)
+        ax.annotate(f"{sample_id}（{point['n']}件）", (point[names[0]], point[names[1]]),
+                    textcoords="offset points", xytext=(8, 8), fontsize=11, fontweight="bold",
+                    fontproperties=JAPANESE_FONT_PROP)
+    ax.axhline(0, color="black", linewidth=0.5)
+    ax.axvline(0, color="black", linewidth=0.5)
+    limit = max(1.0, *(abs(point[name]) for point in points.values() for name in names)) * 1.2
+    ax.set_xlim(-limit, limit)
+    ax.set_ylim(-limit, limit)
+    ax.set_aspect("equal")
+    for name, setter in zip(names, (ax.set_xlabel, ax.set_ylabel)):
+        setter(f"{name}（分散の {factors['components'][name]['variance_ratio']:.1%}）",
+               fontproperties=JAPANESE_FONT_PROP)
+    apply_japanese_font(ax)
+    ax.grid(alpha=0.3)
+
+    plt.tight_layout()
+    plt.savefig(CHARTS_DIR / "C10_知覚マップ.png", dpi=300, bbox_inches="tight")
+    plt.close()
+    print("  C10保存完了")
+
 print()
 print("[9/9] 可視化生成完了")
 print()
@@ -5,21 +5,28 @@ import json
 import csv
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Any, List, Optional
-import pandas as pd
+from typing import Dict, Any, List, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from services.fieldwork_stats import FieldworkStats
+
+# pandasは読み込みが重いため、エクスポート・統計処理の中でのみインポートする
+# （Phase 1〜3の表示では不要なため、起動時間を短縮する）
 
 
 class DataManager:
     """データの保存・読み込みを管理するクラス"""
     
-    def __init__(self, data_dir: Path):
+    def __init__(self, data_dir: Path, fieldwork_stats: Optional["FieldworkStats"] = None):
         """
         データマネージャーの初期化
         
         Args:
             data_dir: データ保存ディレクトリ
+            fieldwork_stats: 保存時に差分更新する実査集計（省略可）
         """
         self.data_dir = Path(data_dir)
+        self.fieldwork_stats = fieldwork_stats
         self.responses_dir = self.data_dir / "responses"
         self.exports_dir = self.data_dir / "exports"
         
@@ -50,6 +57,10 @@ class DataManager:
         with open(filepath, "w", encoding="utf-8") as f:
             json.dump(data, f, ensure_ascii=False, indent=2)
         
+        # 実査集計を差分更新（回答ストアを読み直さない）
+        if self.fieldwork_stats is not None and responses.get("completed"):
+            self.fieldwork_stats.record_completion(responses)
+        
         return filepath
     
     def load_responses_json(self, session_id: str) -> Optional[Dict[str, Any]]:
@@ -115,6 +126,8 @@ class DataManager:
             flattened_data.append(flat_row)
         
         # DataFrameに変換してCSV出力
+        import pandas as pd
+        
         df = pd.DataFrame(flattened_data)
         df.to_csv(filepath, index=False, encoding="utf-8-sig")
         
@@ -136,6 +149,8 @@ class DataManager:
         
         filepath = self.exports_dir / output_filename
         
+        import pandas as pd
+        
         all_responses = self.get_all_responses()
         if not all_responses:
             # 空のExcelを作成
@@ -203,6 +218,8 @@ class DataManager:
                 "group_b_count": 0,
             }
         
+        import pandas as pd
+        
         df = pd.DataFrame([self._flatten_dict(r) for r in all_responses])
         
         return {
@@ -0,0 +1,285 @@
+"""
+実査（フィールドワーク）集計モジュール
+
+回答の保存・ページ遷移のたびに集計値を差分更新し、
+管理者ダッシュボードが回答ストアを読み直さずに参照できるようにする。
+"""
+import json
+import threading
+import time
+from copy import deepcopy
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+
+class FieldworkStats:
+    """実査状況の集計値を差分更新で管理するクラス
+
+    1プロセス内の全セッションで共有する（app.py で st.cache_resource により保持）。
+    スナップショットをJSONファイルへ書き出し、再起動時に復元する。
+    一定時間ページ遷移のない回答中セッションは離脱として dropout に計上し、positions から削除する。
+    """
+
+    def __init__(
+        self,
+        state_file: Path,
+        save_interval: float = 5.0,
+        idle_minutes: float = 30,
+        expire_interval: float = 60.0,
+    ):
+        """
+        集計の初期化
+
+        Args:
+            state_file: スナップショットの保存先
+            save_interval: ページ遷移のみの更新を書き出す最小間隔（秒）
+            idle_minutes: この時間以上ページ遷移がない回答中セッションを離脱とみなす
+            expire_interval: ページ遷移時に離脱セッションを整理する最小間隔（秒）
+        """
+        self.state_file = Path(state_file)
+        self.save_interval = save_interval
+        self.idle_minutes = idle_minutes
+        self.expire_interval = expire_interval
+        self._lock = threading.Lock()
+        self._state = self._load()
+        self._last_saved = 0.0
+        self._last_expired = 0.0
+
+    @staticmethod
+    def _empty_state() -> Dict[str, Any]:
+        """空の集計値"""
+        return {
+            "started": 0,
+            "completed": 0,
+            "groups": {},          # グループ -> {"started": n, "completed": n}
+            "positions": {},       # 回答中セッションID -> [phase, step, 最終更新時刻]
+            "position_counts": {},  # "phase_step" -> 回答中セッション数
+            "dropout": {},         # "phase_step" -> 離脱したセッション数
+            "samples": {},         # サンプル -> SD・購買意欲の件数と合計
+            "updated_at": None,
+        }
+
+    def _load(self) -> Dict[str, Any]:
+        """保存済みスナップショットを読み込み"""
+        if not self.state_file.exists():
+            return self._empty_state()
+        with open(self.state_file, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        return {**self._empty_state(), **state}
+
+    def _save(self, force: bool = True) -> None:
+        """
+        スナップショットを書き出し（一時ファイル経由で置き換え）
+
+        Args:
+            force: Falseの場合、前回の書き出しから save_interval 未満なら省略する
+        """
+        now = time.time()
+        self._state["updated_at"] = now
+        if not force and now - self._last_saved < self.save_interval:
+            return
+        self._last_saved = now
+        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.state_file.with_suffix(".tmp")
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(self._state, f, ensure_ascii=False)
+        tmp_file.replace(self.state_file)
+
+    @property
+    def is_empty(self) -> bool:
+        """まだ何も集計されていないか"""
+        return self._state["started"] == 0 and self._state["completed"] == 0
+
+    def record_start(self, session_id: str, group: str, phase: int = 1, step: int = 1) -> None:
+        """
+        回答開始を記録
+
+        Args:
+            session_id: セッションID
+            group: 割り当てグループ
+            phase: 開始時のフェーズ
+            step: 開始時のステップ
+        """
+        with self._lock:
+            self._state["started"] += 1
+            group_counts = self._state["groups"].setdefault(group, {"started": 0, "completed": 0})
+            group_counts["started"] += 1
+            self._move(session_id, phase, step)
+            self._expire(self.idle_minutes, force=False)
+            self._save()
+
+    def record_position(self, session_id: str, phase: int, step: int) -> None:
+        """
+        ページ遷移を記録（離脱位置の集計用）
+
+        Args:
+            session_id: セッションID
+            phase: 現在のフェーズ
+            step: 現在のステップ
+        """
+        with self._lock:
+            self._move(session_id, phase, step)
+            self._expire(self.idle_minutes, force=False)
+            self._save(force=False)
+
+    def record_completion(self, record: Dict[str, Any]) -> None:
+        """
+        回答完了を記録し、サンプルごとの平均値を差分更新
+
+        Args:
+            record: SessionManager.get_all_data() 形式の回答データ
+        """
+        with self._lock:
+            self._fold_completion(record)
+            self._save()
+
+    def _fold_completion(self, record: Dict[str, Any]) -> None:
+        """完了した回答1件を集計値に加算（ロック取得済みで呼び出す）"""
+        session_id = record.get("session_id")
+        group = record.get("group")
+
+        self._state["completed"] += 1
+        if group is not None:
+            group_counts = self._state["groups"].setdefault(group, {"started": 0, "completed": 0})
+            group_counts["completed"] += 1
+        self._remove_position(session_id)
+
+        for key, evaluation in (record.get("responses") or {}).items():
+            if not key.startswith("evaluation_") or not isinstance(evaluation, dict):
+                continue
+            sample_id = evaluation.get("sample_id") or key[len("evaluation_"):]
+            sample = self._state["samples"].setdefault(sample_id, {
+                "sd_sum": {}, "sd_n": {}, "intent_sum": 0.0, "intent_n": 0,
+            })
+            for axis_id, score in (evaluation.get("sd_scores") or {}).items():
+                if score is None:
+                    continue
+                sample["sd_sum"][axis_id] = sample["sd_sum"].get(axis_id, 0.0) + float(score)
+                sample["sd_n"][axis_id] = sample["sd_n"].get(axis_id, 0) + 1
+            intent = parse_purchase_intent(evaluation.get("purchase_intent"))
+            if intent is not None:
+                sample["intent_sum"] += intent
+                sample["intent_n"] += 1
+
+    def _move(self, session_id: str, phase: int, step: int) -> None:
+        """セッションの現在位置を更新（ロック取得済みで呼び出す）"""
+        self._remove_position(session_id)
+        self._state["positions"][session_id] = [phase, step, time.time()]
+        position_key = f"{phase}_{step}"
+        counts = self._state["position_counts"]
+        counts[position_key] = counts.get(position_key, 0) + 1
+
+    def _remove_position(self, session_id: Optional[str]) -> None:
+        """セッションの現在位置を削除（ロック取得済みで呼び出す）"""
+        previous = self._state["positions"].pop(session_id, None)
+        if previous is None:
+            return
+        position_key = f"{previous[0]}_{previous[1]}"
+        counts = self._state["position_counts"]
+        counts[position_key] = counts.get(position_key, 1) - 1
+        if counts[position_key] <= 0:
+            del counts[position_key]
+
+    def _expire(self, idle_minutes: float, force: bool = True) -> int:
+        """
+        一定時間ページ遷移のないセッションを離脱として dropout に移す（ロック取得済みで呼び出す）
+
+        Args:
+            idle_minutes: この時間以上ページ遷移がないセッションを離脱とみなす
+            force: Falseの場合、前回の整理から expire_interval 未満なら省略する
+
+        Returns:
+            離脱とみなしたセッション数
+        """
+        now = time.time()
+        if not force and now - self._last_expired < self.expire_interval:
+            return 0
+        self._last_expired = now
+        idle_before = now - idle_minutes * 60
+        expired = [
+            session_id for session_id, (_, _, last_seen) in self._state["positions"].items()
+            if last_seen < idle_before
+        ]
+        dropout = self._state["dropout"]
+        for session_id in expired:
+            phase, step, _ = self._state["positions"][session_id]
+            position_key = f"{phase}_{step}"
+            dropout[position_key] = dropout.get(position_key, 0) + 1
+            self._remove_position(session_id)
+        return len(expired)
+
+    def rebuild(self, records: Iterable[Dict[str, Any]]) -> None:
+        """
+        保存済みの完了回答から集計値を再構築（集計ファイルがない初回のみ使用）
+
+        Args:
+            records: DataManager.get_all_responses() 形式の保存データ
+        """
+        with self._lock:
+            self._state = self._empty_state()
+            for saved in records:
+                record = saved.get("responses", saved)
+                group = record.get("group")
+                self._state["started"] += 1
+                if group is not None:
+                    group_counts = self._state["groups"].setdefault(group, {"started": 0, "completed": 0})
+                    group_counts["started"] += 1
+                self._fold_completion(record)
+            self._save()
+
+    def snapshot(self, idle_minutes: float = 30) -> Dict[str, Any]:
+        """
+        ダッシュボード表示用の集計結果を取得
+
+        Args:
+            idle_minutes: この時間以上ページ遷移がない回答中セッションを離脱とみなす
+
+        Returns:
+            完了数・グループ別件数・離脱位置・サンプル別平均値
+        """
+        with self._lock:
+            if self._expire(idle_minutes):
+                self._save()
+            state = deepcopy(self._state)
+
+        sample_means = {}
+        for sample_id, sample in state["samples"].items():
+            sample_means[sample_id] = {
+                "sd_means": {
+                    axis_id: sample["sd_sum"][axis_id] / n
+                    for axis_id, n in sample["sd_n"].items() if n
+                },
+                "purchase_intent_mean": (
+                    sample["intent_sum"] / sample["intent_n"] if sample["intent_n"] else None
+                ),
+                "n": sample["intent_n"],
+            }
+
+        return {
+            "started": state["started"],
+            "completed": state["completed"],
+            "active": len(state["positions"]),
+            "groups": state["groups"],
+            "position_counts": state["position_counts"],
+            "dropout": state["dropout"],
+            "samples": sample_means,
+            "updated_at": state["updated_at"],
+        }
+
+
+def parse_purchase_intent(value: Any) -> Optional[int]:
+    """
+    購買意欲の回答（"5: どちらかといえば購入したい" または数値）を1〜7の整数に変換
+
+    Args:
+        value: 回答値
+
+    Returns:
+        整数値（変換できない場合はNone）
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    head = str(value).split(":", 1)[0].strip()
+    return int(head) if head.isdigit() else None
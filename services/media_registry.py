@@ -0,0 +1,332 @@
+"""
+メディアレジストリモジュール
+
+起動時に素材ファイル（音声・動画）を一度だけ検査し、
+サイズ・再生時間・MIMEタイプ・コンテンツハッシュを保持する。
+プレイヤーは再実行のたびにファイルシステムへアクセスせず、レジストリを参照する。
+"""
+import hashlib
+import mimetypes
+import struct
+import wave
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+# ハッシュ計算時の読み込みサイズ
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+# 拡張子からMIMEタイプを推定できない場合の対応表
+_FALLBACK_MIME_TYPES = {
+    ".mp3": "audio/mpeg",
+    ".wav": "audio/wav",
+    ".mp4": "video/mp4",
+    ".m4v": "video/mp4",
+    ".webm": "video/webm",
+    ".ogg": "video/ogg",
+}
+
+
+class MediaRegistryError(Exception):
+    """素材ファイルの検証に失敗した場合の例外"""
+
+
+@dataclass(frozen=True)
+class MediaAsset:
+    """素材ファイルのメタデータ"""
+
+    key: str
+    path: Path
+    size: int
+    sha256: str
+    mime_type: str
+    duration: Optional[float] = None
+
+    @property
+    def content_hash(self) -> str:
+        """キャッシュ無効化用の短いコンテンツハッシュ"""
+        return self.sha256[:16]
+
+    @property
+    def is_audio(self) -> bool:
+        """音声ファイルかどうか"""
+        return self.mime_type.startswith("audio/")
+
+
+class MediaRegistry:
+    """素材ファイルのメタデータとバイト列を管理するクラス"""
+
+    def __init__(self, assets: Dict[str, MediaAsset], missing: Dict[str, Path]):
+        """
+        メディアレジストリの初期化
+
+        Args:
+            assets: キー -> 素材メタデータ
+            missing: キー -> 見つからなかったファイルのパス
+        """
+        self.assets = assets
+        self.missing = missing
+        self._bytes_cache: Dict[str, bytes] = {}
+
+    @classmethod
+    def build(cls, sources: Dict[str, Path]) -> "MediaRegistry":
+        """
+        素材ファイルを検査してレジストリを構築
+
+        Args:
+            sources: キー -> ファイルパス
+
+        Returns:
+            構築したレジストリ
+        """
+        assets = {}
+        missing = {}
+        for key, path in sources.items():
+            path = Path(path)
+            if not path.is_file():
+                missing[key] = path
+                continue
+            assets[key] = _inspect_file(key, path)
+        return cls(assets, missing)
+
+    def validate(self) -> None:
+        """
+        全ての素材ファイルが存在することを検証
+
+        Raises:
+            MediaRegistryError: 見つからない素材ファイルがある場合
+        """
+        if self.missing:
+            lines = [f"  - {key}: {path}" for key, path in self.missing.items()]
+            raise MediaRegistryError(
+                "素材ファイルが見つかりません:\n" + "\n".join(lines)
+            )
+
+    def get(self, key: str) -> Optional[MediaAsset]:
+        """
+        素材メタデータを取得
+
+        Args:
+            key: 素材キー
+
+        Returns:
+            素材メタデータ（未登録・欠損の場合はNone）
+        """
+        return self.assets.get(key)
+
+    def read_bytes(self, key: str) -> bytes:
+        """
+        素材ファイルのバイト列を取得（初回のみファイルを読み込みキャッシュする）
+
+        Args:
+            key: 素材キー
+
+        Returns:
+            ファイル内容
+        """
+        data = self._bytes_cache.get(key)
+        if data is None:
+            asset = self.assets[key]
+            data = asset.path.read_bytes()
+            self._bytes_cache[key] = data
+        return data
+
+    def summary(self) -> List[Dict[str, object]]:
+        """
+        登録内容の一覧を取得
+
+        Returns:
+            素材ごとのメタデータ（欠損分を含む）
+        """
+        rows = []
+        for key, asset in self.assets.items():
+            rows.append({
+                "key": key,
+                "path": str(asset.path),
+                "size": asset.size,
+                "duration": asset.duration,
+                "mime_type": asset.mime_type,
+                "content_hash": asset.content_hash,
+                "status": "ok",
+            })
+        for key, path in self.missing.items():
+            rows.append({"key": key, "path": str(path), "status": "missing"})
+        return rows
+
+
+def _inspect_file(key: str, path: Path) -> MediaAsset:
+    """ファイルのハッシュ・サイズ・MIMEタイプ・再生時間を取得"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+
+    suffix = path.suffix.lower()
+    mime_type = _FALLBACK_MIME_TYPES.get(suffix) or mimetypes.guess_type(path.name)[0]
+
+    return MediaAsset(
+        key=key,
+        path=path,
+        size=path.stat().st_size,
+        sha256=digest.hexdigest(),
+        mime_type=mime_type or "application/octet-stream",
+        duration=_probe_duration(path, suffix),
+    )
+
+
+def _probe_duration(path: Path, suffix: str) -> Optional[float]:
+    """
+    再生時間（秒）を取得
+
+    外部ライブラリを使わずにヘッダーのみを解析する。
+    解析できない形式の場合はNoneを返す。
+    """
+    try:
+        if suffix == ".mp3":
+            return _probe_mp3_duration(path)
+        if suffix in (".mp4", ".m4v", ".m4a", ".mov"):
+            return _probe_mp4_duration(path)
+        if suffix == ".wav":
+            with wave.open(str(path), "rb") as w:
+                return w.getnframes() / float(w.getframerate())
+    except (OSError, EOFError, struct.error, wave.Error):
+        return None
+    return None
+
+
+# MPEG Audio Layer III のビットレート表（kbps）
+_MP3_BITRATES = {
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+# バージョンビット -> (MPEGバージョン, サンプリング周波数表)
+_MP3_SAMPLE_RATES = {
+    0b11: (1, [44100, 48000, 32000]),
+    0b10: (2, [22050, 24000, 16000]),
+    0b00: (2, [11025, 12000, 8000]),  # MPEG 2.5
+}
+
+
+def _probe_mp3_duration(path: Path) -> Optional[float]:
+    """MP3の再生時間を取得（Xing/Infoヘッダー、なければCBRとして推定）"""
+    file_size = path.stat().st_size
+    with open(path, "rb") as f:
+        head = f.read(64 * 1024)
+
+    # ID3v2タグを読み飛ばす
+    offset = 0
+    if head[:3] == b"ID3" and len(head) >= 10:
+        tag_size = (head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9]
+        offset = 10 + tag_size + (10 if head[5] & 0x10 else 0)
+        if offset + 4 > len(head):
+            with open(path, "rb") as f:
+                f.seek(offset)
+                head = b"\0" * offset + f.read(64 * 1024)
+
+    # フレーム同期を探す
+    while offset + 4 <= len(head):
+        if head[offset] == 0xFF and (head[offset + 1] & 0xE0) == 0xE0:
+            break
+        offset += 1
+    else:
+        return None
+
+    header = struct.unpack(">I", head[offset:offset + 4])[0]
+    version_bits = (header >> 19) & 0b11
+    layer_bits = (header >> 17) & 0b11
+    bitrate_index = (header >> 12) & 0xF
+    sample_rate_index = (header >> 10) & 0b11
+    channel_mode = (header >> 6) & 0b11
+
+    if version_bits not in _MP3_SAMPLE_RATES or layer_bits != 0b01 or sample_rate_index == 3:
+        return None
+    version, sample_rates = _MP3_SAMPLE_RATES[version_bits]
+    sample_rate = sample_rates[sample_rate_index]
+    samples_per_frame = 1152 if version == 1 else 576
+
+    # Xing/Infoヘッダー（VBR・LAMEエンコード）からフレーム数を取得
+    mono = channel_mode == 0b11
+    side_info = (17 if mono else 32) if version == 1 else (9 if mono else 17)
+    xing = offset + 4 + side_info
+    if head[xing:xing + 4] in (b"Xing", b"Info"):
+        flags = struct.unpack(">I", head[xing + 4:xing + 8])[0]
+        if flags & 0x1:
+            frames = struct.unpack(">I", head[xing + 8:xing + 12])[0]
+            return frames * samples_per_frame / float(sample_rate)
+
+    # CBRとして推定
+    bitrate = _MP3_BITRATES[version][bitrate_index] * 1000
+    if bitrate == 0:
+        return None
+    return (file_size - offset) * 8 / float(bitrate)
+
+
+def _probe_mp4_duration(path: Path) -> Optional[float]:
+    """MP4の再生時間を取得（moov/mvhd ボックスを解析）"""
+    with open(path, "rb") as f:
+        moov = _find_box(f, b"moov", path.stat().st_size)
+        if moov is None:
+            return None
+        start, size = moov
+        f.seek(start)
+        mvhd = _find_box(f, b"mvhd", start + size)
+        if mvhd is None:
+            return None
+        f.seek(mvhd[0])
+        version = f.read(4)[0]
+        if version == 1:
+            f.seek(16, 1)
+            timescale, duration = struct.unpack(">IQ", f.read(12))
+        else:
+            f.seek(8, 1)
+            timescale, duration = struct.unpack(">II", f.read(8))
+    if timescale == 0:
+        return None
+    return duration / float(timescale)
+
+
+def _find_box(f, box_type: bytes, end: int) -> Optional[tuple]:
+    """
+    現在位置から end までの範囲で指定タイプのボックスを探す
+
+    Returns:
+        (ボックス本体の開始位置, 本体サイズ)
+    """
+    while f.tell() + 8 <= end:
+        box_start = f.tell()
+        size, current_type = struct.unpack(">I4s", f.read(8))
+        header_size = 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            header_size = 16
+        elif size == 0:
+            size = end - box_start
+        if size < header_size:
+            return None
+        if current_type == box_type:
+            return box_start + header_size, size - header_size
+        f.seek(box_start + size)
+    return None
+
+
+if __name__ == "__main__":
+    # デプロイ前の素材チェック: python -m services.media_registry
+    import sys
+
+    sys.path.insert(0, str(Path(__file__).parent.parent))
+    from config import MEDIA_ASSETS
+
+    registry = MediaRegistry.build(MEDIA_ASSETS)
+    for row in registry.summary():
+        if row["status"] == "ok":
+            duration = f"{row['duration']:.2f}s" if row["duration"] is not None else "不明"
+            print(f"[OK]      {row['key']}: {row['mime_type']}, {row['size']:,} bytes, "
+                  f"{duration}, hash={row['content_hash']}")
+        else:
+            print(f"[MISSING] {row['key']}: {row['path']}")
+    try:
+        registry.validate()
+    except MediaRegistryError as e:
+        print(e)
+        sys.exit(1)
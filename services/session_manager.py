@@ -3,11 +3,23 @@
 """
 import uuid
 import random
+import time
+from array import array
 from datetime import datetime
 from typing import Any, Dict, Optional
 import streamlit as st
 
 
+# 同一コールバック内の連続遷移（set_phase → set_step 等）で生じる
+# 滞在時間がほぼゼロのページは記録しない
+_MIN_STEP_SECONDS = 0.05
+
+
+def _page_code(phase: int, step: int) -> int:
+    """フェーズ・ステップをページコード（phase * 100 + step）に変換"""
+    return phase * 100 + step
+
+
 class SessionManager:
     """セッション状態を管理するクラス"""
     
@@ -43,6 +55,13 @@ class SessionManager:
         
         if "audio_check_passed" not in st.session_state:
             st.session_state.audio_check_passed = False
+        
+        if "step_clock_origin" not in st.session_state:
+            # ページごとの入退室時刻（start_time からの単調増加オフセット, ミリ秒）
+            st.session_state.step_clock_origin = time.monotonic()
+            st.session_state.step_pages = array("H", [_page_code(1, 1)])
+            st.session_state.step_enter_ms = array("q", [0])
+            st.session_state.step_leave_ms = array("q")
     
     def _assign_group(self) -> str:
         """ランダムにグループを割り当て"""
@@ -85,20 +104,69 @@ class SessionManager:
     def next_step(self) -> None:
         """次のステップへ進む"""
         st.session_state.current_step += 1
+        self._record_step_transition()
     
     def next_phase(self) -> None:
         """次のフェーズへ進む"""
         st.session_state.current_phase += 1
         st.session_state.current_step = 1
+        self._record_step_transition()
     
     def set_phase(self, phase: int) -> None:
         """フェーズを設定"""
         st.session_state.current_phase = phase
         st.session_state.current_step = 1
+        self._record_step_transition()
     
     def set_step(self, step: int) -> None:
         """ステップを設定"""
         st.session_state.current_step = step
+        self._record_step_transition()
+    
+    def _elapsed_ms(self) -> int:
+        """セッション開始からの経過時間（ミリ秒, 単調増加）"""
+        return int((time.monotonic() - st.session_state.step_clock_origin) * 1000)
+    
+    def _close_current_step(self, now_ms: int) -> None:
+        """表示中のページの退室時刻を記録（滞在時間がほぼゼロのページは破棄）"""
+        pages = st.session_state.step_pages
+        enter_ms = st.session_state.step_enter_ms
+        leave_ms = st.session_state.step_leave_ms
+        if len(leave_ms) == len(pages):
+            return
+        if now_ms - enter_ms[-1] < _MIN_STEP_SECONDS * 1000 and len(pages) > 1:
+            pages.pop()
+            enter_ms.pop()
+        else:
+            leave_ms.append(now_ms)
+    
+    def _record_step_transition(self) -> None:
+        """ページ遷移を記録（前のページを閉じ、新しいページを開く）"""
+        code = _page_code(self.current_phase, self.current_step)
+        pages = st.session_state.step_pages
+        if len(st.session_state.step_leave_ms) < len(pages) and pages[-1] == code:
+            return
+        now_ms = self._elapsed_ms()
+        self._close_current_step(now_ms)
+        pages.append(code)
+        st.session_state.step_enter_ms.append(now_ms)
+    
+    def get_step_timings(self) -> Dict[str, list]:
+        """
+        ページごとの入退室時刻を取得
+        
+        Returns:
+            pages（phase * 100 + step）と、start_time からの入室・退室オフセット（ミリ秒）。
+            表示中のページの退室時刻は現在時刻とする。
+        """
+        leave_ms = st.session_state.step_leave_ms.tolist()
+        if len(leave_ms) < len(st.session_state.step_pages):
+            leave_ms.append(self._elapsed_ms())
+        return {
+            "pages": st.session_state.step_pages.tolist(),
+            "enter_ms": st.session_state.step_enter_ms.tolist(),
+            "leave_ms": leave_ms,
+        }
     
     def save_response(self, key: str, value: Any) -> None:
         """回答を保存"""
@@ -137,6 +205,7 @@ class SessionManager:
         """アンケートを完了"""
         st.session_state.completed = True
         st.session_state.responses["completed_at"] = datetime.now().isoformat()
+        self._close_current_step(self._elapsed_ms())
     
     @property
     def is_completed(self) -> bool:
@@ -153,6 +222,7 @@ class SessionManager:
             "current_step": self.current_step,
             "sample_order": self.sample_order,
             "completed": self.is_completed,
+            "step_timings": self.get_step_timings(),
             "responses": self.responses,
         }
     